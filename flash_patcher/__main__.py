@@ -1,9 +1,12 @@
 #!/usr/bin/env python3
 
-from argparse import ArgumentParser, Namespace
+import os
+from argparse import ArgumentParser, ArgumentTypeError, Namespace
 from pathlib import Path
 
-from flash_patcher.patcher import main, print_version
+from flash_patcher.compile.cache import CACHE_FORMATS, parse_size
+from flash_patcher.compile.ffdec import DEFAULT_PROFILE, FFDEC_PROFILES
+from flash_patcher.patcher import list_cache, main, print_version, prune_cache
 
 def validate_args(args: Namespace) -> bool:
     """Validate if all CLI arguments are provided correctly.
@@ -11,6 +14,55 @@ def validate_args(args: Namespace) -> bool:
     """
     return args.input_swf and args.folder and args.stagefile and args.output_swf
 
+def parse_jobs(jobs: str) -> int:
+    """Parse a number of processes to run at once, which must be at least 1."""
+    try:
+        count = int(jobs)
+    except ValueError as exc:
+        raise ArgumentTypeError(f"invalid number of jobs: {jobs}") from exc
+
+    if count < 1:
+        raise ArgumentTypeError(f"the number of jobs must be at least 1, not {count}")
+
+    return count
+
+def add_cache_commands(parser: ArgumentParser) -> None:
+    """Add the `cache` subcommands, used to inspect and manage the decompilation cache."""
+    subparsers = parser.add_subparsers(dest="command")
+
+    cache_parser = subparsers.add_parser(
+        "cache",
+        help="Manage cached decompilations",
+    )
+
+    cache_subparsers = cache_parser.add_subparsers(dest="cache_command", required=True)
+
+    cache_subparsers.add_parser(
+        "ls",
+        help="List cached decompilations, most recently used first",
+    )
+
+    prune_parser = cache_subparsers.add_parser(
+        "prune",
+        help="Evict the least recently used decompilations, builds, patched scripts and parses, "
+            "and remove the folders of finished runs",
+    )
+
+    prune_parser.add_argument(
+        "--cacheSize",
+        dest="cache_size",
+        type=parse_size,
+        default=None,
+        help="Evict until the cache fits in this size, like 500M or 2G (default: clear the cache)",
+    )
+
+def run_cache_command(args: Namespace) -> None:
+    """Run a `cache` subcommand."""
+    if args.cache_command == "ls":
+        list_cache(args.cache_dir)
+    else:
+        prune_cache(args.cache_size, args.cache_dir, args.workspace_dir)
+
 def cli() -> None:
     """Run Flash Patcher from the CLI."""
     parser = ArgumentParser()
@@ -56,7 +108,7 @@ def cli() -> None:
         dest="recompile_all",
         default=False,
         action="store_true",
-        help="Recompile the whole SWF (if this is off, only scripts will recompile)",
+        help="Recompile the whole SWF (if this is off, only the changed parts will recompile)",
     )
 
     parser.add_argument(
@@ -67,6 +119,130 @@ def cli() -> None:
         help="Inject into an XML decompilation instead of standard syntax",
     )
 
+    parser.add_argument(
+        "--pcode",
+        dest="pcode",
+        default=False,
+        action="store_true",
+        help="Patch P-code (.pcode files) instead of ActionScript, "
+            "so FFDec assembles scripts on import instead of compiling them",
+    )
+
+    parser.add_argument(
+        "--cacheSize",
+        dest="cache_size",
+        type=parse_size,
+        default=None,
+        help="Maximum size of the decompilation cache, like 500M or 2G (default: unbounded)",
+    )
+
+    parser.add_argument(
+        "--buildCacheSize",
+        dest="build_cache_size",
+        type=parse_size,
+        default=None,
+        help="Maximum size of the build cache, like 500M or 2G (default: --cacheSize)",
+    )
+
+    parser.add_argument(
+        "--cacheDir",
+        dest="cache_dir",
+        type=Path,
+        default=os.getenv("FLASH_PATCHER_CACHE_DIR"),
+        help="Decompilation cache folder, which may be shared between machines "
+            "(default: $FLASH_PATCHER_CACHE_DIR, or .Patcher-Temp/cache)",
+    )
+
+    parser.add_argument(
+        "--cacheFormat",
+        dest="cache_format",
+        choices=CACHE_FORMATS,
+        default="files",
+        help="How to cache decompiled scripts: as loose files, or packed into a single "
+            "database, optionally compressed (default: files)",
+    )
+
+    parser.add_argument(
+        "--ffdec",
+        dest="ffdec",
+        type=str,
+        default=os.getenv("FLASH_PATCHER_FFDEC"),
+        help="FFDec command to use, skipping detection "
+            "(default: $FLASH_PATCHER_FFDEC, or the detected install)",
+    )
+
+    parser.add_argument(
+        "--ffdecJava",
+        dest="ffdec_java",
+        default=False,
+        action="store_true",
+        help="Start FFDec with Java directly, with a shared class archive and a heap sized "
+            "from the SWF (needs ffdec.jar next to the FFDec launcher)",
+    )
+
+    parser.add_argument(
+        "--ffdecProfile",
+        dest="ffdec_profile",
+        choices=FFDEC_PROFILES,
+        default=DEFAULT_PROFILE,
+        help="FFDec performance profile: fast-export decompiles in parallel and gives up "
+            "quickly on slow methods, safe favors fidelity over speed (default: default)",
+    )
+
+    parser.add_argument(
+        "--ffdecReport",
+        dest="ffdec_report",
+        type=Path,
+        default=None,
+        help="Write the time, memory use, exit code and output of every FFDec command "
+            "to this JSON file",
+    )
+
+    parser.add_argument(
+        "--ffdecWorker",
+        dest="ffdec_worker",
+        default=False,
+        action="store_true",
+        help="Run FFDec commands in a worker process that loads FFDec ahead of time "
+            "(needs Java 11 or later and ffdec.jar next to the FFDec launcher)",
+    )
+
+    parser.add_argument(
+        "--selective",
+        dest="selective",
+        default=False,
+        action="store_true",
+        help="Only decompile the scripts the patches target, unless the whole SWF is cached "
+            "(other scripts are decompiled if needed)",
+    )
+
+    parser.add_argument(
+        "--exportJobs",
+        dest="export_jobs",
+        type=parse_jobs,
+        default=1,
+        help="Most FFDec processes to run at once, like to export the SWF in shards "
+            "of its frames and sprites (default: 1)",
+    )
+
+    parser.add_argument(
+        "--memoryBudget",
+        dest="memory_budget",
+        type=parse_size,
+        default=None,
+        help="Maximum size of scripts to keep in memory while patching, like 200M "
+            "(default: unbounded)",
+    )
+
+    parser.add_argument(
+        "--workspace",
+        dest="workspace_dir",
+        type=Path,
+        default=os.getenv("FLASH_PATCHER_WORKSPACE"),
+        help="Folder to patch in, like a tmpfs mount. Each run uses its own subfolder "
+            "(default: $FLASH_PATCHER_WORKSPACE, or .Patcher-Temp/runs)",
+    )
+
     parser.add_argument(
         "--version",
         dest="version",
@@ -83,12 +259,18 @@ def cli() -> None:
         help="Show verbose logging output",
     )
 
+    add_cache_commands(parser)
+
     args = parser.parse_args()
 
     if args.version:
         print_version()
         return
 
+    if args.command == "cache":
+        run_cache_command(args)
+        return
+
     if not validate_args(args):
         parser.print_usage()
         print("flash-patcher: error: the following arguments are required:\n \
@@ -104,6 +286,20 @@ def cli() -> None:
         recompile_all=args.recompile_all,
         xml_mode=args.xml_mode,
         verbose=args.verbose,
+        cache_size=args.cache_size,
+        cache_dir=args.cache_dir,
+        cache_format=args.cache_format,
+        ffdec=args.ffdec,
+        memory_budget=args.memory_budget,
+        workspace_dir=args.workspace_dir,
+        ffdec_worker=args.ffdec_worker,
+        selective=args.selective,
+        export_jobs=args.export_jobs,
+        ffdec_profile=args.ffdec_profile,
+        ffdec_java=args.ffdec_java,
+        ffdec_report=args.ffdec_report,
+        pcode=args.pcode,
+        build_cache_size=args.build_cache_size,
     )
 
 
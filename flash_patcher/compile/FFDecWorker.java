@@ -0,0 +1,128 @@
+import java.io.BufferedReader;
+import java.io.IOException;
+import java.io.InputStreamReader;
+import java.io.OutputStream;
+import java.io.PrintStream;
+import java.lang.reflect.InvocationTargetException;
+import java.lang.reflect.Method;
+import java.nio.charset.StandardCharsets;
+import java.security.Permission;
+import java.util.jar.JarFile;
+
+/**
+ * Runs FFDec commands sent by Flash Patcher over stdin, in a JVM that already loaded FFDec.
+ *
+ * Usage: java -cp ffdec.jar FFDecWorker.java
+ *
+ * Once FFDec is loaded, the worker prints "ready persistent" or "ready single".
+ * Each command is then read as one line, with arguments separated by tabs.
+ *
+ * A persistent worker catches FFDec's calls to System.exit, prints "status [exit code]"
+ * after each command, and runs commands until stdin is closed. This needs a Java version
+ * that still supports security managers (up to 23). Otherwise, a single worker runs
+ * one command and exits with its exit code.
+ */
+public class FFDecWorker {
+
+    /** Thrown instead of stopping the JVM when FFDec calls System.exit. */
+    static class ExitTrap extends SecurityException {
+        final int status;
+
+        ExitTrap(int status) {
+            super("System.exit(" + status + ")");
+            this.status = status;
+        }
+    }
+
+    static volatile boolean trapExit = false;
+
+    public static void main(String[] args) throws Exception {
+        PrintStream protocol = System.out;
+
+        // FFDec output would get mixed with the replies
+        System.setOut(new PrintStream(OutputStream.nullOutputStream()));
+
+        BufferedReader commands = new BufferedReader(
+            new InputStreamReader(System.in, StandardCharsets.UTF_8)
+        );
+
+        Method entry = findEntry();
+        boolean persistent = trapExits();
+
+        protocol.println(persistent ? "ready persistent" : "ready single");
+        protocol.flush();
+
+        String command;
+
+        while ((command = commands.readLine()) != null) {
+            int status = run(entry, command.split("\t", -1));
+
+            if (!persistent) {
+                System.exit(status);
+            }
+
+            protocol.println("status " + status);
+            protocol.flush();
+        }
+
+        // FFDec may have left threads running
+        trapExit = false;
+        System.exit(0);
+    }
+
+    /** Return the main method of the jar on the classpath (ffdec.jar). */
+    static Method findEntry() throws IOException, ReflectiveOperationException {
+        String jar = System.getProperty("java.class.path").split(java.io.File.pathSeparator)[0];
+
+        try (JarFile file = new JarFile(jar)) {
+            String mainClass = file.getManifest().getMainAttributes().getValue("Main-Class");
+            return Class.forName(mainClass).getMethod("main", String[].class);
+        }
+    }
+
+    /** Catch calls to System.exit from now on. Returns false if this Java version can't. */
+    @SuppressWarnings("removal")
+    static boolean trapExits() {
+        try {
+            System.setSecurityManager(new SecurityManager() {
+                @Override
+                public void checkPermission(Permission permission) {
+                }
+
+                @Override
+                public void checkPermission(Permission permission, Object context) {
+                }
+
+                @Override
+                public void checkExit(int status) {
+                    if (trapExit) {
+                        throw new ExitTrap(status);
+                    }
+                }
+            });
+        } catch (UnsupportedOperationException | SecurityException e) {
+            return false;
+        }
+
+        trapExit = true;
+        return true;
+    }
+
+    /** Run an FFDec command, and return its exit code. */
+    static int run(Method entry, String[] args) {
+        try {
+            entry.invoke(null, (Object) args);
+            return 0;
+        } catch (InvocationTargetException e) {
+            for (Throwable cause = e.getCause(); cause != null; cause = cause.getCause()) {
+                if (cause instanceof ExitTrap) {
+                    return ((ExitTrap) cause).status;
+                }
+            }
+
+            return 1;
+        } catch (ReflectiveOperationException | RuntimeException e) {
+            return 1;
+        }
+    }
+}
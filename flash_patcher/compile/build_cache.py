@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import shutil
+from importlib.metadata import PackageNotFoundError, version
+from pathlib import Path
+
+from flash_patcher.compile.cache import CacheManager, get_payload_location
+from flash_patcher.compile.ffdec import FFDecInterface, get_install_stamp
+from flash_patcher.exception.dependency import DependencyError
+from flash_patcher.exception.injection import InjectionError
+from flash_patcher.parse.build_inputs import collect_build_inputs
+from flash_patcher.util.hashing import hash_file, hash_parts
+from flash_patcher.util.logging import logger
+
+BUILD_CACHE_ROOT = Path("./.Patcher-Temp/builds")
+
+def get_patcher_version() -> str:
+    """Return the installed Flash Patcher version, since it affects the output."""
+    try:
+        return version("flash_patcher")
+    except PackageNotFoundError:
+        return "unknown"
+
+def get_decompiler_fingerprint(decompiler: FFDecInterface) -> str:
+    """Identify the FFDec install without starting the JVM.
+
+    This uses the location of FFDec and its install stamp (see get_install_stamp),
+    which changes when it's updated, even through Flatpak, and the performance profile it runs with.
+    """
+    stamp = get_install_stamp(decompiler.path, decompiler.args) or []
+
+    return hash_parts(
+        str(decompiler.path),
+        *decompiler.args,
+        *decompiler.get_profile_args(),
+        *map(str, stamp),
+    )
+
+def get_build_fingerprint(
+    inputfile: Path,
+    folder: Path,
+    stagefile: Path,
+    decompiler: FFDecInterface,
+    flags: list[str],
+) -> str | None:
+    """Return the fingerprint of a build, which identifies its output SWF.
+
+    This covers the input SWF, every patch file, asset and Python script reached from the
+    stagefile, the variables they define, the Flash Patcher and FFDec installs,
+    and the given CLI flags. Returns None if the build can't be fingerprinted
+    (for example, if a Python script generates an asset that another patch uses).
+    """
+    try:
+        inputs, variables = collect_build_inputs(folder / stagefile, folder)
+
+        parts = [
+            hash_file(inputfile),
+            get_patcher_version(),
+            get_decompiler_fingerprint(decompiler),
+            variables,
+            *flags,
+        ]
+
+        for file in inputs:
+            parts += [file.as_posix(), hash_file(file)]
+
+    except (OSError, DependencyError, InjectionError, NameError):
+        logger.info("Could not fingerprint the build inputs. Skipping the build cache...")
+        return None
+
+    return hash_parts(*parts)
+
+def restore_build(cache: CacheManager, fingerprint: str, output: Path) -> bool:
+    """Copy a previously built SWF with the same fingerprint to the output location.
+
+    Returns True if the build was restored.
+    """
+    entry = cache.lookup(fingerprint)
+
+    if entry is None:
+        return False
+
+    shutil.copyfile(entry.get_payload(), output)
+    return True
+
+def store_build(cache: CacheManager, fingerprint: str, output: Path) -> None:
+    """Save a freshly built SWF in the build cache."""
+    with cache.lock(fingerprint):
+        staging = cache.begin(fingerprint)
+
+        try:
+            shutil.copyfile(output, get_payload_location(staging, "build"))
+        except BaseException:
+            cache.abort(staging)
+            raise
+
+        cache.commit(fingerprint, staging, output.name, "build")
+
+    cache.evict(keep={fingerprint})
@@ -0,0 +1,449 @@
+from __future__ import annotations
+
+import json
+import os
+import re
+import shutil
+import time
+import uuid
+from pathlib import Path
+
+from flash_patcher.compile.manifest import build_manifest, get_manifest_size, verify_manifest
+from flash_patcher.util.file_lock import FileLock
+from flash_patcher.util.logging import logger
+
+CACHE_ROOT = Path("./.Patcher-Temp/cache")
+
+# Each cache entry is a folder containing the metadata file, the manifest
+# and the decompiled payload.
+# The modification time of the metadata file doubles as the last-use time of the entry.
+METADATA_FILE = "entry.json"
+MANIFEST_FILE = "manifest.json"
+PAYLOAD_SCRIPTS = "export"
+PAYLOAD_XML = "swf.xml"
+PAYLOAD_PACKED = "scripts.db"
+PAYLOAD_BUILD = "output.swf"
+
+# Scripts can be cached as loose files, or packed into a single SQLite database
+# (optionally zlib-compressed), which is much cheaper on network and overlay filesystems
+CACHE_FORMATS = ("files", "packed", "packed-zlib")
+
+# Entries are populated in a staging folder next to the entry, which is renamed into place
+# once the export succeeded. Staging folders are named [key].staging-[unique id].
+STAGING_MARKER = ".staging-"
+TRASH_MARKER = ".trash-"
+
+# Entries are only populated or evicted while holding the lock file [key].lock,
+# so several processes (or machines sharing the cache folder) never export the same SWF at once.
+LOCK_SUFFIX = ".lock"
+
+# Automatic eviction never removes entries that were used this recently (in seconds),
+# since another run may still be linking scripts out of them while it patches.
+# This applies to the local cache too, since several runs may share the same .Patcher-Temp.
+EVICTION_GRACE = 600
+
+SIZE_UNITS = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+SIZE_PATTERN = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*([KMGT]?)i?B?\s*$", re.IGNORECASE)
+
+def parse_size(size: str) -> int:
+    """Parse a human-readable size (like 500M or 2G) into a number of bytes.
+
+    Plain numbers are treated as bytes. Raises ValueError on invalid input.
+    """
+    match = SIZE_PATTERN.match(size)
+
+    if match is None:
+        raise ValueError(f"Invalid size: {size}")
+
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2).upper()])
+
+def format_size(size: int) -> str:
+    """Format a number of bytes in a human-readable way."""
+    if size < 1024:
+        return f"{size} B"
+
+    for unit in ("KiB", "MiB", "GiB"):
+        size /= 1024
+
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+
+    return f"{size / 1024:.1f} TiB"
+
+class CacheEntry:
+    """A single cached decompilation."""
+
+    key: str
+    location: Path
+
+    source: str
+    mode: str
+    size: int
+    last_used: float
+
+    def __init__(
+        self: CacheEntry,
+        key: str,
+        location: Path,
+        metadata: dict,
+        last_used: float,
+    ) -> None:
+        self.key = key
+        self.location = location
+
+        self.source = metadata.get("source", "")
+        self.mode = metadata.get("mode", "")
+        self.size = metadata.get("size", 0)
+        self.last_used = last_used
+
+    def get_payload(self: CacheEntry) -> Path:
+        """Return the location of the decompiled content within this entry."""
+        return get_payload_location(self.location, self.mode)
+
+def get_payload_location(entry_location: Path, mode: str) -> Path:
+    """Return the location of the decompiled content within an entry folder."""
+    if mode == "xml":
+        return entry_location / PAYLOAD_XML
+
+    if mode == "packed":
+        return entry_location / PAYLOAD_PACKED
+
+    if mode == "build":
+        return entry_location / PAYLOAD_BUILD
+
+    return entry_location / PAYLOAD_SCRIPTS
+
+class CacheManager:
+    """Manage the decompilation cache.
+
+    Every decompiled SWF is stored in its own entry, named by its cache key.
+    Entries track their last use, and the least recently used ones are evicted
+    once the cache grows beyond its byte budget.
+
+    The cache folder may be shared by several processes or machines (for example,
+    a volume mounted on every CI worker). Populating and evicting an entry is guarded
+    by a lock file, and committed entries are never modified, only read.
+    """
+
+    root: Path
+    max_size: int | None
+    eviction_grace: float
+
+    def __init__(
+        self: CacheManager,
+        root: Path = CACHE_ROOT,
+        max_size: int | None = None,
+        eviction_grace: float = 0,
+    ) -> None:
+        """Create a cache manager.
+
+        root: the folder to keep cache entries in
+        max_size: the byte budget of the cache. If None, the cache is unbounded.
+        eviction_grace: automatic eviction skips entries used within this many seconds
+        """
+        self.root = root
+        self.max_size = max_size
+        self.eviction_grace = eviction_grace
+
+    def get_entry_location(self: CacheManager, key: str) -> Path:
+        """Return the folder for the entry with the given key."""
+        return self.root / key
+
+    def lock(self: CacheManager, key: str) -> FileLock:
+        """Return the lock guarding the entry with the given key."""
+        return FileLock(self.root / f"{key}{LOCK_SUFFIX}")
+
+    def lookup(self: CacheManager, key: str) -> CacheEntry | None:
+        """Return the entry with the given key, or None if it is not cached.
+
+        The entry is verified against its manifest first.
+        Damaged entries are treated as not cached, so they get exported again.
+        A successful lookup counts as a use of the entry.
+        """
+        entry = self.load_entry(self.get_entry_location(key))
+
+        if entry is None:
+            return None
+
+        if not self.verify(entry):
+            return None
+
+        self.touch(entry)
+        return entry
+
+    def verify(self: CacheManager, entry: CacheEntry) -> bool:
+        """Check the entry against its manifest. Returns True if the entry is intact."""
+        try:
+            with (entry.location / MANIFEST_FILE).open() as file:
+                manifest = json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            logger.warning("Cached decompilation of %s has no manifest.", entry.source)
+            return False
+
+        damaged = verify_manifest(entry.get_payload(), manifest)
+
+        if damaged:
+            logger.warning(
+                "Cached decompilation of %s is damaged (%d files, first: %s).",
+                entry.source, len(damaged), damaged[0],
+            )
+            return False
+
+        return True
+
+    def load_entry(self: CacheManager, location: Path) -> CacheEntry | None:
+        """Load an entry from its folder. Returns None if it has no valid metadata."""
+        if STAGING_MARKER in location.name:
+            return None
+
+        metadata_file = location / METADATA_FILE
+
+        try:
+            with metadata_file.open() as file:
+                metadata = json.load(file)
+
+            last_used = metadata_file.stat().st_mtime
+        except (FileNotFoundError, NotADirectoryError, json.JSONDecodeError):
+            return None
+
+        return CacheEntry(location.name, location, metadata, last_used)
+
+    def begin(self: CacheManager, key: str) -> Path:
+        """Create an empty staging folder to populate the entry with the given key.
+
+        Once populated, the staging folder must be passed to either commit or abort.
+        """
+        staging = self.root / f"{key}{STAGING_MARKER}{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        staging.mkdir(parents=True)
+
+        return staging
+
+    def commit(
+        self: CacheManager,
+        key: str,
+        staging: Path,
+        source: str,
+        mode: str,
+    ) -> CacheEntry:
+        """Finish populating an entry from its staging folder.
+
+        This writes the manifest and metadata, then atomically renames the staging folder
+        into place, replacing any previous (damaged) entry with the same key.
+        """
+        manifest = build_manifest(get_payload_location(staging, mode))
+
+        metadata = {
+            "source": source,
+            "mode": mode,
+            "size": get_manifest_size(manifest),
+            "created": time.time(),
+        }
+
+        with (staging / MANIFEST_FILE).open("w") as file:
+            json.dump(manifest, file)
+
+        with (staging / METADATA_FILE).open("w") as file:
+            json.dump(metadata, file)
+
+        location = self.get_entry_location(key)
+
+        # Move the previous entry aside instead of deleting it in place,
+        # so the entry is only missing for as short a time as possible
+        trash = None
+        if location.exists():
+            trash = staging.with_name(staging.name.replace(STAGING_MARKER, TRASH_MARKER))
+            location.rename(trash)
+
+        staging.rename(location)
+
+        if trash is not None:
+            self.remove(trash)
+
+        return self.load_entry(location)
+
+    def abort(self: CacheManager, staging: Path) -> None:
+        """Discard a staging folder after a failed export."""
+        if staging.exists():
+            self.remove(staging)
+
+    def touch(self: CacheManager, entry: CacheEntry) -> None:
+        """Mark the entry as used now.
+
+        If the cache is read-only for this process, the entry is used without being marked.
+        """
+        try:
+            os.utime(entry.location / METADATA_FILE)
+        except OSError:
+            logger.debug("Could not mark cache entry %s as used.", entry.key)
+            return
+
+        entry.last_used = time.time()
+
+    def list_locations(self: CacheManager) -> list[Path]:
+        """Return all entry folders in the cache, including incomplete ones."""
+        if not self.root.is_dir():
+            return []
+
+        return [
+            location for location in self.root.iterdir()
+            if not location.name.endswith(LOCK_SUFFIX)
+        ]
+
+    def list_entries(self: CacheManager) -> list[CacheEntry]:
+        """Return all valid entries, most recently used first."""
+        entries = [self.load_entry(location) for location in self.list_locations()]
+        entries = [entry for entry in entries if entry is not None]
+
+        return sorted(entries, key=lambda entry: entry.last_used, reverse=True)
+
+    def list_incomplete(self: CacheManager) -> list[Path]:
+        """Return all folders in the cache that are not valid entries.
+
+        These are staging folders, either of decompilations that are still running
+        or left behind by decompilations that did not finish.
+        """
+        return [
+            location for location in self.list_locations()
+            if self.load_entry(location) is None
+        ]
+
+    def get_total_size(self: CacheManager) -> int:
+        """Return the total size of all valid entries in bytes."""
+        return sum(entry.size for entry in self.list_entries())
+
+    def remove(self: CacheManager, location: Path) -> None:
+        """Remove a cache entry (or an incomplete entry) from disk."""
+        if location.is_dir():
+            shutil.rmtree(location)
+        else:
+            location.unlink()
+
+    def evict(
+        self: CacheManager,
+        max_size: int | None = None,
+        keep: set[str] | None = None,
+        min_idle: float | None = None,
+    ) -> list[CacheEntry]:
+        """Evict the least recently used entries until the cache fits in the budget.
+
+        max_size: the budget to use. If None, the budget of this manager is used.
+        keep: keys of entries that must not be evicted (for example, the one in use)
+        min_idle: only evict entries that have not been used for this many seconds.
+            If None, the eviction grace period of this manager is used.
+
+        Entries that another process is currently populating are skipped.
+        Returns the list of evicted entries.
+        """
+        if max_size is None:
+            max_size = self.max_size
+
+        if max_size is None:
+            return []
+
+        if min_idle is None:
+            min_idle = self.eviction_grace
+
+        keep = keep or set()
+        entries = self.list_entries()
+        total_size = sum(entry.size for entry in entries)
+        idle_before = time.time() - min_idle
+        evicted = []
+
+        # Entries are sorted most recent first, so evict from the back
+        for entry in reversed(entries):
+            if total_size <= max_size:
+                break
+
+            if entry.key in keep or entry.last_used > idle_before:
+                continue
+
+            lock = self.lock(entry.key)
+            if not lock.try_acquire():
+                continue
+
+            try:
+                logger.info("Evicting cached decompilation of %s (%s)...",
+                    entry.source, format_size(entry.size))
+
+                self.remove(entry.location)
+            finally:
+                lock.release()
+
+            total_size -= entry.size
+            evicted.append(entry)
+
+        return evicted
+
+    def prune(self: CacheManager, max_size: int | None = None) -> list[CacheEntry]:
+        """Remove abandoned staging folders, then evict entries down to the budget.
+
+        If no budget is given (here or on the manager), all entries are removed.
+        """
+        for location in self.list_incomplete():
+            lock = self.lock(location.name.split(STAGING_MARKER)[0].split(TRASH_MARKER)[0])
+
+            # If the lock is held, the staging folder belongs to a running decompilation
+            if lock.try_acquire():
+                try:
+                    self.remove(location)
+                finally:
+                    lock.release()
+
+        if max_size is None:
+            max_size = self.max_size if self.max_size is not None else 0
+
+        return self.evict(max_size, min_idle=0)
+
+def mark_used(location: Path) -> None:
+    """Mark a file of a flat cache folder (see evict_files) as used now."""
+    try:
+        os.utime(location)
+    except OSError:
+        logger.debug("Could not mark cached file %s as used.", location.name)
+
+def evict_files(root: Path, max_size: int = 0) -> list[tuple[Path, int]]:
+    """Evict the least recently used files of a flat cache folder, like the result cache,
+    until the folder fits in max_size bytes.
+
+    Unlike decompilation cache entries, these files are written atomically and never modified,
+    so they need no lock. Their modification time is their last-use time (see mark_used).
+    Returns the evicted files and their sizes.
+    """
+    if not root.is_dir():
+        return []
+
+    files = []
+
+    for location in root.iterdir():
+        try:
+            stat = location.stat()
+        except OSError:
+            continue
+
+        files.append((stat.st_mtime, stat.st_size, location))
+
+    total_size = sum(size for _, size, _ in files)
+    evicted = []
+
+    for _, size, location in sorted(files):
+        if total_size <= max_size:
+            break
+
+        # The file may be gone already, or be in use on Windows
+        try:
+            location.unlink()
+        except OSError:
+            continue
+
+        total_size -= size
+        evicted.append((location, size))
+
+    return evicted
+
+def open_cache(cache_dir: Path | None = None, max_size: int | None = None) -> CacheManager:
+    """Return the manager for a cache folder.
+
+    If no folder is given, the local cache in .Patcher-Temp is used.
+    Either way, the cache may be shared with other processes.
+    """
+    return CacheManager(CACHE_ROOT if cache_dir is None else cache_dir, max_size, EVICTION_GRACE)
@@ -1,11 +1,136 @@
 from __future__ import annotations
 
-import base64
-from pathlib import Path
+import shutil
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from functools import partial
+from pathlib import Path, PurePosixPath
+from typing import Callable, Iterable
 
-from flash_patcher.compile.ffdec import FFDecInterface
+from flash_patcher.compile.cache import CacheEntry, CacheManager, get_payload_location
+from flash_patcher.compile.ffdec import \
+    DEFAULT_PROFILE, DEFAULT_SCRIPT_FORMAT, FFDecInterface
+from flash_patcher.compile.ffdec_telemetry import FFDecCall
+from flash_patcher.compile.packed_scripts import PackedScripts, pack_folder
+from flash_patcher.compile.swf_fingerprint import FINGERPRINT_FILE, SwfFingerprint, \
+    get_swf_fingerprint, get_unit_name, has_unselectable_scripts, load_fingerprint, \
+    save_fingerprint
 from flash_patcher.exception.dependency import DependencyError
+from flash_patcher.util.hashing import hash_file, hash_parts
 from flash_patcher.util.logging import logger
+from flash_patcher.util.process_group import ProcessGroup
+
+# An incremental export is only worth it if at most this share of the scripts changed
+INCREMENTAL_LIMIT = 0.5
+
+# The folder of each SWF part in a decompilation, and the FFDec import pass for it.
+# Parts are imported in this order, scripts first.
+IMPORT_PARTS = {
+    "scripts": "Script",
+    "images": "Images",
+    "sounds": "Sounds",
+    "shapes": "Shapes",
+    "texts": "Text",
+    "movies": "Movies",
+    "symbolClass": "SymbolClass",
+}
+
+# The parts imported by --all
+ALL_PARTS = ["Script", "Images", "Sounds", "Shapes", "Text"]
+
+def get_fingerprint_safe(inputfile: Path) -> SwfFingerprint | None:
+    """Return the tag-level fingerprint of the SWF, or None if the SWF can't be read.
+
+    Unreadable SWFs are still left to FFDec, they're just never exported incrementally.
+    """
+    try:
+        return get_swf_fingerprint(inputfile)
+    except (OSError, ValueError):
+        logger.debug("Could not read the tags of %s.", inputfile)
+        return None
+
+def get_import_parts(injection: Path, modified_files: Iterable[Path]) -> list[str]:
+    """Return the SWF parts to import, given the files modified in the decompilation.
+
+    Files outside the folder of a part can't be imported, so they're skipped with a warning.
+    """
+    found = set()
+
+    for file in modified_files:
+        try:
+            folder = file.relative_to(injection).parts[0]
+        except (ValueError, IndexError):
+            folder = None
+
+        if folder in IMPORT_PARTS:
+            found.add(IMPORT_PARTS[folder])
+        else:
+            logger.warning("%s is not part of the SWF, so it won't be imported.", file)
+
+    return [part for part in IMPORT_PARTS.values() if part in found]
+
+def get_cache_mode(xml_mode: bool, cache_format: str) -> str:
+    """Return how a decompilation is cached: script, packed or xml."""
+    if xml_mode:
+        return "xml"
+
+    if cache_format.startswith("packed"):
+        return "packed"
+
+    return "script"
+
+def get_script_units(targets: Iterable[str]) -> set[str] | None:
+    """Return the frames, sprites and buttons that FFDec must export to write the given scripts.
+
+    targets: scripts relative to the scripts folder, like DefineSprite_12/frame_1/DoAction.as
+    Returns None if a script doesn't belong to one of them.
+    """
+    units = set()
+
+    for target in targets:
+        parts = PurePosixPath(target).parts
+        unit = get_unit_name(parts[0]) if len(parts) > 1 else None
+
+        if unit is None:
+            return None
+
+        units.add(unit)
+
+    return units
+
+def split_units(units: Iterable[str]) -> tuple[list[int], list[int]]:
+    """Return the frame numbers and the character IDs of the given units, for FFDec."""
+    frames = sorted(int(unit.split("_")[1]) for unit in units if unit.startswith("frame_"))
+    character_ids = sorted(
+        int(unit.split("_")[1]) for unit in units if not unit.startswith("frame_")
+    )
+
+    return frames, character_ids
+
+def get_shards(units: Iterable[str], count: int) -> list[set[str]]:
+    """Split frames, sprites and buttons into at most count shards of about the same size.
+
+    Each shard holds a range of frames or character IDs, so FFDec can select it compactly.
+    """
+    ordered = sorted(units, key=lambda unit: (unit.split("_")[0], int(unit.split("_")[1])))
+    count = min(count, len(ordered))
+
+    return [
+        set(ordered[index * len(ordered) // count:(index + 1) * len(ordered) // count])
+        for index in range(count)
+    ]
+
+def list_folders(location: Path) -> list[Path]:
+    """Return the subfolders of a folder, or an empty list if it doesn't exist."""
+    if not location.is_dir():
+        return []
+
+    return [folder for folder in location.iterdir() if folder.is_dir()]
+
+def remove_units(scripts: Path, units: set[str]) -> None:
+    """Remove the exported scripts of the given frames, sprites and buttons."""
+    for folder in list_folders(scripts):
+        if get_unit_name(folder.name) in units:
+            shutil.rmtree(folder)
 
 class CompilationManager:
     """Manage Flash compilation and decompilation, including caching.
@@ -14,15 +139,101 @@ class CompilationManager:
     """
 
     decompiler: FFDecInterface
+    cache: CacheManager
+
+    # The most FFDec processes to run at once
+    export_jobs: int
+
+    def __init__(
+        self: CompilationManager,
+        cache: CacheManager | None = None,
+        decompiler: FFDecInterface | None = None,
+        export_jobs: int = 1,
+        profile: str = DEFAULT_PROFILE,
+        script_format: str = DEFAULT_SCRIPT_FORMAT,
+    ) -> None:
+        """Initialize with a cache and an FFDec interface.
+        If no FFDec interface is given, FFDec is detected automatically.
+
+        export_jobs: the most FFDec processes to run at once. If more than 1, SWFs are exported
+            in shards, and independent exports run at the same time.
+        profile: the FFDec performance profile to run every command with (see FFDEC_PROFILES)
+        script_format: the format to export scripts in (see SCRIPT_FORMATS). In pcode format,
+            patches target .pcode files, and FFDec assembles them on import.
+        """
+        self.decompiler = FFDecInterface() if decompiler is None else decompiler
+        self.decompiler.profile = profile
+        self.decompiler.script_format = script_format
+        self.decompiler.processes = ProcessGroup(export_jobs)
+        self.cache = CacheManager() if cache is None else cache
+        self.export_jobs = export_jobs
+
+    def get_decompiler_id(self: CompilationManager) -> str:
+        """Return the FFDec version, performance profile and script format,
+        which decide how exports look.
+        """
+        parts = [self.decompiler.get_version()]
+
+        if self.decompiler.profile != DEFAULT_PROFILE:
+            parts.append(self.decompiler.profile)
+
+        if self.decompiler.script_format != DEFAULT_SCRIPT_FORMAT:
+            parts.append(self.decompiler.script_format)
+
+        return "+".join(parts)
+
+    def report_ffdec_calls(self: CompilationManager) -> list[FFDecCall]:
+        """Log the FFDec commands run so far, and return their records.
+
+        Each command is logged in debug mode, along with the output of failed commands.
+        The total time and peak memory of all commands are always logged.
+        """
+        calls = list(self.decompiler.calls)
+
+        if not calls:
+            return calls
+
+        for call in calls:
+            logger.debug("FFDec command: %s", call.describe())
+
+            if not call.succeeded():
+                logger.debug("Output of the failed command:\n%s", "\n".join(call.output))
 
-    def __init__(self: CompilationManager) -> None:
-        self.decompiler = FFDecInterface()
+        cpu_times = [call.cpu_time for call in calls if call.cpu_time is not None]
+        peak_rss = [call.peak_rss for call in calls if call.peak_rss is not None]
+
+        logger.info(
+            "Ran %d FFDec commands in %.2fs (%.2fs CPU, %d MiB peak).",
+            len(calls),
+            sum(call.wall_time for call in calls),
+            sum(cpu_times),
+            max(peak_rss, default=0) // 1024 ** 2,
+        )
+
+        return calls
+
+    def get_cache_key(
+        self: CompilationManager,
+        inputfile: Path,
+        mode: str = "script",
+    ) -> str:
+        """Return the cache key for decompiling the SWF.
+
+        The key covers the SWF content, the FFDec version and profile, and the export mode
+        (script, packed or xml), so a cached decompilation is only reused if all of them match.
+        """
+        return hash_parts(
+            hash_file(inputfile),
+            self.get_decompiler_id(),
+            mode,
+        )
 
     def decompile(
         self: CompilationManager,
         inputfile: Path,
         drop_cache: bool = False,
-        xml_mode: bool = False
+        xml_mode: bool = False,
+        cache_format: str = "files",
     ) -> Path:
         """Decompile the SWF and return the decompilation location.
 
@@ -31,11 +242,10 @@ class CompilationManager:
         inputfile: the SWF to decompile
         drop_cache: if True, will force decompilation instead of using cached files
         xml_mode: if True, will dump XML instead of decompiling normally
+        cache_format: how to cache scripts (see CACHE_FORMATS). If the scripts are packed,
+            the location of the packed database is returned instead of a folder.
         """
-        # Validity checking: Decompilation path and input file
-        if not Path("./.Patcher-Temp").exists():
-            Path("./.Patcher-Temp").mkdir()
-
+        # Validity checking: input file
         if not inputfile.exists():
             failure_mesg = f"""Could not locate the SWF file: {inputfile}.
             Aborting..."""
@@ -43,40 +253,405 @@ class CompilationManager:
             logger.error(failure_mesg)
             raise FileNotFoundError(failure_mesg)
 
-        # Decompile swf into temp folder called ./.Patcher-Temp/[swf name, base32 encoded]
-        cache_location = Path(
-            "./.Patcher-Temp/",
-            base64.b32encode(
-                bytes(inputfile.name, "utf-8"),
-            ).decode("ascii"),
-        )
+        mode = get_cache_mode(xml_mode, cache_format)
+        key = self.get_cache_key(inputfile, mode)
+
+        entry = None if drop_cache else self.cache.lookup(key)
 
-        # If the cache is dropped or nonexistent, rerun decompiler
-        if drop_cache or (not Path(cache_location).exists()):
-            if not Path(cache_location).exists() and not xml_mode:
-                Path(cache_location).mkdir()
+        # If the cache is dropped, nonexistent or damaged, rerun decompiler
+        if entry is None:
+            with self.cache.lock(key):
+                # Another process sharing the cache may have decompiled the SWF
+                # while we were waiting for the lock
+                if not drop_cache:
+                    entry = self.cache.lookup(key)
 
-            logger.info("Beginning decompilation...")
+                if entry is None:
+                    entry = self.populate(inputfile, key, mode, cache_format == "packed-zlib")
+                else:
+                    logger.info("Another process decompiled the SWF. Reusing it...")
 
-            decomp = None
+        else:
+            logger.info("Detected cached decompilation. Skipping...")
+
+        cache_location = entry.get_payload()
+
+        # Keep the cache within its budget, but never evict the decompilation we just used
+        self.cache.evict(keep={key})
+
+        return cache_location
+
+    def populate(
+        self: CompilationManager,
+        inputfile: Path,
+        key: str,
+        mode: str,
+        compress: bool = False,
+    ) -> CacheEntry:
+        """Decompile the SWF into a new cache entry. The entry's lock must be held.
+
+        Scripts are exported incrementally from a cached export of a similar SWF when possible.
+
+        compress: if True, packed scripts are stored zlib-compressed
+        """
+        staging = self.cache.begin(key)
 
-            if xml_mode:
-                decomp = self.decompiler.dump_xml(inputfile, cache_location)
-                logger.info("XML decompilation mode.")
+        try:
+            if mode == "xml":
+                self.export(inputfile, get_payload_location(staging, mode), True)
             else:
-                decomp = self.decompiler.export_scripts(inputfile, cache_location)
+                export = get_payload_location(staging, "script")
+                fingerprint = get_fingerprint_safe(inputfile)
 
-            if not decomp:
-                failure_mesg = f"""FFDec couldn't decompile the SWF file: {inputfile}.
-                    Aborting..."""
+                if fingerprint is None:
+                    self.export(inputfile, export)
 
-                logger.error(failure_mesg)
-                raise DependencyError(failure_mesg)
+                elif not self.export_incremental(inputfile, export, fingerprint, mode) \
+                    and not self.export_sharded(inputfile, export, fingerprint):
+                    self.export(inputfile, export)
+
+                if fingerprint is not None:
+                    save_fingerprint(
+                        staging / FINGERPRINT_FILE, fingerprint, self.get_decompiler_id()
+                    )
+
+                # FFDec can only export loose files, so pack them once they're written
+                if mode == "packed":
+                    count = pack_folder(export, get_payload_location(staging, mode), compress)
+                    shutil.rmtree(export)
+                    logger.info("Packed %d decompiled files.", count)
+
+        # Never leave a half-written export behind, even if we're interrupted
+        except BaseException:
+            self.cache.abort(staging)
+            raise
+
+        return self.cache.commit(key, staging, inputfile.name, mode)
+
+    def find_base(
+        self: CompilationManager,
+        fingerprint: SwfFingerprint,
+        mode: str,
+    ) -> tuple[CacheEntry, set[str]] | None:
+        """Find the cached export closest to the SWF with the given fingerprint.
+
+        Returns the entry and the units that differ from it, or None if no cached
+        export can be reused.
+        """
+        version = self.get_decompiler_id()
+        candidates = []
+
+        for entry in self.cache.list_entries():
+            if entry.mode != mode:
+                continue
+
+            base = load_fingerprint(entry.location / FINGERPRINT_FILE, version)
+            changed = None if base is None else fingerprint.get_changed_units(base)
+
+            if changed is not None:
+                candidates.append((entry, changed))
+
+        # Entries are sorted most recent first, so ties go to the most recently used
+        return min(candidates, key=lambda candidate: len(candidate[1]), default=None)
+
+    def export_incremental(
+        self: CompilationManager,
+        inputfile: Path,
+        export: Path,
+        fingerprint: SwfFingerprint,
+        mode: str,
+    ) -> bool:
+        """Export scripts by reusing the cached export of a similar SWF.
+
+        Only the frames, sprites and buttons whose tags changed are exported with FFDec,
+        everything else is copied from the cached export.
+        Returns False (with nothing written) if no cached export is close enough,
+        in which case the SWF has to be exported in full.
+        """
+        base = self.find_base(fingerprint, mode)
+
+        if base is None:
+            return False
+
+        entry, changed = base
+        exported = changed & fingerprint.units.keys()
+
+        # Removed scripts are free, only the scripts to export count
+        if len(exported) > INCREMENTAL_LIMIT * len(fingerprint.units):
+            return False
+
+        # Hold the lock of the cached export, so it's not evicted while we copy it
+        lock = self.cache.lock(entry.key)
+
+        if not lock.try_acquire():
+            return False
 
+        try:
+            if not self.cache.verify(entry):
+                return False
+
+            logger.info(
+                "Reusing the decompilation of %s, exporting %d changed scripts...",
+                entry.source, len(exported),
+            )
+
+            if mode == "packed":
+                PackedScripts(entry.get_payload()).extract_all(export)
+            else:
+                shutil.copytree(entry.get_payload(), export)
+
+            remove_units(export / "scripts", changed)
+            self.export_units(inputfile, export, exported)
+
+        except (OSError, DependencyError):
+            logger.warning("Could not reuse the cached decompilation. Exporting in full...")
+            shutil.rmtree(export, ignore_errors=True)
+            return False
+
+        finally:
+            lock.release()
+
+        return True
+
+    def export_sharded(
+        self: CompilationManager,
+        inputfile: Path,
+        export: Path,
+        fingerprint: SwfFingerprint,
+    ) -> bool:
+        """Export the SWF with several FFDec processes at once, each exporting a shard
+        of its frames, sprites and buttons, then merge the shards into one export.
+
+        Returns False (with nothing written) if the SWF can't be exported in shards,
+        like if it has AS2 classes or AS3 code, in which case it has to be exported in one go.
+        """
+        if self.export_jobs < 2 or len(fingerprint.units) < 2:
+            return False
+
+        try:
+            if has_unselectable_scripts(inputfile):
+                logger.info("The SWF has scripts that can't be exported in shards. Skipping...")
+                return False
+        except (OSError, ValueError):
+            return False
+
+        shards = get_shards(fingerprint.units, self.export_jobs)
+        folders = [export.with_name(f"{export.name}.shard{index}") for index in range(len(shards))]
+
+        logger.info(
+            "Exporting %d frames, sprites and buttons in %d shards...",
+            len(fingerprint.units), len(shards),
+        )
+
+        try:
+            for folder in folders:
+                folder.mkdir()
+
+            self.run_parallel([
+                partial(self.export_units, inputfile, folder, units)
+                for folder, units in zip(folders, shards)
+            ])
+
+            # Every shard holds whole unit folders, so they're merged by moving them
+            scripts = export / "scripts"
+            scripts.mkdir(parents=True)
+
+            for folder in folders:
+                for unit_folder in list_folders(folder / "scripts"):
+                    unit_folder.rename(scripts / unit_folder.name)
+
+        except (OSError, DependencyError):
+            logger.warning("Could not export the SWF in shards. Exporting in one go...")
+            shutil.rmtree(export, ignore_errors=True)
+            return False
+
+        finally:
+            for folder in folders:
+                shutil.rmtree(folder, ignore_errors=True)
+
+        return True
+
+    def export_units(
+        self: CompilationManager,
+        inputfile: Path,
+        export: Path,
+        units: set[str],
+    ) -> None:
+        """Export the scripts of the given frames, sprites and buttons into an existing export.
+
+        Raises DependencyError if FFDec didn't export all of them.
+        """
+        if not units:
+            return
+
+        frames, character_ids = split_units(units)
+
+        selected = export.with_name(f"{export.name}.partial")
+        selected.mkdir()
+
+        try:
+            self.export_selection(inputfile, selected, frames, character_ids)
+
+            exported = set()
+            scripts = export / "scripts"
+
+            for folder in list_folders(selected / "scripts"):
+                unit = get_unit_name(folder.name)
+
+                # FFDec may export more than we selected, only keep what changed
+                if unit in units:
+                    scripts.mkdir(exist_ok=True)
+                    folder.rename(scripts / folder.name)
+                    exported.add(unit)
+
+            if exported != units:
+                raise DependencyError(
+                    f"FFDec didn't export: {', '.join(sorted(units - exported))}"
+                )
+
+        finally:
+            shutil.rmtree(selected, ignore_errors=True)
+
+    def export_selected(
+        self: CompilationManager,
+        inputfile: Path,
+        output: Path,
+        targets: set[str],
+        drop_cache: bool = False,
+        cache_format: str = "files",
+    ) -> bool:
+        """Export only the given scripts into output, instead of decompiling the whole SWF.
+
+        Every frame, sprite and button with a target is exported in full.
+        Nothing is cached, since the export is incomplete.
+
+        targets: scripts relative to the scripts folder (see get_script_units)
+        Returns False (with nothing written) if the whole decompilation should be used instead:
+        if it's already cached, or if some scripts can't be exported on their own.
+        """
+        if not inputfile.exists():
+            return False
+
+        key = self.get_cache_key(inputfile, get_cache_mode(False, cache_format))
+
+        if not drop_cache and self.cache.lookup(key) is not None:
+            logger.info("Detected cached decompilation. Skipping selective export...")
+            return False
+
+        units = get_script_units(targets)
+
+        if units is None:
+            logger.info("Some patched scripts can't be exported on their own. Skipping...")
+            return False
+
+        frames, character_ids = split_units(units)
+        logger.info("Exporting the scripts of %d frames, sprites and buttons...", len(units))
+
+        output.mkdir(parents=True)
+
+        try:
+            self.export_selection(inputfile, output, frames, character_ids)
+        except DependencyError:
+            logger.warning("FFDec couldn't export the patched scripts. Skipping...")
+            shutil.rmtree(output, ignore_errors=True)
+            return False
+
+        return True
+
+    def export_selection(
+        self: CompilationManager,
+        inputfile: Path,
+        output: Path,
+        frames: list[int],
+        character_ids: list[int],
+    ) -> None:
+        """Export the scripts of the given frames and characters into output.
+
+        FFDec selects frames and characters separately, so each selection is exported
+        into its own folder, at the same time as the other, then merged into output.
+        Raises DependencyError if FFDec couldn't export them.
+        """
+        selections = {
+            name: ids
+            for name, ids in (("frames", frames), ("character_ids", character_ids))
+            if ids
+        }
+        folders = {name: output.with_name(f"{output.name}.{name}") for name in selections}
+
+        def export(name: str) -> None:
+            folders[name].mkdir()
+
+            if not self.decompiler.export_scripts(
+                inputfile, folders[name], **{name: selections[name]}
+            ):
+                raise DependencyError(f"FFDec couldn't export scripts from: {inputfile}")
+
+        try:
+            self.run_parallel([partial(export, name) for name in selections])
+
+            scripts = output / "scripts"
+            scripts.mkdir(parents=True, exist_ok=True)
+
+            for folder in folders.values():
+                for unit_folder in list_folders(folder / "scripts"):
+                    # FFDec may export the same unit in both selections
+                    if not (scripts / unit_folder.name).exists():
+                        unit_folder.rename(scripts / unit_folder.name)
+
+        finally:
+            for folder in folders.values():
+                shutil.rmtree(folder, ignore_errors=True)
+
+    def run_parallel(self: CompilationManager, steps: list[Callable[[], None]]) -> None:
+        """Run independent FFDec steps at the same time, like the shards of an export.
+
+        The FFDec processes are still limited to export_jobs at once (see ProcessGroup).
+        Once a step fails, the FFDec processes of the other steps are killed,
+        and the error of the failed step is raised.
+        """
+        if len(steps) < 2:
+            for step in steps:
+                step()
+
+            return
+
+        processes = self.decompiler.processes
+
+        with processes.batch(), \
+            ThreadPoolExecutor(len(steps), thread_name_prefix="ffdec") as executor:
+
+            futures = [executor.submit(step) for step in steps]
+            done, _ = wait(futures, return_when=FIRST_EXCEPTION)
+            failed = [future for future in done if future.exception() is not None]
+
+            if failed:
+                processes.cancel()
+
+        if failed:
+            raise failed[0].exception()
+
+    def export(
+        self: CompilationManager,
+        inputfile: Path,
+        output: Path,
+        xml_mode: bool = False,
+    ) -> None:
+        """Export the SWF into the given location, with a check for program errors."""
+        logger.info("Beginning decompilation...")
+
+        if xml_mode:
+            decomp = self.decompiler.dump_xml(inputfile, output)
+            logger.info("XML decompilation mode.")
         else:
-            logger.info("Detected cached decompilation. Skipping...")
+            output.mkdir()
+            decomp = self.decompiler.export_scripts(inputfile, output)
 
-        return cache_location
+        if not decomp:
+            failure_mesg = f"""FFDec couldn't decompile the SWF file: {inputfile}.
+                Aborting..."""
+
+            logger.error(failure_mesg)
+            raise DependencyError(failure_mesg)
 
     def recompile_with_check(
         self: CompilationManager,
@@ -102,21 +677,41 @@ class CompilationManager:
         output: Path,
         recompile_all: bool = False,
         xml_mode: bool = False,
+        modified_files: Iterable[Path] | None = None,
     ) -> None:
         """Recompile the SWF after injection is complete.
 
         inputfile: The base SWF to use for missing files
         outputfile: The location to save the output
-        recompile_all: If this is set to False, will only recompile scripts
+        recompile_all: If this is set to True, will import scripts, images, sounds, shapes and text
+            whether they changed or not, along with any other modified part
+        modified_files: The files changed by the patches. Only the parts of the SWF they belong to
+            are imported. If None, only scripts are imported.
         """
         if xml_mode:
-            self.decompiler.rebuild_xml(injection, output)
+            if not self.decompiler.rebuild_xml(injection, output, swf=inputfile):
+                failure_mesg = f"""FFDec couldn't rebuild the SWF file from XML: {injection}.
+                    Aborting.."""
+
+                logger.error(failure_mesg)
+                raise DependencyError(failure_mesg)
+
             return
 
-        self.recompile_with_check("Script", injection, inputfile, output)
+        if modified_files is None:
+            parts = ["Script"]
+        else:
+            # Even if nothing changed, one pass is needed to write the output
+            parts = get_import_parts(injection, modified_files) or ["Script"]
 
         if recompile_all:
-            for part in ("Images", "Sounds", "Shapes", "Text"):
-                # FFDec doesn't have a way to import everything at once.
-                # We re-import iteratively.
-                self.recompile_with_check(part, injection, output, output)
+            # Modified parts outside of --all (like movies) are still imported
+            parts = [part for part in IMPORT_PARTS.values() if part in ALL_PARTS or part in parts]
+
+        # FFDec doesn't have a way to import everything at once.
+        # The first pass reads the base SWF, then each pass re-imports into the output.
+        source = inputfile
+
+        for part in parts:
+            self.recompile_with_check(part, injection, source, output)
+            source = output
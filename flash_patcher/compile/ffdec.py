@@ -1,10 +1,20 @@
 from __future__ import annotations
 
 import os
+import re
+import shlex
 import subprocess
+import time
 from pathlib import Path
 
+from flash_patcher.compile.ffdec_config import \
+    FFDecConfig, get_config_location, get_install_config_location, load_ffdec_config, \
+    save_ffdec_config
+from flash_patcher.compile.ffdec_java import JavaLauncher
+from flash_patcher.compile.ffdec_telemetry import FFDecCall, run_process
+from flash_patcher.compile.ffdec_worker import FFDecWorker, find_ffdec_jar, find_java
 from flash_patcher.util.logging import logger
+from flash_patcher.util.process_group import ProcessGroup
 
 LOCATION_APT = Path("/usr/bin/ffdec")
 LOCATION_FLATPAK = Path("/usr/bin/flatpak")
@@ -19,6 +29,90 @@ ARGS_FLATPAK = [
     "com.jpexs.decompiler.flash",
 ]
 
+# FFDec settings for each performance profile, passed with -config before every command.
+# Profiles change what exports look like, so they're part of the cache key.
+DEFAULT_PROFILE = "default"
+
+FFDEC_PROFILES = {
+    DEFAULT_PROFILE: {},
+
+    # Decompile methods in parallel, and give up quickly on methods that are hard to decompile
+    "fast-export": {
+        "parallelSpeedUp": "true",
+        "autoDeobfuscate": "false",
+        "decompilationTimeoutSingleMethod": "5",
+    },
+
+    # Decompile methods one at a time, leave the code as is, and give every method plenty of time
+    "safe": {
+        "parallelSpeedUp": "false",
+        "autoDeobfuscate": "false",
+        "decompilationTimeoutSingleMethod": "600",
+    },
+}
+
+# The formats FFDec exports scripts in: ActionScript source, or P-code (FFDec's assembly).
+# -importScript imports each script from whichever file it finds, by extension.
+DEFAULT_SCRIPT_FORMAT = "script"
+SCRIPT_FORMATS = [DEFAULT_SCRIPT_FORMAT, "pcode"]
+
+# Flatpak updates FFDec without touching the flatpak launcher.
+# The "current" symlink of the app is swapped instead, so it's checked too.
+FLATPAK_APP_LOCATIONS = [
+    Path("/var/lib/flatpak/app/com.jpexs.decompiler.flash/current"),
+    Path.home() / ".local/share/flatpak/app/com.jpexs.decompiler.flash/current",
+]
+
+# FFDec prints its version as part of the -help header, e.g. "JPEXS Free Flash Decompiler v.20.1.0"
+VERSION_PATTERN = re.compile(r"(\d+(?:\.\d+)+)")
+VERSION_UNKNOWN = "unknown"
+
+def parse_ffdec_command(command: str) -> tuple[Path, list[str]]:
+    """Split an FFDec command, like "flatpak run com.jpexs.decompiler.flash",
+    into the launcher path and its arguments.
+    """
+    if Path(command).exists():
+        # A plain path, which may contain spaces (like C:\Program Files\FFDec\ffdec.bat)
+        return Path(command), []
+
+    path, *args = shlex.split(command, posix=os.name != "nt")
+    return Path(path), args
+
+def format_ranges(numbers: list[int]) -> str:
+    """Format numbers as FFDec ranges, like 1-3,7."""
+    ranges = []
+
+    for number in sorted(set(numbers)):
+        if ranges and ranges[-1][1] == number - 1:
+            ranges[-1][1] = number
+        else:
+            ranges.append([number, number])
+
+    return ",".join(
+        str(start) if start == end else f"{start}-{end}" for start, end in ranges
+    )
+
+def get_install_stamp(path: Path, args: list[str]) -> list[int] | None:
+    """Return the modification times identifying the state of an FFDec install.
+
+    This is cheap to compute, and changes whenever FFDec is moved, removed or updated.
+    Returns None if FFDec is not at the given path anymore.
+    """
+    try:
+        stamp = [path.stat().st_mtime_ns]
+    except OSError:
+        return None
+
+    if args == ARGS_FLATPAK:
+        for location in FLATPAK_APP_LOCATIONS:
+            try:
+                stamp.append(location.lstat().st_mtime_ns)
+            except OSError:
+                stamp.append(0)
+
+    return stamp
+
+# pylint: disable=too-many-instance-attributes
 class FFDecInterface:
     """An interface to interact with FFDec via the shell.
 
@@ -29,13 +123,48 @@ class FFDecInterface:
 
     path: Path
     args: list[str]
+    version: str | None = None
+
+    # Where the install and its version are saved
+    config_location: Path
+
+    # If set, commands run in a long-lived FFDec process instead of starting their own
+    worker: FFDecWorker | None = None
+
+    # If set, FFDec is started with Java directly instead of through its launcher
+    java: JavaLauncher | None = None
+
+    # The performance profile of every command (see FFDEC_PROFILES)
+    profile: str = DEFAULT_PROFILE
+
+    # The format to export scripts in (see SCRIPT_FORMATS)
+    script_format: str = DEFAULT_SCRIPT_FORMAT
+
+    # The record of every command run so far, in the order they finished
+    calls: list[FFDecCall]
+
+    # The FFDec processes that run commands, including the worker while it runs one
+    processes: ProcessGroup
 
     def __init__(
         self: FFDecInterface,
         path: Path | None = None,
         args: list[str] | None = None,
+        config_location: Path | None = None,
     ) -> None:
-        """Initialize by detecting FFDec, or using a provided version"""
+        """Initialize by detecting FFDec, or using a provided version.
+
+        Detecting FFDec may start the JVM (to check a Flatpak install), so the detected
+        install is saved in a user-level config file and reused while it's still valid.
+        A provided install isn't detected, but its version is saved the same way,
+        in a config file of its own.
+
+        config_location: the FFDec config file. If None, the user-level config is used,
+            or the config of the provided install.
+        """
+        self.calls = []
+        self.processes = ProcessGroup()
+
         if path is not None:
             self.path = path
             if args is None:
@@ -43,26 +172,80 @@ class FFDecInterface:
             else:
                 self.args = args
 
+            self.config_location = get_install_config_location(path, self.args) \
+                if config_location is None else config_location
+
+            self.load_version()
             logger.info("Using FFDec at: %s", path)
+            return
 
-        else:
-            # Auto-detect FFDec at any of the default locations
-            ffdec_installed = any([
-                self.install_ffdec(LOCATION_APT),
-                self.install_ffdec(LOCATION_FLATPAK, ARGS_FLATPAK),
-                self.install_ffdec(LOCATION_WINDOWS),
-                self.install_ffdec(LOCATION_WOW64),
-            ])
-
-            if not ffdec_installed:
-                raise ModuleNotFoundError(
-                    """Failed to locate dependency: JPEXS Flash Decompiler.
-                    You can download FFDec from this link:
-                    https://github.com/jindrapetrik/jpexs-decompiler/releases
-                    """
-                )
+        self.config_location = get_config_location() if config_location is None \
+            else config_location
 
+        if self.load_config():
             logger.info("Using FFDec at: %s", self.path)
+            return
+
+        # Auto-detect FFDec at any of the default locations
+        ffdec_installed = (
+            self.install_ffdec(LOCATION_APT)
+            or self.install_ffdec(LOCATION_FLATPAK, ARGS_FLATPAK)
+            or self.install_ffdec(LOCATION_WINDOWS)
+            or self.install_ffdec(LOCATION_WOW64)
+        )
+
+        if not ffdec_installed:
+            raise ModuleNotFoundError(
+                """Failed to locate dependency: JPEXS Flash Decompiler.
+                You can download FFDec from this link:
+                https://github.com/jindrapetrik/jpexs-decompiler/releases
+                """
+            )
+
+        logger.info("Using FFDec at: %s", self.path)
+        self.save_config()
+
+    def load_config(self: FFDecInterface) -> bool:
+        """Use the FFDec install saved in the config file.
+
+        Returns True if the saved install is still valid.
+        """
+        config = load_ffdec_config(self.config_location)
+
+        if config is None:
+            return False
+
+        if get_install_stamp(config.path, config.args) != config.stamp:
+            logger.info("FFDec changed since it was detected. Detecting FFDec again...")
+            return False
+
+        self.path = config.path
+        self.args = config.args
+        self.version = config.version
+        return True
+
+    def load_version(self: FFDecInterface) -> None:
+        """Reuse the version saved for the provided FFDec install, if it didn't change since."""
+        config = load_ffdec_config(self.config_location)
+
+        if config is None or (config.path, config.args) != (self.path, self.args):
+            return
+
+        if get_install_stamp(self.path, self.args) == config.stamp:
+            self.version = config.version
+
+    def save_config(self: FFDecInterface) -> None:
+        """Save the FFDec install (and version, once known) to the config file."""
+        stamp = get_install_stamp(self.path, self.args)
+
+        # An unknown version is detected again next time, rather than saved
+        version = None if self.version == VERSION_UNKNOWN else self.version
+
+        if stamp is not None:
+            save_ffdec_config(
+                self.config_location,
+                FFDecConfig(self.path, self.args, version, stamp),
+            )
 
     def install_ffdec(self: FFDecInterface, path: Path, args: list[str] | None = None) -> bool:
         """Install FFDec from a path. Return true if the installation was successful."""
@@ -90,6 +273,139 @@ class FFDecInterface:
 
         return False
 
+    def use_java(self: FFDecInterface) -> bool:
+        """Start FFDec with Java directly from now on, if possible (see JavaLauncher).
+
+        Returns True if FFDec will be started with Java.
+        """
+        java = find_java()
+        jar = find_ffdec_jar(self.path)
+
+        if java is None or jar is None:
+            logger.info("Could not find Java or ffdec.jar to start FFDec with. Skipping...")
+            return False
+
+        try:
+            self.java = JavaLauncher(java, jar)
+        except OSError:
+            logger.info("Could not create the folder of the Java archive. Skipping...")
+            return False
+
+        return True
+
+    def start_worker(self: FFDecInterface, swf: Path | None = None) -> bool:
+        """Run the next commands in a warm FFDec worker, if possible (see FFDecWorker).
+
+        The worker starts loading FFDec right away, in the background.
+        swf: the SWF the commands work on, to size the heap when starting FFDec with Java
+        Returns True if the worker started.
+        """
+        if self.java is not None:
+            java, jar, options = self.java.java, self.java.jar, self.java.get_jvm_options(swf)
+        else:
+            java, jar, options = find_java(), find_ffdec_jar(self.path), []
+
+        if java is None or jar is None:
+            logger.info("Could not find Java or ffdec.jar for the FFDec worker. Skipping...")
+            return False
+
+        try:
+            worker = FFDecWorker(java, jar, options)
+            worker.spawn()
+        except OSError:
+            logger.info("Could not start the FFDec worker. Skipping...")
+            return False
+
+        self.worker = worker
+        return True
+
+    def stop_worker(self: FFDecInterface) -> None:
+        """Stop the FFDec worker, once no more commands will run."""
+        if self.worker is not None:
+            self.worker.stop()
+            self.worker = None
+
+    def get_profile_args(self: FFDecInterface) -> list[str]:
+        """Return the FFDec arguments that apply the performance profile."""
+        settings = FFDEC_PROFILES[self.profile]
+
+        if not settings:
+            return []
+
+        return ["-config", ",".join(f"{key}={value}" for key, value in settings.items())]
+
+    def run_command(
+        self: FFDecInterface,
+        args: list[str | Path],
+        quiet: bool = True,
+        swf: Path | None = None,
+    ) -> bool:
+        """Run an FFDec command, in the worker if there is one.
+
+        If the worker is busy with another command, FFDec is run directly,
+        so commands can run in parallel.
+
+        Every command is recorded in calls (see FFDecCall).
+
+        quiet: if False, FFDec output is shown if the command fails
+        swf: the SWF the command works on, to size the heap when starting FFDec with Java
+        Returns True on success.
+        """
+        args = [*self.get_profile_args(), *args]
+        worker = self.worker
+
+        if worker is not None and worker.lock.acquire(blocking=False):
+            try:
+                start = time.monotonic()
+                status = worker.run(args, self.processes)
+
+                if status is None:
+                    logger.info("The FFDec worker is unavailable. Running FFDec directly...")
+                    self.stop_worker()
+
+            finally:
+                worker.lock.release()
+
+            if status is not None:
+                self.calls.append(FFDecCall(
+                    [str(arg) for arg in args],
+                    "worker",
+                    status,
+                    time.monotonic() - start,
+                ))
+                return status == 0
+
+        command = [self.path, *self.args] if self.java is None else self.java.get_command(swf)
+        call = run_process([*command, *args], quiet=quiet, group=self.processes)
+        self.calls.append(call)
+
+        return call.succeeded()
+
+    def get_version(self: FFDecInterface) -> str:
+        """Return the version of the installed FFDec.
+
+        The version is detected once from the -help output and then reused.
+        Returns "unknown" if the version could not be detected.
+        """
+        if self.version is not None:
+            return self.version
+
+        process = subprocess.run(
+            [self.path, *self.args, "-help"],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            check=False,
+        )
+
+        match = VERSION_PATTERN.search(process.stdout or "")
+        self.version = match.group(1) if match else VERSION_UNKNOWN
+
+        logger.debug("Detected FFDec version: %s", self.version)
+        self.save_config()
+
+        return self.version
+
     def dump_xml(
         self: FFDecInterface,
         inputfile: Path,
@@ -99,57 +415,50 @@ class FFDecInterface:
 
         Returns True if dump was successful.
         """
-        process = subprocess.run(
-            [self.path, *self.args, "-swf2xml", inputfile, output_dir],
-            stdout=subprocess.DEVNULL,
-            stderr=subprocess.DEVNULL,
-            check=False,
-        )
-        return process.returncode == 0
+        return self.run_command(["-swf2xml", inputfile, output_dir], swf=inputfile)
 
     def rebuild_xml(
         self: FFDecInterface,
         input_dir: Path,
         output_file: Path,
+        swf: Path | None = None,
     ) -> bool:
         """Rebuild XML data from a directory into an output SWF file.
 
+        swf: the SWF the XML data was dumped from, to size the heap
+
         Return True on success.
         """
-        process = subprocess.run(
-            [self.path, *self.args, "-xml2swf", input_dir, output_file],
-            stdout=subprocess.DEVNULL,
-            check=False,
-        )
-        return process.returncode == 0
+        return self.run_command(["-xml2swf", input_dir, output_file], quiet=False, swf=swf)
 
     def export_scripts(
         self: FFDecInterface,
         inputfile: Path,
         output_dir: Path,
+        frames: list[int] | None = None,
+        character_ids: list[int] | None = None,
     ) -> bool:
         """Export scripts from a SWF file into a directory.
-        
+
+        frames: if set, only export the scripts of these frames (-select)
+        character_ids: if set, only export the scripts of these sprites and buttons (-selectid)
+
         Returns True on success.
         """
         logger.info("Exporting scripts into %s...", output_dir)
 
-        # set check=False, we will verify the return code manually later
-        process = subprocess.run(
-            [
-                self.path,
-                *self.args,
-                "-export",
-                "script",
-                output_dir,
-                inputfile,
-            ],
-            stdout=subprocess.DEVNULL,
-            stderr=subprocess.DEVNULL,
-            check=False,
-        )
+        selection = []
+
+        if frames:
+            selection += ["-select", format_ranges(frames)]
 
-        return process.returncode == 0
+        if character_ids:
+            selection += ["-selectid", format_ranges(character_ids)]
+
+        return self.run_command(
+            [*selection, "-export", self.script_format, output_dir, inputfile],
+            swf=inputfile,
+        )
 
     def recompile_data(
         self: FFDecInterface,
@@ -163,18 +472,8 @@ class FFDecInterface:
         # Part types: SymbolClass, Movies, Sounds, Shapes, Images, Text, Script
         logger.info("Reimporting %s...", part)
 
-        # set check=False, we will verify the return code manually later
-        process = subprocess.run(
-            [
-                self.path,
-                *self.args,
-                f"-import{part}",
-                swf,
-                output,
-                decomp_location,
-            ],
-            stdout=subprocess.DEVNULL,
-            check=False,
+        return self.run_command(
+            [f"-import{part}", swf, output, decomp_location],
+            quiet=False,
+            swf=swf,
         )
-
-        return process.returncode == 0
@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import json
+import os
+import sys
+import uuid
+from pathlib import Path
+from typing import Any
+
+from flash_patcher.util.hashing import hash_parts
+from flash_patcher.util.logging import logger
+
+FFDEC_CONFIG_NAME = "ffdec.json"
+FFDEC_INSTALLS_NAME = "ffdec-installs"
+
+def get_config_location() -> Path:
+    """Return the location of the user-level FFDec config file.
+
+    This follows the platform convention: %APPDATA% on Windows,
+    and $XDG_CONFIG_HOME (or ~/.config) everywhere else.
+    """
+    if sys.platform == "win32" and os.getenv("APPDATA"):
+        config_dir = Path(os.getenv("APPDATA"))
+    elif os.getenv("XDG_CONFIG_HOME"):
+        config_dir = Path(os.getenv("XDG_CONFIG_HOME"))
+    else:
+        config_dir = Path.home() / ".config"
+
+    return config_dir / "flash_patcher" / FFDEC_CONFIG_NAME
+
+def get_install_config_location(path: Path, args: list[str]) -> Path:
+    """Return the config file of an FFDec install that was provided, instead of detected.
+
+    Each provided install gets its own file next to the user-level config,
+    so switching between installs doesn't detect their versions again.
+    """
+    name = hash_parts(str(path), *args)[:16]
+    return get_config_location().parent / FFDEC_INSTALLS_NAME / f"{name}.json"
+
+class FFDecConfig:
+    """A previously detected FFDec install.
+
+    stamp identifies the state of the install when it was detected (see get_install_stamp),
+    so the config is dropped as soon as FFDec is moved, removed or updated.
+    """
+
+    path: Path
+    args: list[str]
+    version: str | None
+    stamp: list[int]
+
+    def __init__(
+        self: FFDecConfig,
+        path: Path,
+        args: list[str],
+        version: str | None,
+        stamp: list[int],
+    ) -> None:
+        self.path = path
+        self.args = args
+        self.version = version
+        self.stamp = stamp
+
+    def to_json(self: FFDecConfig) -> dict[str, Any]:
+        """Convert the config to JSON-serializable data."""
+        return {
+            "path": str(self.path),
+            "args": self.args,
+            "version": self.version,
+            "stamp": self.stamp,
+        }
+
+    @classmethod
+    def from_json(cls: type[FFDecConfig], data: dict[str, Any]) -> FFDecConfig:
+        """Load a config from the output of to_json."""
+        return cls(
+            Path(data["path"]),
+            list(data["args"]),
+            data["version"],
+            list(data["stamp"]),
+        )
+
+def load_ffdec_config(location: Path) -> FFDecConfig | None:
+    """Load the saved FFDec config.
+
+    Returns None if there is no config, or if it can't be read.
+    """
+    try:
+        with location.open() as config_file:
+            return FFDecConfig.from_json(json.load(config_file))
+
+    except FileNotFoundError:
+        return None
+
+    except (OSError, json.JSONDecodeError, KeyError, TypeError):
+        logger.warning("Could not read the FFDec config at %s. Detecting FFDec again...", location)
+        return None
+
+def save_ffdec_config(location: Path, config: FFDecConfig) -> None:
+    """Save the FFDec config.
+
+    The file is written under a temporary name and renamed into place,
+    so concurrent runs never see a partially written file.
+    The config only saves time, so failing to write it is not an error.
+    """
+    staging = location.with_name(f"{location.name}.{uuid.uuid4().hex[:8]}.tmp")
+
+    try:
+        location.parent.mkdir(parents=True, exist_ok=True)
+
+        with staging.open("w") as config_file:
+            json.dump(config.to_json(), config_file, indent=4)
+
+        os.replace(staging, location)
+
+    except OSError:
+        logger.debug("Could not save the FFDec config to %s.", location)
+        staging.unlink(missing_ok=True)
@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+import os
+import sys
+from pathlib import Path
+
+from flash_patcher.util.hashing import hash_parts
+
+# FFDec's own launcher gives it a deep stack, to decompile deeply nested code
+STACK_SIZE = "32m"
+
+# FFDec holds many times the size of a SWF in memory while exporting it
+HEAP_PER_SWF_BYTE = 64
+
+# FFDec's launcher scripts give it 1 GiB, so no SWF gets less than that
+HEAP_MIN = 1024 ** 3
+HEAP_MAX = 8 * 1024 ** 3
+
+def get_jvm_cache_dir() -> Path:
+    """Return the user-level folder of class-data-sharing archives.
+
+    This follows the platform convention: %LOCALAPPDATA% on Windows,
+    and $XDG_CACHE_HOME (or ~/.cache) everywhere else.
+    """
+    if sys.platform == "win32" and os.getenv("LOCALAPPDATA"):
+        cache_dir = Path(os.getenv("LOCALAPPDATA"))
+    elif os.getenv("XDG_CACHE_HOME"):
+        cache_dir = Path(os.getenv("XDG_CACHE_HOME"))
+    else:
+        cache_dir = Path.home() / ".cache"
+
+    return cache_dir / "flash_patcher" / "jvm"
+
+def get_archive_location(java: str, jar: Path) -> Path:
+    """Return the class-data-sharing archive of an FFDec install run by a Java install.
+
+    Each pair gets its own archive, which changes when either of them is updated.
+    """
+    stamps = []
+
+    for path in (Path(java), jar):
+        try:
+            stamps.append(str(path.stat().st_mtime_ns))
+        except OSError:
+            stamps.append("")
+
+    return get_jvm_cache_dir() / f"{hash_parts(java, str(jar.resolve()), *stamps)[:16]}.jsa"
+
+def get_heap_size(swf: Path | None) -> int:
+    """Return the most memory FFDec may use to work on a SWF, in bytes."""
+    try:
+        size = swf.stat().st_size * HEAP_PER_SWF_BYTE if swf is not None else 0
+    except OSError:
+        size = 0
+
+    return min(max(size, HEAP_MIN), HEAP_MAX)
+
+class JavaLauncher:
+    """Launch FFDec with Java directly, instead of through its launcher script.
+
+    Most of a short FFDec command is spent starting the JVM and loading FFDec's classes.
+    The classes FFDec loads are kept in a class-data-sharing archive, which Java 19 and later
+    create on the first run and map into memory on every later run.
+    Older Java versions ignore the archive options, and only get the heap and GC options.
+    """
+
+    java: str
+    jar: Path
+    archive: Path
+
+    def __init__(self: JavaLauncher, java: str, jar: Path) -> None:
+        """Raises OSError if the archive folder can't be created."""
+        self.java = java
+        self.jar = jar
+        self.archive = get_archive_location(java, jar)
+
+        self.archive.parent.mkdir(parents=True, exist_ok=True)
+
+    def get_jvm_options(self: JavaLauncher, swf: Path | None = None) -> list[str]:
+        """Return the JVM options to run FFDec with.
+
+        swf: the SWF FFDec works on, to size the heap. If None, the smallest heap is used.
+        """
+        return [
+            # Options older Java versions don't know are skipped, instead of failing to start
+            "-XX:+IgnoreUnrecognizedVMOptions",
+            "-XX:+AutoCreateSharedArchive",
+            f"-XX:SharedArchiveFile={self.archive}",
+            f"-Xmx{get_heap_size(swf) // 1024 ** 2}m",
+            f"-Xss{STACK_SIZE}",
+            # FFDec commands are batch jobs, so throughput matters more than pause times
+            "-XX:+UseParallelGC",
+        ]
+
+    def get_command(self: JavaLauncher, swf: Path | None = None) -> list[str]:
+        """Return the command that starts FFDec, to add FFDec arguments to."""
+        return [self.java, *self.get_jvm_options(swf), "-jar", str(self.jar)]
@@ -0,0 +1,195 @@
+from __future__ import annotations
+
+import json
+import os
+import subprocess
+import sys
+import time
+from collections import deque
+from pathlib import Path
+
+from flash_patcher.util.logging import logger
+from flash_patcher.util.process_group import ProcessGroup
+
+# How many lines of FFDec output to keep from the start and the end of each command
+OUTPUT_HEAD_LINES = 20
+OUTPUT_TAIL_LINES = 50
+
+class OutputBuffer:
+    """Keep the first and last lines of a command's output, however long it is."""
+
+    head_lines: int
+    head: list[str]
+    tail: deque[str]
+
+    # How many lines were dropped between the head and the tail
+    skipped: int
+
+    def __init__(
+        self: OutputBuffer,
+        head_lines: int = OUTPUT_HEAD_LINES,
+        tail_lines: int = OUTPUT_TAIL_LINES,
+    ) -> None:
+        self.head_lines = head_lines
+        self.head = []
+        self.tail = deque(maxlen=tail_lines)
+        self.skipped = 0
+
+    def add(self: OutputBuffer, line: str) -> None:
+        """Keep a line of output."""
+        if len(self.head) < self.head_lines:
+            self.head.append(line)
+            return
+
+        if len(self.tail) == self.tail.maxlen:
+            self.skipped += 1
+
+        self.tail.append(line)
+
+    def get_lines(self: OutputBuffer) -> list[str]:
+        """Return the kept lines, with a marker where lines were dropped."""
+        marker = [f"... ({self.skipped} lines skipped) ..."] if self.skipped else []
+        return [*self.head, *marker, *self.tail]
+
+class FFDecCall:
+    """The record of one FFDec command: how it ran, what it cost and what it printed."""
+
+    command: list[str]
+
+    # "process" if FFDec was started for the command, "worker" if the worker ran it
+    runner: str
+
+    # The exit code, or None if FFDec couldn't be started
+    status: int | None
+
+    # In seconds. CPU time and peak memory (in bytes) are None if they're unknown,
+    # like for commands run in the worker, or on Windows.
+    wall_time: float
+    cpu_time: float | None
+    peak_rss: int | None
+
+    output: list[str]
+
+    def __init__(
+        self: FFDecCall,
+        command: list[str],
+        runner: str,
+        status: int | None,
+        wall_time: float,
+        cpu_time: float | None = None,
+        peak_rss: int | None = None,
+        output: list[str] | None = None,
+    ) -> None:
+        self.command = command
+        self.runner = runner
+        self.status = status
+        self.wall_time = wall_time
+        self.cpu_time = cpu_time
+        self.peak_rss = peak_rss
+        self.output = [] if output is None else output
+
+    def succeeded(self: FFDecCall) -> bool:
+        """Return True if the command succeeded."""
+        return self.status == 0
+
+    def describe(self: FFDecCall) -> str:
+        """Return a one-line summary of the command, for logs."""
+        parts = [f"exit {self.status}", f"{self.wall_time:.2f}s"]
+
+        if self.cpu_time is not None:
+            parts.append(f"{self.cpu_time:.2f}s CPU")
+
+        if self.peak_rss is not None:
+            parts.append(f"{self.peak_rss // 1024 ** 2} MiB peak")
+
+        return f"{subprocess.list2cmdline(self.command)} ({self.runner}: {', '.join(parts)})"
+
+    def to_dict(self: FFDecCall) -> dict:
+        """Return the record as JSON-compatible data."""
+        return {
+            "command": self.command,
+            "runner": self.runner,
+            "status": self.status,
+            "wall_time": self.wall_time,
+            "cpu_time": self.cpu_time,
+            "peak_rss": self.peak_rss,
+            "output": self.output,
+        }
+
+def wait_process(process: subprocess.Popen) -> tuple[int, float | None, int | None]:
+    """Wait for a process to exit.
+
+    Returns its exit code, its CPU time and its peak memory in bytes, including the processes
+    it waited for (like the JVM started by an FFDec launcher script).
+    The CPU time and peak memory are None if the platform doesn't report them.
+    """
+    if not hasattr(os, "wait4"):
+        return process.wait(), None, None
+
+    _, status, usage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(status)
+
+    # Linux reports the peak memory in KiB, macOS in bytes
+    peak_rss = usage.ru_maxrss if sys.platform == "darwin" else usage.ru_maxrss * 1024
+
+    return process.returncode, usage.ru_utime + usage.ru_stime, peak_rss
+
+def run_process(
+    command: list[str | Path],
+    quiet: bool = True,
+    group: ProcessGroup | None = None,
+) -> FFDecCall:
+    """Run an FFDec command in a new process, and record it.
+
+    The output of FFDec is streamed to the debug log as it's printed (like its progress),
+    and the start and end of it are kept in the record.
+
+    quiet: if False, the output is logged as an error if the command fails
+    group: the processes the command is part of (see ProcessGroup). If the group is cancelled,
+        the command fails.
+    """
+    command = [str(arg) for arg in command]
+    group = ProcessGroup() if group is None else group
+    output = OutputBuffer()
+    start = time.monotonic()
+
+    try:
+        with group.popen(
+            command,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            errors="replace",
+        ) as process:
+            for line in process.stdout:
+                line = line.rstrip()
+                output.add(line)
+                logger.debug("FFDec: %s", line)
+
+            status, cpu_time, peak_rss = wait_process(process)
+
+    except OSError as exc:
+        output.add(str(exc))
+        status, cpu_time, peak_rss = None, None, None
+
+    call = FFDecCall(
+        command,
+        "process",
+        status,
+        time.monotonic() - start,
+        cpu_time,
+        peak_rss,
+        output.get_lines(),
+    )
+
+    if not quiet and not call.succeeded():
+        logger.error("FFDec failed with this output:\n%s", "\n".join(call.output))
+
+    return call
+
+def save_calls(location: Path, calls: list[FFDecCall]) -> None:
+    """Write the records of FFDec commands to a JSON file, like for a CI artifact."""
+    location.write_text(
+        json.dumps([call.to_dict() for call in calls], indent=4),
+        encoding="utf-8",
+    )
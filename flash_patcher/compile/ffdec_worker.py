@@ -0,0 +1,232 @@
+from __future__ import annotations
+
+import os
+import queue
+import shutil
+import subprocess
+from pathlib import Path
+from threading import Lock, Thread
+from typing import IO
+
+from flash_patcher.util.process_group import ProcessGroup
+
+# The worker loads FFDec, then runs FFDec's own main method for each command
+# (see FFDecWorker.java). Java 11 and later run the source file directly, without compiling it.
+WORKER_SOURCE = Path(__file__).with_name("FFDecWorker.java")
+
+# The worker catches FFDec's calls to System.exit, which Java 18 to 23 only allow with this option.
+# Java 11 and Java 24 and later refuse to start with it, so the worker is started without it then.
+JAVA_OPTION_SETS = [["-Djava.security.manager=allow"], []]
+
+# How long to wait for a worker to exit once it's not needed anymore
+STOP_TIMEOUT = 5.0
+
+# How long to wait for a worker to load FFDec, and for a command to finish, in seconds.
+# A worker that takes longer is assumed to hang: it's killed, and FFDec is run directly instead.
+READY_TIMEOUT = 120.0
+COMMAND_TIMEOUT = 3600.0
+
+def find_java() -> str | None:
+    """Return the Java executable to run the worker with, from JAVA_HOME or the PATH."""
+    java_home = os.getenv("JAVA_HOME")
+
+    if java_home:
+        java = shutil.which("java", path=str(Path(java_home, "bin")))
+
+        if java is not None:
+            return java
+
+    return shutil.which("java")
+
+def find_ffdec_jar(path: Path) -> Path | None:
+    """Return the ffdec.jar next to an FFDec launcher (like ffdec.sh or ffdec.bat).
+
+    Returns None if there is none, like for a Flatpak install.
+    """
+    jar = path.resolve().with_name("ffdec.jar")
+    return jar if jar.is_file() else None
+
+# pylint: disable=too-many-instance-attributes
+class FFDecWorker:
+    """A warm FFDec process that runs commands sent over a pipe.
+
+    Starting the JVM and loading FFDec takes seconds for every command, so the worker
+    starts an FFDec process ahead of time, which is ready by the time a command needs it.
+    If the JVM lets the worker catch FFDec's calls to System.exit, the same process
+    runs every command. Otherwise, each process runs a single command,
+    and the next one starts warming up as soon as it's done.
+    """
+
+    java: str
+    jar: Path
+
+    # The JVM options of FFDec itself, like its heap size (see JavaLauncher)
+    jvm_options: list[str]
+
+    # The Java options to try, the working ones first
+    option_sets: list[list[str]]
+
+    process: subprocess.Popen | None
+    ready: bool
+
+    # The lines printed by the process, read in the background so reads can time out.
+    # An empty line means the process closed its output.
+    lines: queue.Queue[str]
+    reader: Thread | None
+
+    # Held while a command runs, since the worker runs one command at a time
+    lock: Lock
+
+    def __init__(
+        self: FFDecWorker,
+        java: str,
+        jar: Path,
+        jvm_options: list[str] | None = None,
+    ) -> None:
+        self.java = java
+        self.jar = jar
+        self.jvm_options = jvm_options or []
+        self.option_sets = list(JAVA_OPTION_SETS)
+        self.lock = Lock()
+
+        self.process = None
+        self.ready = False
+        self.lines = queue.Queue()
+        self.reader = None
+
+    def spawn(self: FFDecWorker) -> None:
+        """Start a new FFDec process in the background.
+
+        Raises OSError if Java can't be started.
+        """
+        # pylint: disable=consider-using-with
+        self.process = subprocess.Popen(
+            [self.java, *self.jvm_options, *self.option_sets[0], "-cp", self.jar, WORKER_SOURCE],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            encoding="utf-8",
+        )
+        self.ready = False
+
+        # Each process gets its own queue, so lines of a previous process are never read
+        self.lines = queue.Queue()
+        self.reader = Thread(
+            target=forward_lines,
+            args=(self.process.stdout, self.lines),
+            daemon=True,
+        )
+        self.reader.start()
+
+    def read_line(self: FFDecWorker, timeout: float) -> str:
+        """Return the next line printed by the process, or "" once it closed its output.
+
+        Raises TimeoutError if the process prints nothing for timeout seconds.
+        """
+        try:
+            return self.lines.get(timeout=timeout)
+        except queue.Empty as exc:
+            raise TimeoutError(f"The FFDec worker didn't reply in {timeout} seconds") from exc
+
+    def wait_ready(self: FFDecWorker) -> bool:
+        """Wait until the process has loaded FFDec.
+
+        Returns False if no process can be started.
+        Raises TimeoutError if the process takes too long to load FFDec.
+        """
+        while not self.ready:
+            if self.process is None:
+                self.spawn()
+
+            if self.read_line(READY_TIMEOUT).startswith("ready"):
+                self.ready = True
+                break
+
+            # The process couldn't start, so try the next Java options
+            self.process.wait()
+            self.process = None
+            self.option_sets.pop(0)
+
+            if not self.option_sets:
+                return False
+
+        return True
+
+    def run(
+        self: FFDecWorker,
+        args: list[str | Path],
+        group: ProcessGroup | None = None,
+    ) -> int | None:
+        """Run an FFDec command in the worker.
+
+        group: the processes the command is part of (see ProcessGroup). The command holds
+            one of its slots while it runs. If the group is cancelled, the worker's process
+            is killed, and the next command starts a new one.
+        Returns the exit code of the command, or None if the worker can't run it.
+        If the worker hangs (see READY_TIMEOUT and COMMAND_TIMEOUT), it's stopped,
+        and None is returned too.
+        """
+        command = [str(arg) for arg in args]
+        group = ProcessGroup() if group is None else group
+
+        if not self.option_sets or any("\t" in arg or "\n" in arg for arg in command):
+            return None
+
+        try:
+            if not self.wait_ready():
+                return None
+
+            with group.track(self.process):
+                self.ready = False
+                self.process.stdin.write("\t".join(command) + "\n")
+                self.process.stdin.flush()
+
+                reply = self.read_line(COMMAND_TIMEOUT).split()
+
+                if len(reply) == 2 and reply[0] == "status" and reply[1].lstrip("-").isdigit():
+                    self.ready = True
+                    return int(reply[1])
+
+                # The process ran a single command (or was killed), and exited with its result
+                status = self.process.wait()
+
+            self.spawn()
+
+        # A hanging worker times out, which is an OSError too
+        except OSError:
+            self.stop()
+            return None
+
+        return status
+
+    def stop(self: FFDecWorker) -> None:
+        """Stop the FFDec process, once no more commands will be sent."""
+        if self.process is None:
+            return
+
+        process, self.process = self.process, None
+        self.ready = False
+
+        try:
+            process.stdin.close()
+            process.wait(STOP_TIMEOUT)
+        except (OSError, subprocess.TimeoutExpired):
+            process.kill()
+            process.wait()
+
+        # The reader stops once the process is gone, before its output is closed
+        if self.reader is not None:
+            self.reader.join(STOP_TIMEOUT)
+            self.reader = None
+
+        process.stdout.close()
+
+def forward_lines(stream: IO[str], lines: queue.Queue[str]) -> None:
+    """Put every line of a stream in a queue, then an empty line once the stream is closed."""
+    try:
+        for line in stream:
+            lines.put(line)
+    except (OSError, ValueError):
+        pass
+
+    lines.put("")
@@ -1,8 +1,105 @@
+from __future__ import annotations
+
+import os
+import re
+import shutil
+import time
 from pathlib import Path
+from tempfile import mkdtemp
+from typing import Any, Optional, Type
+
+from flash_patcher.util.file_lock import is_process_alive
+from flash_patcher.util.logging import logger
+
+WORKSPACE_ROOT = Path("./.Patcher-Temp/runs")
 
-def get_decomp_locations(xml_mode: bool) -> (Path, Path):
-    """Return (DECOMP_LOCATION, DECOMP_LOCATION_WITH_SCRIPTS)"""
+# The folder of a failed run is kept this long (in seconds) for inspection, then it's removed
+# when another run starts. Past this age, it's removed even if its process ID looks alive,
+# since the ID may have been reused.
+RUN_FOLDER_MAX_AGE = 24 * 60 * 60
+
+RUN_FOLDER_NAME = re.compile(r"run-(\d+)-")
+
+def get_decomp_locations(
+    xml_mode: bool,
+    run_folder: Path = Path("./.Patcher-Temp/"),
+) -> (Path, Path):
+    """Return (DECOMP_LOCATION, DECOMP_LOCATION_WITH_SCRIPTS) inside the folder of a run."""
     if xml_mode:
-        return Path("./.Patcher-Temp/swf.xml"), Path("./.Patcher-Temp/")
+        return run_folder / "swf.xml", run_folder
+
+    return run_folder / "mod", run_folder / "mod" / "scripts"
+
+def prune_run_folders(
+    workspace: Path | None = None,
+    min_age: float = 0,
+) -> list[Path]:
+    """Remove the folders of runs that are over, like the ones kept after a failure.
+
+    A folder is removed if its process is no longer running and it's at least min_age seconds
+    old, or if it's older than RUN_FOLDER_MAX_AGE.
+    Returns the removed folders.
+    """
+    workspace = WORKSPACE_ROOT if workspace is None else workspace
+
+    if not workspace.is_dir():
+        return []
+
+    removed = []
+
+    for location in workspace.iterdir():
+        match = RUN_FOLDER_NAME.match(location.name)
+
+        if match is None:
+            continue
+
+        try:
+            age = time.time() - location.stat().st_mtime
+        except OSError:
+            continue
+
+        over = age >= min_age and not is_process_alive(int(match.group(1)))
+
+        if over or age >= RUN_FOLDER_MAX_AGE:
+            shutil.rmtree(location, ignore_errors=True)
+            removed.append(location)
+
+    return removed
+
+class RunFolder:
+    """A new folder for the files of a single run, so runs started at the same time
+    never touch each other's files.
+
+    The folder is removed once the run succeeds. If it fails, it's kept for inspection,
+    until `cache prune` or a run started after RUN_FOLDER_MAX_AGE removes it.
+    """
+
+    workspace: Path
+    path: Path | None
+
+    def __init__(self: RunFolder, workspace: Path | None = None) -> None:
+        """workspace: the folder to create run folders in, like a tmpfs mount.
+        If None, they are created in .Patcher-Temp.
+        """
+        self.workspace = WORKSPACE_ROOT if workspace is None else workspace
+        self.path = None
+
+    def __enter__(self: RunFolder) -> Path:
+        self.workspace.mkdir(parents=True, exist_ok=True)
+
+        for location in prune_run_folders(self.workspace, RUN_FOLDER_MAX_AGE):
+            logger.info("Removed the files of an old run in %s", location)
+
+        self.path = Path(mkdtemp(prefix=f"run-{os.getpid()}-", dir=self.workspace))
+        return self.path
 
-    return Path("./.Patcher-Temp/mod/"), Path("./.Patcher-Temp/mod/scripts/")
+    def __exit__(
+        self: RunFolder,
+        exc_type: Optional[Type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[Any],
+    ) -> None:
+        if exc_type is None:
+            shutil.rmtree(self.path, ignore_errors=True)
+        else:
+            logger.info("The files of the failed run were kept in %s", self.path)
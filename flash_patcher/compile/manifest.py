@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+import os
+from pathlib import Path
+
+from flash_patcher.util.hashing import hash_file
+
+def list_files(payload: Path) -> list[str]:
+    """Return the POSIX-style paths of all files in the payload, relative to it.
+
+    If the payload is a single file, "." is returned to refer to the payload itself.
+    """
+    if payload.is_file():
+        return ["."]
+
+    return sorted(
+        Path(dp, f).relative_to(payload).as_posix()
+        for dp, _, fn in os.walk(payload) for f in fn
+    )
+
+def build_manifest(payload: Path) -> dict[str, dict]:
+    """Build the manifest of a decompilation payload (a folder or a single file).
+
+    The manifest maps each file to its size, modification time and SHA-256 hash.
+    """
+    manifest = {}
+
+    for name in list_files(payload):
+        file = payload / name
+        stat = file.stat()
+
+        manifest[name] = {
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "sha256": hash_file(file),
+        }
+
+    return manifest
+
+def get_manifest_size(manifest: dict[str, dict]) -> int:
+    """Return the total size in bytes of all files in the manifest."""
+    return sum(item["size"] for item in manifest.values())
+
+def verify_manifest(payload: Path, manifest: dict[str, dict]) -> list[str]:
+    """Check the payload against its manifest and return the list of damaged files.
+
+    This is a fast, stat-based check: a file is only hashed if its size matches
+    but its modification time changed since the manifest was built.
+    """
+    damaged = []
+
+    for name, item in manifest.items():
+        file = payload / name
+
+        try:
+            stat = file.stat()
+        except (FileNotFoundError, NotADirectoryError):
+            damaged.append(name)
+            continue
+
+        if stat.st_size != item["size"]:
+            damaged.append(name)
+
+        elif stat.st_mtime_ns != item["mtime_ns"] and hash_file(file) != item["sha256"]:
+            damaged.append(name)
+
+    return damaged
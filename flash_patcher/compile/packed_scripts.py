@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+import sqlite3
+import zlib
+from contextlib import closing
+from pathlib import Path
+from typing import Iterator
+
+from flash_patcher.compile.manifest import list_files
+
+# Each file of the decompilation is one row, indexed by its POSIX path relative to the export
+SCHEMA = """CREATE TABLE scripts (
+    path TEXT PRIMARY KEY,
+    compressed INTEGER NOT NULL,
+    data BLOB NOT NULL
+)"""
+
+def pack_folder(folder: Path, location: Path, compress: bool = False) -> int:
+    """Pack every file in the folder into a new database at the given location.
+
+    compress: if True, files are stored zlib-compressed (unless that makes them larger)
+    Returns the number of packed files.
+    """
+    def read_rows() -> Iterator[tuple[str, int, bytes]]:
+        for name in list_files(folder):
+            data = (folder / name).read_bytes()
+
+            if compress:
+                packed = zlib.compress(data)
+
+                if len(packed) < len(data):
+                    yield name, 1, packed
+                    continue
+
+            yield name, 0, data
+
+    with closing(sqlite3.connect(location)) as database:
+        database.execute(SCHEMA)
+
+        with database:
+            database.executemany("INSERT INTO scripts VALUES (?, ?, ?)", read_rows())
+
+        return database.execute("SELECT COUNT(*) FROM scripts").fetchone()[0]
+
+class PackedScripts:
+    """A decompilation packed into a single SQLite database by pack_folder.
+
+    Loose files are only written to disk on request, when a patch needs them.
+    Packed databases are never modified once written, so they can be read from a read-only cache.
+    """
+
+    location: Path
+
+    def __init__(self: PackedScripts, location: Path) -> None:
+        self.location = location
+
+    def connect(self: PackedScripts) -> sqlite3.Connection:
+        """Open the database for reading."""
+        uri = f"{self.location.resolve().as_uri()}?mode=ro&immutable=1"
+        return sqlite3.connect(uri, uri=True)
+
+    def list_scripts(self: PackedScripts) -> list[str]:
+        """Return the paths of all packed files, relative to the export folder."""
+        with closing(self.connect()) as database:
+            rows = database.execute("SELECT path FROM scripts ORDER BY path")
+            return [path for (path,) in rows]
+
+    def read(self: PackedScripts, name: str) -> bytes | None:
+        """Return the content of a packed file, or None if there is no such file."""
+        with closing(self.connect()) as database:
+            row = database.execute(
+                "SELECT compressed, data FROM scripts WHERE path = ?", (name,)
+            ).fetchone()
+
+        if row is None:
+            return None
+
+        compressed, data = row
+        return zlib.decompress(data) if compressed else data
+
+    def extract(self: PackedScripts, name: str, dest: Path) -> bool:
+        """Write a single packed file into the dest folder, unless it is already there.
+
+        name: the POSIX path of the file, relative to the export folder
+        Returns True if the file was written.
+        """
+        file = dest / name
+
+        if file.exists():
+            return False
+
+        data = self.read(name)
+
+        if data is None:
+            return False
+
+        file.parent.mkdir(parents=True, exist_ok=True)
+        file.write_bytes(data)
+        return True
+
+    def extract_all(self: PackedScripts, dest: Path) -> int:
+        """Write all packed files into the dest folder, keeping the files already there.
+
+        Returns the number of files written.
+        """
+        written = 0
+
+        with closing(self.connect()) as database:
+            for name, compressed, data in database.execute("SELECT * FROM scripts"):
+                file = dest / name
+
+                if file.exists():
+                    continue
+
+                file.parent.mkdir(parents=True, exist_ok=True)
+                file.write_bytes(zlib.decompress(data) if compressed else data)
+                written += 1
+
+        return written
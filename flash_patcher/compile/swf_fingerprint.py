@@ -0,0 +1,291 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import lzma
+import re
+import struct
+import zlib
+from pathlib import Path
+from typing import Any, Iterator
+
+# SWF tag codes (see the SWF file format specification)
+TAG_END = 0
+TAG_SHOW_FRAME = 1
+TAG_DEFINE_BUTTON = 7
+TAG_DO_ACTION = 12
+TAG_PLACE_OBJECT_2 = 26
+TAG_DEFINE_BUTTON_2 = 34
+TAG_DEFINE_SPRITE = 39
+TAG_EXPORT_ASSETS = 56
+TAG_IMPORT_ASSETS = 57
+TAG_DO_INIT_ACTION = 59
+TAG_FILE_ATTRIBUTES = 69
+TAG_PLACE_OBJECT_3 = 70
+TAG_IMPORT_ASSETS_2 = 71
+TAG_DO_ABC_DEFINE = 72
+TAG_SYMBOL_CLASS = 76
+TAG_DO_ABC = 82
+
+# Script tags that FFDec doesn't export into a single frame, sprite or button folder
+# (AS2 classes in __Packages, AS3 packages, and the names used for folders).
+# If any of these change, the whole SWF is exported again.
+GLOBAL_TAGS = {
+    TAG_DEFINE_BUTTON,
+    TAG_EXPORT_ASSETS,
+    TAG_IMPORT_ASSETS,
+    TAG_DO_INIT_ACTION,
+    TAG_FILE_ATTRIBUTES,
+    TAG_IMPORT_ASSETS_2,
+    TAG_DO_ABC_DEFINE,
+    TAG_SYMBOL_CLASS,
+    TAG_DO_ABC,
+}
+
+# Script tags that FFDec doesn't export into a frame, sprite or button folder at all,
+# so they can't be selected: AS2 classes, AS3 code and AS1 buttons
+UNSELECTABLE_SCRIPT_TAGS = {
+    TAG_DEFINE_BUTTON,
+    TAG_DO_INIT_ACTION,
+    TAG_DO_ABC_DEFINE,
+    TAG_DO_ABC,
+}
+
+# PlaceObject2/3 tags carry onClipEvent scripts if this flag is set
+PLACE_FLAG_HAS_CLIP_ACTIONS = 0x80
+
+# FFDec exports each frame, sprite and button with scripts into its own top-level folder,
+# like frame_3, DefineSprite_12 or DefineSprite_12_name
+UNIT_FOLDER_PATTERN = re.compile(r"^(frame|DefineSprite|DefineButton2)_(\d+)(?!\d)")
+
+# Each cached script export keeps the fingerprint of the SWF it was exported from in this file
+FINGERPRINT_FILE = "fingerprint.json"
+FINGERPRINT_VERSION = 1
+
+def get_unit_name(folder_name: str) -> str | None:
+    """Return the unit exported into an FFDec script folder, like DefineSprite_12.
+
+    Returns None if the folder doesn't belong to a single frame, sprite or button.
+    """
+    match = UNIT_FOLDER_PATTERN.match(folder_name)
+
+    if match is None:
+        return None
+
+    return f"{match.group(1)}_{match.group(2)}"
+
+def read_swf_body(inputfile: Path) -> tuple[int, bytes]:
+    """Return the SWF version and the uncompressed content after the 8-byte header.
+
+    Raises ValueError if the file is not a SWF.
+    """
+    data = inputfile.read_bytes()
+
+    if len(data) < 8:
+        raise ValueError(f"Not a SWF file: {inputfile}")
+
+    signature, version = data[:3], data[3]
+    length = struct.unpack_from("<I", data, 4)[0]
+
+    try:
+        if signature == b"FWS":
+            return version, data[8:]
+
+        if signature == b"CWS":
+            return version, zlib.decompress(data[8:])
+
+        if signature == b"ZWS":
+            # SWF stores the LZMA properties after the compressed length. Python only reads
+            # LZMA streams with a .lzma header, which also holds the uncompressed length.
+            header = data[12:17] + struct.pack("<Q", length - 8)
+            return version, lzma.decompress(header + data[17:], lzma.FORMAT_ALONE)
+
+    except (zlib.error, lzma.LZMAError) as exc:
+        raise ValueError(f"Damaged SWF file: {inputfile}") from exc
+
+    raise ValueError(f"Not a SWF file: {inputfile}")
+
+def read_tags(data: bytes, offset: int = 0) -> Iterator[tuple[int, bytes]]:
+    """Iterate over the (code, body) of every tag, up to the End tag.
+
+    Raises ValueError if a tag runs past the end of the data.
+    """
+    while offset + 2 <= len(data):
+        header = struct.unpack_from("<H", data, offset)[0]
+        code, length = header >> 6, header & 0x3F
+        offset += 2
+
+        # Tags of 63 bytes or more store their length in the next 4 bytes
+        if length == 0x3F:
+            if offset + 4 > len(data):
+                raise ValueError("Truncated SWF tag header")
+
+            length = struct.unpack_from("<I", data, offset)[0]
+            offset += 4
+
+        if offset + length > len(data):
+            raise ValueError(f"Truncated SWF tag (code {code})")
+
+        if code == TAG_END:
+            return
+
+        yield code, data[offset:offset + length]
+        offset += length
+
+def has_scripts(code: int, body: bytes) -> bool:
+    """Return True if a control tag (in a frame or sprite timeline) carries scripts."""
+    if code == TAG_DO_ACTION:
+        return True
+
+    if code in (TAG_PLACE_OBJECT_2, TAG_PLACE_OBJECT_3):
+        return bool(body) and bool(body[0] & PLACE_FLAG_HAS_CLIP_ACTIONS)
+
+    return False
+
+class SwfFingerprint:
+    """A tag-level fingerprint of the scripts in a SWF.
+
+    Every frame, sprite and button that has scripts is a unit, which FFDec exports
+    into its own folder. Each unit is identified by the hash of the tags it's exported from,
+    so comparing two fingerprints tells which folders of an export are still valid.
+    All other script tags are hashed together into shared.
+    """
+
+    shared: str
+    units: dict[str, str]
+
+    def __init__(self: SwfFingerprint, shared: str, units: dict[str, str]) -> None:
+        self.shared = shared
+        self.units = units
+
+    def get_changed_units(self: SwfFingerprint, base: SwfFingerprint) -> set[str] | None:
+        """Return the units that were added, removed or changed since the base fingerprint.
+
+        Returns None if the shared script tags changed, since every unit may be affected.
+        """
+        if self.shared != base.shared:
+            return None
+
+        return {
+            unit for unit in self.units.keys() | base.units.keys()
+            if self.units.get(unit) != base.units.get(unit)
+        }
+
+    def to_json(self: SwfFingerprint) -> dict[str, Any]:
+        """Convert the fingerprint to JSON-serializable data."""
+        return {
+            "format": FINGERPRINT_VERSION,
+            "shared": self.shared,
+            "units": self.units,
+        }
+
+    @classmethod
+    def from_json(cls: type[SwfFingerprint], data: dict[str, Any]) -> SwfFingerprint:
+        """Load a fingerprint from the output of to_json.
+
+        Raises ValueError if the fingerprint was made by an incompatible version.
+        """
+        if data["format"] != FINGERPRINT_VERSION:
+            raise ValueError("Incompatible SWF fingerprint")
+
+        return cls(data["shared"], dict(data["units"]))
+
+def hash_tag(digest: Any, code: int, body: bytes) -> None:
+    """Add a tag to a running hash."""
+    digest.update(struct.pack("<HI", code, len(body)))
+    digest.update(body)
+
+def read_swf_tags(inputfile: Path) -> tuple[int, Iterator[tuple[int, bytes]]]:
+    """Return the SWF version and the top-level tags of a SWF (see read_tags).
+
+    Raises ValueError if the SWF can't be read.
+    """
+    version, body = read_swf_body(inputfile)
+
+    # Skip the frame size (a variable-length rectangle), the frame rate and the frame count
+    if not body:
+        raise ValueError(f"Truncated SWF file: {inputfile}")
+
+    rect_bits = 5 + 4 * (body[0] >> 3)
+    return version, read_tags(body, (rect_bits + 7) // 8 + 4)
+
+def has_unselectable_scripts(inputfile: Path) -> bool:
+    """Return True if the SWF has scripts outside of frames, sprites and buttons.
+
+    Raises ValueError if the SWF can't be read.
+    """
+    _, tags = read_swf_tags(inputfile)
+    return any(code in UNSELECTABLE_SCRIPT_TAGS for code, _ in tags)
+
+def get_swf_fingerprint(inputfile: Path) -> SwfFingerprint:
+    """Compute the tag-level fingerprint of the scripts in a SWF.
+
+    Raises ValueError if the SWF can't be read.
+    """
+    version, tags = read_swf_tags(inputfile)
+
+    shared = hashlib.sha256(bytes([version]))
+    units = {}
+
+    frame = 1
+    frame_digest = hashlib.sha256()
+    frame_has_scripts = False
+
+    for code, tag in tags:
+        if code == TAG_SHOW_FRAME:
+            if frame_has_scripts:
+                units[f"frame_{frame}"] = frame_digest.hexdigest()
+
+            frame += 1
+            frame_digest = hashlib.sha256()
+            frame_has_scripts = False
+
+        elif has_scripts(code, tag):
+            hash_tag(frame_digest, code, tag)
+            frame_has_scripts = True
+
+        elif code == TAG_DEFINE_SPRITE and len(tag) >= 4:
+            # Skip the sprite ID and frame count to get to the sprite's own timeline
+            if any(has_scripts(*control) for control in read_tags(tag, 4)):
+                sprite_id = struct.unpack_from("<H", tag)[0]
+                units[f"DefineSprite_{sprite_id}"] = hashlib.sha256(tag).hexdigest()
+
+        # Buttons have actions if the offset after the ID and flags is nonzero
+        elif code == TAG_DEFINE_BUTTON_2 and len(tag) >= 5 and struct.unpack_from("<H", tag, 3)[0]:
+            button_id = struct.unpack_from("<H", tag)[0]
+            units[f"DefineButton2_{button_id}"] = hashlib.sha256(tag).hexdigest()
+
+        elif code in GLOBAL_TAGS:
+            hash_tag(shared, code, tag)
+
+    # Scripts after the last ShowFrame still belong to the last frame
+    if frame_has_scripts:
+        units[f"frame_{frame}"] = frame_digest.hexdigest()
+
+    return SwfFingerprint(shared.hexdigest(), units)
+
+def save_fingerprint(location: Path, fingerprint: SwfFingerprint, decompiler: str) -> None:
+    """Save the fingerprint of the SWF a cache entry was exported from.
+
+    decompiler: the FFDec version that made the export
+    """
+    with location.open("w") as file:
+        json.dump({"decompiler": decompiler, **fingerprint.to_json()}, file)
+
+def load_fingerprint(location: Path, decompiler: str) -> SwfFingerprint | None:
+    """Load the fingerprint of the SWF a cache entry was exported from.
+
+    Returns None if there is no readable fingerprint, or if the export was made
+    by another FFDec version (whose output may differ).
+    """
+    try:
+        with location.open() as file:
+            data = json.load(file)
+
+        if data["decompiler"] != decompiler:
+            return None
+
+        return SwfFingerprint.from_json(data)
+
+    except (OSError, json.JSONDecodeError, KeyError, TypeError, ValueError):
+        return None
@@ -0,0 +1,169 @@
+from __future__ import annotations
+
+import os
+import shutil
+from pathlib import Path
+from typing import Callable
+
+from flash_patcher.compile.manifest import list_files
+from flash_patcher.compile.packed_scripts import PackedScripts
+from flash_patcher.util.file_copy import clean_scripts, link_file, reset_folder
+from flash_patcher.util.logging import logger
+
+class FolderScripts:
+    """A decompilation stored as loose files in the cache.
+
+    Files are linked into the workspace instead of being copied (see link_file),
+    so the cache must never be modified through them.
+    """
+
+    location: Path
+
+    def __init__(self: FolderScripts, location: Path) -> None:
+        self.location = location
+
+    def extract(self: FolderScripts, name: str, dest: Path) -> bool:
+        """Link a single file into the dest folder, unless it is already there.
+
+        name: the POSIX path of the file, relative to the export folder
+        Returns True if the file was linked.
+        """
+        file = dest / name
+        source = self.location / name
+
+        if file.exists() or not source.is_file():
+            return False
+
+        file.parent.mkdir(parents=True, exist_ok=True)
+        link_file(source, file)
+        return True
+
+    def extract_all(self: FolderScripts, dest: Path) -> int:
+        """Copy all files into the dest folder, keeping the files already there.
+
+        Files are copied rather than linked, since they may be modified in place by anything.
+        Files that were linked before and never written are replaced with a copy.
+        Returns the number of files written.
+        """
+        written = 0
+
+        for name in list_files(self.location):
+            file = dest / name
+            source = self.location / name
+
+            if file.exists():
+                if not os.path.samefile(file, source):
+                    continue
+
+                file.unlink()
+
+            file.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copyfile(source, file)
+            written += 1
+
+        return written
+
+class SelectedScripts:
+    """A decompilation of only the scripts the patches were expected to touch.
+
+    Any other file is taken from the whole decompilation, which is only made once needed.
+    """
+
+    selected: FolderScripts
+    load_all: Callable[[], FolderScripts | PackedScripts]
+    all_scripts: FolderScripts | PackedScripts | None
+
+    def __init__(
+        self: SelectedScripts,
+        selected: FolderScripts,
+        load_all: Callable[[], FolderScripts | PackedScripts],
+    ) -> None:
+        """selected: the scripts exported ahead of time
+        load_all: decompiles the whole SWF, and returns its files
+        """
+        self.selected = selected
+        self.load_all = load_all
+        self.all_scripts = None
+
+    def get_all(self: SelectedScripts) -> FolderScripts | PackedScripts:
+        """Return every file of the decompilation, decompiling the whole SWF if needed."""
+        if self.all_scripts is None:
+            logger.info("Patches need more than the selected scripts. Decompiling the whole SWF...")
+            self.all_scripts = self.load_all()
+
+        return self.all_scripts
+
+    def extract(self: SelectedScripts, name: str, dest: Path) -> bool:
+        """Link a single file into the dest folder, unless it is already there.
+
+        Returns True if the file was linked.
+        """
+        if self.selected.extract(name, dest):
+            return True
+
+        if (dest / name).exists():
+            return False
+
+        return self.get_all().extract(name, dest)
+
+    def extract_all(self: SelectedScripts, dest: Path) -> int:
+        """Copy all files into the dest folder, keeping the files already there.
+
+        Returns the number of files written.
+        """
+        return self.get_all().extract_all(dest)
+
+class Workspace:
+    """The folder patches are applied in.
+
+    Nothing is copied up front: decompiled files are only taken from the cache
+    when a patch first touches them, so the workspace ends up holding just the files
+    the patches use, and only those that were modified need to be kept for recompilation.
+    """
+
+    root: Path
+    scripts: FolderScripts | PackedScripts | SelectedScripts
+    materialized: set[Path]
+
+    # Set once every file of the decompilation is in the workspace
+    complete: bool
+
+    def __init__(
+        self: Workspace,
+        root: Path,
+        scripts: FolderScripts | PackedScripts | SelectedScripts,
+    ) -> None:
+        """root: the folder to patch in. It is emptied.
+        scripts: the decompilation to take files from
+        """
+        self.root = root
+        self.scripts = scripts
+        self.materialized = set()
+        self.complete = False
+
+        reset_folder(root)
+
+    def materialize(self: Workspace, file: Path) -> None:
+        """Make sure a decompiled file is in the workspace before it is patched."""
+        try:
+            name = file.relative_to(self.root).as_posix()
+        except ValueError:
+            return
+
+        if self.scripts.extract(name, self.root):
+            self.materialized.add(file)
+
+    def materialize_all(self: Workspace) -> None:
+        """Put every decompiled file in the workspace, for anything that may read any of them."""
+        if not self.complete:
+            self.scripts.extract_all(self.root)
+            self.complete = True
+
+    def clean(self: Workspace, modified_scripts: set[Path]) -> None:
+        """Delete every file of the workspace that wasn't modified."""
+        if self.complete:
+            clean_scripts(self.root, modified_scripts)
+            return
+
+        for file in self.materialized - modified_scripts:
+            file.unlink(missing_ok=True)
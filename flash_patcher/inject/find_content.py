@@ -1,22 +1,21 @@
 from __future__ import annotations
 
-from flash_patcher.antlr_source.PatchfileParser import PatchfileParser
-
 from flash_patcher.exception.error_manager import ErrorManager
 from flash_patcher.inject.location.constant_injection_location import ConstantInjectionLocation
 from flash_patcher.inject.location.injection_location import InjectionLocation
+from flash_patcher.parse.commands import Location
 
 class FindContentManager:
     """A class designed to find specified content within a file,
     and replace it with placeholder text.
     """
 
-    context: PatchfileParser.LocationTokenContext = None
+    context: Location = None
     search_content: str
 
     def __init__(
         self: FindContentManager,
-        symbolic_location: PatchfileParser.LocationTokenContext,
+        symbolic_location: Location,
         search_content: str,
     ) -> None:
         self.context = symbolic_location
@@ -40,19 +39,19 @@ class FindContentManager:
         instance_number = None
 
         # Integer context means Nth instance
-        if isinstance(self.context, PatchfileParser.LineNumberContext):
-            instance_number = int(self.context.INTEGER().getText())
+        if self.context.kind == "line":
+            instance_number = self.context.number
             current_index, occurrences_found = \
                 self.find_nth_instance_after(file_content, 0, instance_number)
 
         # Function context means Nth instance from the start of the function
         # We always take the first function with this name
-        elif isinstance(self.context, PatchfileParser.FunctionContext):
-            function_name = self.context.TEXT_BLOCK().getText()
+        elif self.context.kind == "function":
+            function_name = self.context.name
 
             instance_number = 1
-            if self.context.INTEGER():
-                instance_number = int(self.context.INTEGER().getText())
+            if self.context.number is not None:
+                instance_number = self.context.number
 
             function_index_1 = file_content.find(f"function {function_name}")
             function_index_2 = file_content.find(f"{function_name} = function")
@@ -71,7 +70,7 @@ class FindContentManager:
                 self.find_nth_instance_after(file_content, function_index, instance_number)
 
         # End context means the last instance
-        elif isinstance(self.context, PatchfileParser.EndContext):
+        elif self.context.kind == "end":
             current_index = file_content.rfind(self.search_content)
             instance_number = 0
             occurrences_found = -1 if current_index == -1 else 0
@@ -79,7 +78,7 @@ class FindContentManager:
         # Unsupported context type
         else:
             exception.raise_(
-                f"""The context {self.context.getText()} is not a valid context type
+                f"""The context {self.context.text} is not a valid context type
                 for the find command!!"""
             )
 
@@ -96,7 +95,7 @@ class FindContentManager:
         else:
             # If less than N occurrences are found, raise an error
             exception.raise_(
-                f"""Could not find ({self.context.getText()})th instance of the content:
+                f"""Could not find ({self.context.text})th instance of the content:
                 {self.search_content}
                 """
             )
@@ -1,9 +1,8 @@
 from __future__ import annotations
 
-from flash_patcher.antlr_source.PatchfileParser import PatchfileParser
-
 from flash_patcher.exception.error_manager import ErrorManager
 from flash_patcher.inject.location.injection_location import InjectionLocation
+from flash_patcher.parse.commands import Location
 
 class ParserInjectionLocation (InjectionLocation):
     """Store the location within a file to inject at.
@@ -11,14 +10,14 @@ class ParserInjectionLocation (InjectionLocation):
     This will resolve a symbolic location (like "end") into a line number,
     which can then be injected.
 
-    This uses the parser context to find the correct location.
+    This uses the location as parsed from the patch file to find the correct line.
     """
 
-    context: PatchfileParser.LocationTokenContext = None
+    context: Location = None
 
     def __init__(
         self: ParserInjectionLocation,
-        symbolic_location: PatchfileParser.LocationTokenContext
+        symbolic_location: Location,
     ) -> None:
         self.context = symbolic_location
 
@@ -33,24 +32,24 @@ class ParserInjectionLocation (InjectionLocation):
         If it was unable to resolve, use error_line_no to throw and exception.
         """
         line_no = None
-        if isinstance(self.context, PatchfileParser.LineNumberContext):
+        if self.context.kind == "line":
             line_no = self.resolve_line_no(file_content, is_add, exception)
 
-        elif isinstance(self.context, PatchfileParser.FunctionContext):
+        elif self.context.kind == "function":
             line_no = self.resolve_function(file_content, exception)
 
-        elif isinstance(self.context, PatchfileParser.TextContext):
+        elif self.context.kind == "text":
             line_no = self.resolve_text(file_content, exception)
 
-        elif isinstance(self.context, PatchfileParser.EndContext):
+        elif self.context.kind == "end":
             line_no = self.resolve_end(file_content)
 
         # Unknown injection location
         else:
-            exception.context = self.context
+            exception.context = self.context.text
             exception.raise_(
                 f"""Invalid file location.
-                Expected keyword or integer (got type "{type(self.context)}").""",
+                Expected keyword or integer (got "{self.context.text}").""",
             )
 
         if line_no is None:
@@ -65,7 +64,7 @@ class ParserInjectionLocation (InjectionLocation):
         exception: ErrorManager
     ) -> int:
         """Resolve the injection location if it's a line number."""
-        line_no = int(self.context.INTEGER().getText())
+        line_no = self.context.number
 
         # ensure we inject before the line
         if is_add:
@@ -90,8 +89,8 @@ class ParserInjectionLocation (InjectionLocation):
             line = line.replace("(", " ")
             line = line.replace(")", " ")
 
-            if line.split()[:2] == ["function", self.context.TEXT_BLOCK().getText()] \
-                or line.split()[:3] == [self.context.TEXT_BLOCK().getText(), "=", "function"]:
+            if line.split()[:2] == ["function", self.context.name] \
+                or line.split()[:3] == [self.context.name, "=", "function"]:
                 # We need to add after the specified line
                 line_no = i + 1
                 found_fn = True
@@ -103,8 +102,8 @@ class ParserInjectionLocation (InjectionLocation):
                 break
 
         if line_no is not None:
-            if self.context.INTEGER():
-                line_no += int(self.context.INTEGER().getText())
+            if self.context.number is not None:
+                line_no += self.context.number
 
             else:
                 line_no = curly_brace_line
@@ -123,7 +122,7 @@ class ParserInjectionLocation (InjectionLocation):
         Will return None if there is no such content in the file.
         """
         matched_chars = 0
-        search_query = self.context.replaceBlockText().getText().strip()
+        search_query = self.context.content
 
         # Since we need to match across multiple lines, we need to iterate through each character
         for i, line in enumerate(file_content):
@@ -134,8 +133,8 @@ class ParserInjectionLocation (InjectionLocation):
 
                 if matched_chars == len(search_query):
                     line_no = i + 1
-                    if self.context.INTEGER():
-                        line_no += int(self.context.INTEGER().getText())
+                    if self.context.number is not None:
+                        line_no += self.context.number
 
                     self.verify_line_no(line_no, file_content, exception)
                     return line_no
@@ -0,0 +1,167 @@
+from __future__ import annotations
+
+import json
+import os
+import uuid
+from pathlib import Path
+from typing import Any, Callable
+
+from flash_patcher.compile.build_cache import get_patcher_version
+from flash_patcher.compile.cache import mark_used
+from flash_patcher.util.file_copy import break_hardlink
+from flash_patcher.util.hashing import hash_bytes, hash_parts
+from flash_patcher.util.logging import logger
+from flash_patcher.util.virtual_files import VirtualFileSystem
+
+PATCH_RESULT_ROOT = Path("./.Patcher-Temp/results")
+
+# Bump this whenever the descriptions of patches change
+RESULT_FORMAT = "1"
+
+class PatchMemo:
+    """Memoize the patched content of each script across runs.
+
+    Patches to a script are queued instead of being applied right away. Once flushed,
+    a script whose content and queued patches are unchanged since a previous run is restored
+    from the cache, without replaying any injection.
+
+    Each patch only reads and writes its own script, so scripts are independent of each other.
+    Anything that may read or write several scripts at once (like exec-python)
+    must flush the queue first.
+    """
+
+    root: Path
+    version: str
+    files: VirtualFileSystem | None
+    pending: dict[Path, list[tuple[dict[str, Any], Callable[[], None]]]]
+
+    restored: int
+    patched: int
+
+    def __init__(
+        self: PatchMemo,
+        root: Path | None = None,
+        files: VirtualFileSystem | None = None,
+    ) -> None:
+        """root: the folder of the result cache. If None, the cache is kept in .Patcher-Temp.
+        files: the file system patches write to, if they don't write to disk directly.
+        """
+        self.root = PATCH_RESULT_ROOT if root is None else root
+        self.files = files
+        self.version = get_patcher_version()
+        self.pending = {}
+
+        self.restored = 0
+        self.patched = 0
+
+    def add(
+        self: PatchMemo,
+        script: Path,
+        description: dict[str, Any],
+        apply: Callable[[], None],
+    ) -> None:
+        """Queue a patch to a script.
+
+        description: everything the patch depends on, with variables resolved
+        apply: applies the patch to the script
+        """
+        self.pending.setdefault(script, []).append((description, apply))
+
+    def read(self: PatchMemo, script: Path) -> bytes:
+        """Return the content of a script, with every patch applied to it so far.
+
+        Raises OSError if the script can't be read.
+        """
+        return script.read_bytes() if self.files is None else self.files.get_bytes(script)
+
+    def get_key(
+        self: PatchMemo,
+        content: bytes,
+        descriptions: list[dict[str, Any]],
+    ) -> str:
+        """Return the key of a script's patched content.
+
+        content: the content of the script before patching
+        The key also covers the ordered list of patches applied to it.
+        """
+        return hash_parts(
+            RESULT_FORMAT,
+            self.version,
+            hash_bytes(content),
+            *[json.dumps(description, sort_keys=True) for description in descriptions],
+        )
+
+    def flush(self: PatchMemo) -> None:
+        """Apply every queued patch, restoring scripts from the cache when possible."""
+        pending, self.pending = self.pending, {}
+
+        # Scripts are read ahead of time, while the ones before them are patched
+        if self.files is not None:
+            self.files.prefetch(pending)
+
+        for script, patches in pending.items():
+            self.apply(script, patches)
+
+        if pending:
+            logger.info(
+                "Restored %d patched scripts from the cache, patched %d.",
+                self.restored, self.patched,
+            )
+
+    def apply(
+        self: PatchMemo,
+        script: Path,
+        patches: list[tuple[dict[str, Any], Callable[[], None]]],
+    ) -> None:
+        """Apply the patches to a script, or restore its patched content from the cache."""
+        try:
+            location = self.root / self.get_key(
+                self.read(script), [description for description, _ in patches],
+            )
+        except OSError:
+            # The script can't be read, so let the patches report the error
+            location = None
+
+        if location is not None:
+            try:
+                content = location.read_bytes()
+            except FileNotFoundError:
+                content = None
+
+            if content is not None:
+                mark_used(location)
+
+                # The script may be held in memory, or linked to the decompilation cache
+                if self.files is not None:
+                    self.files.discard(script)
+
+                break_hardlink(script)
+                script.write_bytes(content)
+                self.restored += 1
+                return
+
+        for _, apply in patches:
+            apply()
+
+        self.patched += 1
+
+        if location is not None:
+            self.store(location, script)
+
+    def store(self: PatchMemo, location: Path, script: Path) -> None:
+        """Save the patched content of a script.
+
+        The file is written under a temporary name and renamed into place,
+        so concurrent runs never see a partially written file.
+        The cache is optional, so failing to write it is not an error.
+        """
+        staging = location.with_name(f"{location.name}.{uuid.uuid4().hex[:8]}.tmp")
+
+        try:
+            location.parent.mkdir(parents=True, exist_ok=True)
+            staging.write_bytes(self.read(script))
+            os.replace(staging, location)
+
+        except OSError:
+            logger.debug("Could not cache the patched content of %s.", script.name)
+            staging.unlink(missing_ok=True)
@@ -4,7 +4,7 @@ from pathlib import Path
 
 from flash_patcher.exception.error_manager import ErrorManager
 from flash_patcher.inject.location.injection_location import InjectionLocation
-from flash_patcher.util.file_io import readlines_safe, writelines_safe
+from flash_patcher.util.virtual_files import VirtualFileSystem
 
 class SingleInjectionManager:
     """A position in a named file."""
@@ -24,13 +24,18 @@ class SingleInjectionManager:
     error_manager: ErrorManager
     file_content: list[str]
 
+    # where the file is read from and written to
+    files: VirtualFileSystem
+
     def __init__(
         self: SingleInjectionManager,
         file_name: Path,
         file_location: InjectionLocation,
         patch_file: Path,
         patch_line_no: int,
+        files: VirtualFileSystem | None = None,
     ) -> None:
+        """files: if None, the file is read and written right away."""
         self.file_name = file_name
         self.file_location = file_location
         self.file_content = None
@@ -39,13 +44,14 @@ class SingleInjectionManager:
         self.patch_line_no = patch_line_no
 
         self.error_manager = ErrorManager(self.patch_file.as_posix(), 0, None)
+        self.files = VirtualFileSystem(budget=0) if files is None else files
 
     def inject(self: SingleInjectionManager, content: list[str], patch_file_line: int) -> None:
         """Inject the content into the file."""
         patch_line_no = patch_file_line
 
         if self.file_content is None:
-            self.file_content = readlines_safe(self.file_name, self.error_manager)
+            self.file_content = self.files.readlines(self.file_name, self.error_manager)
 
         file_line_no = self.file_location.resolve(self.file_content, True, self.error_manager)
 
@@ -72,7 +78,7 @@ class SingleInjectionManager:
 
             patch_line_no += 1
 
-        writelines_safe(self.file_name, self.file_content)
+        self.files.write(self.file_name, self.file_content)
 
     def handle_secondary_command(
         self: SingleInjectionManager,
@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+from flash_patcher.compile.manifest import list_files
+from flash_patcher.exception.error_manager import ErrorManager
+from flash_patcher.parse.parse_cache import load_patch_commands
+from flash_patcher.parse.scope import Scope
+
+def collect_patch_inputs(
+    patch_file_name: Path,
+    folder: Path,
+    scope: Scope,
+    inputs: list[Path],
+    targets: set[str] | None = None,
+) -> None:
+    """Add a patch file and every file it reads from the patch folder to inputs.
+
+    The patch is not applied. This follows apply-patch commands and resolves variables
+    the same way the PatchfileProcessor does, so it finds the same patch files, assets and scripts.
+
+    targets: if set, the scripts the patches change are added to it,
+        relative to the scripts folder of the decompilation
+    """
+    inputs.append(patch_file_name)
+
+    for command in load_patch_commands(patch_file_name):
+        error_manager = ErrorManager(patch_file_name, command.line)
+
+        match command.kind:
+            # Variables may be used in file names
+            case "set-var":
+                scope.define_local(command.name, command.value)
+
+            case "export-var":
+                scope.define_global(command.name, command.value)
+
+            case "add" | "remove" | "replace" | "replace-all" if targets is not None:
+                for target in command.targets:
+                    error_manager = ErrorManager(patch_file_name, target.line)
+                    targets.add(scope.resolve_all(target.file, error_manager))
+
+            # Assets and Python scripts are read from the patch folder
+            case "add-asset" | "exec-python":
+                path = folder / scope.resolve_all(command.file, error_manager)
+
+                # Asset folders add every file in them
+                if path.is_dir():
+                    inputs.extend(path / name for name in list_files(path))
+                else:
+                    inputs.append(path)
+
+            case "apply-patch":
+                patch_path = folder / scope.resolve_all(command.file, error_manager)
+                collect_patch_inputs(patch_path, patch_path.parent, scope, inputs, targets)
+
+@contextmanager
+def keep_global_scope() -> Iterator[None]:
+    """Restore the global variables once the patches have been walked."""
+    global_scope = Scope.global_scope.copy()
+
+    try:
+        yield
+    finally:
+        Scope.global_scope.clear()
+        Scope.global_scope.update(global_scope)
+
+def collect_build_inputs(stagefile: Path, folder: Path) -> tuple[list[Path], str]:
+    """Return every file the stagefile reads, in the order they are used,
+    and the variables defined once all patches ran (in CFG format).
+
+    This does not change the global variable scope.
+    """
+    inputs = []
+
+    with keep_global_scope():
+        scope = Scope()
+        collect_patch_inputs(stagefile, folder, scope, inputs)
+        return inputs, scope.get_config()
+
+def collect_script_targets(stagefile: Path, folder: Path) -> set[str]:
+    """Return every script the stagefile patches, relative to the scripts folder
+    of the decompilation, like frame_1/DoAction.as.
+
+    This does not change the global variable scope.
+    """
+    targets = set()
+
+    with keep_global_scope():
+        collect_patch_inputs(stagefile, folder, Scope(), [], targets)
+        return targets
@@ -0,0 +1,180 @@
+from __future__ import annotations
+
+from flash_patcher.antlr_source.PatchfileParser import PatchfileParser
+from flash_patcher.antlr_source.PatchfileParserVisitor import PatchfileParserVisitor
+
+from flash_patcher.parse.commands import Location, PatchCommand, PatchTarget
+
+def compile_location(ctx: PatchfileParser.LocationTokenContext) -> Location:
+    """Convert a location token from the syntax tree into a Location."""
+    if isinstance(ctx, PatchfileParser.LineNumberContext):
+        return Location("line", ctx.getText(), number=int(ctx.INTEGER().getText()))
+
+    if isinstance(ctx, PatchfileParser.FunctionContext):
+        return Location(
+            "function",
+            ctx.getText(),
+            number=int(ctx.INTEGER().getText()) if ctx.INTEGER() else None,
+            name=ctx.TEXT_BLOCK().getText(),
+        )
+
+    if isinstance(ctx, PatchfileParser.TextContext):
+        return Location(
+            "text",
+            ctx.getText(),
+            number=int(ctx.INTEGER().getText()) if ctx.INTEGER() else None,
+            content=ctx.replaceBlockText().getText().strip(),
+        )
+
+    if isinstance(ctx, PatchfileParser.EndContext):
+        return Location("end", ctx.getText())
+
+    # This is rejected once the location is resolved, with the line of the command
+    return Location("invalid", ctx.getText())
+
+class PatchfileCompiler (PatchfileParserVisitor):
+    """Compile the syntax tree of a patch file into a list of PatchCommands.
+
+    This is the only place that depends on the shape of the syntax tree.
+    Everything downstream (running, caching and fingerprinting patches) uses the commands.
+    """
+
+    commands: list[PatchCommand]
+
+    def __init__(self: PatchfileCompiler) -> None:
+        self.commands = []
+
+    def visitAddBlock(
+        self: PatchfileCompiler,
+        ctx: PatchfileParser.AddBlockContext
+    ) -> None:
+        """Compile an add block, with one target per header."""
+        self.commands.append(PatchCommand(
+            "add",
+            ctx.start.line,
+            targets=[
+                PatchTarget(
+                    header.FILENAME().getText(),
+                    [compile_location(header.locationToken())],
+                    header.start.line,
+                )
+                for header in ctx.addBlockHeader()
+            ],
+            text=ctx.addBlockText().getText(),
+        ))
+
+    def visitAddAssetBlock(
+        self: PatchfileCompiler,
+        ctx: PatchfileParser.AddAssetBlockContext
+    ) -> None:
+        """Compile an add-asset command."""
+        self.commands.append(PatchCommand(
+            "add-asset",
+            ctx.start.line,
+            file=ctx.local.getText(),
+            dest=ctx.swf.getText(),
+        ))
+
+    def visitRemoveBlock(
+        self: PatchfileCompiler,
+        ctx: PatchfileParser.RemoveBlockContext
+    ) -> None:
+        """Compile a remove command, with the start and end locations."""
+        self.commands.append(PatchCommand(
+            "remove",
+            ctx.start.line,
+            targets=[PatchTarget(
+                ctx.FILENAME().getText(),
+                [compile_location(ctx.locationToken(0)), compile_location(ctx.locationToken(1))],
+                ctx.start.line,
+            )],
+        ))
+
+    def visitReplaceNthBlock(
+        self: PatchfileCompiler,
+        ctx: PatchfileParser.ReplaceNthBlockContext
+    ) -> None:
+        """Compile a replace block, with one target per header."""
+        self.commands.append(PatchCommand(
+            "replace",
+            ctx.start.line,
+            targets=[
+                PatchTarget(
+                    header.FILENAME().getText(),
+                    [compile_location(header.locationToken())],
+                    header.start.line,
+                )
+                for header in ctx.replaceNthBlockHeader()
+            ],
+            find=ctx.replaceBlockText().getText(),
+            text=ctx.addBlockText().getText(),
+        ))
+
+    def visitReplaceAllBlock(
+        self: PatchfileCompiler,
+        ctx: PatchfileParser.ReplaceAllBlockContext
+    ) -> None:
+        """Compile a replace-all block, with one target per header."""
+        self.commands.append(PatchCommand(
+            "replace-all",
+            ctx.start.line,
+            targets=[
+                PatchTarget(header.FILENAME().getText(), [], header.start.line)
+                for header in ctx.replaceAllBlockHeader()
+            ],
+            find=ctx.replaceBlockText().getText(),
+            text=ctx.addBlockText().getText(),
+        ))
+
+    def visitSetVarBlock(
+        self: PatchfileCompiler,
+        ctx: PatchfileParser.SetVarBlockContext
+    ) -> None:
+        """Compile a set-var command."""
+        self.commands.append(PatchCommand(
+            "set-var",
+            ctx.start.line,
+            name=ctx.var_name.text,
+            value=ctx.varValue().getText(),
+        ))
+
+    def visitExportVarBlock(
+        self: PatchfileCompiler,
+        ctx: PatchfileParser.ExportVarBlockContext
+    ) -> None:
+        """Compile an export-var command."""
+        self.commands.append(PatchCommand(
+            "export-var",
+            ctx.start.line,
+            name=ctx.var_name.text,
+            value=ctx.varValue().getText(),
+        ))
+
+    def visitExecPatcherBlock(
+        self: PatchfileCompiler,
+        ctx: PatchfileParser.ExecPatcherBlockContext
+    ) -> None:
+        """Compile an apply-patch command."""
+        self.commands.append(PatchCommand(
+            "apply-patch",
+            ctx.start.line,
+            file=ctx.file_name().getText(),
+        ))
+
+    def visitExecPythonBlock(
+        self: PatchfileCompiler,
+        ctx: PatchfileParser.ExecPythonBlockContext
+    ) -> None:
+        """Compile an exec-python command."""
+        self.commands.append(PatchCommand(
+            "exec-python",
+            ctx.start.line,
+            file=ctx.file_name().getText(),
+        ))
+
+def compile_patch(root: PatchfileParser.RootContext) -> list[PatchCommand]:
+    """Compile the syntax tree of a patch file into its list of commands, in order."""
+    compiler = PatchfileCompiler()
+    compiler.visitRoot(root)
+
+    return compiler.commands
@@ -0,0 +1,148 @@
+from __future__ import annotations
+
+from typing import Any
+
+def drop_empty(data: dict[str, Any]) -> dict[str, Any]:
+    """Remove unset fields from serialized data, to keep it compact."""
+    return {key: value for key, value in data.items() if value is not None and value != []}
+
+class Location:
+    """A symbolic location within a script, as written in a patch file.
+
+    kind is one of:
+    - line: a line number (or the Nth instance, for replace)
+    - function: a function name, with an optional line offset (or instance number)
+    - text: the content to find, with an optional line offset
+    - end: the end of the file
+    """
+
+    kind: str
+    number: int | None
+    name: str | None
+    content: str | None
+
+    # The location as written in the patch file, for error messages
+    text: str
+
+    def __init__(
+        self: Location,
+        kind: str,
+        text: str,
+        number: int | None = None,
+        name: str | None = None,
+        content: str | None = None,
+    ) -> None:
+        self.kind = kind
+        self.text = text
+        self.number = number
+        self.name = name
+        self.content = content
+
+    def to_json(self: Location) -> dict[str, Any]:
+        """Convert the location to JSON-serializable data."""
+        return drop_empty(vars(self))
+
+    @classmethod
+    def from_json(cls: type[Location], data: dict[str, Any]) -> Location:
+        """Load a location from the output of to_json."""
+        return cls(**data)
+
+class PatchTarget:
+    """A script targeted by a command, with the location(s) to patch within it.
+
+    Remove commands have two locations (the start and end), replace-all commands have none.
+    """
+
+    file: str
+    locations: list[Location]
+    line: int
+
+    def __init__(
+        self: PatchTarget,
+        file: str,
+        locations: list[Location],
+        line: int,
+    ) -> None:
+        self.file = file
+        self.locations = locations
+        self.line = line
+
+    def to_json(self: PatchTarget) -> dict[str, Any]:
+        """Convert the target to JSON-serializable data."""
+        return {
+            "file": self.file,
+            "locations": [location.to_json() for location in self.locations],
+            "line": self.line,
+        }
+
+    @classmethod
+    def from_json(cls: type[PatchTarget], data: dict[str, Any]) -> PatchTarget:
+        """Load a target from the output of to_json."""
+        return cls(
+            data["file"],
+            [Location.from_json(location) for location in data["locations"]],
+            data["line"],
+        )
+
+class PatchCommand: # pylint: disable=too-many-instance-attributes
+    """A single command from a patch file, independent of the parser.
+
+    All text is kept exactly as written in the patch file: variables are only resolved
+    when the command runs, so the same command list can be reused across runs.
+
+    kind is the patch file keyword, and decides which fields are set:
+    - add: targets, text
+    - remove: targets
+    - replace, replace-all: targets, find, text
+    - add-asset: file (the local file), dest (the location in the SWF)
+    - set-var, export-var: name, value
+    - apply-patch, exec-python: file
+    """
+
+    kind: str
+    line: int
+
+    targets: list[PatchTarget]
+    text: str | None
+    find: str | None
+    file: str | None
+    dest: str | None
+    name: str | None
+    value: str | None
+
+    def __init__(
+        self: PatchCommand,
+        kind: str,
+        line: int,
+        targets: list[PatchTarget] | None = None,
+        text: str | None = None,
+        find: str | None = None,
+        file: str | None = None,
+        dest: str | None = None,
+        name: str | None = None,
+        value: str | None = None,
+    ) -> None:
+        self.kind = kind
+        self.line = line
+        self.targets = [] if targets is None else targets
+        self.text = text
+        self.find = find
+        self.file = file
+        self.dest = dest
+        self.name = name
+        self.value = value
+
+    def to_json(self: PatchCommand) -> dict[str, Any]:
+        """Convert the command to JSON-serializable data."""
+        data = vars(self).copy()
+        data["targets"] = [target.to_json() for target in self.targets]
+
+        return drop_empty(data)
+
+    @classmethod
+    def from_json(cls: type[PatchCommand], data: dict[str, Any]) -> PatchCommand:
+        """Load a command from the output of to_json."""
+        data = data.copy()
+        data["targets"] = [PatchTarget.from_json(target) for target in data.get("targets", [])]
+
+        return cls(**data)
@@ -51,6 +51,17 @@ class CommonParseManager:
         error_manager = ErrorManager(file.as_posix(), 0)
         file_content = read_safe(file, error_manager)
 
+        return self.get_root_from_content(file_content, file)
+
+    def get_root_from_content(
+        self: CommonParseManager,
+        file_content: str,
+        file: Path,
+    ) -> ParserRuleContext:
+        """Get the root node of the syntax tree from content that was already read.
+
+        file: the file the content was read from, used for error messages
+        """
         parser = run_without_antlr_errors(
             lambda: self.parse_input(file_content)
         )
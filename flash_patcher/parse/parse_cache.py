@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import json
+import os
+import uuid
+from functools import cache
+from pathlib import Path
+
+from flash_patcher.antlr_source.PatchfileLexer import PatchfileLexer
+from flash_patcher.antlr_source.PatchfileLexer import serializedATN as lexer_atn
+from flash_patcher.antlr_source.PatchfileParser import PatchfileParser
+from flash_patcher.antlr_source.PatchfileParser import serializedATN as parser_atn
+
+from flash_patcher.compile.cache import mark_used
+from flash_patcher.exception.error_manager import ErrorManager
+from flash_patcher.parse.command_compiler import compile_patch
+from flash_patcher.parse.commands import PatchCommand
+from flash_patcher.parse.common import CommonParseManager
+from flash_patcher.util.file_io import read_safe
+from flash_patcher.util.hashing import hash_parts
+from flash_patcher.util.logging import logger
+
+PARSE_CACHE_ROOT = Path("./.Patcher-Temp/parse")
+
+# Bump this whenever PatchCommand or the way commands are compiled changes,
+# so stale command lists are never reused
+COMMAND_FORMAT = "1"
+
+@cache
+def get_grammar_version() -> str:
+    """Return a version identifying the patch file grammar and the command format.
+
+    The grammar is identified by the serialized state machines of the generated
+    lexer and parser, which change whenever the grammar does.
+    """
+    return hash_parts(
+        COMMAND_FORMAT,
+        ",".join(map(str, lexer_atn())),
+        ",".join(map(str, parser_atn())),
+    )
+
+def load_patch_commands(file: Path, cache_root: Path | None = None) -> list[PatchCommand]:
+    """Return the list of commands in a patch file.
+
+    Parsing patch files with ANTLR is slow, so the commands of every parsed file are
+    cached on disk, keyed by the file content and the grammar version.
+    Unchanged files skip ANTLR entirely.
+
+    cache_root: the folder of the parse cache. If None, the cache is kept in .Patcher-Temp.
+    """
+    if cache_root is None:
+        cache_root = PARSE_CACHE_ROOT
+
+    file_content = read_safe(file, ErrorManager(file.as_posix(), 0))
+
+    location = cache_root / f"{hash_parts(get_grammar_version(), file_content)}.json"
+
+    try:
+        with location.open() as cache_file:
+            commands = [PatchCommand.from_json(command) for command in json.load(cache_file)]
+
+        mark_used(location)
+        return commands
+
+    except FileNotFoundError:
+        pass
+
+    # A damaged cache file is parsed again and replaced
+    except (json.JSONDecodeError, KeyError, TypeError):
+        logger.warning("Cached parse of %s is damaged. Parsing it again...", file.as_posix())
+
+    root = CommonParseManager(PatchfileLexer, PatchfileParser) \
+        .get_root_from_content(file_content, file)
+    commands = compile_patch(root)
+
+    store_patch_commands(location, commands)
+
+    return commands
+
+def store_patch_commands(location: Path, commands: list[PatchCommand]) -> None:
+    """Save a list of commands to the parse cache.
+
+    The file is written under a temporary name and renamed into place,
+    so concurrent runs never see a partially written file.
+    The cache is optional, so failing to write it is not an error.
+    """
+    staging = location.with_name(f"{location.name}.{uuid.uuid4().hex[:8]}.tmp")
+
+    try:
+        location.parent.mkdir(parents=True, exist_ok=True)
+
+        with staging.open("w") as cache_file:
+            json.dump([command.to_json() for command in commands], cache_file)
+
+        os.replace(staging, location)
+
+    except OSError:
+        logger.debug("Could not cache the parse of %s.", location.name)
+        staging.unlink(missing_ok=True)
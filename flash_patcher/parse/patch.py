@@ -2,12 +2,13 @@ from __future__ import annotations
 
 from pathlib import Path
 
-from flash_patcher.antlr_source.PatchfileLexer import PatchfileLexer
-from flash_patcher.antlr_source.PatchfileParser import PatchfileParser
-
-from flash_patcher.parse.common import CommonParseManager
+from flash_patcher.compile.workspace import Workspace
+from flash_patcher.inject.patch_memo import PatchMemo
+from flash_patcher.parse.parse_cache import load_patch_commands
 from flash_patcher.parse.patch_visitor import PatchfileProcessor
 from flash_patcher.parse.scope import Scope
+from flash_patcher.util.logging import logger
+from flash_patcher.util.virtual_files import VirtualFileSystem
 
 class PatchfileManager:
     """Manage patch files."""
@@ -23,11 +24,21 @@ class PatchfileManager:
             file: Path,
             folder: Path,
             scope: Scope = None,
+            workspace: Workspace | None = None,
+            memo: PatchMemo | None = None,
+            files: VirtualFileSystem | None = None,
         ) -> None:
         self.file = file
         self.folder = folder
         self.patchfile_processor = PatchfileProcessor(
-            self.file, self.folder, decomp_location, decomp_location_with_scripts, scope
+            self.file,
+            self.folder,
+            decomp_location,
+            decomp_location_with_scripts,
+            scope,
+            workspace,
+            memo,
+            files,
         )
 
     def parse(self: PatchfileManager) -> set:
@@ -36,10 +47,12 @@ class PatchfileManager:
         folder_location: The location of the decompiled scripts from the SWF.
         file_location: The location of the patch file to apply.
         
-        This class handles everything to do with preprocessing (opening the file, etc.)
+        This class handles everything to do with preprocessing (opening the file, parsing
+        it or loading it from the parse cache, etc.)
         Everything within the file will be handled by the PatchfileProcessor
         Return the set of modified scripts.
         """
-        patchfile = CommonParseManager(PatchfileLexer, PatchfileParser).get_root(self.file)
+        logger.info("Processing file: %s", self.file.as_posix())
+        commands = load_patch_commands(self.file)
 
-        return self.patchfile_processor.visitRoot(patchfile)
+        return self.patchfile_processor.run(commands)
@@ -1,25 +1,90 @@
 from __future__ import annotations
 
-import shutil
+from functools import partial
 from pathlib import Path
+from typing import Any, Callable
 
-from flash_patcher.antlr_source.PatchfileParser import PatchfileParser
-from flash_patcher.antlr_source.PatchfileParserVisitor import PatchfileParserVisitor
-
+from flash_patcher.compile.workspace import Workspace
 from flash_patcher.exception.error_manager import ErrorManager
 from flash_patcher.inject.bulk_injection import BulkInjectionManager
 from flash_patcher.inject.location.parser_injection_location import ParserInjectionLocation
 from flash_patcher.inject.find_content import FindContentManager
+from flash_patcher.inject.patch_memo import PatchMemo
 from flash_patcher.inject.single_injection import SingleInjectionManager
+from flash_patcher.parse.commands import Location, PatchCommand, PatchTarget
 from flash_patcher.parse.scope import Scope
 from flash_patcher.util.external_cmd import get_modified_scripts_of_command
-from flash_patcher.util.file_io import FileWritebackManager, read_safe, writelines_safe
+from flash_patcher.util.file_copy import stage_file, stage_folder
 from flash_patcher.util.logging import logger
+from flash_patcher.util.virtual_files import VirtualFileSystem
+
+def remove_lines(
+    files: VirtualFileSystem,
+    full_path: Path,
+    locations: list[Location],
+    error_manager: ErrorManager,
+) -> None:
+    """Remove the lines between two locations (inclusive) from a script."""
+    current_file = files.readlines(full_path, error_manager)
+
+    line_start = ParserInjectionLocation(locations[0]) \
+        .resolve(current_file, False, error_manager)
+
+    line_end = ParserInjectionLocation(locations[1]) \
+        .resolve(current_file, False, error_manager)
+
+    if line_start is None or line_end is None:
+        error_manager.raise_(
+            """Could not resolve line start or end.
+            You must provide a valid and in-bounds line number for remove.
+            """
+        )
 
-class PatchfileProcessor (PatchfileParserVisitor):
-    """This class inherits from the ANTLR visitor to process patch files.
-    
-    It will automatically take in the file syntax tree and perform the injections in it. 
+    # Exceptions will be thrown in InjectionLocation if this location is invalid
+    for _ in range(line_start, line_end + 1):
+        del current_file[line_start - 1]
+
+    files.write(full_path, current_file)
+
+def replace_nth(
+    files: VirtualFileSystem,
+    full_path: Path,
+    location: Location,
+    find_text: str,
+    add_text: str,
+    patch_line_no: int,
+    error_manager: ErrorManager,
+) -> None:
+    """Replace the nth instance of some content in a script."""
+    current_file = files.read(full_path, error_manager)
+    updated_file, replace_location = FindContentManager(
+        location, find_text
+    ).resolve(current_file, error_manager)
+
+    injector = SingleInjectionManager(
+        full_path, replace_location, full_path, patch_line_no, files
+    )
+
+    injector.file_content = updated_file
+    injector.inject(add_text, patch_line_no)
+
+def replace_all(
+    files: VirtualFileSystem,
+    full_path: Path,
+    find_text: str,
+    add_text: str,
+    error_manager: ErrorManager,
+) -> None:
+    """Replace all instances of some content in a script."""
+    content = files.read(full_path, error_manager)
+    files.write(full_path, content.replace(find_text, add_text))
+
+# pylint: disable=too-many-instance-attributes
+class PatchfileProcessor:
+    """This class runs the commands of a patch file.
+
+    It will automatically take in the commands compiled from the file syntax tree
+    (see PatchfileCompiler) and perform the injections in them.
     """
 
     injector: BulkInjectionManager
@@ -30,6 +95,9 @@ class PatchfileProcessor (PatchfileParserVisitor):
     folder: Path
     decomp_location: Path
     decomp_location_with_scripts: Path
+    workspace: Workspace | None
+    memo: PatchMemo | None
+    files: VirtualFileSystem
 
     def __init__(
         self: PatchfileProcessor,
@@ -38,12 +106,25 @@ class PatchfileProcessor (PatchfileParserVisitor):
         decomp_location: Path,
         decomp_location_with_scripts: Path,
         scope: Scope = None,
+        workspace: Workspace | None = None,
+        memo: PatchMemo | None = None,
+        files: VirtualFileSystem | None = None,
     ) -> None:
+        """workspace: if set, decompiled files are taken from it as patches touch them.
+        Otherwise, the whole decompilation must already be in decomp_location.
+        memo: if set, patches to scripts are queued in it, to be restored from
+        the result cache or applied once it's flushed. Otherwise, they are applied right away.
+        files: where scripts are read from and written to. It must be flushed once all patches
+        are applied. If None, scripts are read and written right away.
+        """
         self.patch_file_name = patch_file_name
         self.folder = folder
 
         self.decomp_location = decomp_location
         self.decomp_location_with_scripts = decomp_location_with_scripts
+        self.workspace = workspace
+        self.memo = memo
+        self.files = VirtualFileSystem(budget=0) if files is None else files
 
         if scope is None:
             self.scope = Scope()
@@ -54,185 +135,240 @@ class PatchfileProcessor (PatchfileParserVisitor):
         self.injector = BulkInjectionManager()
         self.modified_scripts = set()
 
-    def visitAddBlockHeader(
+    def materialize(self: PatchfileProcessor, full_path: Path) -> None:
+        """Make sure a decompiled file is on disk before it is patched.
+
+        With a workspace, files are only taken from the cache once a patch touches them.
+        """
+        if self.workspace is not None:
+            self.workspace.materialize(full_path)
+
+    def schedule(
         self: PatchfileProcessor,
-        ctx: PatchfileParser.AddBlockHeaderContext
+        script: Path,
+        description: dict[str, Any],
+        apply: Callable[[], None],
+    ) -> None:
+        """Apply a patch to a script, or queue it in the memo.
+
+        description: everything the patch depends on, with variables resolved (see PatchMemo)
+        """
+        if self.memo is None:
+            apply()
+        else:
+            self.memo.add(script, description, apply)
+
+    def flush(self: PatchfileProcessor) -> None:
+        """Apply all queued patches and write all scripts to disk,
+        before running anything that may read or write any script.
+        """
+        if self.memo is not None:
+            self.memo.flush()
+
+        self.files.sync()
+
+    def add_injection_target(
+        self: PatchfileProcessor,
+        target: PatchTarget,
     ) -> None:
         """Add the headers to the injector metadata"""
-        error_manager = ErrorManager(self.patch_file_name, ctx.start.line)
-        ctx_filename = self.scope.resolve_all(ctx.FILENAME().getText(), error_manager)
+        error_manager = ErrorManager(self.patch_file_name, target.line)
+        ctx_filename = self.scope.resolve_all(target.file, error_manager)
 
         full_path = self.decomp_location_with_scripts / ctx_filename
+        self.materialize(full_path)
 
-        inject_location = ParserInjectionLocation(ctx.locationToken())
+        inject_location = ParserInjectionLocation(target.locations[0])
 
         self.injector.add_injection_target(
-            SingleInjectionManager(full_path, inject_location, self.patch_file_name, ctx.start.line)
+            SingleInjectionManager(
+                full_path, inject_location, self.patch_file_name, target.line, self.files,
+            )
         )
         self.modified_scripts.add(full_path)
 
-    def visitAddBlock(
+    def run_add(
         self: PatchfileProcessor,
-        ctx: PatchfileParser.AddBlockContext
+        command: PatchCommand,
     ) -> None:
-        """When we visit an add block, use an injector to manage injection"""
-        error_manager = ErrorManager(self.patch_file_name, ctx.start.line)
+        """When we run an add block, use an injector to manage injection"""
+        error_manager = ErrorManager(self.patch_file_name, command.line)
 
-        for header in ctx.addBlockHeader():
-            self.visitAddBlockHeader(header)
+        for target in command.targets:
+            self.add_injection_target(target)
 
-        stripped_text = self.scope.resolve_all(ctx.addBlockText().getText(), error_manager)
+        stripped_text = self.scope.resolve_all(command.text, error_manager)
 
         if stripped_text[0] == "\n":
             stripped_text = stripped_text[1:]
 
-        self.injector.inject(stripped_text)
+        lines = stripped_text.splitlines(keepends=True)
+
+        for injector, target in zip(self.injector.injectors, command.targets):
+            self.schedule(
+                injector.file_name,
+                {"kind": "add", "location": target.locations[0].to_json(), "text": stripped_text},
+                partial(injector.inject, lines, self.injector.starting_line_no),
+            )
+
         self.injector.clear()
 
-    def visitAddAssetBlock(
+    def run_add_asset(
         self: PatchfileProcessor,
-        ctx: PatchfileParser.AddAssetBlockContext
+        command: PatchCommand,
     ) -> None:
-        """In an Add Asset block, we should take the specified assets and copy them into the SWF"""
-        error_manager = ErrorManager(self.patch_file_name, ctx.start.line)
+        """In an Add Asset block, we should take the specified assets and copy them into the SWF.
+
+        The asset may be a file or a folder.
+        """
+        error_manager = ErrorManager(self.patch_file_name, command.line)
+
+        local_name = self.scope.resolve_all(command.file, error_manager)
+        remote_name = self.scope.resolve_all(command.dest, error_manager)
+
+        # The asset may overwrite a script
+        self.flush()
 
-        local_name = self.scope.resolve_all(ctx.local.getText(), error_manager)
-        remote_name = self.scope.resolve_all(ctx.swf.getText(), error_manager)
+        local_path = self.folder / local_name
+        remote_path = self.decomp_location / remote_name
 
-        if not Path(self.folder / local_name).exists():
+        if not local_path.exists():
             error_mesg = f"""Could not find asset: {local_name}
             Aborting..."""
             logger.exception(error_mesg)
             raise FileNotFoundError(error_mesg)
 
-        # Create folder and copy things over
-        remote_folder = remote_name.split("/")[0]
+        # A folder adds every asset in it, keeping their relative paths
+        if local_path.is_dir():
+            self.modified_scripts.update(stage_folder(local_path, remote_path))
+            return
 
-        if not (self.decomp_location / remote_folder).exists():
-            Path.mkdir(self.decomp_location / remote_folder)
+        stage_file(local_path, remote_path)
+        self.modified_scripts.add(remote_path)
 
-        shutil.copyfile(self.folder / local_name, self.decomp_location / remote_name)
-
-        self.modified_scripts.add(self.decomp_location / remote_name)
-
-    def visitRemoveBlock(
+    def run_remove(
         self: PatchfileProcessor,
-        ctx: PatchfileParser.RemoveBlockContext
+        command: PatchCommand,
     ) -> None:
         """Remove is processed manually as the command is less complex than add."""
-        error_manager = ErrorManager(self.patch_file_name, ctx.start.line)
+        error_manager = ErrorManager(self.patch_file_name, command.line)
+        target = command.targets[0]
 
-        ctx_filename = self.scope.resolve_all(ctx.FILENAME().getText(), error_manager)
+        ctx_filename = self.scope.resolve_all(target.file, error_manager)
         full_path = self.decomp_location_with_scripts / ctx_filename
+        self.materialize(full_path)
 
-        # Open file, delete lines, and close it
-
-        with FileWritebackManager(full_path, error_manager, readlines=True) as current_file:
-            line_start = ParserInjectionLocation(ctx.locationToken(0)) \
-                .resolve(current_file, False, error_manager)
-
-            line_end = ParserInjectionLocation(ctx.locationToken(1)) \
-                .resolve(current_file, False, error_manager)
-
-            if line_start is None or line_end is None:
-                error_manager.raise_(
-                    """Could not resolve line start or end.
-                    You must provide a valid and in-bounds line number for remove.
-                    """
-                )
-
-            # Exceptions will be thrown in InjectionLocation if this location is invalid
-            for _ in range(line_start, line_end + 1):
-                del current_file[line_start - 1]
+        self.schedule(
+            full_path,
+            {"kind": "remove", "locations": [location.to_json() for location in target.locations]},
+            partial(remove_lines, self.files, full_path, target.locations, error_manager),
+        )
 
         self.modified_scripts.add(full_path)
 
-    def visitReplaceNthBlock(
+    def run_replace(
         self: PatchfileProcessor,
-        ctx: PatchfileParser.ReplaceNthBlockContext
+        command: PatchCommand,
     ) -> None:
         """Replace the nth block. 
         Find its location as an InjectionLocation, 
         then remove it and perform a standard add-injection at that location.
         """
-        for i in ctx.replaceNthBlockHeader():
-            error_manager = ErrorManager(self.patch_file_name, i.start.line)
-
-            ctx_filename = self.scope.resolve_all(i.FILENAME().getText(), error_manager)
+        for target in command.targets:
+            error_manager = ErrorManager(self.patch_file_name, target.line)
 
-            ctx_replace = self.scope.resolve_all(
-                ctx.replaceBlockText().getText().strip(), error_manager
-            )
+            ctx_filename = self.scope.resolve_all(target.file, error_manager)
 
-            ctx_add = self.scope.resolve_all(
-                ctx.addBlockText().getText().strip(), error_manager
-            )
+            ctx_replace = self.scope.resolve_all(command.find.strip(), error_manager)
+            ctx_add = self.scope.resolve_all(command.text.strip(), error_manager)
 
             full_path = self.decomp_location_with_scripts / ctx_filename
-
-            current_file = read_safe(full_path, error_manager)
-            updated_file, replace_location = FindContentManager(
-                i.locationToken(), ctx_replace
-            ).resolve(current_file, error_manager)
-
-            injector = SingleInjectionManager(
-                full_path, replace_location, full_path, i.start.line
+            self.materialize(full_path)
+
+            self.schedule(
+                full_path,
+                {
+                    "kind": "replace",
+                    "location": target.locations[0].to_json(),
+                    "find": ctx_replace,
+                    "text": ctx_add,
+                },
+                partial(
+                    replace_nth,
+                    self.files,
+                    full_path,
+                    target.locations[0],
+                    ctx_replace,
+                    ctx_add,
+                    target.line,
+                    error_manager,
+                ),
             )
 
-            injector.file_content = updated_file
-            injector.inject(ctx_add, i.start.line)
-
             self.modified_scripts.add(full_path)
 
-    def visitReplaceAllBlock(
+    def run_replace_all(
         self: PatchfileProcessor,
-        ctx: PatchfileParser.ReplaceAllBlockContext
+        command: PatchCommand,
     ) -> None:
         """Replace all instances of the specified content.
         Does not support secondary commands, only direct text replacement.
         """
-        error_manager = ErrorManager(self.patch_file_name, ctx.start.line)
+        error_manager = ErrorManager(self.patch_file_name, command.line)
 
-        find_content = self.scope.resolve_all(
-            ctx.replaceBlockText().getText().strip(), error_manager
-        )
+        find_content = self.scope.resolve_all(command.find.strip(), error_manager)
+        replace_content = self.scope.resolve_all(command.text.strip(), error_manager)
 
-        replace_content = self.scope.resolve_all(
-            ctx.addBlockText().getText().strip(), error_manager
-        )
+        targets = []
 
-        for i in ctx.replaceAllBlockHeader():
-            ctx_filename = self.scope.resolve_all(i.FILENAME().getText(), error_manager)
+        for target in command.targets:
+            ctx_filename = self.scope.resolve_all(target.file, error_manager)
             full_path = self.decomp_location_with_scripts / ctx_filename
-            error_manager = ErrorManager(self.patch_file_name, i.start.line)
-
-            content = read_safe(full_path, error_manager)
-            content = content.replace(find_content, replace_content)
-            writelines_safe(full_path, [content])
+            error_manager = ErrorManager(self.patch_file_name, target.line)
+            self.materialize(full_path)
+
+            targets.append((full_path, error_manager))
+
+        # Large replace-all blocks touch many scripts, so they are all read ahead of time
+        self.files.prefetch(full_path for full_path, _ in targets)
+
+        for full_path, error_manager in targets:
+            self.schedule(
+                full_path,
+                {"kind": "replace-all", "find": find_content, "text": replace_content},
+                partial(
+                    replace_all,
+                    self.files,
+                    full_path,
+                    find_content,
+                    replace_content,
+                    error_manager,
+                ),
+            )
 
             self.modified_scripts.add(full_path)
 
-    def visitSetVarBlock(
+    def run_set_var(
         self: PatchfileProcessor,
-        ctx: PatchfileParser.SetVarBlockContext
+        command: PatchCommand,
     ) -> None:
         """Define a locally (downward-scoped only) variable."""
-        self.scope.define_local(ctx.var_name.text, ctx.varValue().getText())
+        self.scope.define_local(command.name, command.value)
 
-    def visitExportVarBlock(
+    def run_export_var(
         self: PatchfileProcessor,
-        ctx: PatchfileParser.ExportVarBlockContext
+        command: PatchCommand,
     ) -> None:
         """Define a global variable."""
-        self.scope.define_global(ctx.var_name.text, ctx.varValue().getText())
+        self.scope.define_global(command.name, command.value)
 
-    def visitExecPatcherBlock(
+    def run_apply_patch(
         self: PatchfileProcessor,
-        ctx: PatchfileParser.ExecPatcherBlockContext
+        command: PatchCommand,
     ) -> None:
         """Open and process a patch file when it is encountered."""
-        error_manager = ErrorManager(self.patch_file_name, ctx.start.line)
-        ctx_filename = self.scope.resolve_all(ctx.file_name().getText(), error_manager)
+        error_manager = ErrorManager(self.patch_file_name, command.line)
+        ctx_filename = self.scope.resolve_all(command.file, error_manager)
 
         # This import needs to happen here, otherwise it would cause a circular dependency
         # pylint: disable=import-outside-toplevel
@@ -245,29 +381,58 @@ class PatchfileProcessor (PatchfileParserVisitor):
             patch_path,
             patch_folder,
             self.scope,
+            self.workspace,
+            self.memo,
+            self.files,
         ).parse()
 
-    def visitExecPythonBlock(
+    def run_exec_python(
         self: PatchfileProcessor,
-        ctx: PatchfileParser.ExecPythonBlockContext
+        command: PatchCommand,
     ) -> None:
-        """Visit any custom .py files the user would like to execute.
+        """Run any custom .py files the user would like to execute.
         
         The python script should print out the comma-separated filenames that it modified.
         example output: "DoAction1.as,DoAction2.as"
         Python script names may not include spaces.
         """
-        error_manager = ErrorManager(self.patch_file_name, ctx.start.line)
-        ctx_filename = self.scope.resolve_all(ctx.file_name().getText(), error_manager)
+        error_manager = ErrorManager(self.patch_file_name, command.line)
+        ctx_filename = self.scope.resolve_all(command.file, error_manager)
 
         script_path = (self.folder / ctx_filename).resolve()
+
+        # The script may read or write any script, so it must see every patch applied so far
+        self.flush()
+
+        # The script may read any decompiled file, so the workspace needs all of them
+        if self.workspace is not None:
+            logger.info("Preparing the whole decompilation for %s...", ctx_filename)
+            self.workspace.materialize_all()
+
         self.modified_scripts |= get_modified_scripts_of_command(
             ["python3", script_path],
             self.decomp_location,
             self.scope,
         )
 
-    def visitRoot(self: PatchfileProcessor, ctx: PatchfileParser.RootContext) -> set:
-        """Root function. Call this when running the visitor."""
-        super().visitRoot(ctx)
+    def run(self: PatchfileProcessor, commands: list[PatchCommand]) -> set[Path]:
+        """Root function. Call this to run all commands of a patch file, in order.
+
+        Returns the set of modified scripts.
+        """
+        handlers = {
+            "add": self.run_add,
+            "add-asset": self.run_add_asset,
+            "remove": self.run_remove,
+            "replace": self.run_replace,
+            "replace-all": self.run_replace_all,
+            "set-var": self.run_set_var,
+            "export-var": self.run_export_var,
+            "apply-patch": self.run_apply_patch,
+            "exec-python": self.run_exec_python,
+        }
+
+        for command in commands:
+            handlers[command.kind](command)
+
         return self.modified_scripts
@@ -1,14 +1,29 @@
+from datetime import datetime
+from functools import partial
 from importlib.metadata import PackageNotFoundError, version
 # pylint: disable=no-name-in-module
 from logging import DEBUG
 from pathlib import Path
 
+from flash_patcher.compile.build_cache import \
+    BUILD_CACHE_ROOT, get_build_fingerprint, restore_build, store_build
+from flash_patcher.compile.cache import CacheManager, evict_files, format_size, open_cache
 from flash_patcher.compile.compilation import CompilationManager
-from flash_patcher.compile.locate_decomp import get_decomp_locations
+from flash_patcher.compile.ffdec import \
+    DEFAULT_PROFILE, DEFAULT_SCRIPT_FORMAT, FFDecInterface, parse_ffdec_command
+from flash_patcher.compile.ffdec_telemetry import save_calls
+from flash_patcher.compile.locate_decomp import \
+    RunFolder, get_decomp_locations, prune_run_folders
+from flash_patcher.compile.packed_scripts import PackedScripts
+from flash_patcher.compile.workspace import FolderScripts, SelectedScripts, Workspace
 from flash_patcher.exception.dependency import DependencyError
+from flash_patcher.inject.patch_memo import PATCH_RESULT_ROOT, PatchMemo
+from flash_patcher.parse.build_inputs import collect_script_targets
+from flash_patcher.parse.parse_cache import PARSE_CACHE_ROOT
 from flash_patcher.parse.patch import PatchfileManager
-from flash_patcher.util.file_copy import clean_scripts, copy_file
+from flash_patcher.util.file_copy import copy_file
 from flash_patcher.util.logging import logger
+from flash_patcher.util.virtual_files import VirtualFileSystem
 
 # pylint: disable=pointless-string-statement
 """
@@ -36,7 +51,108 @@ def print_version() -> None:
 
     logger.info("rayyaw's SWF Patcher - v%s", __version__)
 
-def main(
+def list_cache(cache_dir: Path | None = None) -> None:
+    """Print all cached decompilations, most recently used first."""
+    entries = open_cache(cache_dir).list_entries()
+
+    for entry in entries:
+        last_used = datetime.fromtimestamp(entry.last_used).strftime("%Y-%m-%d %H:%M")
+        print(f"{entry.key[:16]}  {entry.mode:<6}  {format_size(entry.size):>10}  "
+            f"{last_used}  {entry.source}")
+
+    print(f"{len(entries)} entries, {format_size(sum(entry.size for entry in entries))} total")
+
+def prune_cache(
+    max_size: int | None = None,
+    cache_dir: Path | None = None,
+    workspace_dir: Path | None = None,
+) -> None:
+    """Evict cached decompilations until the cache fits in max_size bytes,
+    then evict cached builds, patched scripts and parsed patch files the same way.
+    The folders of runs that are over are removed too (see prune_run_folders).
+
+    If max_size is None, every cache is cleared.
+    """
+    evicted = open_cache(cache_dir).prune(max_size)
+
+    logger.info(
+        "Pruned %d entries (%s).",
+        len(evicted),
+        format_size(sum(entry.size for entry in evicted)),
+    )
+
+    builds = CacheManager(BUILD_CACHE_ROOT).prune(max_size)
+
+    logger.info(
+        "Pruned %d builds (%s).",
+        len(builds),
+        format_size(sum(entry.size for entry in builds)),
+    )
+
+    for root, name in ((PATCH_RESULT_ROOT, "patched scripts"), (PARSE_CACHE_ROOT, "parses")):
+        evicted_files = evict_files(root, 0 if max_size is None else max_size)
+
+        logger.info(
+            "Pruned %d %s (%s).",
+            len(evicted_files),
+            name,
+            format_size(sum(size for _, size in evicted_files)),
+        )
+
+    run_folders = prune_run_folders(workspace_dir)
+    logger.info("Removed %d folders of finished runs.", len(run_folders))
+
+def load_scripts(
+    compiler: CompilationManager,
+    inputfile: Path,
+    drop_cache: bool,
+    cache_format: str,
+) -> FolderScripts | PackedScripts:
+    """Decompile the whole SWF, and return its scripts."""
+    cache_location = compiler.decompile(
+        inputfile,
+        drop_cache=drop_cache,
+        xml_mode=False,
+        cache_format=cache_format,
+    )
+
+    # Scripts are taken from the cache as patches touch them
+    if cache_format == "files":
+        return FolderScripts(cache_location)
+
+    return PackedScripts(cache_location)
+
+def start_ffdec(
+    compiler: CompilationManager,
+    inputfile: Path,
+    ffdec_java: bool,
+    ffdec_worker: bool,
+) -> None:
+    """Set up how FFDec is started for the commands of the run."""
+    # The worker starts with the same JVM options, so this comes first
+    if ffdec_java:
+        compiler.decompiler.use_java()
+
+    # Later FFDec commands run in a process that loads FFDec ahead of time
+    if ffdec_worker:
+        compiler.decompiler.start_worker(inputfile)
+
+def finish_ffdec(compiler: CompilationManager, ffdec_report: Path | None) -> None:
+    """Stop the FFDec worker once the run is over, then log the FFDec commands of the run
+    and write their records to ffdec_report if set.
+    """
+    compiler.decompiler.stop_worker()
+    calls = compiler.report_ffdec_calls()
+
+    if ffdec_report is None:
+        return
+
+    try:
+        save_calls(ffdec_report, calls)
+    except OSError:
+        logger.warning("Could not write the FFDec report to %s.", ffdec_report)
+
+def main( # pylint: disable=too-many-locals
     inputfile: Path,
     folder: Path,
     mainfile: Path,
@@ -45,52 +161,168 @@ def main(
     recompile_all: bool = False,
     xml_mode: bool = False,
     verbose: bool = False,
+    cache_size: int | None = None,
+    cache_dir: Path | None = None,
+    cache_format: str = "files",
+    ffdec: str | None = None,
+    memory_budget: int | None = None,
+    workspace_dir: Path | None = None,
+    ffdec_worker: bool = False,
+    selective: bool = False,
+    export_jobs: int = 1,
+    ffdec_profile: str = DEFAULT_PROFILE,
+    ffdec_java: bool = False,
+    ffdec_report: Path | None = None,
+    pcode: bool = False,
+    build_cache_size: int | None = None,
 ) -> None:
-    """Run the patcher."""
+    """Run the patcher.
+
+    cache_size: the byte budget of the decompilation cache. If None, the cache is unbounded.
+    cache_dir: the folder of the decompilation cache, which may be shared between machines.
+        If None, the cache is kept in .Patcher-Temp.
+    cache_format: how to cache decompiled scripts, see CACHE_FORMATS.
+    ffdec: the FFDec command to use, like "/opt/ffdec/ffdec.sh".
+        If None, FFDec is detected automatically.
+    memory_budget: roughly how many bytes of scripts to keep in memory while patching.
+        If None, every patched script is kept in memory until all patches are applied.
+    workspace_dir: the folder to patch in, like a tmpfs mount. Each run gets its own subfolder.
+        If None, runs patch in .Patcher-Temp.
+    ffdec_worker: if True, run FFDec commands in a worker that loads FFDec ahead of time.
+    selective: if True, only decompile the scripts the patches target, unless the whole
+        decompilation is cached. Other scripts are decompiled if a patch needs them.
+    export_jobs: the most FFDec processes to run at once, like to export the SWF in shards.
+    ffdec_profile: the FFDec performance profile to run every command with (see FFDEC_PROFILES).
+    ffdec_java: if True, start FFDec with Java directly instead of through its launcher
+        (see JavaLauncher).
+    ffdec_report: if set, the record of every FFDec command is written there as JSON
+        (see FFDecCall), even if the run fails.
+    pcode: if True, scripts are exported as P-code, so patches target .pcode files
+        and FFDec assembles them on import instead of compiling ActionScript.
+    build_cache_size: the byte budget of the build cache, which is separate from the budget
+        of the decompilation cache. If None, cache_size is used.
+    """
     if verbose:
         logger.setLevel(DEBUG)
 
     print_version()
 
     try:
-        compiler = CompilationManager()
+        decompiler = None if ffdec is None else FFDecInterface(*parse_ffdec_command(ffdec))
+        compiler = CompilationManager(
+            open_cache(cache_dir, cache_size),
+            decompiler,
+            export_jobs=export_jobs,
+            profile=ffdec_profile,
+            script_format="pcode" if pcode else DEFAULT_SCRIPT_FORMAT,
+        )
     except ModuleNotFoundError as exc:
         error_mesg = "Could not locate required dependency: JPEXS Flash Decompiler. Aborting..."
         logger.exception(error_mesg)
         raise DependencyError(error_mesg) from exc
 
-    decomp_location, decomp_location_with_scripts = get_decomp_locations(xml_mode)
-
-    cache_location = compiler.decompile(
+    # If nothing changed since a previous build, reuse its output instead of running FFDec
+    build_cache = CacheManager(
+        BUILD_CACHE_ROOT,
+        cache_size if build_cache_size is None else build_cache_size,
+    )
+    fingerprint = get_build_fingerprint(
         inputfile,
-        drop_cache=drop_cache,
-        xml_mode=xml_mode,
+        folder,
+        mainfile,
+        compiler.decompiler,
+        [f"all={recompile_all}", f"xml={xml_mode}", f"pcode={pcode}"],
     )
 
-    # Copy the cache to a different location so we can reuse it
-    copy_file(cache_location, decomp_location)
+    if fingerprint is not None and not drop_cache \
+        and restore_build(build_cache, fingerprint, output):
+        logger.info("Build inputs are unchanged. Restored the output of a previous build.")
+        logger.info("Done.")
+        return
 
-    logger.info("Decompilation finished. Beginning injection...")
+    start_ffdec(compiler, inputfile, ffdec_java, ffdec_worker)
 
-    modified_scripts = PatchfileManager(
-        decomp_location,
-        decomp_location_with_scripts,
-        folder / mainfile,
-        folder,
-    ).parse()
+    try:
+        # Each run patches in its own folder, so concurrent builds never collide
+        with RunFolder(workspace_dir) as run_folder:
+            decomp_location, decomp_location_with_scripts = \
+                get_decomp_locations(xml_mode, run_folder)
 
-    logger.info("Injection complete, cleaning up...")
+            workspace = None
 
-    clean_scripts(decomp_location, modified_scripts)
+            if xml_mode:
+                cache_location = compiler.decompile(
+                    inputfile,
+                    drop_cache=drop_cache,
+                    xml_mode=True,
+                    cache_format=cache_format,
+                )
 
-    logger.info("Recompiling...")
+                # Copy the cache to a different location so we can reuse it
+                copy_file(cache_location, decomp_location)
+            else:
+                load_all = partial(load_scripts, compiler, inputfile, drop_cache, cache_format)
+                selected = run_folder / "selected"
 
-    compiler.recompile(
-        decomp_location,
-        inputfile,
-        output,
-        recompile_all=recompile_all,
-        xml_mode=xml_mode,
-    )
+                # Only the patched scripts are exported, the rest once a patch needs them
+                if selective and compiler.export_selected(
+                    inputfile,
+                    selected,
+                    collect_script_targets(folder / mainfile, folder),
+                    drop_cache=drop_cache,
+                    cache_format=cache_format,
+                ):
+                    scripts = SelectedScripts(FolderScripts(selected), load_all)
+                else:
+                    scripts = load_all()
+
+                workspace = Workspace(decomp_location, scripts)
+
+            logger.info("Decompilation finished. Beginning injection...")
+
+            # Scripts whose content and patches didn't change since a previous run are restored
+            # from the result cache instead of being patched again
+            files = VirtualFileSystem(memory_budget)
+            memo = PatchMemo(files=files)
+
+            modified_scripts = PatchfileManager(
+                decomp_location,
+                decomp_location_with_scripts,
+                folder / mainfile,
+                folder,
+                workspace=workspace,
+                memo=memo,
+                files=files,
+            ).parse()
+
+            memo.flush()
+            files.flush()
+
+            logger.info("Injection complete, cleaning up...")
+
+            # Only the modified files are recompiled into the SWF
+            if workspace is not None:
+                workspace.clean(modified_scripts)
+
+            logger.info("Recompiling...")
+
+            # An output left by an earlier run must not be cached as the output of this one
+            if output.resolve() != inputfile.resolve():
+                output.unlink(missing_ok=True)
+
+            compiler.recompile(
+                decomp_location,
+                inputfile,
+                output,
+                recompile_all=recompile_all,
+                xml_mode=xml_mode,
+                modified_files=modified_scripts,
+            )
+
+    finally:
+        finish_ffdec(compiler, ffdec_report)
+
+    if fingerprint is not None and output.exists():
+        store_build(build_cache, fingerprint, output)
 
     logger.info("Done.")
@@ -1,10 +1,19 @@
 """Helper module for calling external commands."""
-from os import chdir
+from __future__ import annotations
+
 from pathlib import Path
-from subprocess import PIPE, CompletedProcess, run
+from subprocess import PIPE, CalledProcessError, CompletedProcess
+from threading import Thread
+from typing import TextIO
 import sys
 
 from flash_patcher.parse.scope import Scope
+from flash_patcher.util.logging import logger
+from flash_patcher.util.process_group import ProcessGroup
+
+# The processes of exec-python scripts. They run one at a time,
+# since each one may read or write the scripts patched before it.
+SCRIPT_PROCESSES = ProcessGroup(1)
 
 def ask_confirmation() -> None:
     """Prompt the user for confirmation before calling subprocess.run."""
@@ -29,16 +38,77 @@ def ask_confirmation() -> None:
 
     # implicitly, else continue execution
 
-def run_with_confirmation_in_dir(args: list, directory: Path, stdin: str = "") -> CompletedProcess:
-    """Run a command in the given directory."""
+def write_input(stream: TextIO, text: str) -> None:
+    """Write the whole input of a command, then close it, so the command sees its end."""
+    try:
+        stream.write(text)
+        stream.close()
+
+    except BrokenPipeError:
+        # The command exited without reading all of its input
+        pass
+
+def read_output(stream: TextIO, output: list[str]) -> None:
+    """Read the whole output of a command."""
+    output.append(stream.read())
+
+def run_with_confirmation_in_dir(
+    args: list,
+    directory: Path,
+    stdin: str = "",
+    group: ProcessGroup | None = None,
+) -> CompletedProcess:
+    """Run a command in the given directory.
+
+    The working directory of the patcher itself never changes, so other threads
+    (like FFDec exports) can keep using relative paths while the command runs.
+    What the command prints to stderr is logged as it's printed.
+
+    group: the processes the command is part of (see ProcessGroup). By default, the group
+        of exec-python scripts. If the group is cancelled, the command is killed.
+
+    Raises CalledProcessError if the command fails, or ChildProcessError if the group
+    is cancelled before it starts.
+    """
     ask_confirmation()
 
-    cwd = Path.cwd()
-    chdir(directory)
-    output = run(args, check=True, input=stdin, text=True, stdout=PIPE)
-    chdir(cwd)
+    args = [str(arg) for arg in args]
+    group = SCRIPT_PROCESSES if group is None else group
+    output = []
+
+    with group.popen(
+        args,
+        stdin=PIPE,
+        stdout=PIPE,
+        stderr=PIPE,
+        text=True,
+        errors="replace",
+        cwd=directory,
+    ) as process:
+        # The input and output are exchanged in their own threads,
+        # so the command never waits on a full pipe while we wait on another
+        threads = [
+            Thread(target=write_input, args=(process.stdin, stdin), daemon=True),
+            Thread(target=read_output, args=(process.stdout, output), daemon=True),
+        ]
+
+        for thread in threads:
+            thread.start()
+
+        for line in process.stderr:
+            logger.info("%s: %s", Path(args[-1]).name, line.rstrip())
+
+        for thread in threads:
+            thread.join()
+
+        status = process.wait()
+
+    stdout = "".join(output)
+
+    if status != 0:
+        raise CalledProcessError(status, args, stdout)
 
-    return output
+    return CompletedProcess(args, status, stdout)
 
 
 def check_output_in_dir(args: list, directory: Path, stdin: str = "") -> bytes:
@@ -1,7 +1,17 @@
 import os
 import shutil
+import stat
+import sys
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+# The ioctl that clones a file on Linux file systems with copy-on-write support (Btrfs, XFS...)
+FICLONE = 0x40049409
+
+# The most files to read or write at once. File I/O releases the GIL,
+# so reading and writing files from threads hides the latency of slow (like network) filesystems.
+IO_WORKERS = 8
+
 def clean_scripts(decomp_location: Path, modified_scripts: set[Path]) -> None:
     """Delete all non-modified scripts.
 
@@ -29,3 +39,95 @@ def copy_file(source: Path, dest: Path) -> None:
         shutil.copytree(source, dest)
     else:
         shutil.copy(source, dest)
+
+def reset_folder(folder: Path) -> None:
+    """Delete a folder and all its content if it exists, then create it empty."""
+    if folder.exists():
+        shutil.rmtree(folder)
+
+    folder.mkdir(parents=True)
+
+def clone_file(source: Path, dest: Path) -> bool:
+    """Create dest as a copy-on-write clone (reflink) of source, if the file system supports it.
+
+    Returns True if the file was cloned. Otherwise, dest is not created.
+    """
+    if not sys.platform.startswith("linux"):
+        return False
+
+    # pylint: disable=import-outside-toplevel
+    import fcntl
+
+    with source.open("rb") as source_file, dest.open("xb") as dest_file:
+        try:
+            fcntl.ioctl(dest_file.fileno(), FICLONE, source_file.fileno())
+            return True
+        except OSError:
+            pass
+
+    dest.unlink()
+    return False
+
+def link_file(source: Path, dest: Path) -> None:
+    """Make dest a copy of source as cheaply as possible.
+
+    The file is cloned if the file system supports it, otherwise it is hardlinked,
+    and only copied if both fail (like across drives).
+    A hardlinked dest shares its content with source, so it must not be modified in place:
+    see break_hardlink.
+    """
+    if clone_file(source, dest):
+        return
+
+    try:
+        os.link(source, dest)
+    except OSError:
+        shutil.copyfile(source, dest)
+
+def break_hardlink(path: Path) -> bool:
+    """Unlink a file if it has other hardlinks, so writing it creates a new file
+    and leaves the content of the other links untouched.
+
+    Returns True if the file was unlinked.
+    """
+    try:
+        info = path.stat()
+    except OSError:
+        return False
+
+    if stat.S_ISREG(info.st_mode) and info.st_nlink > 1:
+        path.unlink()
+        return True
+
+    return False
+
+def stage_file(source: Path, dest: Path) -> None:
+    """Put a copy of source at dest, creating its folders.
+
+    The file is cloned if the file system supports it, and copied otherwise.
+    Unlike link_file, it's never hardlinked: source is a file of the user's patch folder,
+    and later commands (like exec-python scripts) may write to dest in place.
+    """
+    dest.parent.mkdir(parents=True, exist_ok=True)
+
+    # This also keeps the content of other links to dest
+    dest.unlink(missing_ok=True)
+
+    if not clone_file(source, dest):
+        shutil.copyfile(source, dest)
+
+def stage_folder(source: Path, dest: Path, workers: int = IO_WORKERS) -> list[Path]:
+    """Put a copy of every file in the source folder into dest, keeping their relative paths.
+
+    Files are staged in parallel (see stage_file). Errors are raised in file name order.
+    Returns the paths of all files in dest, sorted.
+    """
+    names = sorted(
+        Path(dp, f).relative_to(source) for dp, _, fn in os.walk(source) for f in fn
+    )
+
+    with ThreadPoolExecutor(workers, thread_name_prefix="patcher-io") as executor:
+        for staged in [executor.submit(stage_file, source / name, dest / name) for name in names]:
+            staged.result()
+
+    return [dest / name for name in names]
@@ -1,9 +1,11 @@
 from __future__ import annotations
 
+from io import StringIO
 from pathlib import Path
-from typing import Any, Optional, Type
+from typing import Any, Callable, Optional, Type
 
 from flash_patcher.exception.error_manager import ErrorManager
+from flash_patcher.util.file_copy import break_hardlink
 from flash_patcher.util.logging import logger
 
 class FileWritebackManager:
@@ -47,43 +49,151 @@ class FileWritebackManager:
 
         writelines_safe(self.file_location, self.content)
 
+# Files are decoded as UTF-8. Bytes that aren't valid UTF-8 are kept as lone surrogates,
+# so any file is decoded without loss and encoded back to the exact same bytes.
+ENCODING = "utf-8"
+ENCODING_ERRORS = "surrogateescape"
+
+def split_lines(data: bytes) -> list[bytes]:
+    """Split raw file content after each LF, keeping the line endings."""
+    lines = [line + b"\n" for line in data.split(b"\n")]
+    lines[-1] = lines[-1][:-1]
+
+    if not lines[-1]:
+        lines.pop()
+
+    return lines
+
+def normalize_line(line: bytes) -> bytes:
+    """Translate the CRLF line ending of a raw line to LF, like text mode does."""
+    return line[:-2] + b"\n" if line.endswith(b"\r\n") else line
+
+class FileBuffer:
+    """The raw content of a file, read once.
+
+    Text is decoded without loss (see ENCODING), and CRLF line endings are translated to LF,
+    like in text mode. When text is written back, every line that didn't change
+    at the start and at the end of the file is copied from the original bytes,
+    and the file is only written from the first byte that changed.
+    Changed lines get the most common line ending of the file.
+    """
+
+    path: Path
+    data: bytes
+    newline: bytes
+
+    def __init__(self: FileBuffer, path: Path, data: bytes) -> None:
+        self.path = path
+        self.data = data
+
+        crlf = data.count(b"\r\n")
+        self.newline = b"\r\n" if crlf > data.count(b"\n") - crlf else b"\n"
+
+    @classmethod
+    def read(
+        cls: type[FileBuffer],
+        path: Path,
+        error_manager: ErrorManager,
+        read_bytes: Callable[[], bytes] | None = None,
+    ) -> FileBuffer:
+        """Read a decompiled file.
+
+        read_bytes: returns the content of the file, if it was read ahead of time.
+        """
+        try:
+            return cls(path, path.read_bytes() if read_bytes is None else read_bytes())
+        except (FileNotFoundError, IsADirectoryError) as exc:
+            error_manager.context = path.as_posix()
+            error_manager.raise_(
+                """Invalid injection location.
+                Could not find or load SWF decompiled file.""",
+                type(exc)
+            )
+
+    def get_text(self: FileBuffer) -> str:
+        """Return the content of the file as text."""
+        return self.data.decode(ENCODING, ENCODING_ERRORS).replace("\r\n", "\n")
+
+    def encode(self: FileBuffer, text: str) -> tuple[bytes, int]:
+        """Encode new text for the file, reusing the original bytes of unchanged lines.
+
+        Returns the new content, and the offset of the first byte that may differ.
+        """
+        old_lines = split_lines(self.data)
+        new_lines = split_lines(text.encode(ENCODING, ENCODING_ERRORS))
+
+        # Lines are compared as bytes, so unchanged lines are never decoded
+        start = 0
+        limit = min(len(old_lines), len(new_lines))
+
+        while start < limit and normalize_line(old_lines[start]) == new_lines[start]:
+            start += 1
+
+        end = 0
+        limit -= start
+
+        while end < limit and normalize_line(old_lines[-1 - end]) == new_lines[-1 - end]:
+            end += 1
+
+        changed = b"".join(new_lines[start:len(new_lines) - end])
+
+        if self.newline != b"\n":
+            changed = changed.replace(b"\n", self.newline)
+
+        prefix = b"".join(old_lines[:start])
+        suffix = b"".join(old_lines[len(old_lines) - end:])
+
+        return prefix + changed + suffix, len(prefix)
+
+    def write(self: FileBuffer, text: str) -> None:
+        """Write new text to the file, only from the first byte that changed."""
+        data, offset = self.encode(text)
+
+        if data == self.data:
+            return
+
+        # The file may be linked to the decompilation cache, so it can't be changed in place
+        if break_hardlink(self.path) or offset == 0:
+            self.path.write_bytes(data)
+        else:
+            with self.path.open("r+b") as file:
+                file.seek(offset)
+                file.write(data[offset:])
+                file.truncate()
+
+        self.data = data
+
 def read_safe(file_location: Path, error_manager: ErrorManager) -> str:
     """Read the full content from a file.
-    
+
     Returns a string containing the entire file.
     """
-    try:
-        with file_location.open() as file:
-            return file.read()
-    except (FileNotFoundError, IsADirectoryError) as exc:
-        error_manager.context = file_location.as_posix()
-        error_manager.raise_(
-            """Invalid injection location.
-            Could not find or load SWF decompiled file.""",
-            type(exc)
-        )
+    return FileBuffer.read(file_location, error_manager).get_text()
 
 def readlines_safe(file_location: Path, error_manager: ErrorManager) -> list:
     """Read all lines from a file.
-    
+
     Returns a list, with one entry for each line.
     """
+    return StringIO(read_safe(file_location, error_manager)).readlines()
+
+def writelines_safe(path: Path, lines: list[str], original: FileBuffer | None = None) -> None:
+    """Write a list of lines to a file.
+
+    original: the content the file had when it was read.
+    If None, the file is read again, so the bytes of unchanged lines are kept.
+    """
     try:
-        with file_location.open() as file:
-            return file.readlines()
-    except (FileNotFoundError, IsADirectoryError) as exc:
-        error_manager.context = file_location.as_posix()
-        error_manager.raise_(
-            """Invalid injection location.
-            Could not find or load SWF decompiled file.""",
-            type(exc)
-        )
-
-def writelines_safe(path: Path, lines: list[str]) -> None:
-    """Write a list of lines to a file."""
-    try:
-        with path.open("w") as file:
-            file.writelines(lines)
+        if original is None:
+            try:
+                original = FileBuffer(path, path.read_bytes())
+            except FileNotFoundError:
+                # A new file (this raises again if its folder doesn't exist either)
+                path.write_bytes("".join(lines).encode(ENCODING, ENCODING_ERRORS))
+                return
+
+        original.write("".join(lines))
+
     except (FileNotFoundError, IsADirectoryError) as exc:
         mesg = """The provided decompilation is not in a writable location.
             Please ensure you have write access in the current directory."""
@@ -0,0 +1,202 @@
+from __future__ import annotations
+
+import os
+import socket
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Optional, Type
+
+from flash_patcher.util.logging import logger
+
+# A lock that has not been refreshed for this long is considered abandoned
+STALE_AFTER = 120.0
+POLL_INTERVAL = 0.5
+
+class FileLock:
+    """An inter-process lock based on exclusively creating a lock file.
+
+    This works across machines sharing a network volume, so it can guard a cache
+    that several build workers use at once. While the lock is held, a background
+    thread refreshes the lock file, so other processes can tell a long-running holder
+    apart from one that crashed and left the lock behind.
+    """
+
+    path: Path
+    stale_after: float
+    poll_interval: float
+
+    held: bool
+    heartbeat: threading.Thread | None
+    released: threading.Event
+
+    def __init__(
+        self: FileLock,
+        path: Path,
+        stale_after: float = STALE_AFTER,
+        poll_interval: float = POLL_INTERVAL,
+    ) -> None:
+        self.path = path
+        self.stale_after = stale_after
+        self.poll_interval = poll_interval
+
+        self.held = False
+        self.heartbeat = None
+        self.released = threading.Event()
+
+    def try_acquire(self: FileLock) -> bool:
+        """Try to acquire the lock once, without waiting. Returns True on success."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        try:
+            descriptor = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            state = read_lock_state(self.path)
+
+            if not self.is_stale(state):
+                return False
+
+            if state is not None and not self.break_lock(state):
+                return False
+
+            return self.try_acquire()
+
+        with os.fdopen(descriptor, "w") as file:
+            file.write(f"{socket.gethostname()} {os.getpid()}\n")
+
+        self.held = True
+        self.released.clear()
+        self.heartbeat = threading.Thread(target=self.refresh, daemon=True)
+        self.heartbeat.start()
+
+        return True
+
+    def acquire(self: FileLock, timeout: float | None = None) -> bool:
+        """Acquire the lock, waiting for other holders to release it.
+
+        timeout: the maximum time to wait in seconds. If None, wait until the lock is free.
+        Returns True if the lock was acquired.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        waiting_logged = False
+
+        while not self.try_acquire():
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+
+            if not waiting_logged:
+                logger.info("Waiting for another process to release %s...", self.path)
+                waiting_logged = True
+
+            time.sleep(self.poll_interval)
+
+        return True
+
+    def release(self: FileLock) -> None:
+        """Release the lock if it is held."""
+        if not self.held:
+            return
+
+        self.held = False
+        self.released.set()
+        self.heartbeat.join()
+        self.path.unlink(missing_ok=True)
+
+    def refresh(self: FileLock) -> None:
+        """Keep the lock file fresh while the lock is held."""
+        while not self.released.wait(self.stale_after / 4):
+            try:
+                os.utime(self.path)
+            except FileNotFoundError:
+                return
+
+    def break_lock(self: FileLock, state: tuple[str, int]) -> bool:
+        """Remove an abandoned lock file, if it's still in the given state (see read_lock_state).
+
+        Several processes may find the same abandoned lock at once. The lock file is first
+        renamed to a unique name, which only one of them can do. If the renamed file isn't
+        the abandoned one (another process broke the lock and took it in the meantime),
+        it's put back instead.
+        Returns True if the abandoned lock file is gone.
+        """
+        broken = self.path.with_name(f"{self.path.name}.broken-{uuid.uuid4().hex[:8]}")
+
+        try:
+            os.rename(self.path, broken)
+        except FileNotFoundError:
+            return True
+
+        try:
+            if read_lock_state(broken) == state:
+                logger.warning("Broke abandoned lock: %s", self.path)
+                return True
+
+            # Linking fails if yet another process took the lock since
+            try:
+                os.link(broken, self.path)
+            except OSError:
+                logger.warning("Could not restore lock %s after breaking it.", self.path)
+
+            return False
+
+        finally:
+            broken.unlink(missing_ok=True)
+
+    def is_stale(self: FileLock, state: tuple[str, int] | None) -> bool:
+        """Return True if the lock file was abandoned by its holder.
+
+        state: the state of the lock file (see read_lock_state)
+
+        A lock is stale if its holder is a dead process on this machine,
+        or if it has not been refreshed for a while.
+        """
+        if state is None:
+            return True
+
+        owner = state[0].split()
+        age = time.time() - state[1] / 1e9
+
+        if len(owner) == 2 and owner[0] == socket.gethostname() and owner[1].isdigit():
+            if not is_process_alive(int(owner[1])):
+                return True
+
+        return age > self.stale_after
+
+    def __enter__(self: FileLock) -> FileLock:
+        self.acquire()
+        return self
+
+    def __exit__(
+        self: FileLock,
+        exc_type: Optional[Type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[Any],
+    ) -> None:
+        self.release()
+
+def read_lock_state(path: Path) -> tuple[str, int] | None:
+    """Return the owner written in a lock file and its last refresh time in nanoseconds,
+    or None if there is no lock file.
+    """
+    try:
+        return path.read_text(), path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+def is_process_alive(pid: int) -> bool:
+    """Return True if a process with the given ID is running on this machine."""
+    # On Windows, os.kill terminates the process instead of probing it,
+    # so we can't tell and rely on the lock age instead
+    if os.name == "nt":
+        return True
+
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # The process exists, but belongs to another user
+        return True
+
+    return True
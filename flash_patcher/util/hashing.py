@@ -0,0 +1,31 @@
+"""Helper module for hashing files and cache keys."""
+import hashlib
+from pathlib import Path
+
+# Read files in 1 MiB chunks so large SWFs are never loaded into memory at once
+CHUNK_SIZE = 1024 * 1024
+
+def hash_file(file: Path) -> str:
+    """Return the SHA-256 hex digest of a file's content.
+
+    The file is streamed in chunks, so this is safe to use on large SWFs.
+    """
+    digest = hashlib.sha256()
+
+    with file.open("rb") as stream:
+        for chunk in iter(lambda: stream.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+def hash_bytes(data: bytes) -> str:
+    """Return the SHA-256 hex digest of some content, like hash_file."""
+    return hashlib.sha256(data).hexdigest()
+
+def hash_parts(*parts: str) -> str:
+    """Combine several strings into a single SHA-256 hex digest.
+
+    Parts are separated by a null byte, so ("ab", "c") and ("a", "bc") hash differently.
+    Parts may hold undecodable bytes read from files (see file_io.ENCODING_ERRORS).
+    """
+    return hashlib.sha256("\0".join(parts).encode("utf-8", "surrogateescape")).hexdigest()
@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import subprocess
+from contextlib import contextmanager
+from threading import BoundedSemaphore, Lock
+from typing import Iterator
+
+class ProcessGroup:
+    """The processes of one external tool, like FFDec.
+
+    At most a given number of them run at once, so parallel steps don't overload the machine.
+    Once a step of a batch fails, the group can be cancelled: running processes are killed,
+    and new ones fail to start, until the batch is over.
+    """
+
+    # Free process slots. None means no limit.
+    slots: BoundedSemaphore | None
+
+    running: set[subprocess.Popen]
+    cancelled: bool
+
+    # How many batches are running, since batches may run inside each other
+    batches: int
+
+    # Held while processes are started, killed or tracked
+    lock: Lock
+
+    def __init__(self: ProcessGroup, limit: int | None = None) -> None:
+        """limit: the most processes to run at once. If None, there is no limit.
+
+        Raises ValueError if the limit is less than 1, since no process could ever start.
+        """
+        if limit is not None and limit < 1:
+            raise ValueError(f"At least 1 process must be allowed to run at once, not {limit}")
+
+        self.slots = None if limit is None else BoundedSemaphore(limit)
+        self.running = set()
+        self.cancelled = False
+        self.batches = 0
+        self.lock = Lock()
+
+    @contextmanager
+    def slot(self: ProcessGroup) -> Iterator[None]:
+        """Wait for a free process slot, and hold it."""
+        if self.slots is None:
+            yield
+            return
+
+        with self.slots:
+            yield
+
+    @contextmanager
+    def popen(
+        self: ProcessGroup,
+        command: list[str],
+        **kwargs: object,
+    ) -> Iterator[subprocess.Popen]:
+        """Start a process once a slot is free, like subprocess.Popen.
+
+        The process is waited for when the context exits. If the context fails (say, on
+        Ctrl+C), the process is killed first, so it isn't left running.
+        Raises ChildProcessError if the group is cancelled, or OSError if the process
+        can't be started.
+        """
+        with self.slot():
+            with self.lock:
+                if self.cancelled:
+                    raise ChildProcessError(f"Cancelled: {subprocess.list2cmdline(command)}")
+
+                # pylint: disable=consider-using-with
+                process = subprocess.Popen(command, **kwargs)
+                self.running.add(process)
+
+            try:
+                with process:
+                    try:
+                        yield process
+
+                    except BaseException:
+                        process.kill()
+                        raise
+
+            finally:
+                with self.lock:
+                    self.running.discard(process)
+
+    @contextmanager
+    def track(self: ProcessGroup, process: subprocess.Popen) -> Iterator[None]:
+        """Count a process that is already running as part of the group, like a warm worker
+        while it runs a command. It holds a slot, and is killed if the group is cancelled.
+
+        Raises ChildProcessError if the group is cancelled.
+        """
+        with self.slot():
+            with self.lock:
+                if self.cancelled:
+                    raise ChildProcessError(f"Cancelled: {subprocess.list2cmdline(process.args)}")
+
+                self.running.add(process)
+
+            try:
+                yield
+
+            finally:
+                with self.lock:
+                    self.running.discard(process)
+
+    @contextmanager
+    def batch(self: ProcessGroup) -> Iterator[None]:
+        """Run steps that may cancel the group. Once the outermost batch is over,
+        processes can be started again.
+        """
+        with self.lock:
+            self.batches += 1
+
+        try:
+            yield
+
+        finally:
+            with self.lock:
+                self.batches -= 1
+
+                if self.batches == 0:
+                    self.cancelled = False
+
+    def cancel(self: ProcessGroup) -> None:
+        """Kill the running processes, and refuse to start new ones until the batch is over."""
+        with self.lock:
+            self.cancelled = True
+
+            for process in self.running:
+                process.kill()
@@ -0,0 +1,224 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from functools import partial
+from io import StringIO
+from pathlib import Path
+from typing import Iterable
+
+from flash_patcher.exception.error_manager import ErrorManager
+from flash_patcher.util.file_copy import IO_WORKERS
+from flash_patcher.util.file_io import FileBuffer, writelines_safe
+
+# pylint: disable=too-many-instance-attributes
+class VirtualFileSystem:
+    """Keep scripts in memory while patches are applied to them.
+
+    Each script is read from disk once, no matter how many patches touch it.
+    Changed scripts are only written back on flush, so a script patched by many blocks
+    is also written once.
+
+    Scripts are held either as a string or as a list of lines, whichever the last patch used,
+    and only converted when a patch needs the other form. The original bytes of each script
+    are kept too, so only the changed part of a script is written back (see FileBuffer).
+
+    Scripts can be read ahead of time (see prefetch), and changed scripts are written
+    in parallel on flush, but patches still see and change them one at a time, in order.
+    """
+
+    # The most characters to hold in memory. None means no limit,
+    # and 0 means every file is read and written right away.
+    budget: int | None
+
+    # Least recently used first
+    files: OrderedDict[Path, str | list[str]]
+    originals: dict[Path, FileBuffer]
+    sizes: dict[Path, int]
+    dirty: set[Path]
+    size: int
+
+    workers: int
+    executor: ThreadPoolExecutor | None
+
+    # The content of files being read ahead of time
+    prefetched: dict[Path, Future[bytes]]
+
+    def __init__(
+        self: VirtualFileSystem,
+        budget: int | None = None,
+        workers: int = IO_WORKERS,
+    ) -> None:
+        """workers: the most files to read or write at once."""
+        self.budget = budget
+        self.workers = workers
+        self.executor = None
+        self.prefetched = {}
+
+        self.files = OrderedDict()
+        self.originals = {}
+        self.sizes = {}
+        self.dirty = set()
+        self.size = 0
+
+    def read(self: VirtualFileSystem, path: Path, error_manager: ErrorManager) -> str:
+        """Return the full content of a file."""
+        content = self.files.get(path)
+
+        if content is None:
+            content = self.load(path, error_manager)
+        elif isinstance(content, list):
+            content = "".join(content)
+
+        self.store(path, content)
+        return content
+
+    def readlines(self: VirtualFileSystem, path: Path, error_manager: ErrorManager) -> list[str]:
+        """Return the lines of a file, like file.readlines().
+
+        The list is shared with the file system: after changing it, call write to keep the changes.
+        """
+        content = self.files.get(path)
+
+        if content is None:
+            content = self.load(path, error_manager)
+
+        if isinstance(content, str):
+            # Line endings are translated when files are read, so they only ever contain \n
+            content = StringIO(content).readlines()
+
+        self.store(path, content)
+        return content
+
+    def get_executor(self: VirtualFileSystem) -> ThreadPoolExecutor:
+        """Return the thread pool files are read and written in, starting it if needed."""
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(self.workers, thread_name_prefix="patcher-io")
+
+        return self.executor
+
+    def prefetch(self: VirtualFileSystem, paths: Iterable[Path]) -> None:
+        """Start reading files in the background, before patches need them.
+
+        Files already in memory or being read are skipped. If a file can't be read,
+        the error is raised once a patch reads it. Prefetched files only count
+        towards the budget once they're read.
+        """
+        for path in paths:
+            if path not in self.files and path not in self.prefetched:
+                self.prefetched[path] = self.get_executor().submit(path.read_bytes)
+
+    def load(self: VirtualFileSystem, path: Path, error_manager: ErrorManager) -> str:
+        """Read a file from disk, keeping its original bytes."""
+        future = self.prefetched.pop(path, None)
+        original = FileBuffer.read(path, error_manager, None if future is None else future.result)
+        self.originals[path] = original
+        return original.get_text()
+
+    def get_bytes(self: VirtualFileSystem, path: Path) -> bytes:
+        """Return the content of a file as it will be written to disk.
+
+        Raises OSError if the file can't be read.
+        """
+        content = self.files.get(path)
+        original = self.originals.get(path)
+
+        if content is not None and original is not None:
+            if path not in self.dirty:
+                return original.data
+
+            return original.encode(content if isinstance(content, str) else "".join(content))[0]
+
+        # Without its original bytes, a file is written first to know how it looks on disk
+        self.evict(path)
+        self.prefetch([path])
+        return self.prefetched[path].result()
+
+    def write(self: VirtualFileSystem, path: Path, content: str | list[str]) -> None:
+        """Replace the content of a file. It will be written to disk on flush."""
+        self.dirty.add(path)
+        self.store(path, content)
+
+    def store(self: VirtualFileSystem, path: Path, content: str | list[str]) -> None:
+        """Hold a file in memory as the most recently used one,
+        then spill the least recently used files until the budget is met.
+        """
+        self.size -= self.sizes.get(path, 0)
+
+        self.files[path] = content
+        self.files.move_to_end(path)
+        self.sizes[path] = len(content) if isinstance(content, str) else sum(map(len, content))
+
+        if path in self.originals:
+            self.sizes[path] += len(self.originals[path].data)
+
+        self.size += self.sizes[path]
+
+        while self.files and self.is_over_budget():
+            self.evict(next(iter(self.files)))
+
+    def is_over_budget(self: VirtualFileSystem) -> bool:
+        """Return True if files must be spilled to disk."""
+        if self.budget is None:
+            return False
+
+        # A budget of 0 writes every file right away, even empty ones
+        return self.budget == 0 or self.size > self.budget
+
+    def evict(self: VirtualFileSystem, path: Path) -> None:
+        """Write a file to disk if it changed, and drop it from memory."""
+        if path not in self.files:
+            return
+
+        content = self.files.pop(path)
+        original = self.originals.pop(path, None)
+        self.size -= self.sizes.pop(path)
+
+        if path in self.dirty:
+            self.dirty.remove(path)
+            writelines_safe(path, [content] if isinstance(content, str) else content, original)
+
+    def discard(self: VirtualFileSystem, path: Path) -> None:
+        """Drop a file from memory without writing it, before it's changed on disk directly."""
+        if path in self.files:
+            del self.files[path]
+            self.size -= self.sizes.pop(path)
+
+        self.originals.pop(path, None)
+        self.prefetched.pop(path, None)
+        self.dirty.discard(path)
+
+    def flush(self: VirtualFileSystem) -> None:
+        """Write every changed file to disk. Files stay in memory.
+
+        Files are written in parallel, but errors are raised in the order the files were used.
+        """
+        writes = [
+            self.get_executor().submit(partial(
+                writelines_safe,
+                path,
+                [content] if isinstance(content, str) else content,
+                self.originals.get(path),
+            ))
+            for path, content in self.files.items() if path in self.dirty
+        ]
+
+        # Every file that can be written is, even if another one fails
+        wait(writes)
+
+        for write in writes:
+            write.result()
+
+        self.dirty.clear()
+
+    def sync(self: VirtualFileSystem) -> None:
+        """Write every changed file to disk and drop all files from memory,
+        before anything else reads or writes files directly.
+        """
+        self.flush()
+
+        self.files.clear()
+        self.originals.clear()
+        self.prefetched.clear()
+        self.sizes.clear()
+        self.size = 0
@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+import os
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+from pytest import raises
+
+from flash_patcher.compile.build_cache import \
+    get_build_fingerprint, get_decompiler_fingerprint, restore_build, store_build
+from flash_patcher.compile.cache import CacheManager
+from flash_patcher.compile.ffdec import ARGS_FLATPAK, FFDecInterface
+
+class BuildCacheSpec (TestCase):
+
+    temp_dir: TemporaryDirectory
+    folder: Path
+    swf: Path
+    decompiler: MagicMock[FFDecInterface]
+    cache: CacheManager
+
+    def setUp(self: BuildCacheSpec) -> None:
+        # pylint: disable=consider-using-with
+        self.temp_dir = TemporaryDirectory()
+        self.folder = Path(self.temp_dir.name, "patches")
+        self.folder.mkdir()
+
+        self.swf = Path(self.temp_dir.name, "base.swf")
+        self.swf.write_bytes(b"FWS")
+
+        (self.folder / "main.stage").write_text(
+            "add-asset 18.png images/18.png\n", encoding="utf-8"
+        )
+        (self.folder / "18.png").write_bytes(b"png")
+
+        self.decompiler = MagicMock(spec=FFDecInterface)
+        self.decompiler.path = self.swf
+        self.decompiler.args = []
+
+        self.cache = CacheManager(Path(self.temp_dir.name, "builds"))
+
+        parse_cache = patch(
+            'flash_patcher.parse.parse_cache.PARSE_CACHE_ROOT', Path(self.temp_dir.name, "parse")
+        )
+        parse_cache.start()
+        self.addCleanup(parse_cache.stop)
+
+    def tearDown(self: BuildCacheSpec) -> None:
+        self.temp_dir.cleanup()
+
+    def get_fingerprint(self: BuildCacheSpec, flags: list[str] | None = None) -> str | None:
+        return get_build_fingerprint(
+            self.swf,
+            self.folder,
+            Path("main.stage"),
+            self.decompiler,
+            flags or ["all=False"],
+        )
+
+    def test_get_build_fingerprint_stable(self: BuildCacheSpec) -> None:
+        fingerprint = self.get_fingerprint()
+
+        assert fingerprint is not None
+        assert self.get_fingerprint() == fingerprint
+
+    def test_get_build_fingerprint_covers_inputs(self: BuildCacheSpec) -> None:
+        fingerprint = self.get_fingerprint()
+
+        assert self.get_fingerprint(["all=True"]) != fingerprint
+
+        (self.folder / "18.png").write_bytes(b"new png")
+        assert self.get_fingerprint() != fingerprint
+
+    def test_get_build_fingerprint_missing_asset(self: BuildCacheSpec) -> None:
+        (self.folder / "18.png").unlink()
+
+        assert self.get_fingerprint() is None
+
+    def test_get_decompiler_fingerprint_profile(self: BuildCacheSpec) -> None:
+        self.decompiler.get_profile_args.return_value = []
+        fingerprint = get_decompiler_fingerprint(self.decompiler)
+
+        # The profile changes how FFDec recompiles, so it changes the output
+        self.decompiler.get_profile_args.return_value = ["-config", "parallelSpeedUp=true"]
+        assert get_decompiler_fingerprint(self.decompiler) != fingerprint
+
+    def test_get_decompiler_fingerprint_flatpak(self: BuildCacheSpec) -> None:
+        self.decompiler.get_profile_args.return_value = []
+        self.decompiler.args = ARGS_FLATPAK
+        app = Path(self.temp_dir.name, "current")
+        app.mkdir()
+
+        with patch('flash_patcher.compile.ffdec.FLATPAK_APP_LOCATIONS', [app]):
+            fingerprint = get_decompiler_fingerprint(self.decompiler)
+
+            # Flatpak updates FFDec without touching the flatpak launcher
+            os.utime(app, ns=(0, 0))
+            assert get_decompiler_fingerprint(self.decompiler) != fingerprint
+
+    def test_get_decompiler_fingerprint_missing(self: BuildCacheSpec) -> None:
+        self.decompiler.path = Path(self.temp_dir.name, "ffdec.sh")
+
+        assert get_decompiler_fingerprint(self.decompiler) != ""
+
+    def test_store_restore_success(self: BuildCacheSpec) -> None:
+        output = Path(self.temp_dir.name, "output.swf")
+        output.write_bytes(b"patched")
+
+        store_build(self.cache, "build1", output)
+        output.unlink()
+
+        assert restore_build(self.cache, "build1", output)
+        assert output.read_bytes() == b"patched"
+
+    @patch('shutil.copyfile')
+    def test_store_failure(self: BuildCacheSpec, mock_copyfile: MagicMock) -> None:
+        mock_copyfile.side_effect = OSError("disk full")
+
+        with raises(OSError):
+            store_build(self.cache, "build1", Path(self.temp_dir.name, "output.swf"))
+
+        assert self.cache.list_incomplete() == []
+
+    def test_restore_missing(self: BuildCacheSpec) -> None:
+        output = Path(self.temp_dir.name, "output.swf")
+
+        assert not restore_build(self.cache, "build1", output)
+        assert not output.exists()
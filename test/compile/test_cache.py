@@ -0,0 +1,281 @@
+from __future__ import annotations
+
+import os
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from unittest.mock import patch
+
+from pytest import raises
+
+from flash_patcher.compile.cache import \
+    CacheManager, evict_files, format_size, mark_used, open_cache, parse_size, \
+    EVICTION_GRACE
+
+def test_parse_size_success() -> None:
+    assert parse_size("1024") == 1024
+    assert parse_size("500M") == 500 * 1024 ** 2
+    assert parse_size("2G") == 2 * 1024 ** 3
+    assert parse_size("1.5 GiB") == int(1.5 * 1024 ** 3)
+    assert parse_size("10kb") == 10 * 1024
+
+def test_parse_size_failure() -> None:
+    with raises(ValueError):
+        parse_size("a lot")
+
+def test_open_cache_success() -> None:
+    local_cache = open_cache(max_size=100)
+    shared_cache = open_cache(Path("/mnt/cache"))
+
+    assert local_cache.root == Path(".Patcher-Temp/cache")
+    assert local_cache.max_size == 100
+
+    # Other runs may still be reading recently used entries, even from the local cache
+    assert local_cache.eviction_grace == EVICTION_GRACE
+
+    assert shared_cache.root == Path("/mnt/cache")
+    assert shared_cache.eviction_grace == EVICTION_GRACE
+
+def test_format_size_success() -> None:
+    assert format_size(12) == "12 B"
+    assert format_size(1536) == "1.5 KiB"
+    assert format_size(3 * 1024 ** 3) == "3.0 GiB"
+    assert format_size(2 * 1024 ** 4) == "2.0 TiB"
+
+def test_evict_files_success() -> None:
+    with TemporaryDirectory() as temp_dir:
+        root = Path(temp_dir)
+
+        for age, name in enumerate(["new", "used", "old"]):
+            (root / name).write_bytes(b"a" * 100)
+            os.utime(root / name, (0, 1000 - age * 100))
+
+        # Using a file makes it the most recently used
+        mark_used(root / "used")
+
+        evicted = evict_files(root, 150)
+
+        assert evicted == [(root / "old", 100), (root / "new", 100)]
+        assert [location.name for location in root.iterdir()] == ["used"]
+
+        # Without a budget, everything is evicted
+        assert evict_files(root) == [(root / "used", 100)]
+        assert not evict_files(root / "missing")
+
+class CacheManagerSpec (TestCase):
+
+    temp_dir: TemporaryDirectory
+    cache: CacheManager
+
+    def setUp(self: CacheManagerSpec) -> None:
+        # pylint: disable=consider-using-with
+        self.temp_dir = TemporaryDirectory()
+        self.cache = CacheManager(Path(self.temp_dir.name, "cache"))
+
+    def tearDown(self: CacheManagerSpec) -> None:
+        self.temp_dir.cleanup()
+
+    def populate(self: CacheManagerSpec, key: str, size: int, last_used: float) -> None:
+        """Create a script entry containing a single file of the given size."""
+        staging = self.cache.begin(key)
+        (staging / "export" / "scripts").mkdir(parents=True)
+        (staging / "export" / "scripts" / "DoAction.as").write_bytes(b"a" * size)
+
+        entry = self.cache.commit(key, staging, f"{key}.swf", "script")
+        os.utime(entry.location / "entry.json", (last_used, last_used))
+
+    def test_lookup_success(self: CacheManagerSpec) -> None:
+        self.populate("key1", 100, 1000)
+
+        entry = self.cache.lookup("key1")
+
+        assert entry.key == "key1"
+        assert entry.source == "key1.swf"
+        assert entry.size == 100
+        assert entry.get_payload() == self.cache.root / "key1" / "export"
+
+        # Looking up an entry counts as a use
+        assert entry.last_used > 1000
+        assert (self.cache.root / "key1" / "entry.json").stat().st_mtime > 1000
+
+    def test_lookup_missing(self: CacheManagerSpec) -> None:
+        assert self.cache.lookup("key1") is None
+
+    def test_lookup_incomplete(self: CacheManagerSpec) -> None:
+        staging = self.cache.begin("key1")
+
+        assert self.cache.lookup("key1") is None
+        assert self.cache.list_incomplete() == [staging]
+
+    def test_lookup_damaged_missing_file(self: CacheManagerSpec) -> None:
+        self.populate("key1", 100, 1000)
+        (self.cache.root / "key1" / "export" / "scripts" / "DoAction.as").unlink()
+
+        assert self.cache.lookup("key1") is None
+
+    def test_lookup_damaged_truncated_file(self: CacheManagerSpec) -> None:
+        self.populate("key1", 100, 1000)
+        (self.cache.root / "key1" / "export" / "scripts" / "DoAction.as").write_bytes(b"a")
+
+        assert self.cache.lookup("key1") is None
+
+    def test_lookup_damaged_no_manifest(self: CacheManagerSpec) -> None:
+        self.populate("key1", 100, 1000)
+        (self.cache.root / "key1" / "manifest.json").unlink()
+
+        assert self.cache.lookup("key1") is None
+
+    def test_lookup_touched_but_intact(self: CacheManagerSpec) -> None:
+        self.populate("key1", 100, 1000)
+        script = self.cache.root / "key1" / "export" / "scripts" / "DoAction.as"
+        os.utime(script, (5000, 5000))
+
+        # Same content with a new mtime is still a valid entry
+        assert self.cache.lookup("key1") is not None
+
+    def test_commit_xml_success(self: CacheManagerSpec) -> None:
+        staging = self.cache.begin("key1")
+        (staging / "swf.xml").write_text("<swf/>")
+
+        entry = self.cache.commit("key1", staging, "base.swf", "xml")
+
+        assert not staging.exists()
+        assert entry.get_payload() == self.cache.root / "key1" / "swf.xml"
+        assert entry.size == 6
+        assert self.cache.lookup("key1") is not None
+
+    def test_commit_replaces_damaged_entry(self: CacheManagerSpec) -> None:
+        self.populate("key1", 100, 1000)
+        (self.cache.root / "key1" / "export" / "scripts" / "DoAction.as").unlink()
+
+        self.populate("key1", 50, 2000)
+
+        assert self.cache.lookup("key1").size == 50
+        assert self.cache.list_incomplete() == []
+
+    def test_abort_success(self: CacheManagerSpec) -> None:
+        staging = self.cache.begin("key1")
+        (staging / "export").mkdir()
+
+        self.cache.abort(staging)
+
+        assert not staging.exists()
+        assert self.cache.lookup("key1") is None
+
+    def test_list_entries_empty(self: CacheManagerSpec) -> None:
+        assert self.cache.list_entries() == []
+        assert self.cache.list_incomplete() == []
+
+    def test_list_entries_lru_order(self: CacheManagerSpec) -> None:
+        self.populate("key1", 100, 1000)
+        self.populate("key2", 100, 3000)
+        self.populate("key3", 100, 2000)
+
+        keys = [entry.key for entry in self.cache.list_entries()]
+
+        assert keys == ["key2", "key3", "key1"]
+        assert self.cache.get_total_size() == 300
+
+    def test_evict_success(self: CacheManagerSpec) -> None:
+        self.populate("key1", 100, 1000)
+        self.populate("key2", 100, 3000)
+        self.populate("key3", 100, 2000)
+
+        evicted = self.cache.evict(150)
+
+        assert [entry.key for entry in evicted] == ["key1", "key3"]
+        assert [entry.key for entry in self.cache.list_entries()] == ["key2"]
+
+    def test_evict_keep(self: CacheManagerSpec) -> None:
+        self.populate("key1", 100, 1000)
+        self.populate("key2", 100, 3000)
+
+        evicted = self.cache.evict(100, keep={"key1"})
+
+        assert [entry.key for entry in evicted] == ["key2"]
+        assert [entry.key for entry in self.cache.list_entries()] == ["key1"]
+
+    def test_evict_manager_budget(self: CacheManagerSpec) -> None:
+        self.populate("key1", 100, 1000)
+        self.populate("key2", 100, 3000)
+
+        assert not self.cache.evict()
+
+        self.cache.max_size = 100
+        assert [entry.key for entry in self.cache.evict()] == ["key1"]
+
+    def test_prune_success(self: CacheManagerSpec) -> None:
+        self.populate("key1", 100, 1000)
+        self.populate("key2", 100, 3000)
+        self.cache.begin("key3")
+
+        evicted = self.cache.prune(100)
+
+        assert [entry.key for entry in evicted] == ["key1"]
+        assert self.cache.list_incomplete() == []
+
+    def test_prune_all(self: CacheManagerSpec) -> None:
+        self.populate("key1", 100, 1000)
+        self.populate("key2", 100, 3000)
+        (self.cache.root / "stray-file").write_text("")
+
+        self.cache.prune()
+
+        assert not any(self.cache.root.iterdir())
+
+    def test_list_ignores_locks(self: CacheManagerSpec) -> None:
+        self.populate("key1", 100, 1000)
+
+        with self.cache.lock("key1"):
+            assert [entry.key for entry in self.cache.list_entries()] == ["key1"]
+            assert self.cache.list_incomplete() == []
+
+    def test_evict_skips_locked(self: CacheManagerSpec) -> None:
+        self.populate("key1", 100, 1000)
+        self.populate("key2", 100, 3000)
+
+        with self.cache.lock("key1"):
+            evicted = self.cache.evict(0)
+
+        assert [entry.key for entry in evicted] == ["key2"]
+
+    def test_evict_min_idle(self: CacheManagerSpec) -> None:
+        self.populate("key1", 100, 1000)
+        self.cache.lookup("key1")
+
+        self.cache.eviction_grace = 600
+        assert not self.cache.evict(0)
+        assert self.cache.evict(0, min_idle=0)
+
+    def test_prune_skips_running_export(self: CacheManagerSpec) -> None:
+        staging = self.cache.begin("key1")
+
+        with self.cache.lock("key1"):
+            self.cache.prune()
+
+        assert staging.exists()
+
+        self.cache.prune()
+        assert not staging.exists()
+
+    def test_lookup_read_only(self: CacheManagerSpec) -> None:
+        self.populate("key1", 100, 1000)
+
+        with patch('os.utime', side_effect=PermissionError("read-only file system")):
+            entry = self.cache.lookup("key1")
+
+        assert entry is not None
+        assert entry.last_used == 1000
+
+    def test_shared_cache_two_workers(self: CacheManagerSpec) -> None:
+        worker_1 = CacheManager(self.cache.root)
+        worker_2 = CacheManager(self.cache.root)
+
+        with worker_1.lock("key1"):
+            assert not worker_2.lock("key1").try_acquire()
+
+            staging = worker_1.begin("key1")
+            (staging / "swf.xml").write_text("<swf/>")
+            worker_1.commit("key1", staging, "base.swf", "xml")
+
+        assert worker_2.lookup("key1").get_payload().read_text() == "<swf/>"
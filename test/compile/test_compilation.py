@@ -1,18 +1,42 @@
 from __future__ import annotations
 
+import json
+import sys
+import time
+
+from logging import DEBUG, WARNING
 from pathlib import Path
+from tempfile import TemporaryDirectory
+from typing import Callable
 from unittest import TestCase
-from unittest.mock import call, MagicMock, patch
+from unittest.mock import ANY, call, MagicMock, patch
 
 from pytest import raises
 
-from flash_patcher.compile.compilation import CompilationManager
+from flash_patcher.compile.cache import CacheManager
+from flash_patcher.compile.compilation import CompilationManager, get_import_parts, \
+    get_shards
 from flash_patcher.compile.ffdec import FFDecInterface
+from flash_patcher.compile.ffdec_telemetry import FFDecCall
 from flash_patcher.exception.dependency import DependencyError
+from flash_patcher.compile.packed_scripts import PackedScripts
+from flash_patcher.compile.swf_fingerprint import get_unit_name
+from flash_patcher.util.hashing import hash_parts
+from flash_patcher.util.logging import logger
+
+# pylint: disable=wrong-import-order
+from test.test_util.swf_builder import make_sprite, make_swf, make_tag
+
+SWF_HASH = "0" * 64
+SCRIPT_CACHE = Path(".Patcher-Temp/cache", hash_parts(SWF_HASH, "20.1.0", "script"))
+XML_CACHE = Path(".Patcher-Temp/cache", hash_parts(SWF_HASH, "20.1.0", "xml"))
+PACKED_CACHE = Path(".Patcher-Temp/cache", hash_parts(SWF_HASH, "20.1.0", "packed"))
+STAGING = Path(".Patcher-Temp/cache/staging")
 
 class CompilationManagerSpec (TestCase):
 
     mock_decompiler: MagicMock[FFDecInterface]
+    mock_cache: MagicMock[CacheManager]
     compilation_manager: CompilationManager
 
     swf: Path
@@ -23,119 +47,276 @@ class CompilationManagerSpec (TestCase):
         super().__init__(methodName)
 
         # Manual initialization required to mock the internal FFDec interface
-        self.compilation_manager = CompilationManager()
         self.mock_decompiler = MagicMock(spec=FFDecInterface)
-        self.compilation_manager.decompiler = self.mock_decompiler
+        self.compilation_manager = CompilationManager(decompiler=self.mock_decompiler)
+        self.mock_decompiler.get_version.return_value = "20.1.0"
+
+        self.mock_cache = MagicMock(spec=CacheManager)
+        self.mock_cache.begin.return_value = STAGING
+        self.mock_cache.commit.return_value.get_payload.return_value = SCRIPT_CACHE / "export"
+        self.compilation_manager.cache = self.mock_cache
 
         self.swf = Path("test.swf")
         self.folder = Path("./.Patcher-Temp/mod")
 
+    @patch('pathlib.Path.mkdir')
+    @patch('flash_patcher.compile.compilation.hash_file')
     @patch('pathlib.Path.exists')
     def test_decompile_success_xml_mode(
         self: CompilationManagerSpec,
         mock_path_exists: MagicMock,
+        mock_hash_file: MagicMock,
+        mock_path_mkdir: MagicMock,
     ) -> None:
         mock_path_exists.return_value = True
+        mock_hash_file.return_value = SWF_HASH
+        self.mock_cache.commit.return_value.get_payload.return_value = XML_CACHE / "swf.xml"
 
         folder = self.compilation_manager.decompile(self.swf, drop_cache=True, xml_mode=True)
 
-        assert mock_path_exists.call_count == 3
-        assert folder == Path('.Patcher-Temp/ORSXG5BOON3WM===')
-        self.mock_decompiler.dump_xml.assert_called_once_with(
-            self.swf, Path('.Patcher-Temp/ORSXG5BOON3WM===')
+        assert folder == XML_CACHE / "swf.xml"
+        self.mock_cache.lookup.assert_not_called()
+        self.mock_cache.begin.assert_called_once_with(XML_CACHE.name)
+        self.mock_cache.commit.assert_called_once_with(
+            XML_CACHE.name, STAGING, "test.swf", "xml"
         )
+        self.mock_decompiler.dump_xml.assert_called_once_with(self.swf, STAGING / "swf.xml")
+        mock_path_mkdir.assert_not_called()
 
+    @patch('pathlib.Path.mkdir')
+    @patch('flash_patcher.compile.compilation.hash_file')
     @patch('pathlib.Path.exists')
     def test_decompile_success_no_cache(
         self: CompilationManagerSpec,
         mock_path_exists: MagicMock,
+        mock_hash_file: MagicMock,
+        mock_path_mkdir: MagicMock,
     ) -> None:
-        mock_path_exists.side_effect = [True, True, False, True]
+        mock_hash_file.return_value = SWF_HASH
+        mock_path_exists.return_value = True
+        self.mock_cache.lookup.return_value = None
 
         folder = self.compilation_manager.decompile(self.swf)
 
-        assert mock_path_exists.call_count == 4
-        assert folder == Path('.Patcher-Temp/ORSXG5BOON3WM===')
+        assert folder == SCRIPT_CACHE / "export"
+        self.mock_cache.lookup.assert_called_with(SCRIPT_CACHE.name)
+        self.mock_cache.lock.assert_called_once_with(SCRIPT_CACHE.name)
+        self.mock_cache.commit.assert_called_once_with(
+            SCRIPT_CACHE.name, STAGING, "test.swf", "script"
+        )
+        self.mock_cache.evict.assert_called_once_with(keep={SCRIPT_CACHE.name})
         self.mock_decompiler.export_scripts.assert_called_once_with(
-            self.swf, Path('.Patcher-Temp/ORSXG5BOON3WM===')
+            self.swf, STAGING / "export"
         )
+        mock_path_mkdir.assert_called_once_with()
 
+    @patch('pathlib.Path.mkdir')
+    @patch('flash_patcher.compile.compilation.hash_file')
     @patch('pathlib.Path.exists')
     def test_decompile_success_drop_cache(
         self: CompilationManagerSpec,
         mock_path_exists: MagicMock,
+        mock_hash_file: MagicMock,
+        _: MagicMock,
     ) -> None:
+        mock_hash_file.return_value = SWF_HASH
         mock_path_exists.return_value = True
 
         folder = self.compilation_manager.decompile(self.swf, drop_cache=True)
 
-        assert mock_path_exists.call_count == 3
-        assert folder == Path('.Patcher-Temp/ORSXG5BOON3WM===')
+        assert folder == SCRIPT_CACHE / "export"
+        self.mock_cache.lookup.assert_not_called()
+        self.mock_decompiler.export_scripts.assert_called_once_with(
+            self.swf, STAGING / "export"
+        )
+
+    @patch('shutil.rmtree')
+    @patch('flash_patcher.compile.compilation.pack_folder')
+    @patch('pathlib.Path.mkdir')
+    @patch('flash_patcher.compile.compilation.hash_file')
+    @patch('pathlib.Path.exists')
+    def test_decompile_success_packed(
+        self: CompilationManagerSpec,
+        mock_path_exists: MagicMock,
+        mock_hash_file: MagicMock,
+        _: MagicMock,
+        mock_pack_folder: MagicMock,
+        mock_rmtree: MagicMock,
+    ) -> None:
+        mock_hash_file.return_value = SWF_HASH
+        mock_path_exists.return_value = True
+        mock_pack_folder.return_value = 2
+        self.mock_cache.commit.return_value.get_payload.return_value = \
+            PACKED_CACHE / "scripts.db"
+
+        folder = self.compilation_manager.decompile(
+            self.swf, drop_cache=True, cache_format="packed-zlib"
+        )
+
+        assert folder == PACKED_CACHE / "scripts.db"
+        self.mock_cache.begin.assert_called_once_with(PACKED_CACHE.name)
         self.mock_decompiler.export_scripts.assert_called_once_with(
-            self.swf, Path('.Patcher-Temp/ORSXG5BOON3WM===')
+            self.swf, STAGING / "export"
+        )
+        mock_pack_folder.assert_called_once_with(
+            STAGING / "export", STAGING / "scripts.db", True
+        )
+        mock_rmtree.assert_called_once_with(STAGING / "export")
+        self.mock_cache.commit.assert_called_once_with(
+            PACKED_CACHE.name, STAGING, "test.swf", "packed"
         )
 
+    @patch('flash_patcher.compile.compilation.hash_file')
     @patch('pathlib.Path.exists')
     def test_decompile_success_cached(
         self: CompilationManagerSpec,
         mock_path_exists: MagicMock,
+        mock_hash_file: MagicMock,
     ) -> None:
+        mock_hash_file.return_value = SWF_HASH
         mock_path_exists.return_value = True
+        self.mock_cache.lookup.return_value.get_payload.return_value = SCRIPT_CACHE / "export"
 
         folder = self.compilation_manager.decompile(self.swf)
 
-        assert mock_path_exists.call_count == 3
-        assert folder == Path('.Patcher-Temp/ORSXG5BOON3WM===')
-        self.mock_decompiler.assert_not_called()
+        assert folder == SCRIPT_CACHE / "export"
+        self.mock_cache.begin.assert_not_called()
+        self.mock_cache.evict.assert_called_once_with(keep={SCRIPT_CACHE.name})
+        self.mock_decompiler.export_scripts.assert_not_called()
 
-    @patch('pathlib.Path.mkdir')
+    @patch('flash_patcher.compile.compilation.hash_file')
     @patch('pathlib.Path.exists')
-    def test_decompile_success_create_folders(
+    def test_decompile_success_other_process(
         self: CompilationManagerSpec,
         mock_path_exists: MagicMock,
-        mock_path_mkdir: MagicMock
+        mock_hash_file: MagicMock,
     ) -> None:
-        mock_path_exists.side_effect = [False, True, False, False]
+        mock_hash_file.return_value = SWF_HASH
+        mock_path_exists.return_value = True
 
-        folder = self.compilation_manager.decompile(self.swf)
+        entry = MagicMock()
+        entry.get_payload.return_value = SCRIPT_CACHE / "export"
+        self.mock_cache.lookup.side_effect = [None, entry]
 
-        assert mock_path_exists.call_count == 4
-        assert folder == Path('.Patcher-Temp/ORSXG5BOON3WM===')
-        self.mock_decompiler.export_scripts.assert_called_once_with(
-            self.swf, Path('.Patcher-Temp/ORSXG5BOON3WM===')
-        )
+        folder = self.compilation_manager.decompile(self.swf)
 
-        assert mock_path_mkdir.call_count == 2
+        assert folder == SCRIPT_CACHE / "export"
+        self.mock_cache.lock.assert_called_once_with(SCRIPT_CACHE.name)
+        self.mock_cache.begin.assert_not_called()
+        self.mock_decompiler.export_scripts.assert_not_called()
 
     @patch('pathlib.Path.exists')
     def test_decompile_failure_no_input(
         self: CompilationManagerSpec,
         mock_path_exists: MagicMock,
     ) -> None:
-        mock_path_exists.side_effect = [True, False]
+        mock_path_exists.return_value = False
 
         with raises(FileNotFoundError):
             self.compilation_manager.decompile(self.swf)
 
-        assert mock_path_exists.call_count == 2
+        mock_path_exists.assert_called_once_with()
         self.mock_decompiler.assert_not_called()
 
+    @patch('pathlib.Path.mkdir')
+    @patch('flash_patcher.compile.compilation.hash_file')
     @patch('pathlib.Path.exists')
     def test_decompile_failure_ffdec_error(
         self: CompilationManagerSpec,
         mock_path_exists: MagicMock,
+        mock_hash_file: MagicMock,
+        _: MagicMock,
     ) -> None:
+        mock_hash_file.return_value = SWF_HASH
         mock_path_exists.return_value = True
         self.mock_decompiler.export_scripts.return_value = False
 
         with raises(DependencyError):
             self.compilation_manager.decompile(self.swf, drop_cache=True)
 
-        assert mock_path_exists.call_count == 3
         self.mock_decompiler.export_scripts.assert_called_once_with(
-            self.swf, Path('.Patcher-Temp/ORSXG5BOON3WM===')
+            self.swf, STAGING / "export"
         )
 
+        # The half-written export must never be committed to the cache
+        self.mock_cache.commit.assert_not_called()
+        self.mock_cache.abort.assert_called_once_with(STAGING)
+
+    @patch('flash_patcher.compile.compilation.hash_file')
+    def test_get_cache_key_depends_on_mode(
+        self: CompilationManagerSpec,
+        mock_hash_file: MagicMock,
+    ) -> None:
+        mock_hash_file.return_value = SWF_HASH
+
+        script_key = self.compilation_manager.get_cache_key(self.swf)
+        xml_key = self.compilation_manager.get_cache_key(self.swf, "xml")
+        packed_key = self.compilation_manager.get_cache_key(self.swf, "packed")
+
+        assert script_key == SCRIPT_CACHE.name
+        assert xml_key == XML_CACHE.name
+        assert packed_key == PACKED_CACHE.name
+        mock_hash_file.assert_called_with(self.swf)
+
+    @patch('flash_patcher.compile.compilation.hash_file')
+    def test_get_cache_key_depends_on_content_and_version(
+        self: CompilationManagerSpec,
+        mock_hash_file: MagicMock,
+    ) -> None:
+        mock_hash_file.return_value = SWF_HASH
+        original_key = self.compilation_manager.get_cache_key(self.swf)
+
+        mock_hash_file.return_value = "1" * 64
+        assert self.compilation_manager.get_cache_key(self.swf) != original_key
+
+        mock_hash_file.return_value = SWF_HASH
+        self.mock_decompiler.get_version.return_value = "21.0.0"
+        assert self.compilation_manager.get_cache_key(self.swf) != original_key
+
+    @patch('flash_patcher.compile.compilation.hash_file')
+    def test_get_cache_key_depends_on_profile(
+        self: CompilationManagerSpec,
+        mock_hash_file: MagicMock,
+    ) -> None:
+        mock_hash_file.return_value = SWF_HASH
+        decompiler = MagicMock(spec=FFDecInterface)
+        decompiler.get_version.return_value = "20.1.0"
+
+        compilation_manager = CompilationManager(MagicMock(), decompiler, profile="fast-export")
+
+        assert decompiler.profile == "fast-export"
+        assert compilation_manager.get_decompiler_id() == "20.1.0+fast-export"
+        assert compilation_manager.get_cache_key(self.swf) != SCRIPT_CACHE.name
+
+    def test_get_decompiler_id_pcode(self: CompilationManagerSpec) -> None:
+        decompiler = MagicMock(spec=FFDecInterface)
+        decompiler.get_version.return_value = "20.1.0"
+
+        compilation_manager = CompilationManager(MagicMock(), decompiler, script_format="pcode")
+
+        # P-code exports never reuse ActionScript exports, or the other way around
+        assert decompiler.script_format == "pcode"
+        assert compilation_manager.get_decompiler_id() == "20.1.0+pcode"
+
+        decompiler.profile = "safe"
+        assert compilation_manager.get_decompiler_id() == "20.1.0+safe+pcode"
+
+    def test_report_ffdec_calls(self: CompilationManagerSpec) -> None:
+        self.mock_decompiler.calls = []
+        assert not self.compilation_manager.report_ffdec_calls()
+
+        self.mock_decompiler.calls = [
+            FFDecCall(["-export"], "process", 0, 2.0, 3.0, 300 * 1024 ** 2),
+            FFDecCall(["-importScript"], "worker", 1, 1.0, output=["Error!"]),
+        ]
+
+        with self.assertLogs(logger, DEBUG) as logs:
+            calls = self.compilation_manager.report_ffdec_calls()
+
+        assert calls == self.mock_decompiler.calls
+        assert "Error!" in logs.output[2]
+        assert logs.output[-1].endswith("Ran 2 FFDec commands in 3.00s (3.00s CPU, 300 MiB peak).")
+
     def test_recompile_with_check_success(
         self: CompilationManagerSpec,
     ) -> None:
@@ -165,7 +346,17 @@ class CompilationManagerSpec (TestCase):
             self: CompilationManagerSpec,
         ) -> None:
         self.compilation_manager.recompile(self.folder, self.folder, self.swf, xml_mode=True)
-        self.mock_decompiler.rebuild_xml.assert_called_once_with(self.folder, self.swf)
+        self.mock_decompiler.rebuild_xml.assert_called_once_with(
+            self.folder, self.swf, swf=self.folder
+        )
+
+    def test_recompile_failure_xml_mode(
+            self: CompilationManagerSpec,
+        ) -> None:
+        self.mock_decompiler.rebuild_xml.return_value = False
+
+        with raises(DependencyError):
+            self.compilation_manager.recompile(self.folder, self.folder, self.swf, xml_mode=True)
 
     @patch('flash_patcher.compile.compilation.CompilationManager.recompile_with_check')
     def test_recompile_success_full(
@@ -187,6 +378,24 @@ class CompilationManagerSpec (TestCase):
         mock_recompile_with_check.assert_has_calls(expected_calls)
         assert mock_recompile_with_check.call_count == 5
 
+    @patch('flash_patcher.compile.compilation.CompilationManager.recompile_with_check')
+    def test_recompile_success_full_modified(
+        self: CompilationManagerSpec,
+        mock_recompile_with_check: MagicMock
+    ) -> None:
+        self.compilation_manager.recompile(
+            self.folder,
+            self.swf,
+            self.swf,
+            recompile_all=True,
+            modified_files=[self.folder / "movies" / "1.flv", self.folder / "images" / "2.png"],
+        )
+
+        # Modified parts are imported along with every part of --all, in import order
+        assert [args[0] for args, _ in mock_recompile_with_check.call_args_list] == [
+            "Script", "Images", "Sounds", "Shapes", "Text", "Movies",
+        ]
+
     @patch('flash_patcher.compile.compilation.CompilationManager.recompile_with_check')
     def test_recompile_success_script_only(
         self: CompilationManagerSpec,
@@ -196,3 +405,409 @@ class CompilationManagerSpec (TestCase):
         mock_recompile_with_check.assert_called_once_with(
             "Script", self.folder, self.swf, self.swf
         )
+
+    @patch('flash_patcher.compile.compilation.CompilationManager.recompile_with_check')
+    def test_recompile_success_modified_parts(
+        self: CompilationManagerSpec,
+        mock_recompile_with_check: MagicMock,
+    ) -> None:
+        output = self.folder / "output.swf"
+
+        self.compilation_manager.recompile(self.folder, self.swf, output, modified_files={
+            self.folder / "sounds" / "3.mp3",
+            self.folder / "images" / "8.png",
+            self.folder / "images" / "9.png",
+        })
+
+        # Only the changed parts are imported, the first one from the base SWF
+        assert mock_recompile_with_check.call_args_list == [
+            call("Images", self.folder, self.swf, output),
+            call("Sounds", self.folder, output, output),
+        ]
+
+    @patch('flash_patcher.compile.compilation.CompilationManager.recompile_with_check')
+    def test_recompile_success_nothing_modified(
+        self: CompilationManagerSpec,
+        mock_recompile_with_check: MagicMock,
+    ) -> None:
+        self.compilation_manager.recompile(self.folder, self.swf, self.swf, modified_files=set())
+
+        mock_recompile_with_check.assert_called_once_with(
+            "Script", self.folder, self.swf, self.swf
+        )
+
+    def test_run_parallel_failure(self: CompilationManagerSpec) -> None:
+        processes = self.mock_decompiler.processes
+        statuses = []
+
+        def slow_step() -> None:
+            with processes.popen([sys.executable, "-c", "import time; time.sleep(30)"]) as process:
+                statuses.append(process.wait())
+
+        def failing_step() -> None:
+            while not processes.running:
+                time.sleep(0.01)
+
+            raise DependencyError("FFDec failed")
+
+        start = time.monotonic()
+
+        with raises(DependencyError):
+            self.compilation_manager.run_parallel([slow_step, failing_step])
+
+        # The other step's FFDec process is killed instead of waited for
+        assert statuses[0] != 0
+        assert time.monotonic() - start < 10
+        assert not processes.cancelled
+
+    def test_run_parallel_single_step(self: CompilationManagerSpec) -> None:
+        step = MagicMock()
+
+        self.compilation_manager.run_parallel([step])
+
+        step.assert_called_once_with()
+
+    def test_get_import_parts(self: CompilationManagerSpec) -> None:
+        with self.assertLogs(logger, WARNING) as logs:
+            parts = get_import_parts(self.folder, [
+                self.folder / "texts" / "4.txt",
+                self.folder / "readme.txt",
+                self.folder / "scripts" / "DefineSprite_2" / "frame_1" / "DoAction.as",
+                Path("/elsewhere/1.png"),
+                self.folder / "symbolClass" / "symbols.csv",
+            ])
+
+        assert parts == ["Script", "Text", "SymbolClass"]
+        assert len(logs.records) == 2
+
+def do_action(script: bytes) -> bytes:
+    return make_tag(12, script)
+
+class IncrementalExportSpec (TestCase):
+
+    temp_dir: TemporaryDirectory
+    swf: Path
+    mock_decompiler: MagicMock[FFDecInterface]
+    compilation_manager: CompilationManager
+
+    def setUp(self: IncrementalExportSpec) -> None:
+        # pylint: disable=consider-using-with
+        self.temp_dir = TemporaryDirectory()
+        self.swf = Path(self.temp_dir.name, "base.swf")
+
+        self.mock_decompiler = MagicMock(spec=FFDecInterface)
+        self.mock_decompiler.get_version.return_value = "20.1.0"
+
+        self.compilation_manager = CompilationManager(
+            CacheManager(Path(self.temp_dir.name, "cache")),
+            self.mock_decompiler,
+        )
+
+    def tearDown(self: IncrementalExportSpec) -> None:
+        self.temp_dir.cleanup()
+
+    def write_swf(self: IncrementalExportSpec, frame: bytes, *sprites: tuple[int, bytes]) -> None:
+        self.swf.write_bytes(make_swf(
+            do_action(frame),
+            make_tag(1),
+            *[make_sprite(sprite_id, do_action(script)) for sprite_id, script in sprites],
+        ))
+
+    def fake_export(
+        self: IncrementalExportSpec,
+        scripts: dict[str, str],
+    ) -> Callable[..., bool]:
+        """Make FFDec export the given scripts, honoring -select and -selectid."""
+        def export(
+            _: Path,
+            output_dir: Path,
+            frames: list[int] | None = None,
+            character_ids: list[int] | None = None,
+        ) -> bool:
+            selected = {f"frame_{frame}" for frame in frames or []} \
+                | {f"DefineSprite_{character}" for character in character_ids or []}
+
+            for folder, script in scripts.items():
+                if frames is None and character_ids is None or get_unit_name(folder) in selected:
+                    (output_dir / "scripts" / folder).mkdir(parents=True)
+                    (output_dir / "scripts" / folder / "DoAction.as").write_text(
+                        script, encoding="utf-8"
+                    )
+
+            return True
+
+        return export
+
+    def read_scripts(self: IncrementalExportSpec, export: Path) -> dict[str, str]:
+        return {
+            file.parent.name: file.read_text(encoding="utf-8")
+            for file in (export / "scripts").glob("*/DoAction.as")
+        }
+
+    def test_decompile_incremental(self: IncrementalExportSpec) -> None:
+        self.write_swf(b"frame", (2, b"old"), (3, b"removed"), (4, b"same"))
+        self.mock_decompiler.export_scripts.side_effect = self.fake_export({
+            "frame_1": "frame", "DefineSprite_2": "old",
+            "DefineSprite_3_removed": "removed", "DefineSprite_4": "same",
+        })
+        self.compilation_manager.decompile(self.swf)
+
+        self.write_swf(b"frame", (2, b"new"), (4, b"same"))
+        self.mock_decompiler.export_scripts.reset_mock()
+        self.mock_decompiler.export_scripts.side_effect = self.fake_export({
+            "frame_1": "frame (new export)", "DefineSprite_2": "new",
+            "DefineSprite_4": "same (new export)",
+        })
+        export = self.compilation_manager.decompile(self.swf)
+
+        # Only the changed sprite is exported, everything else comes from the cache
+        self.mock_decompiler.export_scripts.assert_called_once_with(
+            self.swf, ANY, character_ids=[2]
+        )
+        assert self.read_scripts(export) == \
+            {"frame_1": "frame", "DefineSprite_2": "new", "DefineSprite_4": "same"}
+        assert not (export.parent / "export.partial").exists()
+        assert json.loads((export.parent / "fingerprint.json").read_text(encoding="utf-8"))\
+            ["decompiler"] == "20.1.0"
+
+    def test_decompile_incremental_packed(self: IncrementalExportSpec) -> None:
+        self.write_swf(b"frame", (2, b"old"), (4, b"same"))
+        self.mock_decompiler.export_scripts.side_effect = self.fake_export({
+            "frame_1": "frame", "DefineSprite_2": "old", "DefineSprite_4": "same",
+        })
+        self.compilation_manager.decompile(self.swf, cache_format="packed")
+
+        self.write_swf(b"new frame", (2, b"old"), (4, b"same"))
+        self.mock_decompiler.export_scripts.side_effect = self.fake_export({
+            "frame_1": "new frame", "DefineSprite_2": "old", "DefineSprite_4": "same",
+        })
+        location = self.compilation_manager.decompile(self.swf, cache_format="packed")
+
+        assert self.mock_decompiler.export_scripts.call_args.kwargs == {"frames": [1]}
+        assert PackedScripts(location).read("scripts/frame_1/DoAction.as") == b"new frame"
+
+    def test_decompile_incremental_too_many_changes(self: IncrementalExportSpec) -> None:
+        self.write_swf(b"frame", (2, b"old"))
+        self.mock_decompiler.export_scripts.side_effect = self.fake_export({})
+        self.compilation_manager.decompile(self.swf)
+
+        self.write_swf(b"new frame", (2, b"new"))
+        self.compilation_manager.decompile(self.swf)
+
+        assert self.mock_decompiler.export_scripts.call_args.kwargs == {}
+
+    def test_decompile_incremental_missing_unit(self: IncrementalExportSpec) -> None:
+        self.write_swf(b"frame", (2, b"old"), (4, b"same"))
+        self.mock_decompiler.export_scripts.side_effect = self.fake_export({
+            "frame_1": "frame", "DefineSprite_2": "old", "DefineSprite_4": "same",
+        })
+        self.compilation_manager.decompile(self.swf)
+
+        # FFDec ignored the selection: the SWF is exported in full instead
+        self.write_swf(b"frame", (2, b"new"), (4, b"same"))
+        self.mock_decompiler.export_scripts.reset_mock()
+        self.mock_decompiler.export_scripts.side_effect = self.fake_export({
+            "frame_1": "frame", "DefineSprite_4": "same",
+        })
+        export = self.compilation_manager.decompile(self.swf)
+
+        assert self.mock_decompiler.export_scripts.call_count == 2
+        assert self.read_scripts(export) == {"frame_1": "frame", "DefineSprite_4": "same"}
+
+    def test_decompile_incremental_base_in_use(self: IncrementalExportSpec) -> None:
+        self.write_swf(b"frame", (2, b"old"), (4, b"same"))
+        self.mock_decompiler.export_scripts.side_effect = self.fake_export({})
+        base = self.compilation_manager.decompile(self.swf).parent.name
+
+        self.write_swf(b"frame", (2, b"new"), (4, b"same"))
+
+        with self.compilation_manager.cache.lock(base):
+            self.compilation_manager.decompile(self.swf)
+
+        assert self.mock_decompiler.export_scripts.call_args.kwargs == {}
+
+    def test_decompile_incremental_unreadable_swf(self: IncrementalExportSpec) -> None:
+        self.swf.write_bytes(b"not a swf")
+        self.mock_decompiler.export_scripts.side_effect = self.fake_export({})
+
+        export = self.compilation_manager.decompile(self.swf)
+
+        assert not (export.parent / "fingerprint.json").exists()
+
+    def test_decompile_incremental_no_script_changes(self: IncrementalExportSpec) -> None:
+        self.write_swf(b"frame", (2, b"same"))
+        self.mock_decompiler.export_scripts.side_effect = self.fake_export({
+            "frame_1": "frame", "DefineSprite_2": "same",
+        })
+        self.compilation_manager.decompile(self.swf, xml_mode=True)
+        self.compilation_manager.decompile(self.swf)
+
+        # Only non-script tags changed, so the cached scripts are reused as they are
+        self.swf.write_bytes(self.swf.read_bytes() + b"trailing data")
+        self.mock_decompiler.export_scripts.reset_mock()
+        export = self.compilation_manager.decompile(self.swf)
+
+        self.mock_decompiler.export_scripts.assert_not_called()
+        assert self.read_scripts(export) == {"frame_1": "frame", "DefineSprite_2": "same"}
+
+    def test_decompile_incremental_ffdec_error(self: IncrementalExportSpec) -> None:
+        self.write_swf(b"frame", (2, b"old"), (4, b"same"))
+        self.mock_decompiler.export_scripts.side_effect = self.fake_export({})
+        self.compilation_manager.decompile(self.swf)
+
+        self.write_swf(b"frame", (2, b"new"), (4, b"same"))
+        self.mock_decompiler.export_scripts.side_effect = [False, True]
+        self.compilation_manager.decompile(self.swf)
+
+        assert self.mock_decompiler.export_scripts.call_count == 3
+        assert self.mock_decompiler.export_scripts.call_args.kwargs == {}
+
+    def test_decompile_incremental_damaged_base(self: IncrementalExportSpec) -> None:
+        self.write_swf(b"frame", (2, b"old"), (4, b"same"))
+        self.mock_decompiler.export_scripts.side_effect = self.fake_export({
+            "frame_1": "frame", "DefineSprite_2": "old", "DefineSprite_4": "same",
+        })
+        base = self.compilation_manager.decompile(self.swf)
+        (base / "scripts" / "frame_1" / "DoAction.as").write_text("damaged", encoding="utf-8")
+
+        self.write_swf(b"frame", (2, b"new"), (4, b"same"))
+        self.compilation_manager.decompile(self.swf)
+
+        assert self.mock_decompiler.export_scripts.call_args.kwargs == {}
+
+    def test_export_selected(self: IncrementalExportSpec) -> None:
+        self.write_swf(b"frame", (2, b"sprite"), (4, b"other"))
+        self.mock_decompiler.export_scripts.side_effect = self.fake_export({
+            "frame_1": "frame", "DefineSprite_2_hero": "sprite", "DefineSprite_4": "other",
+        })
+        output = Path(self.temp_dir.name, "run", "selected")
+
+        assert self.compilation_manager.export_selected(
+            self.swf, output, {"frame_1/DoAction.as", "DefineSprite_2_hero/DoAction.as"},
+        )
+
+        # Only the patched frames and sprites are exported, and nothing is cached
+        assert self.read_scripts(output) == {"frame_1": "frame", "DefineSprite_2_hero": "sprite"}
+        assert sorted(
+            str(call.kwargs) for call in self.mock_decompiler.export_scripts.call_args_list
+        ) == ["{'character_ids': [2]}", "{'frames': [1]}"]
+        assert not self.compilation_manager.cache.list_entries()
+
+        # Each selection is exported into its own folder, then merged
+        assert [path.name for path in output.parent.iterdir()] == ["selected"]
+
+    def test_export_selected_cached(self: IncrementalExportSpec) -> None:
+        self.write_swf(b"frame")
+        self.mock_decompiler.export_scripts.side_effect = self.fake_export({"frame_1": "frame"})
+        self.compilation_manager.decompile(self.swf)
+        self.mock_decompiler.export_scripts.reset_mock()
+
+        output = Path(self.temp_dir.name, "selected")
+
+        # The whole decompilation is already there, so it's used instead
+        assert not self.compilation_manager.export_selected(
+            self.swf, output, {"frame_1/DoAction.as"},
+        )
+        assert self.compilation_manager.export_selected(
+            self.swf, output, {"frame_1/DoAction.as"}, drop_cache=True,
+        )
+        assert self.mock_decompiler.export_scripts.call_count == 1
+
+    def test_export_selected_not_selectable(self: IncrementalExportSpec) -> None:
+        self.write_swf(b"frame")
+        output = Path(self.temp_dir.name, "selected")
+
+        # AS2 classes can't be selected
+        assert not self.compilation_manager.export_selected(
+            self.swf, output, {"frame_1/DoAction.as", "__Packages/Hero.as"},
+        )
+        assert not self.compilation_manager.export_selected(self.swf, output, {"Main.as"})
+        assert not self.compilation_manager.export_selected(
+            Path(self.temp_dir.name, "missing.swf"), output, {"frame_1/DoAction.as"},
+        )
+
+        self.mock_decompiler.export_scripts.assert_not_called()
+        assert not output.exists()
+
+    def test_export_selected_ffdec_error(self: IncrementalExportSpec) -> None:
+        self.write_swf(b"frame")
+        self.mock_decompiler.export_scripts.return_value = False
+        output = Path(self.temp_dir.name, "selected")
+
+        assert not self.compilation_manager.export_selected(
+            self.swf, output, {"frame_1/DoAction.as"},
+        )
+        assert not output.exists()
+
+    def test_decompile_sharded(self: IncrementalExportSpec) -> None:
+        self.write_swf(b"frame", (2, b"two"), (3, b"three"), (10, b"ten"))
+        self.mock_decompiler.export_scripts.side_effect = self.fake_export({
+            "frame_1": "frame", "DefineSprite_2": "two",
+            "DefineSprite_3_name": "three", "DefineSprite_10": "ten",
+        })
+        self.compilation_manager.export_jobs = 2
+
+        export = self.compilation_manager.decompile(self.swf)
+
+        # Each shard is exported on its own, and merged into a single cache entry
+        assert sorted(
+            str(call.kwargs) for call in self.mock_decompiler.export_scripts.call_args_list
+        ) == ["{'character_ids': [10]}", "{'character_ids': [2, 3]}", "{'frames': [1]}"]
+        assert self.read_scripts(export) == {
+            "frame_1": "frame", "DefineSprite_2": "two",
+            "DefineSprite_3_name": "three", "DefineSprite_10": "ten",
+        }
+        assert not list(export.parent.glob("export.shard*"))
+
+        manifest = json.loads((export.parent / "manifest.json").read_text(encoding="utf-8"))
+        assert len(manifest) == 4
+
+    def test_decompile_sharded_unselectable(self: IncrementalExportSpec) -> None:
+        self.swf.write_bytes(make_swf(
+            do_action(b"frame"), make_tag(1), make_sprite(2, do_action(b"two")),
+            make_tag(59, b"\2\0class"),
+        ))
+        self.compilation_manager.export_jobs = 2
+
+        self.compilation_manager.decompile(self.swf)
+
+        # AS2 classes can't be selected, so the SWF is exported in one go
+        self.mock_decompiler.export_scripts.assert_called_once_with(self.swf, ANY)
+
+    def test_decompile_sharded_failure(self: IncrementalExportSpec) -> None:
+        self.write_swf(b"frame", (2, b"two"))
+        self.mock_decompiler.export_scripts.side_effect = self.fake_export({"frame_1": "frame"})
+        self.compilation_manager.export_jobs = 4
+
+        export = self.compilation_manager.decompile(self.swf)
+
+        # FFDec didn't export a shard, so the SWF is exported again in one go
+        assert self.mock_decompiler.export_scripts.call_count == 3
+        assert self.mock_decompiler.export_scripts.call_args.kwargs == {}
+        assert self.read_scripts(export) == {"frame_1": "frame"}
+        assert not list(export.parent.glob("export.shard*"))
+
+    @patch('flash_patcher.compile.compilation.has_unselectable_scripts')
+    def test_decompile_sharded_unreadable(
+        self: IncrementalExportSpec,
+        mock_has_unselectable_scripts: MagicMock,
+    ) -> None:
+        self.write_swf(b"frame", (2, b"two"))
+        mock_has_unselectable_scripts.side_effect = OSError("swf was removed")
+        self.compilation_manager.export_jobs = 2
+
+        self.compilation_manager.decompile(self.swf)
+
+        self.mock_decompiler.export_scripts.assert_called_once_with(self.swf, ANY)
+
+def test_get_shards() -> None:
+    units = ["DefineSprite_10", "frame_2", "DefineSprite_9", "frame_1", "DefineButton2_4"]
+
+    # Shards are ranges of IDs, in numeric order
+    assert get_shards(units, 2) == [
+        {"DefineButton2_4", "DefineSprite_9"},
+        {"DefineSprite_10", "frame_1", "frame_2"},
+    ]
+    assert get_shards(units, 8) == [
+        {"DefineButton2_4"}, {"DefineSprite_9"}, {"DefineSprite_10"}, {"frame_1"}, {"frame_2"},
+    ]
@@ -1,12 +1,18 @@
 from __future__ import annotations
 
+import json
+import os
 from pathlib import Path
+from threading import Lock
+from tempfile import TemporaryDirectory
 from unittest import TestCase
-from unittest.mock import MagicMock, patch
+from unittest.mock import ANY, MagicMock, patch
 
 from pytest import raises
 
-from flash_patcher.compile.ffdec import FFDecInterface
+from flash_patcher.compile.ffdec import \
+    ARGS_FLATPAK, FFDecInterface, format_ranges, get_install_stamp, parse_ffdec_command
+from flash_patcher.compile.ffdec_telemetry import FFDecCall
 
 class FFDecInterfaceSpec (TestCase):
 
@@ -14,6 +20,8 @@ class FFDecInterfaceSpec (TestCase):
     interface              : FFDecInterface
     subprocess_mock_success: MagicMock
     subprocess_mock_failure: MagicMock
+    call_success           : FFDecCall
+    call_failure           : FFDecCall
 
     def __init__(self: FFDecInterfaceSpec, methodName: str = "runTest") -> None:
         super().__init__(methodName)
@@ -25,6 +33,9 @@ class FFDecInterfaceSpec (TestCase):
         self.subprocess_mock_success = MagicMock(returncode=0, stdout='', stderr='')
         self.subprocess_mock_failure = MagicMock(returncode=1, stdout='', stderr='Error!')
 
+        self.call_success = FFDecCall([], "process", 0, 0.1)
+        self.call_failure = FFDecCall([], "process", 1, 0.1, output=["Error!"])
+
     def test_sanity(self: FFDecInterfaceSpec) -> None:
         assert True
 
@@ -40,6 +51,7 @@ class FFDecInterfaceSpec (TestCase):
         assert self.interface.path == self.ffdec_path
         assert self.interface.args == ["--derppotato"]
 
+    @patch('flash_patcher.compile.ffdec.load_ffdec_config', MagicMock(return_value=None))
     @patch('flash_patcher.compile.ffdec.FFDecInterface.install_ffdec')
     def test_automatic_installation_complete_failure_not_found(
         self: FFDecInterfaceSpec,
@@ -113,165 +125,576 @@ class FFDecInterfaceSpec (TestCase):
         assert mock_path_exists.call_count == 2
         assert not success
 
-    # FFDec calling tests
+    # FFDec version tests
     @patch('subprocess.run')
-    def test_dump_xml_success(self: FFDecInterfaceSpec, mock_subprocess_run: MagicMock) -> None:
+    def test_get_version_success(
+        self: FFDecInterfaceSpec,
+        mock_subprocess_run: MagicMock,
+    ) -> None:
+        mock_subprocess_run.return_value = MagicMock(
+            returncode=0,
+            stdout="JPEXS Free Flash Decompiler v.20.1.0\n-------\nCommand line parameters:",
+        )
+
+        assert self.interface.get_version() == "20.1.0"
+        assert self.interface.get_version() == "20.1.0"
+
+        mock_subprocess_run.assert_called_once_with([
+            self.ffdec_path,
+            '--derppotato',
+            '-help',
+        ], stdout=-1, stderr=-3, text=True, check=False)
+
+    @patch('subprocess.run')
+    def test_get_version_unknown(
+        self: FFDecInterfaceSpec,
+        mock_subprocess_run: MagicMock,
+    ) -> None:
+        mock_subprocess_run.return_value = self.subprocess_mock_failure
+
+        assert self.interface.get_version() == "unknown"
+
+    # FFDec calling tests
+    @patch('flash_patcher.compile.ffdec.run_process')
+    def test_dump_xml_success(self: FFDecInterfaceSpec, mock_run_process: MagicMock) -> None:
         input_swf = Path("./.Patcher-Temp/base.swf")
         output = Path("./folder")
 
-        mock_subprocess_run.return_value = self.subprocess_mock_success
+        mock_run_process.return_value = self.call_success
 
         success = self.interface.dump_xml(input_swf, output)
 
-        mock_subprocess_run.assert_called_once_with([
+        mock_run_process.assert_called_once_with([
             self.ffdec_path,
             '--derppotato',
             '-swf2xml',
             input_swf,
             output,
-        ], stdout=-3, stderr=-3, check=False)
+        ], quiet=True, group=ANY)
         assert success
 
-    @patch('subprocess.run')
-    def test_dump_xml_failure(self: FFDecInterfaceSpec, mock_subprocess_run: MagicMock) -> None:
+    @patch('flash_patcher.compile.ffdec.run_process')
+    def test_dump_xml_failure(self: FFDecInterfaceSpec, mock_run_process: MagicMock) -> None:
         input_swf = Path("./.Patcher-Temp/base.swf")
         output = Path("./folder")
 
-        mock_subprocess_run.return_value = self.subprocess_mock_failure
+        mock_run_process.return_value = self.call_failure
 
         success = self.interface.dump_xml(input_swf, output)
 
-        mock_subprocess_run.assert_called_once_with([
+        mock_run_process.assert_called_once_with([
             self.ffdec_path,
             '--derppotato',
             '-swf2xml',
             input_swf,
             output,
-        ], stdout=-3, stderr=-3, check=False)
+        ], quiet=True, group=ANY)
         assert not success
 
-    @patch('subprocess.run')
-    def test_rebuild_xml_success(self: FFDecInterfaceSpec, mock_subprocess_run: MagicMock) -> None:
+    @patch('flash_patcher.compile.ffdec.run_process')
+    def test_rebuild_xml_success(self: FFDecInterfaceSpec, mock_run_process: MagicMock) -> None:
         input_folder = Path("./.Patcher-Temp/base")
         output = Path("./folder/file.swf")
 
-        mock_subprocess_run.return_value = self.subprocess_mock_success
+        mock_run_process.return_value = self.call_success
 
         success = self.interface.rebuild_xml(input_folder, output)
 
-        mock_subprocess_run.assert_called_once_with([
+        mock_run_process.assert_called_once_with([
             self.ffdec_path,
             '--derppotato',
             '-xml2swf',
             input_folder,
             output,
-        ], stdout=-3, check=False)
+        ], quiet=False, group=ANY)
         assert success
 
-    @patch('subprocess.run')
-    def test_rebuild_xml_failure(self: FFDecInterfaceSpec, mock_subprocess_run: MagicMock) -> None:
+    @patch('flash_patcher.compile.ffdec.run_process')
+    def test_rebuild_xml_failure(self: FFDecInterfaceSpec, mock_run_process: MagicMock) -> None:
         input_folder = Path("./.Patcher-Temp/base")
         output = Path("./folder/file.swf")
 
-        mock_subprocess_run.return_value = self.subprocess_mock_failure
+        mock_run_process.return_value = self.call_failure
 
         success = self.interface.rebuild_xml(input_folder, output)
 
-        mock_subprocess_run.assert_called_once_with([
+        mock_run_process.assert_called_once_with([
             self.ffdec_path,
             '--derppotato',
             '-xml2swf',
             input_folder,
             output,
-        ], stdout=-3, check=False)
+        ], quiet=False, group=ANY)
         assert not success
 
-    @patch('subprocess.run')
+    @patch('flash_patcher.compile.ffdec.run_process')
     def test_export_scripts_success(
         self: FFDecInterfaceSpec,
-        mock_subprocess_run: MagicMock
+        mock_run_process: MagicMock
     ) -> None:
         input_file = Path("base.swf")
         output = Path("./folder")
 
-        mock_subprocess_run.return_value = self.subprocess_mock_success
+        mock_run_process.return_value = self.call_success
 
         success = self.interface.export_scripts(input_file, output)
 
-        mock_subprocess_run.assert_called_once_with([
+        mock_run_process.assert_called_once_with([
             self.ffdec_path,
             '--derppotato',
             '-export',
             'script',
             output,
             input_file,
-        ], stdout=-3, stderr=-3, check=False)
+        ], quiet=True, group=ANY)
         assert success
 
-    @patch('subprocess.run')
+    @patch('flash_patcher.compile.ffdec.run_process')
+    def test_export_scripts_success_pcode(
+        self: FFDecInterfaceSpec,
+        mock_run_process: MagicMock
+    ) -> None:
+        interface = FFDecInterface(self.ffdec_path)
+        interface.script_format = "pcode"
+        mock_run_process.return_value = self.call_success
+
+        assert interface.export_scripts(Path("base.swf"), Path("out"))
+
+        mock_run_process.assert_called_once_with([
+            self.ffdec_path,
+            '-export',
+            'pcode',
+            Path("out"),
+            Path("base.swf"),
+        ], quiet=True, group=ANY)
+
+    @patch('flash_patcher.compile.ffdec.run_process')
+    def test_export_scripts_success_selection(
+        self: FFDecInterfaceSpec,
+        mock_run_process: MagicMock
+    ) -> None:
+        input_file = Path("base.swf")
+        output = Path("./folder")
+
+        mock_run_process.return_value = self.call_success
+
+        success = self.interface.export_scripts(
+            input_file, output, frames=[3, 1, 2, 7], character_ids=[12]
+        )
+
+        mock_run_process.assert_called_once_with([
+            self.ffdec_path,
+            '--derppotato',
+            '-select',
+            '1-3,7',
+            '-selectid',
+            '12',
+            '-export',
+            'script',
+            output,
+            input_file,
+        ], quiet=True, group=ANY)
+        assert success
+
+    @patch('flash_patcher.compile.ffdec.run_process')
     def test_export_scripts_failure(
         self: FFDecInterfaceSpec,
-        mock_subprocess_run: MagicMock
+        mock_run_process: MagicMock
     ) -> None:
         input_file = Path("base.swf")
         output = Path("./folder")
 
-        mock_subprocess_run.return_value = self.subprocess_mock_failure
+        mock_run_process.return_value = self.call_failure
 
         success = self.interface.export_scripts(input_file, output)
 
-        mock_subprocess_run.assert_called_once_with([
+        mock_run_process.assert_called_once_with([
             self.ffdec_path,
             '--derppotato',
             '-export',
             'script',
             output,
             input_file,
-        ], stdout=-3, stderr=-3, check=False)
+        ], quiet=True, group=ANY)
         assert not success
 
-    @patch('subprocess.run')
+    @patch('flash_patcher.compile.ffdec.run_process')
     def test_recompile_data_success(
         self: FFDecInterfaceSpec,
-        mock_subprocess_run: MagicMock
+        mock_run_process: MagicMock
     ) -> None:
         input_folder = Path("./.Patcher-Temp/mod")
         swf = Path("test.swf")
         output = Path("./folder")
 
-        mock_subprocess_run.return_value = self.subprocess_mock_success
+        mock_run_process.return_value = self.call_success
 
         success = self.interface.recompile_data("Script", input_folder, swf, output)
 
-        mock_subprocess_run.assert_called_once_with([
+        mock_run_process.assert_called_once_with([
             self.ffdec_path,
             '--derppotato',
             '-importScript',
             swf,
             output,
             input_folder,
-        ], stdout=-3, check=False)
+        ], quiet=False, group=ANY)
         assert success
 
-    @patch('subprocess.run')
+    @patch('flash_patcher.compile.ffdec.run_process')
     def test_recompile_data_failure(
         self: FFDecInterfaceSpec,
-        mock_subprocess_run: MagicMock
+        mock_run_process: MagicMock
     ) -> None:
         input_folder = Path("./.Patcher-Temp/mod")
         swf = Path("test.swf")
         output = Path("./folder")
 
-        mock_subprocess_run.return_value = self.subprocess_mock_failure
+        mock_run_process.return_value = self.call_failure
 
         success = self.interface.recompile_data("Script", input_folder, swf, output)
 
-        mock_subprocess_run.assert_called_once_with([
+        mock_run_process.assert_called_once_with([
             self.ffdec_path,
             '--derppotato',
             '-importScript',
             swf,
             output,
             input_folder,
-        ], stdout=-3, check=False)
+        ], quiet=False, group=ANY)
         assert not success
+
+    @patch('flash_patcher.compile.ffdec.run_process')
+    def test_run_command_profile(
+        self: FFDecInterfaceSpec,
+        mock_run_process: MagicMock,
+    ) -> None:
+        interface = FFDecInterface(self.ffdec_path)
+        interface.profile = "fast-export"
+        worker = MagicMock()
+        worker.run.return_value = None
+        interface.worker = worker
+        mock_run_process.return_value = self.call_success
+
+        assert interface.dump_xml(Path("test.swf"), Path("out"))
+
+        # The profile applies to every command, in the worker or not
+        config = [
+            "-config",
+            "parallelSpeedUp=true,autoDeobfuscate=false,decompilationTimeoutSingleMethod=5",
+        ]
+        assert mock_run_process.call_args.args[0] == \
+            [self.ffdec_path, *config, "-swf2xml", Path("test.swf"), Path("out")]
+        worker.run.assert_called_once_with(
+            [*config, "-swf2xml", Path("test.swf"), Path("out")], ANY
+        )
+        assert not FFDecInterface(self.ffdec_path).get_profile_args()
+
+    # FFDec worker tests
+    @patch('flash_patcher.compile.ffdec.find_ffdec_jar', MagicMock(return_value=None))
+    def test_start_worker_no_jar(self: FFDecInterfaceSpec) -> None:
+        interface = FFDecInterface(self.ffdec_path)
+
+        assert not interface.start_worker()
+        assert interface.worker is None
+
+    @patch('flash_patcher.compile.ffdec.find_java', MagicMock(return_value="/usr/bin/java"))
+    @patch('flash_patcher.compile.ffdec.find_ffdec_jar', MagicMock(return_value=Path("ffdec.jar")))
+    @patch('flash_patcher.compile.ffdec.FFDecWorker')
+    def test_start_worker_success(
+        self: FFDecInterfaceSpec,
+        mock_worker: MagicMock,
+    ) -> None:
+        interface = FFDecInterface(self.ffdec_path)
+
+        assert interface.start_worker()
+        mock_worker.assert_called_once_with("/usr/bin/java", Path("ffdec.jar"), [])
+        mock_worker.return_value.spawn.assert_called_once_with()
+
+        interface.stop_worker()
+        interface.stop_worker()
+
+        mock_worker.return_value.stop.assert_called_once_with()
+        assert interface.worker is None
+
+    @patch('flash_patcher.compile.ffdec.find_java', MagicMock(return_value="/usr/bin/java"))
+    @patch('flash_patcher.compile.ffdec.find_ffdec_jar', MagicMock(return_value=Path("ffdec.jar")))
+    @patch('flash_patcher.compile.ffdec.FFDecWorker')
+    def test_start_worker_failure(
+        self: FFDecInterfaceSpec,
+        mock_worker: MagicMock,
+    ) -> None:
+        interface = FFDecInterface(self.ffdec_path)
+        mock_worker.return_value.spawn.side_effect = PermissionError("no java")
+
+        assert not interface.start_worker()
+        assert interface.worker is None
+
+    @patch('flash_patcher.compile.ffdec.run_process')
+    def test_run_command_worker(
+        self: FFDecInterfaceSpec,
+        mock_run_process: MagicMock,
+    ) -> None:
+        interface = FFDecInterface(self.ffdec_path)
+        interface.worker = MagicMock()
+        interface.worker.run.side_effect = [0, 1]
+
+        assert interface.dump_xml(Path("test.swf"), Path("out"))
+        assert not interface.rebuild_xml(Path("out"), Path("test.swf"))
+
+        # The worker runs its commands as part of the same process group
+        interface.worker.run.assert_any_call(
+            ["-swf2xml", Path("test.swf"), Path("out")], interface.processes
+        )
+        mock_run_process.assert_not_called()
+
+        # Commands run in the worker are recorded too
+        assert [call.runner for call in interface.calls] == ["worker", "worker"]
+        assert interface.calls[0].command == ["-swf2xml", "test.swf", "out"]
+        assert interface.calls[1].status == 1
+
+    @patch('flash_patcher.compile.ffdec.run_process')
+    def test_run_command_worker_busy(
+        self: FFDecInterfaceSpec,
+        mock_run_process: MagicMock,
+    ) -> None:
+        interface = FFDecInterface(self.ffdec_path)
+        interface.worker = MagicMock(lock=Lock())
+        mock_run_process.return_value = self.call_success
+
+        # Another command is running in the worker, so FFDec runs directly
+        with interface.worker.lock:
+            assert interface.dump_xml(Path("test.swf"), Path("out"))
+
+        interface.worker.run.assert_not_called()
+        mock_run_process.assert_called_once()
+
+    @patch('flash_patcher.compile.ffdec.run_process')
+    def test_run_command_worker_unavailable(
+        self: FFDecInterfaceSpec,
+        mock_run_process: MagicMock,
+    ) -> None:
+        worker = MagicMock()
+        worker.run.return_value = None
+
+        self.interface.worker = worker
+        mock_run_process.return_value = self.call_success
+
+        try:
+            assert self.interface.dump_xml(Path("test.swf"), Path("out"))
+        finally:
+            self.interface.worker = None
+
+        # FFDec runs directly from then on
+        worker.stop.assert_called_once_with()
+        mock_run_process.assert_called_once_with([
+            self.ffdec_path,
+            '--derppotato',
+            '-swf2xml',
+            Path("test.swf"),
+            Path("out"),
+        ], quiet=True, group=ANY)
+
+    # Direct Java launch tests
+    @patch('flash_patcher.compile.ffdec.find_java', MagicMock(return_value=None))
+    def test_use_java_no_java(self: FFDecInterfaceSpec) -> None:
+        interface = FFDecInterface(self.ffdec_path)
+
+        assert not interface.use_java()
+        assert interface.java is None
+
+    @patch('flash_patcher.compile.ffdec.find_java', MagicMock(return_value="/usr/bin/java"))
+    @patch('flash_patcher.compile.ffdec.find_ffdec_jar', MagicMock(return_value=Path("ffdec.jar")))
+    @patch('flash_patcher.compile.ffdec.JavaLauncher', MagicMock(side_effect=PermissionError()))
+    def test_use_java_failure(self: FFDecInterfaceSpec) -> None:
+        interface = FFDecInterface(self.ffdec_path)
+
+        assert not interface.use_java()
+        assert interface.java is None
+
+    @patch('flash_patcher.compile.ffdec.run_process')
+    @patch('flash_patcher.compile.ffdec.FFDecWorker')
+    @patch('flash_patcher.compile.ffdec.find_java', MagicMock(return_value="/usr/bin/java"))
+    @patch('flash_patcher.compile.ffdec.find_ffdec_jar', MagicMock(return_value=Path("ffdec.jar")))
+    def test_use_java_success(
+        self: FFDecInterfaceSpec,
+        mock_worker: MagicMock,
+        mock_run_process: MagicMock,
+    ) -> None:
+        interface = FFDecInterface(self.ffdec_path, ["--derppotato"])
+        mock_run_process.return_value = self.call_success
+
+        with TemporaryDirectory() as temp_dir, \
+            patch.dict('os.environ', {"XDG_CACHE_HOME": temp_dir}):
+
+            assert interface.use_java()
+            assert interface.dump_xml(Path("test.swf"), Path("out"))
+
+        # The launcher script and its arguments are skipped
+        command = mock_run_process.call_args.args[0]
+        assert command[0] == "/usr/bin/java"
+        assert "-XX:+AutoCreateSharedArchive" in command
+        assert command[-5:] == ["-jar", "ffdec.jar", "-swf2xml", Path("test.swf"), Path("out")]
+        assert "--derppotato" not in command
+
+        # The worker shares the JVM options
+        assert interface.start_worker(Path("test.swf"))
+        mock_worker.assert_called_once_with(
+            "/usr/bin/java",
+            Path("ffdec.jar"),
+            interface.java.get_jvm_options(Path("test.swf")),
+        )
+
+    @patch('flash_patcher.compile.ffdec.run_process')
+    @patch('flash_patcher.compile.ffdec.find_java', MagicMock(return_value="/usr/bin/java"))
+    @patch('flash_patcher.compile.ffdec.find_ffdec_jar', MagicMock(return_value=Path("ffdec.jar")))
+    def test_use_java_rebuild_xml_heap(
+        self: FFDecInterfaceSpec,
+        mock_run_process: MagicMock,
+    ) -> None:
+        interface = FFDecInterface(self.ffdec_path)
+        mock_run_process.return_value = self.call_success
+
+        with TemporaryDirectory() as temp_dir, \
+            patch.dict('os.environ', {"XDG_CACHE_HOME": temp_dir}):
+
+            swf = Path(temp_dir, "test.swf")
+
+            with open(swf, "wb") as file:
+                file.truncate(32 * 1024 ** 2)
+
+            assert interface.use_java()
+            assert interface.rebuild_xml(Path("swf.xml"), Path("out.swf"), swf=swf)
+
+        # The heap is sized from the SWF the XML was dumped from, not from the XML
+        assert "-Xmx2048m" in mock_run_process.call_args.args[0]
+
+class FFDecDetectionSpec (TestCase):
+
+    temp_dir: TemporaryDirectory
+    launcher: Path
+    config: Path
+
+    def setUp(self: FFDecDetectionSpec) -> None:
+        # pylint: disable=consider-using-with
+        self.temp_dir = TemporaryDirectory()
+        self.launcher = Path(self.temp_dir.name, "ffdec.sh")
+        self.launcher.write_text("", encoding="utf-8")
+        self.config = Path(self.temp_dir.name, "config", "ffdec.json")
+
+    def tearDown(self: FFDecDetectionSpec) -> None:
+        self.temp_dir.cleanup()
+
+    def write_config(self: FFDecDetectionSpec, stamp: list[int] | None) -> None:
+        self.config.parent.mkdir()
+        self.config.write_text(json.dumps({
+            "path": str(self.launcher),
+            "args": [],
+            "version": "20.1.0",
+            "stamp": stamp,
+        }), encoding="utf-8")
+
+    def read_config(self: FFDecDetectionSpec) -> dict:
+        return json.loads(self.config.read_text(encoding="utf-8"))
+
+    @patch('flash_patcher.compile.ffdec.FFDecInterface.install_ffdec')
+    def test_detection_saved_config(
+        self: FFDecDetectionSpec,
+        mock_install_ffdec: MagicMock,
+    ) -> None:
+        self.write_config(get_install_stamp(self.launcher, []))
+
+        interface = FFDecInterface(config_location=self.config)
+
+        # The saved install is reused without probing any location
+        mock_install_ffdec.assert_not_called()
+        assert interface.path == self.launcher
+        assert interface.args == []
+        assert interface.get_version() == "20.1.0"
+
+    @patch('subprocess.run')
+    @patch('flash_patcher.compile.ffdec.LOCATION_APT')
+    def test_detection_stale_config(
+        self: FFDecDetectionSpec,
+        mock_location_apt: MagicMock,
+        mock_subprocess_run: MagicMock,
+    ) -> None:
+        self.write_config([0])
+        mock_location_apt.exists.return_value = True
+        mock_location_apt.stat.return_value.st_mtime_ns = 5
+
+        interface = FFDecInterface(config_location=self.config)
+
+        assert interface.path == mock_location_apt
+        assert self.read_config()["stamp"] == [5]
+        assert self.read_config()["version"] is None
+
+        # The version is saved once it's detected
+        mock_subprocess_run.return_value = MagicMock(stdout="JPEXS Free Flash Decompiler v.20.1.0")
+        interface.get_version()
+
+        assert self.read_config()["version"] == "20.1.0"
+
+    @patch('subprocess.run')
+    def test_detection_unknown_version(
+        self: FFDecDetectionSpec,
+        mock_subprocess_run: MagicMock,
+    ) -> None:
+        mock_subprocess_run.return_value = MagicMock(stdout="")
+
+        with patch('flash_patcher.compile.ffdec.LOCATION_APT', self.launcher):
+            interface = FFDecInterface(config_location=self.config)
+
+        assert interface.get_version() == "unknown"
+        assert self.read_config()["version"] is None
+
+    @patch('flash_patcher.compile.ffdec.LOCATION_WOW64', Path("/nonexistent/ffdec.bat"))
+    @patch('flash_patcher.compile.ffdec.LOCATION_WINDOWS', Path("/nonexistent/ffdec.bat"))
+    @patch('flash_patcher.compile.ffdec.LOCATION_FLATPAK', Path("/nonexistent/flatpak"))
+    @patch('flash_patcher.compile.ffdec.LOCATION_APT', Path("/nonexistent/ffdec"))
+    def test_detection_removed_install(self: FFDecDetectionSpec) -> None:
+        self.write_config(get_install_stamp(self.launcher, []))
+        self.launcher.unlink()
+
+        with raises(ModuleNotFoundError):
+            FFDecInterface(config_location=self.config)
+
+    @patch('subprocess.run')
+    def test_provided_install_version(
+        self: FFDecDetectionSpec,
+        mock_subprocess_run: MagicMock,
+    ) -> None:
+        mock_subprocess_run.return_value = MagicMock(stdout="JPEXS Free Flash Decompiler v.20.1.0")
+
+        interface = FFDecInterface(self.launcher, config_location=self.config)
+        assert interface.get_version() == "20.1.0"
+
+        # The next run reuses the saved version instead of running FFDec
+        interface = FFDecInterface(self.launcher, config_location=self.config)
+        assert interface.get_version() == "20.1.0"
+        mock_subprocess_run.assert_called_once()
+
+        # Other installs, and updated ones, detect their version again
+        assert FFDecInterface(self.launcher, ["--verbose"], self.config).version is None
+
+        os.utime(self.launcher, ns=(0, 0))
+        assert FFDecInterface(self.launcher, config_location=self.config).version is None
+
+    def test_get_install_stamp_flatpak(self: FFDecDetectionSpec) -> None:
+        stamp = get_install_stamp(self.launcher, ARGS_FLATPAK)
+
+        assert len(stamp) == 3
+        assert get_install_stamp(Path(self.temp_dir.name, "missing"), []) is None
+
+    def test_parse_ffdec_command(self: FFDecDetectionSpec) -> None:
+        spaced = Path(self.temp_dir.name, "FFDec install", "ffdec.sh")
+        spaced.parent.mkdir()
+        spaced.write_text("", encoding="utf-8")
+
+        assert parse_ffdec_command(str(spaced)) == (spaced, [])
+        assert parse_ffdec_command("flatpak run 'com.jpexs.decompiler.flash'") == \
+            (Path("flatpak"), ["run", "com.jpexs.decompiler.flash"])
+
+def test_format_ranges() -> None:
+    assert format_ranges([5]) == "5"
+    assert format_ranges([4, 2, 3, 3, 9, 10, 12]) == "2-4,9-10,12"
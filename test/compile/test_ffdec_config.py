@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+import os
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+from flash_patcher.compile.ffdec_config import \
+    FFDecConfig, get_config_location, get_install_config_location, load_ffdec_config, \
+    save_ffdec_config
+
+class FFDecConfigSpec (TestCase):
+
+    temp_dir: TemporaryDirectory
+    location: Path
+
+    def setUp(self: FFDecConfigSpec) -> None:
+        # pylint: disable=consider-using-with
+        self.temp_dir = TemporaryDirectory()
+        self.location = Path(self.temp_dir.name, "flash_patcher", "ffdec.json")
+
+    def tearDown(self: FFDecConfigSpec) -> None:
+        self.temp_dir.cleanup()
+
+    def test_save_load_success(self: FFDecConfigSpec) -> None:
+        save_ffdec_config(
+            self.location,
+            FFDecConfig(Path("/usr/bin/flatpak"), ["run"], "20.1.0", [1, 0, 0]),
+        )
+
+        config = load_ffdec_config(self.location)
+
+        assert config.path == Path("/usr/bin/flatpak")
+        assert config.args == ["run"]
+        assert config.version == "20.1.0"
+        assert config.stamp == [1, 0, 0]
+
+    def test_load_missing(self: FFDecConfigSpec) -> None:
+        assert load_ffdec_config(self.location) is None
+
+    def test_load_damaged(self: FFDecConfigSpec) -> None:
+        self.location.parent.mkdir()
+        self.location.write_text('{"path": "/usr/bin/ffdec"}', encoding="utf-8")
+
+        assert load_ffdec_config(self.location) is None
+
+    @patch('os.replace')
+    def test_save_failure(self: FFDecConfigSpec, mock_replace: MagicMock) -> None:
+        mock_replace.side_effect = PermissionError("read-only home")
+
+        save_ffdec_config(self.location, FFDecConfig(Path("/usr/bin/ffdec"), [], None, [1]))
+
+        assert not any(self.location.parent.iterdir())
+
+    @patch.dict(os.environ, {"XDG_CONFIG_HOME": "/tmp/xdg"})
+    def test_get_config_location_xdg(self: FFDecConfigSpec) -> None:
+        assert get_config_location() == Path("/tmp/xdg/flash_patcher/ffdec.json")
+
+    @patch('pathlib.Path.home')
+    def test_get_config_location_default(self: FFDecConfigSpec, mock_home: MagicMock) -> None:
+        mock_home.return_value = Path("/home/user")
+
+        with patch.dict(os.environ, clear=True):
+            assert get_config_location() == Path("/home/user/.config/flash_patcher/ffdec.json")
+
+    @patch.dict(os.environ, {"XDG_CONFIG_HOME": "/tmp/xdg"})
+    def test_get_install_config_location(self: FFDecConfigSpec) -> None:
+        location = get_install_config_location(Path("/opt/ffdec/ffdec.sh"), [])
+
+        assert location.parent == Path("/tmp/xdg/flash_patcher/ffdec-installs")
+        assert location != get_install_config_location(Path("/opt/ffdec/ffdec.sh"), ["-v"])
+
+    @patch('sys.platform', "win32")
+    @patch.dict(os.environ, {"APPDATA": "/appdata"})
+    def test_get_config_location_windows(self: FFDecConfigSpec) -> None:
+        assert get_config_location() == Path("/appdata/flash_patcher/ffdec.json")
@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import os
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from unittest.mock import patch
+
+from flash_patcher.compile.ffdec_java import \
+    HEAP_MAX, HEAP_MIN, JavaLauncher, get_archive_location, get_heap_size, get_jvm_cache_dir
+
+class JavaLauncherSpec (TestCase):
+
+    temp_dir: TemporaryDirectory
+    folder: Path
+    jar: Path
+
+    def setUp(self: JavaLauncherSpec) -> None:
+        # pylint: disable=consider-using-with
+        self.temp_dir = TemporaryDirectory()
+        self.folder = Path(self.temp_dir.name)
+        self.jar = self.folder / "ffdec.jar"
+        self.jar.write_bytes(b"")
+
+    def tearDown(self: JavaLauncherSpec) -> None:
+        self.temp_dir.cleanup()
+
+    def test_get_command(self: JavaLauncherSpec) -> None:
+        with patch.dict(os.environ, {"XDG_CACHE_HOME": str(self.folder / "cache")}):
+            launcher = JavaLauncher("java", self.jar)
+
+        # The archive folder is created, and Java creates the archive itself
+        assert launcher.archive.parent.is_dir()
+        assert launcher.archive.is_relative_to(self.folder / "cache")
+
+        command = launcher.get_command()
+
+        assert command[0] == "java"
+        assert command[-2:] == ["-jar", str(self.jar)]
+        assert f"-XX:SharedArchiveFile={launcher.archive}" in command
+        assert f"-Xmx{HEAP_MIN // 1024 ** 2}m" in command
+
+        # Unknown options are ignored, so they must come first
+        assert command[1] == "-XX:+IgnoreUnrecognizedVMOptions"
+
+    def test_get_archive_location(self: JavaLauncherSpec) -> None:
+        archive = get_archive_location("java", self.jar)
+
+        assert archive == get_archive_location("java", self.jar)
+        assert archive != get_archive_location("/opt/java", self.jar)
+
+        # Updating FFDec uses a new archive
+        os.utime(self.jar, ns=(0, 0))
+        assert archive != get_archive_location("java", self.jar)
+
+    def test_get_heap_size(self: JavaLauncherSpec) -> None:
+        swf = self.folder / "test.swf"
+
+        assert get_heap_size(None) == HEAP_MIN
+        assert get_heap_size(swf) == HEAP_MIN
+
+        with open(swf, "wb") as file:
+            file.truncate(32 * 1024 ** 2)
+
+        assert HEAP_MIN < get_heap_size(swf) < HEAP_MAX
+
+        with open(swf, "wb") as file:
+            file.truncate(1024 ** 3)
+
+        assert get_heap_size(swf) == HEAP_MAX
+
+    def test_get_jvm_cache_dir(self: JavaLauncherSpec) -> None:
+        with patch.dict(os.environ, {"XDG_CACHE_HOME": str(self.folder)}):
+            assert get_jvm_cache_dir() == self.folder / "flash_patcher" / "jvm"
+
+        with patch.dict(os.environ, {"XDG_CACHE_HOME": ""}), \
+            patch('pathlib.Path.home', return_value=self.folder):
+            assert get_jvm_cache_dir() == self.folder / ".cache" / "flash_patcher" / "jvm"
+
+        with patch.dict(os.environ, {"LOCALAPPDATA": str(self.folder)}), \
+            patch('sys.platform', "win32"):
+            assert get_jvm_cache_dir() == self.folder / "flash_patcher" / "jvm"
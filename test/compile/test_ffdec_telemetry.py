@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import json
+import sys
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+from flash_patcher.compile.ffdec_telemetry import \
+    FFDecCall, OutputBuffer, run_process, save_calls, wait_process
+from flash_patcher.util.process_group import ProcessGroup
+
+class FFDecTelemetrySpec (TestCase):
+
+    def test_run_process_success(self: FFDecTelemetrySpec) -> None:
+        call = run_process([
+            sys.executable,
+            "-c",
+            "import sys; print('Exporting 1/2'); print('oops', file=sys.stderr)",
+        ])
+
+        assert call.succeeded()
+        assert call.runner == "process"
+        assert call.command[0] == sys.executable
+
+        # Both streams are captured, in order
+        assert call.output == ["Exporting 1/2", "oops"]
+        assert call.wall_time > 0
+
+        if sys.platform != "win32":
+            assert call.cpu_time > 0
+            assert call.peak_rss > 1024 ** 2
+
+    def test_run_process_failure(self: FFDecTelemetrySpec) -> None:
+        command = [sys.executable, "-c", "import sys; print('Error!'); sys.exit(3)"]
+
+        with patch('flash_patcher.compile.ffdec_telemetry.logger') as mock_logger:
+            assert run_process(command).status == 3
+            mock_logger.error.assert_not_called()
+
+            # Failures are shown unless the command is quiet
+            call = run_process(command, quiet=False)
+            mock_logger.error.assert_called_once()
+
+        assert not call.succeeded()
+        assert call.output == ["Error!"]
+
+    def test_run_process_cannot_start(self: FFDecTelemetrySpec) -> None:
+        call = run_process([Path("/nonexistent/ffdec.sh"), "-help"])
+
+        assert call.status is None
+        assert call.cpu_time is None
+        assert call.command == ["/nonexistent/ffdec.sh", "-help"]
+        assert len(call.output) == 1
+
+    def test_run_process_cancelled(self: FFDecTelemetrySpec) -> None:
+        group = ProcessGroup()
+        group.cancel()
+
+        # Once a step of the batch failed, FFDec isn't started anymore
+        call = run_process([sys.executable, "-c", ""], group=group)
+
+        assert call.status is None
+        assert call.output[0].startswith("Cancelled")
+
+    def test_wait_process_no_rusage(self: FFDecTelemetrySpec) -> None:
+        process = MagicMock()
+        process.wait.return_value = 0
+
+        with patch('flash_patcher.compile.ffdec_telemetry.os', MagicMock(spec=[])):
+            assert wait_process(process) == (0, None, None)
+
+    def test_output_buffer(self: FFDecTelemetrySpec) -> None:
+        output = OutputBuffer(head_lines=2, tail_lines=2)
+
+        for line in range(7):
+            output.add(str(line))
+
+        assert output.get_lines() == ["0", "1", "... (3 lines skipped) ...", "5", "6"]
+
+    def test_describe(self: FFDecTelemetrySpec) -> None:
+        call = FFDecCall(["ffdec", "-export", "script"], "process", 0, 1.5, 3.25, 512 * 1024 ** 2)
+
+        assert call.describe() == \
+            "ffdec -export script (process: exit 0, 1.50s, 3.25s CPU, 512 MiB peak)"
+        assert FFDecCall(["-help"], "worker", 1, 0.5).describe() == "-help (worker: exit 1, 0.50s)"
+
+    def test_save_calls(self: FFDecTelemetrySpec) -> None:
+        calls = [FFDecCall(["-help"], "worker", 0, 0.5), FFDecCall(["-x"], "process", 1, 1.0)]
+
+        with TemporaryDirectory() as temp_dir:
+            report = Path(temp_dir, "ffdec.json")
+            save_calls(report, calls)
+
+            records = json.loads(report.read_text(encoding="utf-8"))
+
+        assert [record["command"] for record in records] == [["-help"], ["-x"]]
+        assert records[1]["status"] == 1
+        assert records[0]["cpu_time"] is None
@@ -0,0 +1,217 @@
+from __future__ import annotations
+
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+from flash_patcher.compile.ffdec_worker import \
+    JAVA_OPTION_SETS, WORKER_SOURCE, FFDecWorker, find_ffdec_jar, find_java
+from flash_patcher.util.process_group import ProcessGroup
+
+# Stands in for FFDecWorker.java: "-exit <code>" exits with the given code
+FAKE_WORKER = """
+import sys, time
+
+mode = sys.argv[1]
+
+if mode == "slow":
+    time.sleep(30)
+
+print("ready " + mode, flush=True)
+
+if mode == "hang":
+    time.sleep(30)
+
+for line in sys.stdin:
+    args = line.rstrip("\\n").split("\\t")
+
+    if args[0] == "-hang":
+        time.sleep(30)
+
+    status = int(args[1]) if args[0] == "-exit" else 0
+
+    if mode == "single":
+        sys.exit(status)
+
+    print(f"status {status}", flush=True)
+"""
+
+class FFDecWorkerSpec (TestCase):
+
+    temp_dir: TemporaryDirectory
+    folder: Path
+    jar: Path
+
+    def setUp(self: FFDecWorkerSpec) -> None:
+        # pylint: disable=consider-using-with
+        self.temp_dir = TemporaryDirectory()
+        self.folder = Path(self.temp_dir.name)
+        self.jar = self.folder / "ffdec.jar"
+        self.jar.write_bytes(b"")
+
+        (self.folder / "worker.py").write_text(FAKE_WORKER, encoding="utf-8")
+
+    def tearDown(self: FFDecWorkerSpec) -> None:
+        self.temp_dir.cleanup()
+
+    def get_java(self: FFDecWorkerSpec, mode: str, allow_option: bool = True) -> str:
+        """Write a fake Java launcher, which may refuse the security manager option."""
+        java = self.folder / f"java-{mode}"
+        refuse = "" if allow_option else "case \"$1\" in -D*) exit 1;; esac\n"
+
+        worker = self.folder / "worker.py"
+        java.write_text(
+            f"#!/bin/sh\n{refuse}exec \"{sys.executable}\" \"{worker}\" {mode}\n",
+            encoding="utf-8",
+        )
+        java.chmod(0o755)
+        return str(java)
+
+    def test_run_persistent(self: FFDecWorkerSpec) -> None:
+        worker = FFDecWorker(self.get_java("persistent"), self.jar)
+        worker.spawn()
+        process = worker.process
+
+        assert worker.run(["-exit", "0"]) == 0
+        assert worker.run(["-exit", "3", self.folder]) == 3
+
+        # The same process runs every command
+        assert worker.process is process
+        assert worker.option_sets == JAVA_OPTION_SETS
+
+        worker.stop()
+        worker.stop()
+
+        assert worker.process is None
+        assert process.returncode == 0
+
+    def test_run_cancelled(self: FFDecWorkerSpec) -> None:
+        worker = FFDecWorker(self.get_java("persistent"), self.jar)
+        group = ProcessGroup(1)
+
+        with group.batch(), ThreadPoolExecutor(1) as executor:
+            hung = executor.submit(worker.run, ["-hang"], group)
+
+            # The command holds the only slot while it runs
+            deadline = time.monotonic() + 10
+            while not group.running and time.monotonic() < deadline:
+                time.sleep(0.01)
+
+            process = worker.process
+            group.cancel()
+
+            assert hung.result() != 0
+
+        # The killed process is replaced, and runs the next commands
+        assert worker.process is not process
+        assert worker.run(["-exit", "0"], group) == 0
+        worker.stop()
+
+    @patch('flash_patcher.compile.ffdec_worker.STOP_TIMEOUT', 0.1)
+    @patch('flash_patcher.compile.ffdec_worker.READY_TIMEOUT', 0.1)
+    def test_run_ready_timeout(self: FFDecWorkerSpec) -> None:
+        worker = FFDecWorker(self.get_java("slow"), self.jar)
+        worker.spawn()
+        process = worker.process
+
+        # A worker that never loads FFDec is stopped, so FFDec is run directly instead
+        assert worker.run(["-exit", "0"]) is None
+        assert worker.process is None
+        assert process.returncode is not None
+
+    @patch('flash_patcher.compile.ffdec_worker.STOP_TIMEOUT', 0.1)
+    @patch('flash_patcher.compile.ffdec_worker.COMMAND_TIMEOUT', 0.1)
+    def test_run_command_timeout(self: FFDecWorkerSpec) -> None:
+        worker = FFDecWorker(self.get_java("persistent"), self.jar)
+        worker.spawn()
+        process = worker.process
+
+        assert worker.run(["-hang"]) is None
+        assert worker.process is None
+        assert process.returncode is not None
+
+    def test_run_single(self: FFDecWorkerSpec) -> None:
+        worker = FFDecWorker(self.get_java("single", allow_option=False), self.jar)
+
+        assert worker.run(["-exit", "2"]) == 2
+        process = worker.process
+
+        # The next process is started as soon as a command is done
+        assert worker.run(["-exit", "0"]) == 0
+        assert worker.process is not process
+        assert worker.option_sets == [[]]
+
+        worker.stop()
+
+    @patch('subprocess.Popen')
+    def test_spawn_jvm_options(self: FFDecWorkerSpec, mock_popen: MagicMock) -> None:
+        worker = FFDecWorker("java", self.jar, ["-Xmx512m"])
+        worker.spawn()
+
+        # The JVM options of FFDec come before the options of the worker
+        assert mock_popen.call_args.args[0] == \
+            ["java", "-Xmx512m", *JAVA_OPTION_SETS[0], "-cp", self.jar, WORKER_SOURCE]
+
+    def test_run_cannot_start(self: FFDecWorkerSpec) -> None:
+        java = self.folder / "java"
+        java.write_text("#!/bin/sh\nexit 1\n", encoding="utf-8")
+        java.chmod(0o755)
+
+        worker = FFDecWorker(str(java), self.jar)
+
+        assert worker.run(["-help"]) is None
+        assert worker.run(["-help"]) is None
+        assert not worker.option_sets
+
+    def test_run_no_java(self: FFDecWorkerSpec) -> None:
+        worker = FFDecWorker(str(self.folder / "missing"), self.jar)
+
+        assert worker.run(["-help"]) is None
+        assert worker.process is None
+
+    def test_run_invalid_argument(self: FFDecWorkerSpec) -> None:
+        worker = FFDecWorker(self.get_java("persistent"), self.jar)
+
+        # Arguments are sent on a single line, separated by tabs
+        assert worker.run(["-export", "script\tas"]) is None
+        assert worker.process is None
+
+    @patch('flash_patcher.compile.ffdec_worker.STOP_TIMEOUT', 0.1)
+    def test_stop_unresponsive(self: FFDecWorkerSpec) -> None:
+        worker = FFDecWorker(self.get_java("hang"), self.jar)
+        worker.spawn()
+        process = worker.process
+
+        assert worker.wait_ready()
+        worker.stop()
+
+        assert process.returncode is not None
+
+    def test_find_ffdec_jar_success(self: FFDecWorkerSpec) -> None:
+        launcher = self.folder / "ffdec.sh"
+        launcher.write_text("", encoding="utf-8")
+        (self.folder / "bin").mkdir()
+        (self.folder / "bin" / "ffdec").symlink_to(launcher)
+
+        # Links to the launcher are followed
+        assert find_ffdec_jar(self.folder / "bin" / "ffdec") == self.jar.resolve()
+
+        self.jar.unlink()
+        assert find_ffdec_jar(launcher) is None
+
+    def test_find_java_java_home(self: FFDecWorkerSpec) -> None:
+        (self.folder / "bin").mkdir()
+        java = self.get_java("persistent")
+        os.rename(java, self.folder / "bin" / "java")
+
+        with patch.dict(os.environ, {"JAVA_HOME": str(self.folder)}):
+            assert find_java() == str(self.folder / "bin" / "java")
+
+        with patch.dict(os.environ, {"JAVA_HOME": str(self.folder / "missing")}), \
+            patch('shutil.which', side_effect=[None, "/usr/bin/java"]):
+            assert find_java() == "/usr/bin/java"
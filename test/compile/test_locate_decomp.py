@@ -1,8 +1,15 @@
 from __future__ import annotations
 
+import os
+import time
 from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
 
-from flash_patcher.compile.locate_decomp import get_decomp_locations
+from pytest import raises
+
+from flash_patcher.compile.locate_decomp import \
+    RUN_FOLDER_MAX_AGE, RunFolder, get_decomp_locations, prune_run_folders
 
 def test_locate_decomp_success_normal() -> None:
     decomp, decomp_with_scripts = get_decomp_locations(False)
@@ -15,3 +22,79 @@ def test_locate_decomp_success_xml() -> None:
 
     assert decomp == Path("./.Patcher-Temp/swf.xml")
     assert decomp_with_scripts == Path("./.Patcher-Temp/")
+
+def test_locate_decomp_success_run_folder() -> None:
+    decomp, decomp_with_scripts = get_decomp_locations(False, Path("/dev/shm/run-1"))
+
+    assert decomp == Path("/dev/shm/run-1/mod")
+    assert decomp_with_scripts == Path("/dev/shm/run-1/mod/scripts")
+
+def test_run_folder_success() -> None:
+    with TemporaryDirectory() as temp_dir:
+        workspace = Path(temp_dir, "workspace")
+
+        with RunFolder(workspace) as first, RunFolder(workspace) as second:
+            # Runs started at the same time get their own folders
+            assert first != second
+            assert first.parent == workspace
+            assert first.is_dir()
+
+            (first / "mod").mkdir()
+
+        assert not any(workspace.iterdir())
+
+def test_run_folder_failure_kept() -> None:
+    with TemporaryDirectory() as temp_dir:
+        with raises(ValueError):
+            with RunFolder(Path(temp_dir)) as run_folder:
+                raise ValueError("patch failed")
+
+        # The files of a failed run are kept for inspection
+        assert run_folder.is_dir()
+
+def test_prune_run_folders() -> None:
+    with TemporaryDirectory() as temp_dir:
+        workspace = Path(temp_dir)
+        old = time.time() - RUN_FOLDER_MAX_AGE - 60
+
+        running = workspace / f"run-{os.getpid()}-a"
+        finished = workspace / "run-1-b"
+        reused = workspace / f"run-{os.getpid()}-c"
+        other = workspace / "notes"
+
+        for location in [running, finished, reused, other]:
+            location.mkdir()
+
+        os.utime(reused, (old, old))
+        os.utime(other, (old, old))
+
+        with patch(
+            "flash_patcher.compile.locate_decomp.is_process_alive",
+            lambda pid: pid == os.getpid(),
+        ):
+            # A run that is over is kept for inspection until it's old enough
+            assert prune_run_folders(workspace, RUN_FOLDER_MAX_AGE) == [reused]
+            assert finished.is_dir()
+
+            assert prune_run_folders(workspace) == [finished]
+
+        # The folders of running runs and other files are kept
+        assert running.is_dir()
+        assert other.is_dir()
+
+def test_prune_run_folders_missing() -> None:
+    with TemporaryDirectory() as temp_dir:
+        assert not prune_run_folders(Path(temp_dir, "missing"))
+
+def test_run_folder_prunes_old_runs() -> None:
+    with TemporaryDirectory() as temp_dir:
+        workspace = Path(temp_dir)
+        old = time.time() - RUN_FOLDER_MAX_AGE - 60
+
+        failed = workspace / "run-1-a"
+        failed.mkdir()
+        os.utime(failed, (old, old))
+
+        with RunFolder(workspace):
+            # Old failed runs are removed when a new run starts
+            assert not failed.exists()
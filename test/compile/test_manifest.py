@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+import os
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from flash_patcher.compile.manifest import \
+    build_manifest, get_manifest_size, list_files, verify_manifest
+
+class ManifestSpec (TestCase):
+
+    temp_dir: TemporaryDirectory
+    payload: Path
+
+    def setUp(self: ManifestSpec) -> None:
+        # pylint: disable=consider-using-with
+        self.temp_dir = TemporaryDirectory()
+        self.payload = Path(self.temp_dir.name, "export")
+
+        (self.payload / "scripts" / "frame_1").mkdir(parents=True)
+        (self.payload / "scripts" / "frame_1" / "DoAction.as").write_text("abc")
+        (self.payload / "scripts" / "DoAction.as").write_text("defgh")
+
+    def tearDown(self: ManifestSpec) -> None:
+        self.temp_dir.cleanup()
+
+    def test_list_files_folder(self: ManifestSpec) -> None:
+        assert list_files(self.payload) == [
+            "scripts/DoAction.as",
+            "scripts/frame_1/DoAction.as",
+        ]
+
+    def test_list_files_single_file(self: ManifestSpec) -> None:
+        assert list_files(self.payload / "scripts" / "DoAction.as") == ["."]
+
+    def test_build_manifest_success(self: ManifestSpec) -> None:
+        manifest = build_manifest(self.payload)
+
+        assert set(manifest) == {"scripts/DoAction.as", "scripts/frame_1/DoAction.as"}
+        assert manifest["scripts/DoAction.as"]["size"] == 5
+        assert len(manifest["scripts/DoAction.as"]["sha256"]) == 64
+        assert get_manifest_size(manifest) == 8
+
+    def test_verify_manifest_intact(self: ManifestSpec) -> None:
+        manifest = build_manifest(self.payload)
+
+        assert not verify_manifest(self.payload, manifest)
+
+    def test_verify_manifest_single_file(self: ManifestSpec) -> None:
+        file = self.payload / "scripts" / "DoAction.as"
+        manifest = build_manifest(file)
+
+        assert not verify_manifest(file, manifest)
+
+        file.write_text("12345")
+        assert verify_manifest(file, manifest) == ["."]
+
+    def test_verify_manifest_damaged(self: ManifestSpec) -> None:
+        manifest = build_manifest(self.payload)
+
+        (self.payload / "scripts" / "frame_1" / "DoAction.as").unlink()
+        (self.payload / "scripts" / "DoAction.as").write_text("xyz")
+
+        assert verify_manifest(self.payload, manifest) == [
+            "scripts/DoAction.as",
+            "scripts/frame_1/DoAction.as",
+        ]
+
+    def test_verify_manifest_same_size_new_content(self: ManifestSpec) -> None:
+        manifest = build_manifest(self.payload)
+        file = self.payload / "scripts" / "DoAction.as"
+
+        file.write_text("HGFED")
+        os.utime(file, ns=(1, 1))
+
+        assert verify_manifest(self.payload, manifest) == ["scripts/DoAction.as"]
@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import sqlite3
+from contextlib import closing
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from flash_patcher.compile.packed_scripts import pack_folder, PackedScripts
+
+class PackedScriptsSpec (TestCase):
+
+    temp_dir: TemporaryDirectory
+    export: Path
+    database: Path
+
+    def setUp(self: PackedScriptsSpec) -> None:
+        # pylint: disable=consider-using-with
+        self.temp_dir = TemporaryDirectory()
+        self.export = Path(self.temp_dir.name, "export")
+        self.database = Path(self.temp_dir.name, "scripts.db")
+
+        (self.export / "scripts" / "frame_1").mkdir(parents=True)
+        (self.export / "scripts" / "frame_1" / "DoAction.as").write_bytes(b"trace(1);\n" * 100)
+        (self.export / "scripts" / "DefineSprite_2.as").write_bytes(b"x\r\n")
+
+    def tearDown(self: PackedScriptsSpec) -> None:
+        self.temp_dir.cleanup()
+
+    def get_compressed_flags(self: PackedScriptsSpec) -> dict[str, int]:
+        with closing(sqlite3.connect(self.database)) as database:
+            return dict(database.execute("SELECT path, compressed FROM scripts"))
+
+    def test_pack_folder_success(self: PackedScriptsSpec) -> None:
+        assert pack_folder(self.export, self.database) == 2
+
+        assert PackedScripts(self.database).list_scripts() == [
+            "scripts/DefineSprite_2.as",
+            "scripts/frame_1/DoAction.as",
+        ]
+        assert set(self.get_compressed_flags().values()) == {0}
+
+    def test_pack_folder_compressed(self: PackedScriptsSpec) -> None:
+        pack_folder(self.export, self.database, compress=True)
+
+        # Files that don't shrink when compressed are stored as they are
+        assert self.get_compressed_flags() == {
+            "scripts/DefineSprite_2.as": 0,
+            "scripts/frame_1/DoAction.as": 1,
+        }
+
+        packed = PackedScripts(self.database)
+        assert packed.read("scripts/frame_1/DoAction.as") == b"trace(1);\n" * 100
+        assert packed.read("scripts/DefineSprite_2.as") == b"x\r\n"
+
+    def test_read_missing(self: PackedScriptsSpec) -> None:
+        pack_folder(self.export, self.database)
+
+        assert PackedScripts(self.database).read("scripts/DoAction.as") is None
+
+    def test_extract_success(self: PackedScriptsSpec) -> None:
+        pack_folder(self.export, self.database, compress=True)
+        dest = Path(self.temp_dir.name, "mod")
+
+        assert PackedScripts(self.database).extract("scripts/frame_1/DoAction.as", dest)
+
+        assert (dest / "scripts" / "frame_1" / "DoAction.as").read_bytes() == \
+            b"trace(1);\n" * 100
+        assert not (dest / "scripts" / "DefineSprite_2.as").exists()
+
+    def test_extract_keeps_existing(self: PackedScriptsSpec) -> None:
+        pack_folder(self.export, self.database)
+        dest = Path(self.temp_dir.name, "mod")
+        (dest / "scripts").mkdir(parents=True)
+        (dest / "scripts" / "DefineSprite_2.as").write_bytes(b"patched")
+
+        packed = PackedScripts(self.database)
+
+        assert not packed.extract("scripts/DefineSprite_2.as", dest)
+        assert not packed.extract("scripts/Missing.as", dest)
+        assert (dest / "scripts" / "DefineSprite_2.as").read_bytes() == b"patched"
+        assert not (dest / "scripts" / "Missing.as").exists()
+
+    def test_extract_all_success(self: PackedScriptsSpec) -> None:
+        pack_folder(self.export, self.database, compress=True)
+        dest = Path(self.temp_dir.name, "mod")
+        (dest / "scripts").mkdir(parents=True)
+        (dest / "scripts" / "DefineSprite_2.as").write_bytes(b"patched")
+
+        assert PackedScripts(self.database).extract_all(dest) == 1
+
+        assert (dest / "scripts" / "frame_1" / "DoAction.as").read_bytes() == \
+            b"trace(1);\n" * 100
+        assert (dest / "scripts" / "DefineSprite_2.as").read_bytes() == b"patched"
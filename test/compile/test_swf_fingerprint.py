@@ -0,0 +1,149 @@
+from __future__ import annotations
+
+import json
+import struct
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from pytest import raises
+
+from flash_patcher.compile.swf_fingerprint import get_swf_fingerprint, get_unit_name, \
+    has_unselectable_scripts, load_fingerprint, save_fingerprint, SwfFingerprint
+
+# pylint: disable=wrong-import-order
+from test.test_util.swf_builder import make_sprite, make_swf, make_tag
+
+SHOW_FRAME = make_tag(1)
+
+def do_action(script: bytes) -> bytes:
+    return make_tag(12, script + b"\0")
+
+def place_object(flags: int) -> bytes:
+    return make_tag(26, bytes([flags]) + struct.pack("<H", 1))
+
+def button(button_id: int, action_offset: int) -> bytes:
+    return make_tag(34, struct.pack("<HBH", button_id, 0, action_offset) + b"actions")
+
+class SwfFingerprintSpec (TestCase):
+
+    temp_dir: TemporaryDirectory
+    swf: Path
+
+    def setUp(self: SwfFingerprintSpec) -> None:
+        # pylint: disable=consider-using-with
+        self.temp_dir = TemporaryDirectory()
+        self.swf = Path(self.temp_dir.name, "base.swf")
+
+    def tearDown(self: SwfFingerprintSpec) -> None:
+        self.temp_dir.cleanup()
+
+    def fingerprint(self: SwfFingerprintSpec, *tags: bytes, **kwargs: bytes) -> SwfFingerprint:
+        self.swf.write_bytes(make_swf(*tags, **kwargs))
+        return get_swf_fingerprint(self.swf)
+
+    def test_get_swf_fingerprint_units(self: SwfFingerprintSpec) -> None:
+        fingerprint = self.fingerprint(
+            do_action(b"frame1"),
+            SHOW_FRAME,
+            # Frames and sprites without scripts are not exported
+            place_object(0),
+            make_sprite(5, place_object(0), SHOW_FRAME),
+            SHOW_FRAME,
+            place_object(0x80),
+            make_sprite(6, do_action(b"sprite"), SHOW_FRAME),
+            button(7, 5),
+            button(8, 0),
+            SHOW_FRAME,
+            do_action(b"frame4"),
+        )
+
+        assert set(fingerprint.units) == \
+            {"frame_1", "frame_3", "frame_4", "DefineSprite_6", "DefineButton2_7"}
+
+    def test_get_swf_fingerprint_compressed(self: SwfFingerprintSpec) -> None:
+        tags = [do_action(b"a" * 100), SHOW_FRAME, make_sprite(2, do_action(b"b"))]
+
+        plain = self.fingerprint(*tags)
+        zlib_compressed = self.fingerprint(*tags, signature=b"CWS")
+        lzma_compressed = self.fingerprint(*tags, signature=b"ZWS")
+
+        assert plain.to_json() == zlib_compressed.to_json() == lzma_compressed.to_json()
+
+    def test_get_changed_units(self: SwfFingerprintSpec) -> None:
+        base = self.fingerprint(
+            do_action(b"frame1"),
+            SHOW_FRAME,
+            make_sprite(2, do_action(b"old")),
+            make_sprite(3, do_action(b"removed")),
+        )
+
+        changed = self.fingerprint(
+            do_action(b"frame1"),
+            SHOW_FRAME,
+            make_sprite(2, do_action(b"new")),
+            make_sprite(4, do_action(b"added")),
+        )
+
+        assert changed.get_changed_units(base) == \
+            {"DefineSprite_2", "DefineSprite_3", "DefineSprite_4"}
+        assert base.get_changed_units(base) == set()
+
+    def test_get_changed_units_shared(self: SwfFingerprintSpec) -> None:
+        base = self.fingerprint(do_action(b"frame1"), make_tag(59, b"\1\0class"))
+        changed = self.fingerprint(do_action(b"frame1"), make_tag(59, b"\1\0other"))
+
+        assert changed.get_changed_units(base) is None
+
+    def test_has_unselectable_scripts(self: SwfFingerprintSpec) -> None:
+        # File attributes and export names only change names, they're not scripts
+        self.swf.write_bytes(make_swf(
+            make_tag(69, b"\0\0\0\0"), do_action(b"frame1"), make_tag(56, b"\0\0"),
+        ))
+        assert not has_unselectable_scripts(self.swf)
+
+        # AS2 classes
+        self.swf.write_bytes(make_swf(do_action(b"frame1"), make_tag(59, b"\1\0class")))
+        assert has_unselectable_scripts(self.swf)
+
+    def test_get_swf_fingerprint_failure(self: SwfFingerprintSpec) -> None:
+        self.swf.write_bytes(b"not a swf file")
+
+        with raises(ValueError):
+            get_swf_fingerprint(self.swf)
+
+        self.swf.write_bytes(b"CWS\x08\0\0\0\0garbage")
+
+        with raises(ValueError):
+            get_swf_fingerprint(self.swf)
+
+        # The last tag claims to be longer than the file
+        self.swf.write_bytes(make_swf(do_action(b"frame1"))[:-6])
+
+        with raises(ValueError):
+            get_swf_fingerprint(self.swf)
+
+    def test_save_load_fingerprint(self: SwfFingerprintSpec) -> None:
+        location = Path(self.temp_dir.name, "fingerprint.json")
+        fingerprint = SwfFingerprint("shared", {"frame_1": "abc"})
+
+        save_fingerprint(location, fingerprint, "20.1.0")
+
+        assert load_fingerprint(location, "20.1.0").units == {"frame_1": "abc"}
+
+        # Exports made by another FFDec version can't be reused
+        assert load_fingerprint(location, "21.0.0") is None
+
+        location.write_text(json.dumps({"decompiler": "20.1.0", "format": 0}), encoding="utf-8")
+        assert load_fingerprint(location, "20.1.0") is None
+
+        location.unlink()
+        assert load_fingerprint(location, "20.1.0") is None
+
+def test_get_unit_name() -> None:
+    assert get_unit_name("frame_12") == "frame_12"
+    assert get_unit_name("DefineSprite_1058_boss2") == "DefineSprite_1058"
+    assert get_unit_name("DefineSprite_1058 boss2") == "DefineSprite_1058"
+    assert get_unit_name("DefineButton2_7") == "DefineButton2_7"
+    assert get_unit_name("__Packages") is None
+    assert get_unit_name("frame_12a") == "frame_12"
@@ -0,0 +1,169 @@
+from __future__ import annotations
+
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+from flash_patcher.compile.packed_scripts import pack_folder, PackedScripts
+from flash_patcher.compile.workspace import FolderScripts, SelectedScripts, Workspace
+from flash_patcher.util.file_io import writelines_safe
+
+class WorkspaceSpec (TestCase):
+
+    temp_dir: TemporaryDirectory
+    export: Path
+    root: Path
+
+    def setUp(self: WorkspaceSpec) -> None:
+        # pylint: disable=consider-using-with
+        self.temp_dir = TemporaryDirectory()
+        self.export = Path(self.temp_dir.name, "export")
+        self.root = Path(self.temp_dir.name, "mod")
+
+        (self.export / "scripts" / "frame_1").mkdir(parents=True)
+        (self.export / "scripts" / "frame_1" / "DoAction.as").write_bytes(b"trace(1);\n")
+        (self.export / "scripts" / "DefineSprite_2.as").write_bytes(b"x\r\n")
+
+    def tearDown(self: WorkspaceSpec) -> None:
+        self.temp_dir.cleanup()
+
+    def test_init_resets_root(self: WorkspaceSpec) -> None:
+        self.root.mkdir()
+        (self.root / "stale.as").write_bytes(b"")
+
+        Workspace(self.root, FolderScripts(self.export))
+
+        assert self.root.is_dir()
+        assert not any(self.root.iterdir())
+
+    def test_materialize_success(self: WorkspaceSpec) -> None:
+        workspace = Workspace(self.root, FolderScripts(self.export))
+        script = self.root / "scripts" / "frame_1" / "DoAction.as"
+
+        workspace.materialize(script)
+
+        # Only the touched file is in the workspace
+        assert script.read_bytes() == b"trace(1);\n"
+        assert not (self.root / "scripts" / "DefineSprite_2.as").exists()
+        assert workspace.materialized == {script}
+
+    def test_materialize_missing(self: WorkspaceSpec) -> None:
+        workspace = Workspace(self.root, FolderScripts(self.export))
+
+        workspace.materialize(self.root / "scripts" / "DoAction.as")
+        workspace.materialize(self.root / "scripts")
+
+        assert workspace.materialized == set()
+
+    def test_materialize_outside_workspace(self: WorkspaceSpec) -> None:
+        workspace = Workspace(self.root, FolderScripts(self.export))
+
+        workspace.materialize(Path("../test/testdata/DoAction1.as"))
+
+        assert workspace.materialized == set()
+
+    def test_materialize_packed(self: WorkspaceSpec) -> None:
+        database = Path(self.temp_dir.name, "scripts.db")
+        pack_folder(self.export, database)
+
+        workspace = Workspace(self.root, PackedScripts(database))
+        workspace.materialize(self.root / "scripts" / "DefineSprite_2.as")
+
+        assert (self.root / "scripts" / "DefineSprite_2.as").read_bytes() == b"x\r\n"
+        assert not (self.root / "scripts" / "frame_1").exists()
+
+    def test_write_keeps_cache(self: WorkspaceSpec) -> None:
+        workspace = Workspace(self.root, FolderScripts(self.export))
+        script = self.root / "scripts" / "frame_1" / "DoAction.as"
+
+        workspace.materialize(script)
+        writelines_safe(script, ["trace(2);\n"])
+
+        # Writing a script never changes the cached export it was linked from
+        assert script.read_bytes() == b"trace(2);\n"
+        assert (self.export / "scripts" / "frame_1" / "DoAction.as").read_bytes() == b"trace(1);\n"
+
+    @patch('os.link')
+    @patch('flash_patcher.util.file_copy.clone_file')
+    def test_materialize_copy_fallback(
+        self: WorkspaceSpec,
+        mock_clone_file: MagicMock,
+        mock_link: MagicMock,
+    ) -> None:
+        mock_clone_file.return_value = False
+        mock_link.side_effect = OSError("cross-device link")
+
+        workspace = Workspace(self.root, FolderScripts(self.export))
+        workspace.materialize(self.root / "scripts" / "DefineSprite_2.as")
+
+        assert (self.root / "scripts" / "DefineSprite_2.as").read_bytes() == b"x\r\n"
+
+    def test_materialize_all_success(self: WorkspaceSpec) -> None:
+        workspace = Workspace(self.root, FolderScripts(self.export))
+        modified = self.root / "scripts" / "frame_1" / "DoAction.as"
+        linked = self.root / "scripts" / "DefineSprite_2.as"
+
+        workspace.materialize(modified)
+        workspace.materialize(linked)
+        writelines_safe(modified, ["trace(2);\n"])
+
+        workspace.materialize_all()
+        workspace.materialize_all()
+
+        # Modified files are kept, and nothing in the workspace is shared with the cache
+        assert modified.read_bytes() == b"trace(2);\n"
+        assert linked.stat().st_nlink == 1
+        assert workspace.complete
+
+        # Python scripts may modify files in place
+        linked.write_bytes(b"y\n")
+        assert (self.export / "scripts" / "DefineSprite_2.as").read_bytes() == b"x\r\n"
+
+    def test_materialize_selected(self: WorkspaceSpec) -> None:
+        selected = Path(self.temp_dir.name, "selected")
+        (selected / "scripts" / "frame_1").mkdir(parents=True)
+        (selected / "scripts" / "frame_1" / "DoAction.as").write_bytes(b"trace(1);\n")
+
+        load_all = MagicMock(return_value=FolderScripts(self.export))
+        workspace = Workspace(self.root, SelectedScripts(FolderScripts(selected), load_all))
+
+        workspace.materialize(self.root / "scripts" / "frame_1" / "DoAction.as")
+        workspace.materialize(self.root / "scripts" / "frame_1" / "DoAction.as")
+
+        # The whole SWF is only decompiled once a file outside the selection is needed
+        load_all.assert_not_called()
+
+        workspace.materialize(self.root / "scripts" / "DefineSprite_2.as")
+        workspace.materialize_all()
+
+        load_all.assert_called_once_with()
+        assert (self.root / "scripts" / "DefineSprite_2.as").read_bytes() == b"x\r\n"
+        assert workspace.materialized == {
+            self.root / "scripts" / "frame_1" / "DoAction.as",
+            self.root / "scripts" / "DefineSprite_2.as",
+        }
+
+    def test_clean_success(self: WorkspaceSpec) -> None:
+        workspace = Workspace(self.root, FolderScripts(self.export))
+        modified = self.root / "scripts" / "frame_1" / "DoAction.as"
+        read = self.root / "scripts" / "DefineSprite_2.as"
+
+        workspace.materialize(modified)
+        workspace.materialize(read)
+
+        workspace.clean({modified})
+
+        assert modified.exists()
+        assert not read.exists()
+        assert (self.export / "scripts" / "DefineSprite_2.as").exists()
+
+    def test_clean_complete(self: WorkspaceSpec) -> None:
+        workspace = Workspace(self.root, FolderScripts(self.export))
+        modified = self.root / "scripts" / "frame_1" / "DoAction.as"
+
+        workspace.materialize_all()
+        workspace.clean({modified})
+
+        assert modified.exists()
+        assert not (self.root / "scripts" / "DefineSprite_2.as").exists()
@@ -5,14 +5,13 @@ from unittest import TestCase
 
 from pytest import raises
 
-from flash_patcher.antlr_source.PatchfileParser import PatchfileParser
-
 from flash_patcher.exception.error_manager import ErrorManager
 from flash_patcher.exception.injection import InjectionError
 from flash_patcher.inject.location.parser_injection_location import ParserInjectionLocation
+from flash_patcher.parse.commands import Location
 
 # pylint: disable=wrong-import-order
-from test.test_util.get_patch_context import get_add_patch_context
+from test.test_util.get_patch_context import get_add_patch_location
 
 class ParserInjectionLocationSpec (TestCase):
 
@@ -32,7 +31,7 @@ class ParserInjectionLocationSpec (TestCase):
     def get_valid_patch_context(
         self: ParserInjectionLocationSpec,
         context_type: str,
-    ) -> PatchfileParser.LocationTokenContext:
+    ) -> Location:
         context_map = {
             "line_no"           : 0,
             "end"               : 2,
@@ -42,7 +41,7 @@ class ParserInjectionLocationSpec (TestCase):
             "content_offset"    : 6,
         }
 
-        return get_add_patch_context(
+        return get_add_patch_location(
             Path("../test/testdata/Patch1.patch"),
             context_map[context_type],
         )
@@ -50,14 +49,14 @@ class ParserInjectionLocationSpec (TestCase):
     def get_none_patch_context(
         self: ParserInjectionLocationSpec,
         context_type: str,
-    ) -> PatchfileParser.LocationTokenContext:
+    ) -> Location:
         context_map = {
             "function"          : 0,
             "function_offset"   : 1,
             "content"           : 4,
         }
 
-        return get_add_patch_context(
+        return get_add_patch_location(
             Path("../test/testdata/Patch2.patch"),
             context_map[context_type],
         )
@@ -65,14 +64,14 @@ class ParserInjectionLocationSpec (TestCase):
     def get_error_eof_patch_context(
         self: ParserInjectionLocationSpec,
         context_type: str,
-    ) -> PatchfileParser.LocationTokenContext:
+    ) -> Location:
         context_map = {
             "line_no"           : 2,
             "function_offset"   : 3,
             "content_offset"    : 5,
         }
 
-        return get_add_patch_context(
+        return get_add_patch_location(
             Path("../test/testdata/Patch2.patch"),
             context_map[context_type],
         )
@@ -165,7 +164,7 @@ class ParserInjectionLocationSpec (TestCase):
         assert line_no is None
 
     def test_resolve_failure_invalid_command(self: ParserInjectionLocationSpec) -> None:
-        location = ParserInjectionLocation("aeiou")
+        location = ParserInjectionLocation(Location("invalid", "aeiou"))
 
         with raises(InjectionError):
             location.resolve(self.file_content, True, self.error_manager)
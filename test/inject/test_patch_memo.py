@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import os
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+from pytest import raises
+
+from flash_patcher.exception.error_manager import ErrorManager
+from flash_patcher.inject.patch_memo import PatchMemo
+from flash_patcher.util.virtual_files import VirtualFileSystem
+
+class PatchMemoSpec (TestCase):
+
+    temp_dir: TemporaryDirectory
+    script: Path
+    memo: PatchMemo
+
+    def setUp(self: PatchMemoSpec) -> None:
+        # pylint: disable=consider-using-with
+        self.temp_dir = TemporaryDirectory()
+        self.script = Path(self.temp_dir.name, "DoAction.as")
+        self.script.write_bytes(b"base\r\n")
+
+        self.memo = PatchMemo(Path(self.temp_dir.name, "results"))
+
+    def tearDown(self: PatchMemoSpec) -> None:
+        self.temp_dir.cleanup()
+
+    def append(self: PatchMemoSpec, text: bytes) -> MagicMock:
+        return MagicMock(
+            side_effect=lambda: self.script.write_bytes(self.script.read_bytes() + text)
+        )
+
+    def test_flush_success(self: PatchMemoSpec) -> None:
+        first, second = self.append(b"first\n"), self.append(b"second\n")
+
+        self.memo.add(self.script, {"kind": "add", "text": "first"}, first)
+        self.memo.add(self.script, {"kind": "add", "text": "second"}, second)
+
+        # Nothing is applied until the memo is flushed
+        first.assert_not_called()
+        self.memo.flush()
+
+        assert self.script.read_bytes() == b"base\r\nfirst\nsecond\n"
+        assert (self.memo.restored, self.memo.patched) == (0, 1)
+        assert not self.memo.pending
+
+    def test_flush_restored(self: PatchMemoSpec) -> None:
+        self.memo.add(self.script, {"kind": "add", "text": "first"}, self.append(b"first\n"))
+        self.memo.flush()
+
+        # The same patches to the same base content are restored without being applied
+        self.script.write_bytes(b"base\r\n")
+        apply = MagicMock()
+
+        result = next(self.memo.root.iterdir())
+        os.utime(result, (0, 0))
+
+        self.memo.add(self.script, {"kind": "add", "text": "first"}, apply)
+        self.memo.flush()
+
+        apply.assert_not_called()
+        assert self.script.read_bytes() == b"base\r\nfirst\n"
+        assert (self.memo.restored, self.memo.patched) == (1, 1)
+
+        # Restoring a result marks it as used, so pruning keeps it longer
+        assert result.stat().st_mtime > 0
+
+    def test_flush_changed(self: PatchMemoSpec) -> None:
+        self.memo.add(self.script, {"kind": "add", "text": "first"}, self.append(b"first\n"))
+        self.memo.flush()
+
+        # A changed patch, or a changed base script, is applied again
+        self.script.write_bytes(b"base\r\n")
+        self.memo.add(self.script, {"kind": "add", "text": "other"}, self.append(b"other\n"))
+        self.memo.flush()
+
+        self.script.write_bytes(b"new base\r\n")
+        self.memo.add(self.script, {"kind": "add", "text": "first"}, self.append(b"first\n"))
+        self.memo.flush()
+
+        assert self.script.read_bytes() == b"new base\r\nfirst\n"
+        assert (self.memo.restored, self.memo.patched) == (0, 3)
+
+    def test_flush_missing_script(self: PatchMemoSpec) -> None:
+        self.script.unlink()
+        apply = MagicMock(side_effect=FileNotFoundError("missing script"))
+
+        self.memo.add(self.script, {"kind": "remove"}, apply)
+
+        # The patch reports the missing script
+        with raises(FileNotFoundError):
+            self.memo.flush()
+
+    @patch('os.replace')
+    def test_flush_read_only(self: PatchMemoSpec, mock_replace: MagicMock) -> None:
+        mock_replace.side_effect = PermissionError("read-only file system")
+
+        self.memo.add(self.script, {"kind": "add", "text": "first"}, self.append(b"first\n"))
+        self.memo.flush()
+
+        assert self.script.read_bytes() == b"base\r\nfirst\n"
+        assert not any(self.memo.root.iterdir())
+
+    def test_flush_virtual_files(self: PatchMemoSpec) -> None:
+        files = VirtualFileSystem()
+        memo = PatchMemo(self.memo.root, files)
+
+        def append(text: str) -> None:
+            content = files.read(self.script, ErrorManager("test.patch", 1))
+            files.write(self.script, content + text)
+
+        memo.add(self.script, {"kind": "add", "text": "first"}, lambda: append("first\n"))
+        memo.flush()
+
+        # The patched script is cached from memory, and only written to disk with the others
+        assert self.script.read_bytes() == b"base\r\n"
+        assert files.dirty == {self.script}
+
+        files.sync()
+        assert self.script.read_bytes() == b"base\r\nfirst\r\n"
+
+        self.script.write_bytes(b"base\r\n")
+        memo.add(self.script, {"kind": "add", "text": "first"}, MagicMock())
+        memo.flush()
+
+        assert self.script.read_bytes() == b"base\r\nfirst\r\n"
+        assert (memo.restored, memo.patched) == (1, 1)
+        assert not files.files
@@ -11,7 +11,7 @@ from flash_patcher.inject.location.parser_injection_location import ParserInject
 from flash_patcher.inject.single_injection import SingleInjectionManager
 
 # pylint: disable=wrong-import-order
-from test.test_util.get_patch_context import get_add_patch_context
+from test.test_util.get_patch_context import get_add_patch_location
 
 class SingleInjectionManagerSpec (TestCase):
 
@@ -31,7 +31,7 @@ class SingleInjectionManagerSpec (TestCase):
         with open(self.as_path, encoding="utf-8") as file:
             self.file_content = file.readlines()
 
-        location = ParserInjectionLocation(get_add_patch_context(
+        location = ParserInjectionLocation(get_add_patch_location(
             Path("../test/testdata/Patch1.patch"), 2,
         ))
 
@@ -44,91 +44,62 @@ class SingleInjectionManagerSpec (TestCase):
 
         self.mock_file = MagicMock()
 
-    # Overwriting write is super annoying...
-    # (For some reason patching writelines_safe doesn't work)
-    @patch('pathlib.Path.open', create=True)
+    @patch('flash_patcher.util.virtual_files.writelines_safe')
     def test_inject_success_with_command(
         self: SingleInjectionManagerSpec,
-        mock_open: MagicMock,
+        mock_writelines: MagicMock,
     ) -> None:
-        mock_file = MagicMock()
         mock_injection_location = MagicMock()
 
-        # Configure the mock_open.return_value to have a mock for the TextIOWrapper
-        mock_open.return_value.__enter__.return_value = mock_file
-        mock_file.readlines.return_value = self.file_content
-
         self.single_injection_manager.file_location = mock_injection_location
         mock_injection_location.resolve.return_value = 2
 
-        with patch.object(mock_file, 'writelines') as mock_writelines:
-            self.single_injection_manager.inject(["test\n", "// cmd: skip 3\n", "line2\n"], 1)
-
-            self.file_content.insert(2, "test\n")
-            self.file_content.insert(7, "line2\n")
-            mock_writelines.assert_called_once_with(self.file_content)
+        self.single_injection_manager.inject(["test\n", "// cmd: skip 3\n", "line2\n"], 1)
 
-        # .readlines() counts as a mock_open call for some reason
-        assert mock_open.call_count == 2
+        self.file_content.insert(2, "test\n")
+        self.file_content.insert(6, "line2\n")
+        mock_writelines.assert_called_once_with(self.as_path, self.file_content, None)
 
         mock_injection_location.resolve.assert_called_once_with(
             self.file_content, True, self.single_injection_manager.error_manager
         )
 
-    # Overwriting write is super annoying...
-    # (For some reason patching writelines_safe doesn't work)
-    @patch('pathlib.Path.open', create=True)
+    @patch('flash_patcher.util.virtual_files.writelines_safe')
     def test_inject_success_no_command(
         self: SingleInjectionManagerSpec,
-        mock_open: MagicMock,
+        mock_writelines: MagicMock,
     ) -> None:
-        mock_file = MagicMock()
-
-        # Configure the mock_open.return_value to have a mock for the TextIOWrapper
-        mock_open.return_value.__enter__.return_value = mock_file
-        mock_file.readlines.return_value = self.file_content
+        self.single_injection_manager.inject(["test\n", "line2\n"], 1)
 
-        with patch.object(mock_file, 'writelines') as mock_writelines:
-            self.single_injection_manager.inject(["test\n", "line2\n"], 1)
-            self.file_content.extend(["test\n", "line2\n"])
-            mock_writelines.assert_called_once_with(self.file_content)
+        self.file_content.extend(["test\n", "line2\n"])
+        mock_writelines.assert_called_once_with(self.as_path, self.file_content, None)
 
-        assert mock_open.call_count == 2
-
-    # Overwriting write is super annoying...
-    # (For some reason patching writelines_safe doesn't work)
-    @patch('pathlib.Path.open', create=True)
+    @patch('flash_patcher.util.virtual_files.writelines_safe')
     def test_inject_success_empty(
         self: SingleInjectionManagerSpec,
-        mock_open: MagicMock,
+        mock_writelines: MagicMock,
     ) -> None:
-        mock_file = MagicMock()
-
-        # Configure the mock_open.return_value to have a mock for the TextIOWrapper
-        mock_open.return_value.__enter__.return_value = mock_file
-        mock_file.readlines.return_value = self.file_content
-
-        with patch.object(mock_file, 'writelines') as mock_writelines:
-            self.single_injection_manager.inject([], 1)
-            mock_writelines.assert_called_once_with(self.file_content)
+        self.single_injection_manager.inject([], 1)
 
-        assert mock_open.call_count == 2
+        mock_writelines.assert_called_once_with(self.as_path, self.file_content, None)
 
-    # Overwriting write is super annoying...
-    # (For some reason patching writelines_safe doesn't work)
-    @patch('pathlib.Path.open', create=True)
+    @patch('flash_patcher.util.virtual_files.writelines_safe')
+    @patch('pathlib.Path.read_bytes')
     def test_inject_no_location(
         self: SingleInjectionManagerSpec,
-        mock_open: MagicMock,
+        mock_read_bytes: MagicMock,
+        mock_writelines: MagicMock,
     ) -> None:
         mock_injection_location = MagicMock()
+        mock_read_bytes.return_value = b"test\n"
 
         self.single_injection_manager.file_location = mock_injection_location
         mock_injection_location.resolve.return_value = None
 
         self.single_injection_manager.inject(["test\n"], 1)
 
-        mock_open.assert_called_once_with()
+        mock_read_bytes.assert_called_once_with()
+        mock_writelines.assert_not_called()
 
     def test_inject_failure_invalid_command(
         self: SingleInjectionManagerSpec,
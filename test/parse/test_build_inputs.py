@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from unittest.mock import patch
+
+from pytest import raises
+
+from flash_patcher.parse.build_inputs import collect_build_inputs, collect_script_targets
+from flash_patcher.parse.scope import Scope
+
+class BuildInputCollectorSpec (TestCase):
+
+    temp_dir: TemporaryDirectory
+    folder: Path
+
+    def setUp(self: BuildInputCollectorSpec) -> None:
+        # pylint: disable=consider-using-with
+        self.temp_dir = TemporaryDirectory()
+        self.folder = Path(self.temp_dir.name)
+
+        (self.folder / "levels").mkdir()
+
+        parse_cache = patch(
+            'flash_patcher.parse.parse_cache.PARSE_CACHE_ROOT', self.folder / ".parse"
+        )
+        parse_cache.start()
+        self.addCleanup(parse_cache.stop)
+
+        (self.folder / "main.stage").write_text(
+            "set-var level = levels\n"
+            "export-var image = 18.png\n"
+            "apply-patch ${level}/level.patch\n"
+            "exec-python generate.py\n",
+            encoding="utf-8",
+        )
+
+        (self.folder / "levels" / "level.patch").write_text(
+            "add-asset ${image} images/${image}\n"
+            "remove frame_1/DoAction1.as 1-2\n",
+            encoding="utf-8",
+        )
+
+    def tearDown(self: BuildInputCollectorSpec) -> None:
+        self.temp_dir.cleanup()
+
+    def test_collect_build_inputs_success(self: BuildInputCollectorSpec) -> None:
+        inputs, variables = collect_build_inputs(self.folder / "main.stage", self.folder)
+
+        assert inputs == [
+            self.folder / "main.stage",
+            self.folder / "levels" / "level.patch",
+            self.folder / "levels" / "18.png",
+            self.folder / "generate.py",
+        ]
+
+        assert "level=levels\n" in variables
+        assert "image=18.png\n" in variables
+
+        # Collecting inputs must not leak variables into the real run
+        assert Scope().resolve("image") is None
+
+    def test_collect_script_targets_success(self: BuildInputCollectorSpec) -> None:
+        (self.folder / "levels" / "level.patch").write_text(
+            "remove frame_1/DoAction1.as 1-2\n"
+            "add DefineSprite_${sprite}/frame_1/DoAction.as 3\n"
+            "begin-patch\n"
+            "// text\n"
+            "end-patch\n"
+            "replace-all DefineSprite_5/frame_1/DoAction.as\n"
+            "replace-all frame_2/DoAction.as\n"
+            "begin-content\n"
+            "// old\n"
+            "end-content\n"
+            "begin-patch\n"
+            "// new\n"
+            "end-patch\n",
+            encoding="utf-8",
+        )
+        (self.folder / "main.stage").write_text(
+            "set-var sprite = 4\n"
+            "apply-patch levels/level.patch\n",
+            encoding="utf-8",
+        )
+
+        assert collect_script_targets(self.folder / "main.stage", self.folder) == {
+            "frame_1/DoAction1.as",
+            "DefineSprite_4/frame_1/DoAction.as",
+            "DefineSprite_5/frame_1/DoAction.as",
+            "frame_2/DoAction.as",
+        }
+
+        assert Scope().resolve("sprite") is None
+
+    def test_collect_build_inputs_undefined_variable(self: BuildInputCollectorSpec) -> None:
+        (self.folder / "main.stage").write_text("exec-python ${missing}.py\n", encoding="utf-8")
+
+        with raises(NameError):
+            collect_build_inputs(self.folder / "main.stage", self.folder)
+
+    def test_collect_build_inputs_missing_patch(self: BuildInputCollectorSpec) -> None:
+        (self.folder / "main.stage").write_text("apply-patch missing.patch\n", encoding="utf-8")
+
+        with raises(FileNotFoundError):
+            collect_build_inputs(self.folder / "main.stage", self.folder)
+
+    def test_collect_build_inputs_asset_folder(self: BuildInputCollectorSpec) -> None:
+        (self.folder / "sounds" / "music").mkdir(parents=True)
+        (self.folder / "sounds" / "music" / "1.mp3").write_bytes(b"")
+        (self.folder / "sounds" / "0.mp3").write_bytes(b"")
+        (self.folder / "main.stage").write_text("add-asset sounds sounds\n", encoding="utf-8")
+
+        inputs, _ = collect_build_inputs(self.folder / "main.stage", self.folder)
+
+        # Every file of the folder is an input
+        assert inputs == [
+            self.folder / "main.stage",
+            self.folder / "sounds" / "0.mp3",
+            self.folder / "sounds" / "music" / "1.mp3",
+        ]
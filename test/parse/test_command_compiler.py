@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest.mock import MagicMock
+
+from flash_patcher.parse.command_compiler import compile_location
+
+# pylint: disable=wrong-import-order
+from test.test_util.get_patch_context import get_patch_commands
+
+def test_compile_patch_add() -> None:
+    command = get_patch_commands(Path("../test/testdata/Patch1.patch"))[0]
+
+    assert command.kind == "add"
+    assert command.line == 1
+    assert len(command.targets) == 7
+    assert command.text.startswith("\n// This is an actionscript command\n")
+
+    locations = [target.locations[0] for target in command.targets]
+    assert [location.kind for location in locations] == \
+        ["line", "line", "end", "function", "function", "text", "text"]
+
+    assert locations[0].number == 17
+    assert locations[3].name == "Mainfunc"
+    assert locations[3].number is None
+    assert locations[4].number == 15
+    assert locations[5].content == "derp"
+    assert locations[6].content == "derp"
+    assert locations[6].number == 2
+
+def test_compile_patch_all_kinds() -> None:
+    patch_commands = get_patch_commands(Path("../test/testdata/Patch1.patch"))
+    stage_commands = get_patch_commands(Path("../test/testdata/Stage1.stage"))
+    asset_commands = get_patch_commands(Path("../test/testdata/Pack1.assets"))
+    replace_all_commands = get_patch_commands(Path("../test/testdata/Patch4.patch"))
+
+    assert [command.kind for command in patch_commands] == \
+        ["add", "remove", "remove", "replace", "set-var", "export-var"]
+
+    remove = patch_commands[1]
+    assert remove.targets[0].file == "frame_169/DoAction.as"
+    assert [location.number for location in remove.targets[0].locations] == [17, 23]
+
+    replace = patch_commands[3]
+    assert len(replace.targets) == 3
+    assert replace.find.strip() == "test"
+
+    assert (patch_commands[4].name, patch_commands[4].value) == ("key1", "val1")
+    assert (patch_commands[5].name, patch_commands[5].value) == ("key2", "val2")
+
+    assert [(command.kind, command.file) for command in stage_commands] == [
+        ("apply-patch", "Patch1.patch"),
+        ("apply-patch", "Pack1.assets"),
+        ("exec-python", "sample.py"),
+        ("exec-python", "empty.py"),
+    ]
+
+    assert asset_commands[1].file == "space -dash.png"
+    assert asset_commands[1].dest == "images/space -dash.png"
+
+    assert replace_all_commands[0].kind == "replace-all"
+    assert replace_all_commands[0].targets[0].locations == []
+    assert replace_all_commands[0].find.strip() == "nonexistent content"
+
+def test_compile_patch_pcode() -> None:
+    with TemporaryDirectory() as temp_dir:
+        patch = Path(temp_dir, "pcode.patch")
+        patch.write_text(
+            "add DefineSprite_5/frame_1/DoAction.pcode 3\n"
+            "begin-patch\n"
+            "Push \"derp\"\n"
+            "end-patch\n"
+            "remove frame_1/DoAction.pcode 7-9\n",
+            encoding="utf-8",
+        )
+
+        commands = get_patch_commands(patch)
+
+    # P-code scripts are patched like ActionScript
+    assert [(command.kind, command.targets[0].file) for command in commands] == [
+        ("add", "DefineSprite_5/frame_1/DoAction.pcode"),
+        ("remove", "frame_1/DoAction.pcode"),
+    ]
+    assert commands[0].text.strip() == 'Push "derp"'
+
+def test_compile_location_invalid() -> None:
+    context = MagicMock()
+    context.getText.return_value = "aeiou"
+
+    location = compile_location(context)
+
+    assert location.kind == "invalid"
+    assert location.text == "aeiou"
@@ -0,0 +1,47 @@
+from __future__ import annotations
+
+import json
+
+from flash_patcher.parse.commands import Location, PatchCommand, PatchTarget
+
+def test_location_round_trip() -> None:
+    location = Location("function", "functionmain2", number=2, name="main")
+
+    data = location.to_json()
+    loaded = Location.from_json(json.loads(json.dumps(data)))
+
+    # Unset fields are left out
+    assert data == {"kind": "function", "text": "functionmain2", "number": 2, "name": "main"}
+    assert vars(loaded) == vars(location)
+
+def test_command_round_trip() -> None:
+    command = PatchCommand(
+        "remove",
+        4,
+        targets=[PatchTarget(
+            "frame_1/DoAction.as",
+            [Location("line", "17", number=17), Location("end", "end")],
+            4,
+        )],
+    )
+
+    data = json.loads(json.dumps(command.to_json()))
+    loaded = PatchCommand.from_json(data)
+
+    assert loaded.kind == "remove"
+    assert loaded.line == 4
+    assert loaded.text is None
+    assert loaded.targets[0].file == "frame_1/DoAction.as"
+    assert loaded.targets[0].line == 4
+    assert [location.kind for location in loaded.targets[0].locations] == ["line", "end"]
+    assert loaded.targets[0].locations[0].number == 17
+
+def test_command_round_trip_no_targets() -> None:
+    command = PatchCommand("set-var", 1, name="key", value="")
+
+    data = command.to_json()
+    loaded = PatchCommand.from_json(data)
+
+    assert data == {"kind": "set-var", "line": 1, "name": "key", "value": ""}
+    assert loaded.targets == []
+    assert loaded.value == ""
@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+import json
+import os
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+from flash_patcher.parse.parse_cache import get_grammar_version, load_patch_commands
+
+class ParseCacheSpec (TestCase):
+
+    temp_dir: TemporaryDirectory
+    cache_root: Path
+    patch_file: Path
+
+    def setUp(self: ParseCacheSpec) -> None:
+        # pylint: disable=consider-using-with
+        self.temp_dir = TemporaryDirectory()
+        self.cache_root = Path(self.temp_dir.name, "parse")
+
+        self.patch_file = Path(self.temp_dir.name, "main.patch")
+        self.patch_file.write_text(
+            "set-var key1 = val1\n"
+            "remove frame_1/DoAction1.as 1-end\n",
+            encoding="utf-8",
+        )
+
+    def tearDown(self: ParseCacheSpec) -> None:
+        self.temp_dir.cleanup()
+
+    def test_load_patch_commands_miss(self: ParseCacheSpec) -> None:
+        commands = load_patch_commands(self.patch_file, self.cache_root)
+
+        assert [command.kind for command in commands] == ["set-var", "remove"]
+        assert len(list(self.cache_root.iterdir())) == 1
+
+    def test_load_patch_commands_hit(self: ParseCacheSpec) -> None:
+        load_patch_commands(self.patch_file, self.cache_root)
+
+        location = next(self.cache_root.iterdir())
+        os.utime(location, (0, 0))
+
+        with patch('flash_patcher.parse.parse_cache.CommonParseManager') as mock_parse_manager:
+            commands = load_patch_commands(self.patch_file, self.cache_root)
+
+        mock_parse_manager.assert_not_called()
+
+        # Loading a parse marks it as used, so pruning keeps it longer
+        assert location.stat().st_mtime > 0
+
+        assert [command.kind for command in commands] == ["set-var", "remove"]
+        assert commands[1].targets[0].locations[1].kind == "end"
+
+    def test_load_patch_commands_changed(self: ParseCacheSpec) -> None:
+        load_patch_commands(self.patch_file, self.cache_root)
+        self.patch_file.write_text("export-var key2 = val2\n", encoding="utf-8")
+
+        commands = load_patch_commands(self.patch_file, self.cache_root)
+
+        assert [command.kind for command in commands] == ["export-var"]
+        assert len(list(self.cache_root.iterdir())) == 2
+
+    def test_load_patch_commands_damaged(self: ParseCacheSpec) -> None:
+        load_patch_commands(self.patch_file, self.cache_root)
+
+        cache_file = next(self.cache_root.iterdir())
+        cache_file.write_text('[{"line": 1}]', encoding="utf-8")
+
+        commands = load_patch_commands(self.patch_file, self.cache_root)
+
+        assert [command.kind for command in commands] == ["set-var", "remove"]
+        assert json.loads(cache_file.read_text(encoding="utf-8"))[0]["kind"] == "set-var"
+
+    @patch('os.replace')
+    def test_load_patch_commands_read_only(
+        self: ParseCacheSpec,
+        mock_replace: MagicMock,
+    ) -> None:
+        mock_replace.side_effect = PermissionError("read-only file system")
+
+        commands = load_patch_commands(self.patch_file, self.cache_root)
+
+        assert [command.kind for command in commands] == ["set-var", "remove"]
+        assert not any(self.cache_root.iterdir())
+
+def test_get_grammar_version_stable() -> None:
+    assert get_grammar_version() == get_grammar_version()
+    assert len(get_grammar_version()) == 64
@@ -1,11 +1,13 @@
 from __future__ import annotations
 
+from logging import INFO
 from pathlib import Path
 from unittest import TestCase
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch
 
 from flash_patcher.parse.patch import PatchfileManager
 from flash_patcher.parse.patch_visitor import PatchfileProcessor
+from flash_patcher.util.logging import logger
 
 class PatchfileManagerSpec (TestCase):
 
@@ -26,9 +28,18 @@ class PatchfileManagerSpec (TestCase):
 
         self.patchfile_manager.patchfile_processor = self.mock_processor
 
+    @patch('flash_patcher.parse.patch.load_patch_commands')
     def test_parse_success(
         self: PatchfileManagerSpec,
+        mock_load_patch_commands: MagicMock,
     ) -> None:
-        self.patchfile_manager.parse()
+        with self.assertLogs(logger, INFO) as logs:
+            self.patchfile_manager.parse()
 
-        self.mock_processor.visitRoot.assert_called_once()
+        # The file is reported once, when it's applied
+        assert [record.getMessage() for record in logs.records] == [
+            "Processing file: ../test/testdata/Patch1.patch",
+        ]
+
+        mock_load_patch_commands.assert_called_once_with(Path("../test/testdata/Patch1.patch"))
+        self.mock_processor.run.assert_called_once_with(mock_load_patch_commands.return_value)
@@ -1,31 +1,31 @@
 from __future__ import annotations
 
 from pathlib import Path
+from tempfile import TemporaryDirectory
 from unittest import TestCase
-from unittest.mock import MagicMock, patch
+from unittest.mock import ANY, MagicMock, patch
 
 from pytest import raises
 
-from flash_patcher.antlr_source.PatchfileLexer import PatchfileLexer
-from flash_patcher.antlr_source.PatchfileParser import PatchfileParser
-
 from flash_patcher.exception.injection import InjectionError
 from flash_patcher.inject.bulk_injection import BulkInjectionManager
-from flash_patcher.parse.common import CommonParseManager
+from flash_patcher.inject.patch_memo import PatchMemo
+from flash_patcher.parse.commands import PatchCommand
 from flash_patcher.parse.patch_visitor import PatchfileProcessor
 from flash_patcher.parse.scope import Scope
+from flash_patcher.util.virtual_files import VirtualFileSystem
 
 # pylint: disable=wrong-import-order
-from test.test_util.get_patch_context import get_remove_patch_context
+from test.test_util.get_patch_context import get_patch_commands, get_remove_patch_command
 
 class PatchfileProcessorSpec (TestCase):
 
-    add_context: PatchfileParser.AddBlockContext
-    remove_context: PatchfileParser.RemoveBlockContext
-    replace_nth_context: PatchfileParser.ReplaceNthBlockContext
-    root_context: PatchfileParser.RootContext
+    add_command: PatchCommand
+    remove_command: PatchCommand
+    replace_nth_command: PatchCommand
+    commands: list[PatchCommand]
 
-    replace_all_root_context: PatchfileParser.RootContext
+    replace_all_commands: list[PatchCommand]
 
     mock_injector: MagicMock[BulkInjectionManager]
     patch_visitor: PatchfileProcessor
@@ -43,147 +43,153 @@ class PatchfileProcessorSpec (TestCase):
         self.mock_injector = MagicMock()
         self.patch_visitor.injector = self.mock_injector
 
-        self.root_context = CommonParseManager(PatchfileLexer, PatchfileParser).get_root(
-            Path("../test/testdata/Patch1.patch")
-        )
+        self.commands = get_patch_commands(Path("../test/testdata/Patch1.patch"))
+
+        self.add_command = get_patch_commands(Path("../test/testdata/Patch1.patch"), "add")[0]
+        self.remove_command = get_remove_patch_command(Path("../test/testdata/Patch1.patch"), 0)
+        self.replace_nth_command = \
+            get_patch_commands(Path("../test/testdata/Patch1.patch"), "replace")[0]
 
-        self.add_context = self.root_context.addBlock()[0]
-        self.remove_context = self.root_context.removeBlock()[0]
-        self.replace_nth_context = self.root_context.replaceNthBlock()[0]
+        self.replace_all_commands = get_patch_commands(Path("../test/testdata/Patch4.patch"))
 
-        self.replace_all_root_context = CommonParseManager(PatchfileLexer, PatchfileParser) \
-            .get_root(Path("../test/testdata/Patch4.patch"))
+    def test_run_add_block_success(self: PatchfileProcessorSpec) -> None:
+        injectors = [MagicMock() for _ in range(7)]
+        self.mock_injector.injectors = injectors
+        self.mock_injector.starting_line_no = -1
 
-    def test_visit_add_block_success(self: PatchfileProcessorSpec) -> None:
-        self.patch_visitor.visitAddBlock(self.add_context)
+        self.patch_visitor.run_add(self.add_command)
 
         assert self.mock_injector.add_injection_target.call_count == 7
 
-        self.mock_injector.inject.assert_called_once_with(
-            "// This is an actionscript command\n" \
-            "This is not an actionscript command, it's just invalid\n" \
-            "// cmd: skip 20\n"
-        )
+        for injector in injectors:
+            injector.inject.assert_called_once_with([
+                "// This is an actionscript command\n",
+                "This is not an actionscript command, it's just invalid\n",
+                "// cmd: skip 20\n",
+            ], -1)
 
+        self.mock_injector.clear.assert_called_once_with()
         assert len(self.patch_visitor.modified_scripts) == 1
 
-    # Overwriting write is super annoying...
-    # (For some reason patching writelines_safe doesn't work)
-    @patch('pathlib.Path.open', create=True)
-    def test_visit_remove_block_success(
-        self: PatchfileProcessorSpec,
-        mock_open: MagicMock,
-    ) -> None:
-        mock_file = MagicMock()
+    def test_run_add_block_memo(self: PatchfileProcessorSpec) -> None:
+        injectors = [MagicMock() for _ in range(7)]
+        self.mock_injector.injectors = injectors
+        self.patch_visitor.memo = MagicMock(spec=PatchMemo)
+
+        self.patch_visitor.run_add(self.add_command)
 
-        mock_open.return_value.__enter__.return_value = mock_file
-        mock_file.readlines.return_value = [" "] * 100
+        # Injections are queued in the memo instead of being applied
+        assert self.patch_visitor.memo.add.call_count == 7
+        injectors[0].inject.assert_not_called()
 
-        with patch.object(mock_file, 'writelines') as mock_writelines:
-            self.patch_visitor.visitRemoveBlock(self.remove_context)
+        description = self.patch_visitor.memo.add.call_args_list[3].args[1]
+        assert description["kind"] == "add"
+        assert description["location"]["name"] == "Mainfunc"
+        assert description["text"].startswith("// This is an actionscript command\n")
 
-            mock_writelines.assert_called_once()
+    @patch('flash_patcher.util.virtual_files.writelines_safe')
+    @patch('pathlib.Path.read_bytes')
+    def test_run_remove_block_success(
+        self: PatchfileProcessorSpec,
+        mock_read_bytes: MagicMock,
+        mock_writelines: MagicMock,
+    ) -> None:
+        mock_read_bytes.return_value = b" \n" * 100
 
+        self.patch_visitor.run_remove(self.remove_command)
+
+        mock_writelines.assert_called_once()
         assert len(self.patch_visitor.modified_scripts) == 1
 
     @patch('flash_patcher.inject.single_injection.SingleInjectionManager.inject')
-    def test_visit_replace_nth_block_success(
+    def test_run_replace_nth_block_success(
         self: PatchfileProcessorSpec,
         mock_single_injector: MagicMock,
     ) -> None:
-        self.patch_visitor.visitReplaceNthBlock(self.replace_nth_context)
+        self.patch_visitor.run_replace(self.replace_nth_command)
 
         assert mock_single_injector.call_count == 3
 
         assert len(self.patch_visitor.modified_scripts) == 1
 
-    @patch('pathlib.Path.open', create=True)
-    def test_visit_replace_all_block_multiple_replacement(
+    @patch('flash_patcher.util.virtual_files.writelines_safe')
+    @patch('pathlib.Path.read_bytes')
+    def test_run_replace_all_block_multiple_replacement(
         self: PatchfileProcessorSpec,
-        mock_open: MagicMock,
+        mock_read_bytes: MagicMock,
+        mock_writelines: MagicMock,
     ) -> None:
-        mock_file = MagicMock()
-
-        mock_open.return_value.__enter__.return_value = mock_file
-        mock_file.read.return_value = "testtesttest"
+        mock_read_bytes.return_value = b"testtesttest"
 
-        with patch.object(mock_file, 'writelines') as mock_writelines:
-            self.patch_visitor.visitReplaceAllBlock(
-                self.replace_all_root_context.replaceAllBlock(1)
-            )
+        self.patch_visitor.run_replace_all(self.replace_all_commands[1])
 
-            mock_writelines.assert_called_once_with([
-                "// some content// some content// some content"
-            ])
+        mock_writelines.assert_called_once_with(ANY, [
+            "// some content// some content// some content"
+        ], None)
 
-    @patch('pathlib.Path.open', create=True)
-    def test_visit_replace_all_block_none(
+    def test_run_replace_all_block_prefetch(
         self: PatchfileProcessorSpec,
-        mock_open: MagicMock,
     ) -> None:
-        mock_file = MagicMock()
-
-        mock_open.return_value.__enter__.return_value = mock_file
-        mock_file.read.return_value = "testtesttest"
+        with patch.object(self.patch_visitor.files, 'prefetch') as mock_prefetch, \
+            patch.object(self.patch_visitor, 'schedule') as mock_schedule:
+            self.patch_visitor.run_replace_all(self.replace_all_commands[1])
 
-        with patch.object(mock_file, 'writelines') as mock_writelines:
-            self.patch_visitor.visitReplaceAllBlock(
-                self.replace_all_root_context.replaceAllBlock(0)
-            )
+            # Every script of the block is read ahead, before any is patched
+            scripts = list(mock_prefetch.call_args.args[0])
 
-            mock_writelines.assert_called_once_with(["testtesttest"])
+        assert scripts == [call.args[0] for call in mock_schedule.call_args_list]
+        assert scripts
 
-    # Overwriting write is super annoying...
-    # (For some reason patching writelines_safe doesn't work)
-    @patch('pathlib.Path.open', create=True)
-    def test_visit_remove_block_failure_beyond_eof(
+    @patch('flash_patcher.util.virtual_files.writelines_safe')
+    @patch('pathlib.Path.read_bytes')
+    def test_run_replace_all_block_none(
         self: PatchfileProcessorSpec,
-        mock_open: MagicMock,
+        mock_read_bytes: MagicMock,
+        mock_writelines: MagicMock,
     ) -> None:
-        mock_file = MagicMock()
+        mock_read_bytes.return_value = b"testtesttest"
+
+        self.patch_visitor.run_replace_all(self.replace_all_commands[0])
 
-        mock_open.return_value.__enter__.return_value = mock_file
-        mock_file.readlines.return_value = [" "] * 2
+        mock_writelines.assert_called_once_with(ANY, ["testtesttest"], None)
+
+    @patch('pathlib.Path.read_bytes')
+    def test_run_remove_block_failure_beyond_eof(
+        self: PatchfileProcessorSpec,
+        mock_read_bytes: MagicMock,
+    ) -> None:
+        mock_read_bytes.return_value = b" \n" * 2
 
         with raises(InjectionError):
-            self.patch_visitor.visitRemoveBlock(self.remove_context)
+            self.patch_visitor.run_remove(self.remove_command)
 
-    def test_visit_remove_block_failure_invalid_target(
+    def test_run_remove_block_failure_invalid_target(
         self: PatchfileProcessorSpec,
     ) -> None:
-        context = get_remove_patch_context(
+        command = get_remove_patch_command(
             Path("../test/testdata/Patch1.patch"), 1,
         )
 
         with raises(InjectionError):
-            self.patch_visitor.visitRemoveBlock(context)
+            self.patch_visitor.run_remove(command)
 
-    @patch('shutil.copyfile')
-    @patch('pathlib.Path.mkdir')
+    @patch('flash_patcher.parse.patch_visitor.stage_file')
     @patch('pathlib.Path.exists')
-    def test_visit_add_asset_block_success_no_folder(
+    def test_run_add_asset_block_success(
         self: PatchfileProcessorSpec,
         mock_path_exists: MagicMock,
-        mock_path_mkdir: MagicMock,
-        mock_shutil_copyfile: MagicMock,
+        mock_stage_file: MagicMock,
     ) -> None:
-        root_context = CommonParseManager(PatchfileLexer, PatchfileParser).get_root(
-            Path("../test/testdata/Pack1.assets")
-        )
-
-        mock_path_exists.side_effect = [True, False, True, False]
-
-        self.patch_visitor.visitRoot(root_context)
+        mock_path_exists.return_value = True
 
-        assert mock_path_mkdir.call_count == 2
-        assert mock_path_mkdir.call_args_list[0].args == (Path(".Patcher-Temp/images"),)
-        assert mock_path_mkdir.call_args_list[1].args == (Path(".Patcher-Temp/images"),)
+        commands = get_patch_commands(Path("../test/testdata/Pack1.assets"))
+        self.patch_visitor.run(commands)
 
-        assert mock_shutil_copyfile.call_count == 2
-        assert mock_shutil_copyfile.call_args_list[0].args == (
+        assert mock_stage_file.call_count == 2
+        assert mock_stage_file.call_args_list[0].args == (
             Path("../test/testdata/local.png"), Path(".Patcher-Temp/images/18.png")
         )
-        assert mock_shutil_copyfile.call_args_list[1].args == (
+        assert mock_stage_file.call_args_list[1].args == (
             Path("../test/testdata/space -dash.png"), Path(".Patcher-Temp/images/space -dash.png")
         )
 
@@ -192,73 +198,66 @@ class PatchfileProcessorSpec (TestCase):
             Path(".Patcher-Temp/images/space -dash.png")
         ])
 
-    @patch('shutil.copyfile')
-    @patch('pathlib.Path.exists')
-    def test_visit_add_asset_block_success_with_folder(
+    def test_run_add_asset_block_success_with_folder(
         self: PatchfileProcessorSpec,
-        mock_path_exists: MagicMock,
-        mock_shutil_copyfile: MagicMock,
     ) -> None:
-        root_context = CommonParseManager(PatchfileLexer, PatchfileParser).get_root(
-            Path("../test/testdata/Pack1.assets")
-        )
+        with TemporaryDirectory() as temp_dir:
+            self.patch_visitor.folder = Path(temp_dir, "patches")
+            self.patch_visitor.decomp_location = Path(temp_dir, "mod")
 
-        mock_path_exists.return_value = True
-
-        self.patch_visitor.visitRoot(root_context)
+            sounds = self.patch_visitor.folder / "sounds"
+            (sounds / "music").mkdir(parents=True)
+            (sounds / "music" / "1.mp3").write_bytes(b"1")
+            (sounds / "0.mp3").write_bytes(b"0")
 
-        assert mock_shutil_copyfile.call_count == 2
-        assert mock_shutil_copyfile.call_args_list[0].args == (
-            Path("../test/testdata/local.png"), Path(".Patcher-Temp/images/18.png")
-        )
-        assert mock_shutil_copyfile.call_args_list[1].args == (
-            Path("../test/testdata/space -dash.png"), Path(".Patcher-Temp/images/space -dash.png")
-        )
+            command = PatchCommand("add-asset", 1, file="sounds", dest="sounds")
+            self.patch_visitor.run_add_asset(command)
 
-        assert self.patch_visitor.modified_scripts == set([
-            Path(".Patcher-Temp/images/18.png"),
-            Path(".Patcher-Temp/images/space -dash.png")
-        ])
+            # Every file of the folder is added, in nested folders too
+            assert (self.patch_visitor.decomp_location / "sounds" / "music" / "1.mp3").exists()
+            assert self.patch_visitor.modified_scripts == {
+                Path(temp_dir, "mod", "sounds", "0.mp3"),
+                Path(temp_dir, "mod", "sounds", "music", "1.mp3"),
+            }
 
     @patch('pathlib.Path.exists')
-    def test_visit_add_asset_block_failure_not_exists(
+    def test_run_add_asset_block_failure_not_exists(
         self: PatchfileProcessorSpec,
         mock_path_exists: MagicMock,
     ) -> None:
-        root_context = CommonParseManager(PatchfileLexer, PatchfileParser).get_root(
-            Path("../test/testdata/Pack1.assets")
-        )
+        commands = get_patch_commands(Path("../test/testdata/Pack1.assets"))
 
         mock_path_exists.return_value = False
 
         with raises(FileNotFoundError):
-            self.patch_visitor.visitRoot(root_context)
+            self.patch_visitor.run(commands)
 
-    def test_visit_set_var(self: PatchfileProcessorSpec) -> None:
-        self.patch_visitor.visitSetVarBlock(self.root_context.setVarBlock(0))
+    def test_run_set_var(self: PatchfileProcessorSpec) -> None:
+        self.patch_visitor.run_set_var(
+            get_patch_commands(Path("../test/testdata/Patch1.patch"), "set-var")[0]
+        )
 
         assert self.patch_visitor.scope.resolve("key1") == "val1"
 
-    def test_visit_export_var(self: PatchfileProcessorSpec) -> None:
-        self.patch_visitor.visitExportVarBlock(self.root_context.exportVarBlock(0))
+    def test_run_export_var(self: PatchfileProcessorSpec) -> None:
+        self.patch_visitor.run_export_var(
+            get_patch_commands(Path("../test/testdata/Patch1.patch"), "export-var")[0]
+        )
 
         assert self.patch_visitor.scope.resolve("key2") == "val2"
         assert Scope().resolve("key2") == "val2"
 
     @patch("builtins.input")
-    def test_visit_python_file_success(
+    def test_run_python_file_success(
         self: PatchfileProcessorSpec,
         mock_input: MagicMock,
     ) -> None:
         mock_input.return_value = "y"
         self.patch_visitor.decomp_location = Path(".")
 
-        root_context = CommonParseManager(
-            PatchfileLexer, PatchfileParser
-        ).get_root(Path("../test/testdata/Stage1.stage"))
+        commands = get_patch_commands(Path("../test/testdata/Stage1.stage"))
 
-        python_file_context = root_context.execPythonBlock(0)
-        self.patch_visitor.visitExecPythonBlock(python_file_context)
+        self.patch_visitor.run_exec_python(commands[2])
 
         assert self.patch_visitor.modified_scripts == set([
             Path("DoAction1.as"),
@@ -266,46 +265,124 @@ class PatchfileProcessorSpec (TestCase):
         ])
 
     @patch("builtins.input")
-    def test_visit_python_file_success_empty(
+    def test_run_python_file_success_empty(
         self: PatchfileProcessorSpec,
         mock_input: MagicMock,
     ) -> None:
         mock_input.return_value = "y"
         self.patch_visitor.decomp_location = Path(".")
 
-        root_context = CommonParseManager(
-            PatchfileLexer, PatchfileParser
-        ).get_root(Path("../test/testdata/Stage1.stage"))
+        commands = get_patch_commands(Path("../test/testdata/Stage1.stage"))
 
-        self.patch_visitor.visitExecPythonBlock(root_context.execPythonBlock(1))
+        self.patch_visitor.run_exec_python(commands[3])
 
         # implicit assert nothrows
         assert self.patch_visitor.modified_scripts == set()
 
+    def test_materialize_success(self: PatchfileProcessorSpec) -> None:
+        mock_workspace = MagicMock()
+        self.patch_visitor.workspace = mock_workspace
+
+        self.patch_visitor.materialize(Path(".Patcher-Temp/scripts/frame_1/DoAction.as"))
+
+        mock_workspace.materialize.assert_called_once_with(
+            Path(".Patcher-Temp/scripts/frame_1/DoAction.as")
+        )
+
+    def test_materialize_no_workspace(self: PatchfileProcessorSpec) -> None:
+        self.patch_visitor.materialize(Path("../test/testdata/DoAction1.as"))
+
+        # The whole decompilation is already on disk
+        assert Path("../test/testdata/DoAction1.as").exists()
+
+    @patch('flash_patcher.parse.patch_visitor.get_modified_scripts_of_command')
+    def test_run_python_file_success_workspace(
+        self: PatchfileProcessorSpec,
+        mock_run_command: MagicMock,
+    ) -> None:
+        mock_workspace = MagicMock()
+        self.patch_visitor.workspace = mock_workspace
+        mock_run_command.return_value = set()
+
+        commands = get_patch_commands(Path("../test/testdata/Stage1.stage"))
+
+        self.patch_visitor.run_exec_python(commands[2])
+
+        # Python scripts may read any file, so the whole decompilation is materialized first
+        mock_workspace.materialize_all.assert_called_once_with()
+        mock_run_command.assert_called_once()
+
+    @patch('flash_patcher.parse.patch_visitor.get_modified_scripts_of_command')
+    def test_run_python_file_success_memo(
+        self: PatchfileProcessorSpec,
+        mock_run_command: MagicMock,
+    ) -> None:
+        memo = MagicMock(spec=PatchMemo)
+        self.patch_visitor.memo = memo
+        mock_run_command.side_effect = lambda *_: memo.flush.assert_called_once_with() or set()
+
+        commands = get_patch_commands(Path("../test/testdata/Stage1.stage"))
+
+        # Queued patches are applied before the script runs
+        self.patch_visitor.run_exec_python(commands[2])
+
+        mock_run_command.assert_called_once()
+
+    @patch('flash_patcher.parse.patch_visitor.get_modified_scripts_of_command')
+    def test_run_virtual_files(
+        self: PatchfileProcessorSpec,
+        mock_run_command: MagicMock,
+    ) -> None:
+        with TemporaryDirectory() as temp_dir:
+            script = Path(temp_dir, "frame_1", "DoAction1.as")
+            script.parent.mkdir()
+            script.write_text("test\ntest\n", encoding="utf-8")
+
+            files = VirtualFileSystem()
+            processor = PatchfileProcessor(
+                Path("../test/testdata/Patch4.patch"),
+                Path("../test/testdata/"),
+                Path(temp_dir),
+                Path(temp_dir),
+                files=files,
+            )
+
+            processor.run(self.replace_all_commands)
+
+            # Scripts are only written to disk once all patches are applied
+            assert script.read_text(encoding="utf-8") == "test\ntest\n"
+
+            seen = []
+            mock_run_command.side_effect = \
+                lambda *_: seen.append(script.read_text(encoding="utf-8")) or set()
+
+            # Python scripts see every patch applied so far
+            commands = get_patch_commands(Path("../test/testdata/Stage1.stage"))
+            processor.run_exec_python(commands[2])
+
+            assert seen == ["// some content\n// some content\n"]
+            assert not files.files
+
     @patch('flash_patcher.parse.patch.PatchfileManager.parse')
-    def test_visit_patchfile_success(
+    def test_run_patchfile_success(
         self: PatchfileProcessorSpec,
         mock_parse_patchfile: MagicMock,
     ) -> None:
-        root_context = CommonParseManager(
-            PatchfileLexer, PatchfileParser
-        ).get_root(Path("../test/testdata/Stage1.stage"))
-
-        patchfile_context = root_context.execPatcherBlock(0)
+        commands = get_patch_commands(Path("../test/testdata/Stage1.stage"))
 
-        self.patch_visitor.visitExecPatcherBlock(patchfile_context)
+        self.patch_visitor.run_apply_patch(commands[0])
 
         mock_parse_patchfile.assert_called_once_with()
 
-    @patch('flash_patcher.parse.patch_visitor.PatchfileProcessor.visitRemoveBlock')
-    @patch('flash_patcher.parse.patch_visitor.PatchfileProcessor.visitAddBlock')
-    def test_visit_root(
+    @patch('flash_patcher.parse.patch_visitor.PatchfileProcessor.run_remove')
+    @patch('flash_patcher.parse.patch_visitor.PatchfileProcessor.run_add')
+    def test_run(
         self: PatchfileProcessorSpec,
-        mock_visit_add: MagicMock,
-        mock_visit_remove: MagicMock,
+        mock_run_add: MagicMock,
+        mock_run_remove: MagicMock,
     ) -> None:
-        self.patch_visitor.visitRoot(self.root_context)
+        self.patch_visitor.run(self.commands)
 
-        mock_visit_add.assert_called_once_with(self.add_context)
+        mock_run_add.assert_called_once_with(self.commands[0])
 
-        assert mock_visit_remove.call_count == 2
+        assert mock_run_remove.call_count == 2
@@ -0,0 +1,92 @@
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+from pytest import raises
+
+from flash_patcher.__main__ import cli
+
+@patch('flash_patcher.__main__.main')
+@patch('sys.argv', [
+    "flash-patcher",
+    "--inputswf", "base.swf",
+    "--folder", "patches",
+    "--stagefile", "main.stage",
+    "--outputswf", "out.swf",
+    "--cacheSize", "2G",
+    "--cacheDir", "/mnt/cache",
+    "--cacheFormat", "packed-zlib",
+    "--ffdec", "/opt/ffdec/ffdec.sh",
+    "--memoryBudget", "200M",
+    "--workspace", "/dev/shm/patcher",
+    "--ffdecWorker",
+    "--selective",
+    "--exportJobs", "8",
+    "--ffdecProfile", "fast-export",
+    "--ffdecJava",
+    "--ffdecReport", "ffdec.json",
+    "--pcode",
+    "--buildCacheSize", "1G",
+])
+def test_cli_patch_success(mock_main: MagicMock) -> None:
+    cli()
+
+    mock_main.assert_called_once_with(
+        Path("base.swf"),
+        Path("patches"),
+        Path("main.stage"),
+        Path("out.swf"),
+        drop_cache=False,
+        recompile_all=False,
+        xml_mode=False,
+        verbose=False,
+        cache_size=2 * 1024 ** 3,
+        cache_dir=Path("/mnt/cache"),
+        cache_format="packed-zlib",
+        ffdec="/opt/ffdec/ffdec.sh",
+        memory_budget=200 * 1024 ** 2,
+        workspace_dir=Path("/dev/shm/patcher"),
+        ffdec_worker=True,
+        selective=True,
+        export_jobs=8,
+        ffdec_profile="fast-export",
+        ffdec_java=True,
+        ffdec_report=Path("ffdec.json"),
+        pcode=True,
+        build_cache_size=1024 ** 3,
+    )
+
+@patch('flash_patcher.__main__.main')
+@patch('sys.argv', ["flash-patcher", "--inputswf", "base.swf"])
+def test_cli_patch_missing_args(mock_main: MagicMock) -> None:
+    cli()
+
+    mock_main.assert_not_called()
+
+@patch('flash_patcher.__main__.main')
+def test_cli_patch_invalid_jobs(mock_main: MagicMock) -> None:
+    for jobs in ["0", "-2", "many"]:
+        with patch('sys.argv', ["flash-patcher", "--exportJobs", jobs]), raises(SystemExit):
+            cli()
+
+    mock_main.assert_not_called()
+
+@patch('flash_patcher.__main__.print_version')
+@patch('sys.argv', ["flash-patcher", "--version"])
+def test_cli_version(mock_print_version: MagicMock) -> None:
+    cli()
+
+    mock_print_version.assert_called_once_with()
+
+@patch('flash_patcher.__main__.list_cache')
+@patch('sys.argv', ["flash-patcher", "cache", "ls"])
+def test_cli_cache_ls(mock_list_cache: MagicMock) -> None:
+    cli()
+
+    mock_list_cache.assert_called_once_with(None)
+
+@patch('flash_patcher.__main__.prune_cache')
+@patch('sys.argv', ["flash-patcher", "cache", "prune", "--cacheSize", "500M"])
+def test_cli_cache_prune(mock_prune_cache: MagicMock) -> None:
+    cli()
+
+    mock_prune_cache.assert_called_once_with(500 * 1024 ** 2, None, None)
@@ -1,12 +1,24 @@
+import json
+from contextlib import nullcontext
 from pathlib import Path
-from unittest.mock import MagicMock, patch
+from tempfile import TemporaryDirectory
+from unittest.mock import ANY, MagicMock, call, patch
 
-from pytest import raises
+from pytest import CaptureFixture, raises
 
+from flash_patcher.compile.build_cache import BUILD_CACHE_ROOT
+from flash_patcher.compile.ffdec_telemetry import FFDecCall
 from flash_patcher.exception.dependency import DependencyError
-from flash_patcher.patcher import main
+from flash_patcher.inject.patch_memo import PATCH_RESULT_ROOT
+from flash_patcher.parse.parse_cache import PARSE_CACHE_ROOT
+from flash_patcher.patcher import list_cache, main, prune_cache
 
-@patch('shutil.copytree')
+RUN_FOLDER = Path(".Patcher-Temp/runs/run-1")
+
+@patch('flash_patcher.compile.ffdec.FFDecInterface.save_config', MagicMock())
+@patch('flash_patcher.compile.ffdec.FFDecInterface.load_config', MagicMock(return_value=False))
+@patch('flash_patcher.patcher.get_build_fingerprint', MagicMock(return_value=None))
+@patch('flash_patcher.patcher.Workspace')
 @patch('flash_patcher.parse.patch.PatchfileManager.parse')
 @patch('flash_patcher.compile.compilation.CompilationManager.recompile')
 @patch('flash_patcher.compile.compilation.CompilationManager.decompile')
@@ -14,37 +26,312 @@ def test_main_success(
     mock_decompile: MagicMock,
     mock_recompile: MagicMock,
     mock_stagefile_parse: MagicMock,
-    mock_shutil_copytree: MagicMock,
+    mock_workspace: MagicMock,
 ) -> None:
 
     inputfile = Path("input")
     outputfile = Path("test.swf")
     cache = Path("../test/testdata/")
-
-    mock_decompile.return_value = cache
-    mock_stagefile_parse.return_value = set([
+    modified_scripts = set([
         Path("../test/testdata/derppotato1")
     ])
 
+    mock_decompile.return_value = cache
+    mock_stagefile_parse.return_value = modified_scripts
+
 
-    main(
+    with TemporaryDirectory() as temp_dir:
+        main(
+            inputfile,
+            Path("../test/testdata"),
+            Path("Stage1.stage"),
+            outputfile,
+            workspace_dir=Path(temp_dir),
+        )
+
+        # The run patched in its own folder, which is removed once the run succeeds
+        decomp_location = mock_recompile.call_args.args[0]
+        assert decomp_location.parent.parent == Path(temp_dir)
+        assert not any(Path(temp_dir).iterdir())
+
+    mock_decompile.assert_called_once_with(
+        inputfile, drop_cache=False, xml_mode=False, cache_format="files"
+    )
+
+    mock_recompile.assert_called_once_with(
+        decomp_location,
         inputfile,
+        outputfile,
+        recompile_all=False,
+        xml_mode=False,
+        modified_files=modified_scripts,
+    )
+
+    mock_stagefile_parse.assert_called_once_with()
+
+    # Nothing is copied, scripts are linked from the cache as the patches touch them
+    mock_workspace.assert_called_once_with(decomp_location, ANY)
+    assert mock_workspace.call_args.args[1].location == cache
+
+    mock_workspace.return_value.clean.assert_called_once_with(modified_scripts)
+
+@patch('flash_patcher.compile.ffdec.FFDecInterface.save_config', MagicMock())
+@patch('flash_patcher.compile.ffdec.FFDecInterface.load_config', MagicMock(return_value=False))
+@patch('flash_patcher.patcher.get_build_fingerprint', MagicMock(return_value=None))
+@patch('flash_patcher.patcher.RunFolder', MagicMock(return_value=nullcontext(RUN_FOLDER)))
+@patch('flash_patcher.patcher.Workspace')
+@patch('flash_patcher.patcher.copy_file')
+@patch('flash_patcher.patcher.PatchfileManager')
+@patch('flash_patcher.compile.compilation.CompilationManager.recompile', MagicMock())
+@patch('flash_patcher.compile.compilation.CompilationManager.decompile')
+def test_main_success_xml(
+    mock_decompile: MagicMock,
+    mock_patchfile_manager: MagicMock,
+    mock_copy_file: MagicMock,
+    mock_workspace: MagicMock,
+) -> None:
+    mock_decompile.return_value = Path("cache/swf.xml")
+
+    main(
+        Path("input"),
         Path("../test/testdata"),
         Path("Stage1.stage"),
-        outputfile,
+        Path("test.swf"),
+        xml_mode=True,
     )
 
-    mock_decompile.assert_called_once_with(
-        inputfile, drop_cache=False, xml_mode=False
+    # The XML file is patched as a whole
+    mock_copy_file.assert_called_once_with(Path("cache/swf.xml"), RUN_FOLDER / "swf.xml")
+    mock_workspace.assert_not_called()
+    assert mock_patchfile_manager.call_args.kwargs["workspace"] is None
+
+@patch('flash_patcher.compile.ffdec.FFDecInterface.save_config', MagicMock())
+@patch('flash_patcher.compile.ffdec.FFDecInterface.load_config', MagicMock(return_value=False))
+@patch('flash_patcher.patcher.get_build_fingerprint', MagicMock(return_value=None))
+@patch('flash_patcher.patcher.RunFolder', MagicMock(return_value=nullcontext(RUN_FOLDER)))
+@patch('flash_patcher.patcher.Workspace')
+@patch('flash_patcher.patcher.PatchfileManager')
+@patch('flash_patcher.compile.compilation.CompilationManager.recompile')
+@patch('flash_patcher.compile.compilation.CompilationManager.decompile')
+def test_main_success_packed(
+    mock_decompile: MagicMock,
+    _: MagicMock,
+    mock_patchfile_manager: MagicMock,
+    mock_workspace: MagicMock,
+) -> None:
+    mock_decompile.return_value = Path("cache/scripts.db")
+    mock_patchfile_manager.return_value.parse.return_value = set()
+
+    main(
+        Path("input"),
+        Path("../test/testdata"),
+        Path("Stage1.stage"),
+        Path("test.swf"),
+        cache_format="packed",
     )
 
-    mock_recompile.assert_called_once_with(
-        Path('.Patcher-Temp/mod'), inputfile, outputfile, recompile_all=False, xml_mode=False
+    # Nothing is copied, scripts are extracted as the patches touch them
+    mock_workspace.assert_called_once_with(RUN_FOLDER / "mod", ANY)
+    assert mock_workspace.call_args.args[1].location == Path("cache/scripts.db")
+
+    workspace = mock_patchfile_manager.call_args.kwargs["workspace"]
+    assert workspace is mock_workspace.return_value
+
+    mock_workspace.return_value.clean.assert_called_once_with(set())
+
+@patch('flash_patcher.compile.ffdec.FFDecInterface.save_config', MagicMock())
+@patch('flash_patcher.compile.ffdec.FFDecInterface.load_config', MagicMock(return_value=False))
+@patch('flash_patcher.patcher.get_build_fingerprint', MagicMock(return_value=None))
+@patch('flash_patcher.patcher.RunFolder', MagicMock(return_value=nullcontext(RUN_FOLDER)))
+@patch('flash_patcher.patcher.collect_script_targets', MagicMock(return_value={"frame_1/a.as"}))
+@patch('flash_patcher.patcher.Workspace')
+@patch('flash_patcher.patcher.PatchfileManager', MagicMock())
+@patch('flash_patcher.compile.compilation.CompilationManager.recompile', MagicMock())
+@patch('flash_patcher.compile.compilation.CompilationManager.export_selected')
+@patch('flash_patcher.compile.compilation.CompilationManager.decompile')
+def test_main_success_selective(
+    mock_decompile: MagicMock,
+    mock_export_selected: MagicMock,
+    mock_workspace: MagicMock,
+) -> None:
+    mock_decompile.return_value = Path("cache/export")
+    mock_export_selected.return_value = True
+
+    main(
+        Path("input"),
+        Path("../test/testdata"),
+        Path("Stage1.stage"),
+        Path("test.swf"),
+        selective=True,
     )
 
-    mock_stagefile_parse.assert_called_once_with()
+    mock_export_selected.assert_called_once_with(
+        Path("input"),
+        RUN_FOLDER / "selected",
+        {"frame_1/a.as"},
+        drop_cache=False,
+        cache_format="files",
+    )
+
+    # The whole SWF is only decompiled once a patch needs a script that wasn't selected
+    mock_decompile.assert_not_called()
 
-    mock_shutil_copytree.assert_called_once_with(cache, Path("./.Patcher-Temp/mod/"))
+    scripts = mock_workspace.call_args.args[1]
+    assert scripts.selected.location == RUN_FOLDER / "selected"
+    assert scripts.get_all().location == Path("cache/export")
+    mock_decompile.assert_called_once()
+
+@patch('flash_patcher.compile.ffdec.FFDecInterface.save_config', MagicMock())
+@patch('flash_patcher.compile.ffdec.FFDecInterface.load_config', MagicMock(return_value=False))
+@patch('flash_patcher.patcher.restore_build')
+@patch('flash_patcher.patcher.get_build_fingerprint')
+@patch('flash_patcher.compile.compilation.CompilationManager.decompile')
+def test_main_success_unchanged(
+    mock_decompile: MagicMock,
+    mock_get_build_fingerprint: MagicMock,
+    mock_restore_build: MagicMock,
+) -> None:
+    mock_get_build_fingerprint.return_value = "build1"
+    mock_restore_build.return_value = True
+
+    main(
+        Path("input"),
+        Path("../test/testdata"),
+        Path("Stage1.stage"),
+        Path("test.swf"),
+    )
+
+    assert mock_get_build_fingerprint.call_args.args[4] == ["all=False", "xml=False", "pcode=False"]
+    mock_restore_build.assert_called_once_with(ANY, "build1", Path("test.swf"))
+    mock_decompile.assert_not_called()
+
+@patch('flash_patcher.compile.ffdec.FFDecInterface.save_config', MagicMock())
+@patch('flash_patcher.compile.ffdec.FFDecInterface.load_config', MagicMock(return_value=False))
+@patch('flash_patcher.patcher.store_build')
+@patch('flash_patcher.patcher.restore_build')
+@patch('flash_patcher.patcher.get_build_fingerprint')
+@patch('flash_patcher.patcher.PatchfileManager', MagicMock())
+@patch('flash_patcher.patcher.Workspace', MagicMock())
+@patch('flash_patcher.compile.compilation.CompilationManager.recompile')
+@patch('flash_patcher.compile.compilation.CompilationManager.decompile', MagicMock())
+def test_main_success_store_build(
+    mock_recompile: MagicMock,
+    mock_get_build_fingerprint: MagicMock,
+    mock_restore_build: MagicMock,
+    mock_store_build: MagicMock,
+) -> None:
+    mock_get_build_fingerprint.return_value = "build1"
+
+    with TemporaryDirectory() as temp_dir:
+        output = Path(temp_dir, "test.swf")
+        mock_recompile.side_effect = lambda *_, **__: output.write_bytes(b"FWS")
+
+        main(
+            Path("input"),
+            Path("../test/testdata"),
+            Path("Stage1.stage"),
+            output,
+            drop_cache=True,
+            cache_size=1024,
+            build_cache_size=512,
+        )
+
+    # The build cache is skipped when the cache is invalidated, but the new output is stored
+    mock_restore_build.assert_not_called()
+    mock_store_build.assert_called_once_with(ANY, "build1", output)
+
+    # The build cache has its own budget
+    assert mock_store_build.call_args.args[0].max_size == 512
+
+@patch('flash_patcher.compile.ffdec.FFDecInterface.save_config', MagicMock())
+@patch('flash_patcher.compile.ffdec.FFDecInterface.load_config', MagicMock(return_value=False))
+@patch('flash_patcher.patcher.store_build')
+@patch('flash_patcher.patcher.restore_build', MagicMock(return_value=False))
+@patch('flash_patcher.patcher.get_build_fingerprint', MagicMock(return_value="build1"))
+@patch('flash_patcher.patcher.PatchfileManager', MagicMock())
+@patch('flash_patcher.patcher.Workspace', MagicMock())
+@patch('flash_patcher.compile.compilation.CompilationManager.recompile', MagicMock())
+@patch('flash_patcher.compile.compilation.CompilationManager.decompile', MagicMock())
+def test_main_success_stale_output(mock_store_build: MagicMock) -> None:
+    with TemporaryDirectory() as temp_dir:
+        output = Path(temp_dir, "test.swf")
+        output.write_bytes(b"old")
+
+        main(
+            Path("input"),
+            Path("../test/testdata"),
+            Path("Stage1.stage"),
+            output,
+        )
+
+        # The output of an earlier run is removed, so it isn't stored as this build
+        assert not output.exists()
+
+    mock_store_build.assert_not_called()
+
+@patch('flash_patcher.patcher.restore_build', MagicMock(return_value=True))
+@patch('flash_patcher.patcher.get_build_fingerprint', MagicMock(return_value="build1"))
+@patch('flash_patcher.patcher.CompilationManager')
+def test_main_success_ffdec_override(mock_compilation_manager: MagicMock) -> None:
+    main(
+        Path("input"),
+        Path("../test/testdata"),
+        Path("Stage1.stage"),
+        Path("test.swf"),
+        ffdec="/opt/ffdec/ffdec.sh --verbose",
+    )
+
+    # The provided FFDec is used as is, without detection
+    decompiler = mock_compilation_manager.call_args.args[1]
+    assert decompiler.path == Path("/opt/ffdec/ffdec.sh")
+    assert decompiler.args == ["--verbose"]
+    assert decompiler.config_location.parent.name == "ffdec-installs"
+
+@patch('flash_patcher.patcher.get_build_fingerprint', MagicMock(return_value=None))
+@patch('flash_patcher.patcher.RunFolder', MagicMock(side_effect=OSError("no space left")))
+@patch('flash_patcher.patcher.CompilationManager')
+def test_main_failure_ffdec_worker(mock_compilation_manager: MagicMock) -> None:
+    decompiler = mock_compilation_manager.return_value.decompiler
+
+    with raises(OSError):
+        main(
+            Path("input"),
+            Path("../test/testdata"),
+            Path("Stage1.stage"),
+            Path("test.swf"),
+            ffdec="/opt/ffdec/ffdec.sh",
+            ffdec_worker=True,
+            ffdec_java=True,
+        )
+
+    # The worker is stopped even if the run fails
+    decompiler.use_java.assert_called_once_with()
+    decompiler.start_worker.assert_called_once_with(Path("input"))
+    decompiler.stop_worker.assert_called_once_with()
+
+@patch('flash_patcher.patcher.get_build_fingerprint', MagicMock(return_value=None))
+@patch('flash_patcher.patcher.RunFolder', MagicMock(side_effect=OSError("no space left")))
+@patch('flash_patcher.patcher.CompilationManager')
+def test_main_failure_ffdec_report(mock_compilation_manager: MagicMock) -> None:
+    mock_compilation_manager.return_value.report_ffdec_calls.return_value = \
+        [FFDecCall(["-importScript"], "process", 1, 1.0)]
+
+    with TemporaryDirectory() as temp_dir:
+        report = Path(temp_dir, "ffdec.json")
+
+        # The report is written even if the run fails
+        for location in [report, Path(temp_dir, "missing", "ffdec.json")]:
+            with raises(OSError):
+                main(
+                    Path("input"),
+                    Path("../test/testdata"),
+                    Path("Stage1.stage"),
+                    Path("test.swf"),
+                    ffdec="/opt/ffdec/ffdec.sh",
+                    ffdec_report=location,
+                )
+
+        assert json.loads(report.read_text(encoding="utf-8"))[0]["status"] == 1
 
 @patch('flash_patcher.compile.compilation.CompilationManager.__init__')
 def test_main_failure_no_ffdec(mock_compilation_manager: MagicMock) -> None:
@@ -58,4 +345,51 @@ def test_main_failure_no_ffdec(mock_compilation_manager: MagicMock) -> None:
             Path("test.swf"),
         )
 
-    mock_compilation_manager.assert_called_once_with()
+    mock_compilation_manager.assert_called_once()
+
+@patch('flash_patcher.patcher.open_cache')
+def test_list_cache_success(mock_open_cache: MagicMock, capsys: CaptureFixture) -> None:
+    mock_entry = MagicMock(key="a" * 64, mode="script", size=2048, last_used=0, source="base.swf")
+    mock_open_cache.return_value.list_entries.return_value = [mock_entry]
+
+    list_cache(Path("/mnt/cache"))
+
+    mock_open_cache.assert_called_once_with(Path("/mnt/cache"))
+
+    output = capsys.readouterr().out
+    assert "aaaaaaaaaaaaaaaa  script" in output
+    assert "base.swf" in output
+    assert "1 entries, 2.0 KiB total" in output
+
+@patch('flash_patcher.patcher.prune_run_folders')
+@patch('flash_patcher.patcher.evict_files')
+@patch('flash_patcher.patcher.CacheManager')
+@patch('flash_patcher.patcher.open_cache')
+def test_prune_cache_success(
+    mock_open_cache: MagicMock,
+    mock_cache_manager: MagicMock,
+    mock_evict_files: MagicMock,
+    mock_prune_run_folders: MagicMock,
+) -> None:
+    mock_open_cache.return_value.prune.return_value = [MagicMock(size=100)]
+    mock_evict_files.return_value = [(Path("results/1"), 10)]
+
+    prune_cache(1024)
+
+    mock_open_cache.assert_called_once_with(None)
+    mock_open_cache.return_value.prune.assert_called_once_with(1024)
+    mock_cache_manager.assert_called_once_with(BUILD_CACHE_ROOT)
+    mock_cache_manager.return_value.prune.assert_called_once_with(1024)
+
+    # Cached patched scripts and parses are pruned too, and cleared without a budget
+    assert mock_evict_files.call_args_list == [
+        call(PATCH_RESULT_ROOT, 1024),
+        call(PARSE_CACHE_ROOT, 1024),
+    ]
+
+    # The folders of finished runs are removed too
+    mock_prune_run_folders.assert_called_once_with(None)
+
+    prune_cache(workspace_dir=Path("/dev/shm/runs"))
+    mock_evict_files.assert_called_with(PARSE_CACHE_ROOT, 0)
+    mock_prune_run_folders.assert_called_with(Path("/dev/shm/runs"))
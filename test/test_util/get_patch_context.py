@@ -3,31 +3,33 @@ from pathlib import Path
 from flash_patcher.antlr_source.PatchfileLexer import PatchfileLexer
 from flash_patcher.antlr_source.PatchfileParser import PatchfileParser
 
+from flash_patcher.parse.command_compiler import compile_patch
+from flash_patcher.parse.commands import Location, PatchCommand
 from flash_patcher.parse.common import CommonParseManager
 
-def get_add_patch_context(
+def get_patch_commands(
     file: Path,
-    offset: int,
-) -> PatchfileParser.LocationTokenContext:
+    kind: str | None = None,
+) -> list[PatchCommand]:
     parse_manager = CommonParseManager(PatchfileLexer, PatchfileParser)
-    root = parse_manager.get_root(file).addBlock(0)
+    commands = compile_patch(parse_manager.get_root(file))
 
-    return root.addBlockHeader(offset).locationToken()
+    return [command for command in commands if kind is None or command.kind == kind]
 
-def get_replace_patch_context(
+def get_add_patch_location(
     file: Path,
     offset: int,
-) -> PatchfileParser.LocationTokenContext:
-    parse_manager = CommonParseManager(PatchfileLexer, PatchfileParser)
-    root = parse_manager.get_root(file).replaceNthBlock(0)
-
-    return root.replaceNthBlockHeader(offset).locationToken()
+) -> Location:
+    return get_patch_commands(file, "add")[0].targets[offset].locations[0]
 
-def get_remove_patch_context(
+def get_replace_patch_location(
     file: Path,
     offset: int,
-) -> PatchfileParser.LocationTokenContext:
-    parse_manager = CommonParseManager(PatchfileLexer, PatchfileParser)
-    root = parse_manager.get_root(file)
+) -> Location:
+    return get_patch_commands(file, "replace")[0].targets[offset].locations[0]
 
-    return root.removeBlock(offset)
+def get_remove_patch_command(
+    file: Path,
+    offset: int,
+) -> PatchCommand:
+    return get_patch_commands(file, "remove")[offset]
@@ -0,0 +1,31 @@
+import lzma
+import struct
+import zlib
+
+# A frame size rectangle with 5-bit coordinates, followed by the frame rate and frame count
+SWF_HEADER = bytes([0x28, 0, 0, 0]) + struct.pack("<HH", 24 << 8, 1)
+
+def make_tag(code: int, body: bytes = b"", long: bool = False) -> bytes:
+    if long or len(body) >= 0x3F:
+        return struct.pack("<HI", code << 6 | 0x3F, len(body)) + body
+
+    return struct.pack("<H", code << 6 | len(body)) + body
+
+def make_sprite(sprite_id: int, *tags: bytes) -> bytes:
+    return make_tag(39, struct.pack("<HH", sprite_id, 1) + b"".join(tags) + make_tag(0))
+
+def make_swf(*tags: bytes, signature: bytes = b"FWS", version: int = 8) -> bytes:
+    body = SWF_HEADER + b"".join(tags) + make_tag(0)
+    length = struct.pack("<I", len(body) + 8)
+
+    if signature == b"CWS":
+        return b"CWS" + bytes([version]) + length + zlib.compress(body)
+
+    if signature == b"ZWS":
+        # Convert the .lzma header (properties and length) to the SWF layout
+        compressed = lzma.compress(body, lzma.FORMAT_ALONE)
+        data = compressed[13:]
+        return b"ZWS" + bytes([version]) + length + struct.pack("<I", len(data)) \
+            + compressed[:5] + data
+
+    return b"FWS" + bytes([version]) + length + body
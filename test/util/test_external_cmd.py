@@ -1,3 +1,4 @@
+import sys
 from pathlib import Path
 from subprocess import CalledProcessError
 from unittest.mock import MagicMock, patch
@@ -8,6 +9,8 @@ from flash_patcher.parse.scope import Scope
 from flash_patcher.util.external_cmd import \
     ask_confirmation, run_with_confirmation_in_dir, check_output_in_dir, \
     get_modified_scripts_of_command
+from flash_patcher.util.logging import logger
+from flash_patcher.util.process_group import ProcessGroup
 
 @patch("sys.exit")
 @patch("builtins.input")
@@ -46,6 +49,8 @@ def test_run_in_dir_success(mock_input: MagicMock) -> None:
 def test_run_in_dir_failure(mock_input: MagicMock) -> None:
     mock_input.return_value = "y"
 
+    cwd = Path.cwd()
+
     with raises(CalledProcessError):
         run_with_confirmation_in_dir(
             # ls [nonexistent file] will return a nonzero exit code
@@ -53,6 +58,49 @@ def test_run_in_dir_failure(mock_input: MagicMock) -> None:
             Path("../test/")
         )
 
+    # The command runs in its directory, without changing ours
+    assert Path.cwd() == cwd
+
+@patch("builtins.input")
+def test_run_in_dir_stderr(mock_input: MagicMock) -> None:
+    mock_input.return_value = "y"
+
+    with patch.object(logger, "info") as mock_info:
+        output = run_with_confirmation_in_dir(
+            [sys.executable, "-c", "import sys; print('out'); print('err', file=sys.stderr)"],
+            Path("../"),
+        )
+
+    # Only stdout is the output, and stderr is logged as it's printed
+    assert output.stdout == "out\n"
+    mock_info.assert_called_once()
+    assert mock_info.call_args.args[-1] == "err"
+
+@patch("builtins.input")
+def test_run_in_dir_large_input(mock_input: MagicMock) -> None:
+    mock_input.return_value = "y"
+    stdin = "x" * 1000000
+
+    # Input and output larger than a pipe don't block each other
+    output = run_with_confirmation_in_dir(
+        [sys.executable, "-c", "import sys; print(sys.stdin.read())"],
+        Path("../"),
+        stdin,
+    )
+
+    assert output.stdout == stdin + "\n"
+
+@patch("builtins.input")
+def test_run_in_dir_cancelled(mock_input: MagicMock) -> None:
+    mock_input.return_value = "y"
+    group = ProcessGroup()
+
+    with group.batch():
+        group.cancel()
+
+        with raises(ChildProcessError):
+            run_with_confirmation_in_dir(["ls", "README.md"], Path("../"), group=group)
+
 @patch("builtins.input")
 def test_check_output_in_dir_success(mock_input: MagicMock) -> None:
     mock_input.return_value = "y"
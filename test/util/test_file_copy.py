@@ -1,7 +1,11 @@
+import os
 from pathlib import Path
+from tempfile import TemporaryDirectory
 from unittest.mock import MagicMock, patch
 
-from flash_patcher.util.file_copy import clean_scripts, copy_file
+from flash_patcher.util.file_copy import \
+    break_hardlink, clean_scripts, clone_file, copy_file, link_file, reset_folder, stage_file, \
+    stage_folder
 
 @patch('pathlib.Path.unlink')
 def test_clean_scripts_success(
@@ -102,3 +106,129 @@ def test_copy_directory_not_exists_success(
     mock_path_exists.assert_called_once_with()
     mock_path_isdir.assert_called_once_with()
     mock_shutil_copytree.assert_called_once_with(source, dest)
+
+def test_reset_folder_success() -> None:
+    with TemporaryDirectory() as temp_dir:
+        folder = Path(temp_dir, "mod")
+
+        reset_folder(folder)
+        assert folder.is_dir()
+
+        (folder / "scripts").mkdir()
+        (folder / "scripts" / "DoAction.as").write_text("", encoding="utf-8")
+
+        reset_folder(folder)
+        assert not any(folder.iterdir())
+
+@patch('fcntl.ioctl')
+def test_clone_file_success(mock_ioctl: MagicMock) -> None:
+    with TemporaryDirectory() as temp_dir:
+        source = Path(temp_dir, "source.as")
+        dest = Path(temp_dir, "dest.as")
+        source.write_bytes(b"trace(1);")
+
+        assert clone_file(source, dest)
+        assert dest.exists()
+
+    mock_ioctl.assert_called_once()
+
+@patch('fcntl.ioctl')
+def test_clone_file_unsupported(mock_ioctl: MagicMock) -> None:
+    mock_ioctl.side_effect = OSError("Operation not supported")
+
+    with TemporaryDirectory() as temp_dir:
+        source = Path(temp_dir, "source.as")
+        dest = Path(temp_dir, "dest.as")
+        source.write_bytes(b"trace(1);")
+
+        assert not clone_file(source, dest)
+        assert not dest.exists()
+
+@patch('sys.platform', "win32")
+def test_clone_file_not_linux() -> None:
+    assert not clone_file(Path("source.as"), Path("dest.as"))
+
+@patch('flash_patcher.util.file_copy.clone_file', MagicMock(return_value=False))
+def test_link_file_hardlink() -> None:
+    with TemporaryDirectory() as temp_dir:
+        source = Path(temp_dir, "source.as")
+        dest = Path(temp_dir, "dest.as")
+        source.write_bytes(b"trace(1);")
+
+        link_file(source, dest)
+
+        assert dest.samefile(source)
+
+        # Breaking the link leaves the source untouched
+        break_hardlink(dest)
+        assert not dest.exists()
+        assert source.read_bytes() == b"trace(1);"
+
+def test_break_hardlink_single_link() -> None:
+    with TemporaryDirectory() as temp_dir:
+        file = Path(temp_dir, "file.as")
+        file.write_bytes(b"trace(1);")
+
+        break_hardlink(file)
+        break_hardlink(Path(temp_dir, "missing.as"))
+        break_hardlink(Path(temp_dir))
+
+        assert file.exists()
+        assert Path(temp_dir).exists()
+
+@patch('os.link')
+@patch('flash_patcher.util.file_copy.clone_file')
+def test_link_file_cloned(mock_clone_file: MagicMock, mock_link: MagicMock) -> None:
+    mock_clone_file.return_value = True
+
+    link_file(Path("source.as"), Path("dest.as"))
+
+    mock_clone_file.assert_called_once_with(Path("source.as"), Path("dest.as"))
+    mock_link.assert_not_called()
+
+def test_stage_file_success() -> None:
+    with TemporaryDirectory() as temp_dir:
+        source = Path(temp_dir, "local.png")
+        dest = Path(temp_dir, "mod", "images", "18.png")
+        source.write_bytes(b"png")
+
+        # Folders are created as needed
+        stage_file(source, dest)
+        assert dest.read_bytes() == b"png"
+
+@patch('flash_patcher.util.file_copy.clone_file', MagicMock(return_value=False))
+def test_stage_file_replaced() -> None:
+    with TemporaryDirectory() as temp_dir:
+        source = Path(temp_dir, "local.png")
+        dest = Path(temp_dir, "18.png")
+        other = Path(temp_dir, "other.png")
+        source.write_bytes(b"new")
+        other.write_bytes(b"old")
+        os.link(other, dest)
+
+        stage_file(source, dest)
+
+        # Other links to the file keep their content
+        assert dest.read_bytes() == b"new"
+        assert other.read_bytes() == b"old"
+
+        # The file is a copy, so writing it in place leaves the asset untouched
+        with dest.open("r+b") as file:
+            file.write(b"mod")
+
+        assert source.read_bytes() == b"new"
+
+def test_stage_folder_success() -> None:
+    with TemporaryDirectory() as temp_dir:
+        source = Path(temp_dir, "sounds")
+        dest = Path(temp_dir, "mod", "sounds")
+
+        (source / "music").mkdir(parents=True)
+        (source / "music" / "1.mp3").write_bytes(b"1")
+        (source / "0.mp3").write_bytes(b"0")
+
+        staged = stage_folder(source, dest, workers=2)
+
+        assert staged == [dest / "0.mp3", dest / "music" / "1.mp3"]
+        assert (dest / "music" / "1.mp3").read_bytes() == b"1"
+        assert stage_folder(Path(temp_dir, "missing"), dest) == []
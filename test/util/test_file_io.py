@@ -1,62 +1,125 @@
 from __future__ import annotations
 
+import os
 from pathlib import Path
+from tempfile import TemporaryDirectory
 from unittest import TestCase
 from unittest.mock import MagicMock, patch
 
 from pytest import raises
 
 from flash_patcher.exception.error_manager import ErrorManager
-from flash_patcher.util.file_io import FileWritebackManager, \
+from flash_patcher.util.file_io import FileBuffer, FileWritebackManager, \
     read_safe, readlines_safe, writelines_safe
 
 EXAMPLE_FILE = "../test/testdata/DoAction1.as"
 
 class FileWritebackManagerSpec (TestCase):
-    @patch('pathlib.Path.open', create=True)
+
+    temp_dir: TemporaryDirectory
+    script: Path
+
+    def setUp(self: FileWritebackManagerSpec) -> None:
+        # pylint: disable=consider-using-with
+        self.temp_dir = TemporaryDirectory()
+        self.script = Path(self.temp_dir.name, "DoAction.as")
+        self.script.write_bytes(b"a\r\nb\r\n")
+
+    def tearDown(self: FileWritebackManagerSpec) -> None:
+        self.temp_dir.cleanup()
+
+    @patch('pathlib.Path.write_bytes')
     def test_rw_safe_success(
         self: FileWritebackManagerSpec,
-        mock_open: MagicMock,
+        mock_write_bytes: MagicMock,
     ) -> None:
-        mock_file = MagicMock()
+        with FileWritebackManager(self.script, ErrorManager(".", 1)) as content:
+            assert content == "a\nb\n"
 
-        mock_open.return_value.__enter__.return_value = mock_file
+        # Nothing changed, so nothing is written
+        mock_write_bytes.assert_not_called()
 
-        with open(EXAMPLE_FILE, encoding="utf-8") as file:
-            content_expected = file.read()
-            mock_file.read.return_value = content_expected
+    def test_rwlines_safe_success(self: FileWritebackManagerSpec) -> None:
+        with FileWritebackManager(self.script, ErrorManager(".", 1), readlines=True) as content:
+            assert content == ["a\n", "b\n"]
+            content.insert(1, "c\n")
 
-        with patch.object(mock_file, 'writelines') as mock_writelines:
-            with FileWritebackManager(
-                Path(EXAMPLE_FILE),
-                ErrorManager(".", 1),
-            ) as content:
-                assert content == content_expected
+        assert self.script.read_bytes() == b"a\r\nc\r\nb\r\n"
 
-            mock_writelines.assert_called_once_with([content_expected])
+class FileBufferSpec (TestCase):
 
-    @patch('pathlib.Path.open', create=True)
-    def test_rwlines_safe_success(
-        self: FileWritebackManagerSpec,
-        mock_open: MagicMock,
-    ) -> None:
-        mock_file = MagicMock()
+    temp_dir: TemporaryDirectory
+    script: Path
+
+    def setUp(self: FileBufferSpec) -> None:
+        # pylint: disable=consider-using-with
+        self.temp_dir = TemporaryDirectory()
+        self.script = Path(self.temp_dir.name, "DoAction.as")
+
+    def tearDown(self: FileBufferSpec) -> None:
+        self.temp_dir.cleanup()
+
+    def read(self: FileBufferSpec, data: bytes) -> FileBuffer:
+        self.script.write_bytes(data)
+        return FileBuffer.read(self.script, ErrorManager(".", 1))
+
+    def test_get_text_success(self: FileBufferSpec) -> None:
+        buffer = self.read(b"a\r\n\xe9\xff\r\nb")
+
+        # Line endings are translated, and bytes that aren't UTF-8 are kept
+        assert buffer.get_text() == "a\n\udce9\udcff\nb"
+
+    def test_newline_success(self: FileBufferSpec) -> None:
+        assert self.read(b"a\r\nb\r\nc\n").newline == b"\r\n"
+        assert self.read(b"a\nb\r\nc\n").newline == b"\n"
+        assert self.read(b"").newline == b"\n"
+
+    def test_write_keeps_untouched_bytes(self: FileBufferSpec) -> None:
+        buffer = self.read(b"first\n\xff\r\nold\r\nlast\r\n")
+
+        buffer.write(buffer.get_text().replace("old", "new\nlines"))
 
-        mock_open.return_value.__enter__.return_value = mock_file
+        # Only the changed lines get the most common line ending of the file
+        assert self.script.read_bytes() == b"first\n\xff\r\nnew\r\nlines\r\nlast\r\n"
 
-        with open(EXAMPLE_FILE, encoding="utf-8") as file:
-            content_expected = file.readlines()
-            mock_file.readlines.return_value = content_expected
+    def test_write_no_final_newline(self: FileBufferSpec) -> None:
+        buffer = self.read(b"a\r\nb")
 
-        with patch.object(mock_file, 'writelines') as mock_writelines:
-            with FileWritebackManager(
-                Path(EXAMPLE_FILE),
-                ErrorManager(".", 1),
-                readlines=True,
-            ) as content:
-                assert content == content_expected
+        buffer.write("a\nb\nc")
 
-            mock_writelines.assert_called_once_with(content_expected)
+        assert self.script.read_bytes() == b"a\r\nb\r\nc"
+
+    def test_write_changed_range_only(self: FileBufferSpec) -> None:
+        buffer = self.read(b"a\nb\nc\n")
+
+        with patch('pathlib.Path.write_bytes') as mock_write_bytes, \
+            patch('pathlib.Path.open', wraps=self.script.open) as mock_open:
+            buffer.write("a\nb\nd\n")
+            buffer.write("a\nb\nd\n")
+
+        # The file is written in place from the first changed line, and only once
+        mock_open.assert_called_once_with("r+b")
+        mock_write_bytes.assert_not_called()
+        assert self.script.read_bytes() == b"a\nb\nd\n"
+
+    def test_write_truncate(self: FileBufferSpec) -> None:
+        buffer = self.read(b"a\nb\nc\n")
+
+        buffer.write("a\n")
+
+        assert self.script.read_bytes() == b"a\n"
+
+    def test_write_hardlinked(self: FileBufferSpec) -> None:
+        source = Path(self.temp_dir.name, "cache.as")
+        source.write_bytes(b"a\nb\n")
+        os.link(source, self.script)
+
+        buffer = FileBuffer.read(self.script, ErrorManager(".", 1))
+        buffer.write("a\nc\n")
+
+        # The file is replaced, so the file it was linked to is untouched
+        assert self.script.read_bytes() == b"a\nc\n"
+        assert source.read_bytes() == b"a\nb\n"
 
 def test_read_safe_success() -> None:
     content_actual = read_safe(
@@ -70,9 +133,9 @@ def test_read_safe_success() -> None:
     assert content_actual == content_expected
 
 
-@patch('pathlib.Path.open', create=True)
-def test_read_safe_failure_not_found(mock_open: MagicMock) -> None:
-    mock_open.return_value.__enter__.side_effect = FileNotFoundError("file not found.")
+@patch('pathlib.Path.read_bytes')
+def test_read_safe_failure_not_found(mock_read_bytes: MagicMock) -> None:
+    mock_read_bytes.side_effect = FileNotFoundError("file not found.")
 
     with raises(FileNotFoundError):
         read_safe(
@@ -80,11 +143,11 @@ def test_read_safe_failure_not_found(mock_open: MagicMock) -> None:
             ErrorManager(".", 1),
         )
 
-    mock_open.assert_called_once_with()
+    mock_read_bytes.assert_called_once_with()
 
-@patch('pathlib.Path.open', create=True)
-def test_read_safe_failure_directory(mock_open: MagicMock) -> None:
-    mock_open.return_value.__enter__.side_effect = IsADirectoryError("your file is invalid.")
+@patch('pathlib.Path.read_bytes')
+def test_read_safe_failure_directory(mock_read_bytes: MagicMock) -> None:
+    mock_read_bytes.side_effect = IsADirectoryError("your file is invalid.")
 
     with raises(IsADirectoryError):
         read_safe(
@@ -92,7 +155,7 @@ def test_read_safe_failure_directory(mock_open: MagicMock) -> None:
             ErrorManager(".", 1),
         )
 
-    mock_open.assert_called_once_with()
+    mock_read_bytes.assert_called_once_with()
 
 def test_readlines_safe_success() -> None:
     content_actual = readlines_safe(
@@ -105,9 +168,9 @@ def test_readlines_safe_success() -> None:
 
     assert content_actual == content_expected
 
-@patch('pathlib.Path.open', create=True)
-def test_readlines_safe_failure_not_found(mock_open: MagicMock) -> None:
-    mock_open.return_value.__enter__.side_effect = FileNotFoundError("file not found.")
+@patch('pathlib.Path.read_bytes')
+def test_readlines_safe_failure_not_found(mock_read_bytes: MagicMock) -> None:
+    mock_read_bytes.side_effect = FileNotFoundError("file not found.")
 
     with raises(FileNotFoundError):
         readlines_safe(
@@ -115,11 +178,11 @@ def test_readlines_safe_failure_not_found(mock_open: MagicMock) -> None:
             ErrorManager(".", 1),
         )
 
-    mock_open.assert_called_once_with()
+    mock_read_bytes.assert_called_once_with()
 
-@patch('pathlib.Path.open', create=True)
-def test_readlines_safe_failure_directory(mock_open: MagicMock) -> None:
-    mock_open.return_value.__enter__.side_effect = IsADirectoryError("your file is invalid.")
+@patch('pathlib.Path.read_bytes')
+def test_readlines_safe_failure_directory(mock_read_bytes: MagicMock) -> None:
+    mock_read_bytes.side_effect = IsADirectoryError("your file is invalid.")
 
     with raises(IsADirectoryError):
         readlines_safe(
@@ -127,28 +190,33 @@ def test_readlines_safe_failure_directory(mock_open: MagicMock) -> None:
             ErrorManager(".", 1),
         )
 
-    mock_open.assert_called_once_with()
+    mock_read_bytes.assert_called_once_with()
 
-# Overwriting write is super annoying...
-# We can't do it directly because TextIOWrapper is immutable
-@patch('pathlib.Path.open', create=True)
-def test_writelines_safe_success(mock_open: MagicMock) -> None:
-    mock_file = MagicMock()
+def test_writelines_safe_success() -> None:
+    with TemporaryDirectory() as temp_dir:
+        script = Path(temp_dir, "DoAction.as")
+        script.write_bytes(b"a\r\nb\r\n")
 
-    mock_open.return_value.__enter__.return_value = mock_file
+        writelines_safe(script, ["a\n", "content\n"])
 
-    with patch.object(mock_file, 'writelines') as mock_writelines:
-        writelines_safe(
-            Path(EXAMPLE_FILE),
-            ["content"]
-        )
-        mock_writelines.assert_called_once_with(["content"])
+        assert script.read_bytes() == b"a\r\ncontent\r\n"
+
+def test_writelines_safe_new_file() -> None:
+    with TemporaryDirectory() as temp_dir:
+        script = Path(temp_dir, "DoAction.as")
+
+        writelines_safe(script, ["content\n", ""])
 
-    mock_open.assert_called_once_with("w")
+        assert script.read_bytes() == b"content\n"
 
-@patch('pathlib.Path.open', create=True)
-def test_writelines_safe_failure_not_found(mock_open: MagicMock) -> None:
-    mock_open.return_value.__enter__.side_effect = FileNotFoundError("file not found.")
+@patch('pathlib.Path.write_bytes')
+@patch('pathlib.Path.read_bytes')
+def test_writelines_safe_failure_not_found(
+    mock_read_bytes: MagicMock,
+    mock_write_bytes: MagicMock,
+) -> None:
+    mock_read_bytes.side_effect = FileNotFoundError("file not found.")
+    mock_write_bytes.side_effect = FileNotFoundError("folder not found.")
 
     with raises(FileNotFoundError):
         writelines_safe(
@@ -156,11 +224,11 @@ def test_writelines_safe_failure_not_found(mock_open: MagicMock) -> None:
             ["content"],
         )
 
-    mock_open.assert_called_once_with("w")
+    mock_write_bytes.assert_called_once_with(b"content")
 
-@patch('pathlib.Path.open', create=True)
-def test_writelines_safe_failure_directory(mock_open: MagicMock) -> None:
-    mock_open.return_value.__enter__.side_effect = IsADirectoryError("your file is invalid.")
+@patch('pathlib.Path.read_bytes')
+def test_writelines_safe_failure_directory(mock_read_bytes: MagicMock) -> None:
+    mock_read_bytes.side_effect = IsADirectoryError("your file is invalid.")
 
     with raises(IsADirectoryError):
         writelines_safe(
@@ -168,4 +236,4 @@ def test_writelines_safe_failure_directory(mock_open: MagicMock) -> None:
             ["content"],
         )
 
-    mock_open.assert_called_once_with("w")
+    mock_read_bytes.assert_called_once_with()
@@ -0,0 +1,148 @@
+from __future__ import annotations
+
+import os
+import socket
+import time
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+from flash_patcher.util.file_lock import FileLock, is_process_alive, read_lock_state
+
+class FileLockSpec (TestCase):
+
+    temp_dir: TemporaryDirectory
+    path: Path
+
+    def setUp(self: FileLockSpec) -> None:
+        # pylint: disable=consider-using-with
+        self.temp_dir = TemporaryDirectory()
+        self.path = Path(self.temp_dir.name, "locks", "key.lock")
+
+    def tearDown(self: FileLockSpec) -> None:
+        self.temp_dir.cleanup()
+
+    def test_acquire_release_success(self: FileLockSpec) -> None:
+        lock = FileLock(self.path)
+
+        assert lock.acquire()
+        assert self.path.read_text(encoding="utf-8") == f"{socket.gethostname()} {os.getpid()}\n"
+
+        lock.release()
+        assert not self.path.exists()
+
+        # Releasing twice is harmless
+        lock.release()
+
+    def test_context_manager_success(self: FileLockSpec) -> None:
+        with FileLock(self.path) as lock:
+            assert lock.held
+            assert self.path.exists()
+
+        assert not self.path.exists()
+
+    def test_acquire_contended(self: FileLockSpec) -> None:
+        with FileLock(self.path):
+            other = FileLock(self.path, poll_interval=0.01)
+
+            assert not other.try_acquire()
+            assert not other.acquire(timeout=0.05)
+
+        assert other.try_acquire()
+        other.release()
+
+    def test_acquire_breaks_dead_holder(self: FileLockSpec) -> None:
+        self.path.parent.mkdir()
+        self.path.write_text(f"{socket.gethostname()} 999999999\n", encoding="utf-8")
+
+        lock = FileLock(self.path)
+
+        assert lock.try_acquire()
+        lock.release()
+
+    def test_acquire_breaks_old_lock(self: FileLockSpec) -> None:
+        self.path.parent.mkdir()
+        self.path.write_text("some-other-machine 1234\n", encoding="utf-8")
+        os.utime(self.path, (time.time() - 1000, time.time() - 1000))
+
+        lock = FileLock(self.path, stale_after=100)
+
+        assert lock.try_acquire()
+        lock.release()
+
+    def test_acquire_respects_fresh_remote_lock(self: FileLockSpec) -> None:
+        self.path.parent.mkdir()
+        self.path.write_text("some-other-machine 1234\n", encoding="utf-8")
+
+        assert not FileLock(self.path).try_acquire()
+
+    def test_refresh_success(self: FileLockSpec) -> None:
+        lock = FileLock(self.path, stale_after=0.04)
+        lock.acquire()
+
+        os.utime(self.path, (0, 0))
+        time.sleep(0.1)
+
+        assert self.path.stat().st_mtime > 0
+        lock.release()
+
+    def test_refresh_lock_removed(self: FileLockSpec) -> None:
+        lock = FileLock(self.path, stale_after=0.04)
+        lock.acquire()
+
+        self.path.unlink()
+        time.sleep(0.05)
+
+        lock.release()
+        assert not self.path.exists()
+
+    def test_is_stale_missing(self: FileLockSpec) -> None:
+        assert FileLock(self.path).is_stale(read_lock_state(self.path))
+
+    def test_break_lock_success(self: FileLockSpec) -> None:
+        self.path.parent.mkdir()
+        self.path.write_text("some-other-machine 1234\n", encoding="utf-8")
+        state = read_lock_state(self.path)
+
+        assert FileLock(self.path).break_lock(state)
+
+        # Nothing is left behind, and a lock that is already gone counts as broken
+        assert not any(self.path.parent.iterdir())
+        assert FileLock(self.path).break_lock(state)
+
+    def test_break_lock_taken_meanwhile(self: FileLockSpec) -> None:
+        self.path.parent.mkdir()
+        self.path.write_text("some-other-machine 1234\n", encoding="utf-8")
+        state = read_lock_state(self.path)
+
+        # Another process broke the lock and took it before this one got to it
+        self.path.write_text("another-machine 5678\n", encoding="utf-8")
+
+        assert not FileLock(self.path).break_lock(state)
+        assert self.path.read_text(encoding="utf-8") == "another-machine 5678\n"
+        assert list(self.path.parent.iterdir()) == [self.path]
+
+    @patch('os.link', MagicMock(side_effect=FileExistsError("taken again")))
+    def test_break_lock_taken_again(self: FileLockSpec) -> None:
+        self.path.parent.mkdir()
+        self.path.write_text("some-other-machine 1234\n", encoding="utf-8")
+        state = read_lock_state(self.path)
+        self.path.write_text("another-machine 5678\n", encoding="utf-8")
+
+        assert not FileLock(self.path).break_lock(state)
+        assert not any(self.path.parent.iterdir())
+
+def test_is_process_alive_success() -> None:
+    assert is_process_alive(os.getpid())
+    assert not is_process_alive(999999999)
+
+@patch('os.kill')
+def test_is_process_alive_other_user(mock_kill: MagicMock) -> None:
+    mock_kill.side_effect = PermissionError()
+
+    assert is_process_alive(1)
+
+@patch('os.name', 'nt')
+def test_is_process_alive_windows() -> None:
+    assert is_process_alive(999999999)
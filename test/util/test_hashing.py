@@ -0,0 +1,17 @@
+import hashlib
+from pathlib import Path
+
+from flash_patcher.util.hashing import hash_file, hash_parts
+
+EXAMPLE_FILE = "../test/testdata/DoAction1.as"
+
+def test_hash_file_success() -> None:
+    with open(EXAMPLE_FILE, "rb") as file:
+        expected = hashlib.sha256(file.read()).hexdigest()
+
+    assert hash_file(Path(EXAMPLE_FILE)) == expected
+
+def test_hash_parts_success() -> None:
+    assert hash_parts("a", "b") == hash_parts("a", "b")
+    assert hash_parts("ab", "c") != hash_parts("a", "bc")
+    assert len(hash_parts("a")) == 64
@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from subprocess import PIPE, Popen
+from threading import Lock
+
+from pytest import raises
+
+from flash_patcher.util.process_group import ProcessGroup
+
+SLEEP = [sys.executable, "-c", "import time; time.sleep(30)"]
+
+def test_popen_limit() -> None:
+    group = ProcessGroup(2)
+    lock = Lock()
+    running = [0, 0]
+
+    def run() -> None:
+        with group.popen([sys.executable, "-c", "import time; time.sleep(0.2)"]) as process:
+            with lock:
+                running[0] += 1
+                running[1] = max(running)
+
+            process.wait()
+
+            with lock:
+                running[0] -= 1
+
+    with ThreadPoolExecutor(4) as executor:
+        for future in [executor.submit(run) for _ in range(4)]:
+            future.result()
+
+    # Never more than 2 processes at once
+    assert running[1] == 2
+    assert not group.running
+
+def test_invalid_limit() -> None:
+    for limit in [0, -1]:
+        with raises(ValueError):
+            ProcessGroup(limit)
+
+def test_popen_output() -> None:
+    with ProcessGroup().popen([sys.executable, "-c", "print('hi')"], stdout=PIPE) as process:
+        assert process.stdout.read().strip() == b"hi"
+
+    assert process.returncode == 0
+
+def test_cancel() -> None:
+    group = ProcessGroup()
+
+    with group.batch():
+        with group.popen(SLEEP) as process:
+            with group.batch():
+                start = time.monotonic()
+                group.cancel()
+
+            # An inner batch doesn't end the cancellation
+            assert group.cancelled
+            process.wait()
+
+        assert process.returncode != 0
+        assert time.monotonic() - start < 10
+
+        with raises(ChildProcessError):
+            with group.popen(SLEEP):
+                pass
+
+    # Processes can start again once the batch is over
+    with group.popen([sys.executable, "-c", ""]) as process:
+        process.wait()
+
+    assert process.returncode == 0
+
+def test_track() -> None:
+    group = ProcessGroup(1)
+
+    with Popen(SLEEP) as process:
+        with group.batch():
+            with group.track(process):
+                # A tracked process holds a slot, and is killed on cancel
+                # pylint: disable=consider-using-with
+                assert not group.slots.acquire(blocking=False)
+                group.cancel()
+                process.wait()
+
+            assert process.returncode != 0
+            assert not group.running
+
+            with raises(ChildProcessError):
+                with group.track(process):
+                    pass
+
+def test_popen_failure() -> None:
+    start = time.monotonic()
+
+    # A process isn't left running when its context fails
+    with raises(KeyboardInterrupt):
+        with ProcessGroup().popen(SLEEP) as process:
+            raise KeyboardInterrupt
+
+    assert process.returncode != 0
+    assert time.monotonic() - start < 10
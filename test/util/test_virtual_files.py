@@ -0,0 +1,192 @@
+from __future__ import annotations
+
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from unittest.mock import ANY, patch
+
+from pytest import raises
+
+from flash_patcher.exception.error_manager import ErrorManager
+from flash_patcher.util.file_io import writelines_safe
+from flash_patcher.util.virtual_files import VirtualFileSystem
+
+class VirtualFileSystemSpec (TestCase):
+
+    temp_dir: TemporaryDirectory
+    first: Path
+    second: Path
+    error_manager: ErrorManager
+
+    def setUp(self: VirtualFileSystemSpec) -> None:
+        # pylint: disable=consider-using-with
+        self.temp_dir = TemporaryDirectory()
+        self.first = Path(self.temp_dir.name, "DoAction1.as")
+        self.second = Path(self.temp_dir.name, "DoAction2.as")
+        self.error_manager = ErrorManager("test.patch", 1)
+
+        self.first.write_text("a\nb\n", encoding="utf-8")
+        self.second.write_text("c\n", encoding="utf-8")
+
+    def tearDown(self: VirtualFileSystemSpec) -> None:
+        self.temp_dir.cleanup()
+
+    def test_read_once(self: VirtualFileSystemSpec) -> None:
+        files = VirtualFileSystem()
+
+        with patch('pathlib.Path.read_bytes') as mock_read_bytes:
+            mock_read_bytes.return_value = b"a\r\nb\r\n"
+
+            assert files.read(self.first, self.error_manager) == "a\nb\n"
+            assert files.readlines(self.first, self.error_manager) == ["a\n", "b\n"]
+            assert files.read(self.first, self.error_manager) == "a\nb\n"
+
+        mock_read_bytes.assert_called_once_with()
+
+    def test_readlines_missing(self: VirtualFileSystemSpec) -> None:
+        missing = Path(self.temp_dir.name, "missing.as")
+
+        with raises(FileNotFoundError):
+            VirtualFileSystem().readlines(missing, self.error_manager)
+
+    def test_flush_writes_dirty_files(self: VirtualFileSystemSpec) -> None:
+        files = VirtualFileSystem()
+
+        lines = files.readlines(self.first, self.error_manager)
+        lines.insert(1, "inserted\n")
+        files.write(self.first, lines)
+        files.write(self.first, files.read(self.first, self.error_manager).replace("b", "B"))
+        files.read(self.second, self.error_manager)
+
+        # Nothing is written until the flush
+        assert self.first.read_text(encoding="utf-8") == "a\nb\n"
+
+        with patch(
+            'flash_patcher.util.virtual_files.writelines_safe', wraps=writelines_safe,
+        ) as mock_writelines_safe:
+            files.flush()
+            files.flush()
+
+        # Only the changed file is written, once
+        mock_writelines_safe.assert_called_once_with(self.first, ["a\ninserted\nB\n"], ANY)
+        assert self.first.read_text(encoding="utf-8") == "a\ninserted\nB\n"
+        assert not files.dirty
+
+    def test_budget_spills_cold_files(self: VirtualFileSystemSpec) -> None:
+        files = VirtualFileSystem(budget=6)
+
+        files.write(self.first, "a\nb\nc\n")
+        assert self.first.read_text(encoding="utf-8") == "a\nb\n"
+
+        # Holding both files goes over budget, so the least recently used one is written.
+        # Files read from disk also count their original bytes.
+        files.read(self.second, self.error_manager)
+
+        assert self.first.read_text(encoding="utf-8") == "a\nb\nc\n"
+        assert list(files.files) == [self.second]
+        assert files.size == 4
+
+    def test_no_budget_writes_right_away(self: VirtualFileSystemSpec) -> None:
+        files = VirtualFileSystem(budget=0)
+
+        files.write(self.first, "")
+        files.read(self.second, self.error_manager)
+
+        assert self.first.read_text(encoding="utf-8") == ""
+        assert not files.files
+        assert files.size == 0
+
+    def test_evict_not_loaded(self: VirtualFileSystemSpec) -> None:
+        files = VirtualFileSystem()
+        files.evict(self.first)
+
+        assert self.first.read_text(encoding="utf-8") == "a\nb\n"
+
+    def test_sync_success(self: VirtualFileSystemSpec) -> None:
+        files = VirtualFileSystem()
+
+        files.write(self.first, ["x\n"])
+        files.sync()
+
+        assert self.first.read_text(encoding="utf-8") == "x\n"
+
+        # Files changed on disk are read again
+        self.first.write_text("y\n", encoding="utf-8")
+        assert files.read(self.first, self.error_manager) == "y\n"
+
+    def test_prefetch_success(self: VirtualFileSystemSpec) -> None:
+        files = VirtualFileSystem(workers=2)
+
+        files.prefetch([self.first, self.second])
+        files.prefetch([self.first])
+        files.prefetched[self.first].result()
+
+        # The content read ahead of time is used, once
+        self.first.write_text("changed\n", encoding="utf-8")
+
+        assert files.read(self.first, self.error_manager) == "a\nb\n"
+        assert files.read(self.second, self.error_manager) == "c\n"
+        assert not files.prefetched
+
+    def test_prefetch_missing(self: VirtualFileSystemSpec) -> None:
+        files = VirtualFileSystem()
+        missing = Path(self.temp_dir.name, "missing.as")
+
+        # Errors are reported to the patch that reads the file
+        files.prefetch([missing])
+
+        with raises(FileNotFoundError):
+            files.readlines(missing, self.error_manager)
+
+    def test_get_bytes_success(self: VirtualFileSystemSpec) -> None:
+        files = VirtualFileSystem()
+        self.first.write_bytes(b"a\r\nb\r\n")
+
+        assert files.get_bytes(self.first) == b"a\r\nb\r\n"
+
+        files.read(self.first, self.error_manager)
+        assert files.get_bytes(self.first) == b"a\r\nb\r\n"
+
+        # Changed files keep the bytes of their unchanged lines
+        files.write(self.first, "a\nB\n")
+        assert files.get_bytes(self.first) == b"a\r\nB\r\n"
+        assert self.first.read_bytes() == b"a\r\nb\r\n"
+
+    def test_get_bytes_new_file(self: VirtualFileSystemSpec) -> None:
+        files = VirtualFileSystem()
+        new = Path(self.temp_dir.name, "new.as")
+
+        files.write(new, ["x\n"])
+
+        assert files.get_bytes(new) == b"x\n"
+        assert new.read_bytes() == b"x\n"
+
+    def test_discard_success(self: VirtualFileSystemSpec) -> None:
+        files = VirtualFileSystem()
+
+        files.write(self.first, files.read(self.first, self.error_manager) + "c\n")
+        files.prefetch([self.second])
+
+        files.discard(self.first)
+        files.discard(self.second)
+        files.flush()
+
+        assert self.first.read_text(encoding="utf-8") == "a\nb\n"
+        assert not files.files
+        assert not files.prefetched
+        assert files.size == 0
+
+    def test_flush_failure_in_order(self: VirtualFileSystemSpec) -> None:
+        files = VirtualFileSystem()
+        missing = Path(self.temp_dir.name, "missing", "DoAction.as")
+
+        files.write(self.first, "x\n")
+        files.write(missing, "y\n")
+        files.write(self.second, "z\n")
+
+        with raises(FileNotFoundError):
+            files.flush()
+
+        # Other files are still written
+        assert self.second.read_text(encoding="utf-8") == "z\n"
+        assert files.dirty